@@ -0,0 +1,142 @@
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+DEFAULT_REPEAT = 7
+DEFAULT_MIN_TIME = 0.2  # seconds per repeat
+DEFAULT_THRESHOLD = 0.10  # relative slowdown reported as a regression
+
+
+class Benchmark:
+    """
+    A named hot-path operation. `setup()` returns a zero-argument callable that performs one
+    operation; it is called again before every repeat so stateful benchmarks start fresh.
+    """
+
+    def __init__(self, name, setup, group=None):
+        self.name = name
+        self.setup = setup
+        self.group = group or name.split(".", 1)[0]
+
+
+def _time_loops(op, loops):
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(loops):
+            op()
+        return time.perf_counter() - started
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+def _calibrate(bench, min_time):
+    """Loop count (1, 2, 5, 10, 20, ...) that makes one repeat last at least `min_time`."""
+    op = bench.setup()
+    op()  # warm up caches and lazy imports
+    loops = 1
+    while True:
+        for factor in (1, 2, 5):
+            n = loops * factor
+            if _time_loops(op, n) >= min_time:
+                return n
+        loops *= 10
+
+def run_benchmark(bench, repeat=DEFAULT_REPEAT, min_time=DEFAULT_MIN_TIME):
+    """
+    Times `bench` and returns per-operation statistics in microseconds.
+    The minimum over repeats is the number to compare; the others show the noise.
+    """
+    loops = _calibrate(bench, min_time)
+    per_op = []
+    for _ in range(repeat):
+        op = bench.setup()
+        per_op.append(_time_loops(op, loops) / loops * 1e6)
+    return {
+        "group": bench.group,
+        "loops": loops,
+        "repeat": repeat,
+        "min_us": min(per_op),
+        "median_us": statistics.median(per_op),
+        "stdev_us": statistics.stdev(per_op) if len(per_op) > 1 else 0.0,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.system(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+def save_results(path, results):
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _format_us(value):
+    if value < 1:
+        return f"{value * 1000:8.1f} ns"
+    if value < 1000:
+        return f"{value:8.2f} us"
+    return f"{value / 1000:8.2f} ms"
+
+def print_results(results, out=sys.stdout):
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}}  {'min':>11}  {'median':>11}  {'stdev':>11}  loops", file=out)
+    for name, r in results.items():
+        print(f"{name:<{width}}  {_format_us(r['min_us'])}  {_format_us(r['median_us'])}  "
+              f"{_format_us(r['stdev_us'])}  {r['loops']}x{r['repeat']}", file=out)
+
+def compare_results(baseline, results, threshold=DEFAULT_THRESHOLD, out=sys.stdout):
+    """
+    Prints current vs baseline minimums. Returns the names that got slower than `threshold`.
+    """
+    base_env = baseline.get("environment", {})
+    env = environment()
+    for key in ("python", "implementation", "machine"):
+        if base_env.get(key) != env.get(key):
+            print(f"warning: baseline {key} {base_env.get(key)!r} differs from {env.get(key)!r}; "
+                  f"numbers are not directly comparable", file=out)
+
+    base = baseline.get("results", {})
+    width = max((len(name) for name in (*results, *base)), default=10)
+    print(f"baseline: {base_env.get('commit')} ({base_env.get('created_at')})", file=out)
+    print(f"{'benchmark':<{width}}  {'baseline':>11}  {'current':>11}  change", file=out)
+    regressions = []
+    for name, r in results.items():
+        if name not in base:
+            print(f"{name:<{width}}  {'-':>11}  {_format_us(r['min_us'])}  new", file=out)
+            continue
+        ratio = r["min_us"] / base[name]["min_us"]
+        verdict = ""
+        if ratio > 1 + threshold:
+            verdict = "  SLOWER"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            verdict = "  faster"
+        print(f"{name:<{width}}  {_format_us(base[name]['min_us'])}  {_format_us(r['min_us'])}  "
+              f"{(ratio - 1) * 100:+6.1f}%{verdict}", file=out)
+    for name in base:
+        if name not in results:
+            print(f"{name:<{width}}  {_format_us(base[name]['min_us'])}  {'-':>11}  not run", file=out)
+    return regressions
@@ -0,0 +1,342 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import zlib
+
+from benchmarks.harness import (
+    DEFAULT_MIN_TIME, DEFAULT_REPEAT, DEFAULT_THRESHOLD,
+    Benchmark, compare_results, load_results, print_results, run_benchmark, save_results,
+)
+
+# Fill payloads as each exchange delivers them (one execution/order update per frame)
+BINANCE_EXECUTION_REPORT = {
+    "e": "executionReport", "E": 1700000000123, "s": "BTCUSDT", "c": "web_4f1b2c3d4e5f",
+    "S": "BUY", "o": "LIMIT", "f": "GTC", "q": "0.00066000", "p": "29850.00000000",
+    "P": "0.00000000", "F": "0.00000000", "g": -1, "C": "", "x": "TRADE", "X": "FILLED",
+    "r": "NONE", "i": 21875431234, "l": "0.00066000", "z": "0.00066000", "L": "29850.00000000",
+    "n": "0.00000066", "N": "BTC", "T": 1700000000120, "t": 3312345678, "I": 45123456789,
+    "w": False, "m": True, "M": True, "O": 1699999990000, "Z": "19.70100000",
+    "Y": "19.70100000", "Q": "0.00000000", "W": 1699999990000, "V": "EXPIRE_MAKER",
+}
+GATEIO_USERTRADES = {
+    "time": 1700000000, "time_ms": 1700000000123, "channel": "spot.usertrades", "event": "update",
+    "result": [{
+        "id": 5736713, "user_id": 1000001, "order_id": "30784428", "currency_pair": "BTC_USDT",
+        "create_time": 1700000000, "create_time_ms": "1700000000123.456", "side": "buy",
+        "amount": "0.00066", "role": "maker", "price": "29850", "fee": "0.00000066",
+        "fee_currency": "BTC", "point_fee": "0", "gt_fee": "0", "text": "apiv4",
+    }],
+}
+BYBIT_ORDER = {
+    "id": "5923240c6880ab-c59f-420b-9adb-3639adc9dd90", "topic": "order", "creationTime": 1700000000123,
+    "data": [{
+        "symbol": "BTCUSDT", "orderId": "5cf98598-39a7-459e-97bf-76ca765ee020", "side": "Buy",
+        "orderType": "Limit", "cancelType": "UNKNOWN", "price": "29850", "qty": "0.00066",
+        "orderIv": "", "timeInForce": "GTC", "orderStatus": "Filled", "orderLinkId": "",
+        "lastPriceOnCreated": "29900", "reduceOnly": False, "leavesQty": "0", "leavesValue": "0",
+        "cumExecQty": "0.00066", "cumExecValue": "19.701", "avgPrice": "29850",
+        "blockTradeId": "", "positionIdx": 0, "cumExecFee": "0.00000066", "feeCurrency": "BTC",
+        "createdTime": "1699999990000", "updatedTime": "1700000000120", "rejectReason": "EC_NoError",
+        "stopOrderType": "", "tpslMode": "", "triggerPrice": "", "takeProfit": "", "stopLoss": "",
+        "tpTriggerBy": "", "slTriggerBy": "", "tpLimitPrice": "", "slLimitPrice": "",
+        "triggerDirection": 0, "triggerBy": "", "closeOnTrigger": False, "category": "spot",
+        "placeType": "", "smpType": "None", "smpGroup": 0, "smpOrderId": "", "marketUnit": "",
+    }],
+}
+BITMART_ORDER = {
+    "table": "spot/user/order",
+    "data": [{
+        "symbol": "BTC_USDT", "side": "buy", "type": "limit", "notional": "", "size": "0.00066",
+        "ms_t": "1700000000123", "price": "29850.00", "filled_notional": "19.70100000",
+        "filled_size": "0.00066", "margin_trading": "0", "state": "6", "order_id": "137478201134228205",
+        "order_type": "0", "last_fill_time": "1700000000120", "last_fill_price": "29850.00",
+        "last_fill_count": "0.00066", "exec_type": "M", "detail_id": "256348632",
+        "client_order_id": "order4872191", "create_time": "1699999990000",
+        "update_time": "1700000000120", "order_mode": "spot", "entrust_type": "normal",
+        "order_state": "filled", "dealFee": "0.00000066", "fee_currency": "BTC",
+    }],
+}
+
+SYMBOL = "BTC/USDT"
+PRICE = 30000.0
+TICK_SIZE = "0.01"
+STEP_SIZE = "0.00001"
+MIN_NOTIONAL = 5.0
+ORDER_AMOUNT = 20.0
+LEVEL_PERCENT = 1.0
+STATUS_GRID_COUNTS = (1000, 5000)
+DEEP_GRID_LEVELS = (200,)  # SL levels in the deep-grid order update benchmark
+
+
+def _deflate(payload):
+    """BitMart's compressed channel sends raw deflate frames."""
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(payload) + compressor.flush()
+
+
+class _BenchExchange:
+    """
+    In-memory stand-in for a ccxt client: keeps a book of resting orders so cancels and
+    open-order lookups behave, and answers instantly so only the bot's own work is timed.
+    """
+
+    def __init__(self, exchange_id="binance", keep_orders=True):
+        self.id = exchange_id
+        self.name = exchange_id
+        self.keep_orders = keep_orders
+        self.orders = {}
+        self._next_id = 0
+
+    def _create(self, symbol, side, amount, price):
+        self._next_id += 1
+        order = {"id": str(self._next_id), "symbol": symbol, "side": side, "amount": amount,
+                 "price": price, "status": "open"}
+        if self.keep_orders:
+            self.orders[order["id"]] = order
+        return order
+
+    def create_limit_buy_order(self, symbol, amount, price, params=None):
+        return self._create(symbol, "buy", amount, price)
+
+    def create_limit_sell_order(self, symbol, amount, price, params=None):
+        return self._create(symbol, "sell", amount, price)
+
+    def fetch_open_orders(self, symbol=None):
+        return list(self.orders.values())
+
+    def cancel_order(self, order_id, symbol=None):
+        return self.orders.pop(order_id, None)
+
+    def fetch_balance(self):
+        return {"BTC": {"free": 0.00066}, "USDT": {"free": 1e6}}
+
+    def fill(self, side, pick):
+        """Removes the resting `side` order chosen by `pick` (min/max) and returns its price."""
+        order = pick((o for o in self.orders.values() if o["side"] == side), key=lambda o: o["price"])
+        del self.orders[order["id"]]
+        return order["price"]
+
+
+class _InlineTimer:
+    """threading.Timer replacement that runs the delayed placement immediately, in the caller."""
+
+    def __init__(self, interval, function, args=None, kwargs=None):
+        self.function = function
+        self.args = args or ()
+        self.kwargs = kwargs or {}
+
+    def start(self):
+        self.function(*self.args, **self.kwargs)
+
+
+class _ConnectedSocket:
+    class sock:
+        connected = True
+
+
+def decode_benchmarks():
+    texts = {name: json.dumps(payload) for name, payload in (
+        ("binance", BINANCE_EXECUTION_REPORT), ("gateio", GATEIO_USERTRADES), ("bybit", BYBIT_ORDER),
+    )}
+    bitmart_frame = _deflate(json.dumps(BITMART_ORDER).encode("utf-8"))
+
+    benches = [Benchmark(f"decode.{name}", lambda text=text: lambda: json.loads(text))
+               for name, text in texts.items()]
+    benches.append(Benchmark(
+        "decode.bitmart",
+        lambda: lambda: json.loads(zlib.decompress(bitmart_frame, -zlib.MAX_WBITS)),
+    ))
+    return benches
+
+def normalize_benchmarks():
+    from utils import trade_normalizers as tn
+
+    bybit_item = BYBIT_ORDER["data"][0]
+    cases = [
+        ("normalize.symbol", lambda: lambda: tn.normalize_symbol("btc_usdt")),
+        ("normalize.binance", lambda: lambda: tn.normalize_binance(BINANCE_EXECUTION_REPORT, 1)),
+        ("normalize.gateio", lambda: lambda: tn.normalize_gateio(GATEIO_USERTRADES, 1)),
+        ("normalize.bybit", lambda: lambda: tn.normalize_bybit(bybit_item, 1)),
+        ("normalize.bitmart", lambda: lambda: tn.normalize_bitmart(BITMART_ORDER, 1)),
+        ("normalize.dispatch", lambda: lambda: tn.normalize_trade_message("Binance", BINANCE_EXECUTION_REPORT, 1)),
+    ]
+    return [Benchmark(name, setup) for name, setup in cases]
+
+def quantize_benchmarks():
+    from exchanges.quantizer import Quantizer
+    from websocket_manager.websocket_manager import place_limit_buys
+
+    quantizer = Quantizer(TICK_SIZE, STEP_SIZE)
+    sl_prices = [PRICE * (1 - LEVEL_PERCENT / 100) ** (i + 1) for i in range(3)]
+
+    def place_buys():
+        exchange = _BenchExchange(keep_orders=False)
+        return lambda: place_limit_buys(exchange, SYMBOL, ORDER_AMOUNT, sl_prices, quantizer, MIN_NOTIONAL)
+
+    return [
+        Benchmark("quantize.round_price", lambda: lambda: quantizer.round_price(29850.123456)),
+        Benchmark("quantize.amount_to_steps", lambda: lambda: quantizer.amount_to_steps(ORDER_AMOUNT / 29850.12)),
+        Benchmark("quantize.place_limit_buys[3]", place_buys),
+    ]
+
+def order_update_benchmarks():
+    """
+    One SL fill followed by the TP fill it arms, against a scratch SQLite database, for the
+    default 3-level grid and a deep one. The 0.5 s delayed placements run inline so each
+    cycle leaves the grid as it found it.
+    """
+    from types import SimpleNamespace
+
+    from database import crud, models
+    from database.database import SessionLocal
+    from exchanges.quantizer import Quantizer
+    from grid_logic.levels import GridLevels
+    import websocket_manager.websocket_manager as wm
+
+    wm.threading = SimpleNamespace(Timer=_InlineTimer, Thread=wm.threading.Thread)
+    quantizer = Quantizer(TICK_SIZE, STEP_SIZE)
+    tp_levels = [quantizer.round_price(PRICE * (1 + LEVEL_PERCENT / 100))]
+
+    db_session = SessionLocal()
+    try:
+        key = models.ExchangeAPIKey(exchange="binance", api_key="bench", api_secret="bench", balance=ORDER_AMOUNT)
+        symbol_row = models.Symbol(symbol=SYMBOL)
+        db_session.add_all([key, symbol_row])
+        db_session.commit()
+        key_id, symbol_id = key.id, symbol_row.id
+    finally:
+        db_session.close()
+
+    def bench(name, sl_count):
+        sl_levels = [quantizer.round_price(PRICE * (1 - LEVEL_PERCENT / 100) ** (i + 1)) for i in range(sl_count)]
+        db_session = SessionLocal()
+        try:
+            config = models.ExchangeBotConfig(exchange_id=key_id, symbol_id=symbol_id, amount=ORDER_AMOUNT,
+                                              tp_percent=LEVEL_PERCENT, sl_percent=LEVEL_PERCENT)
+            db_session.add(config)
+            db_session.commit()
+            config_id = config.id
+        finally:
+            db_session.close()
+
+        def setup():
+            exchange = _BenchExchange()
+            db_session = SessionLocal()
+            try:
+                config = db_session.get(models.ExchangeBotConfig, config_id)
+                crud.close_order_levels(db_session, config_id)
+                levels = GridLevels.for_grid(config, SYMBOL, quantizer)
+                for price in tp_levels:
+                    levels.add_tp(price, exchange.create_limit_sell_order(SYMBOL, 0.00066, price)["id"])
+                for price in sl_levels:
+                    levels.add_sl(price, exchange.create_limit_buy_order(SYMBOL, 0.00066, price)["id"])
+                levels.save(db_session)
+                db_session.commit()
+            finally:
+                db_session.close()
+
+            def cycle():
+                wm.process_order_update(exchange, SYMBOL, config_id, ORDER_AMOUNT, quantizer, MIN_NOTIONAL,
+                                        LEVEL_PERCENT, LEVEL_PERCENT, exchange.fill("buy", max))
+                wm.process_order_update(exchange, SYMBOL, config_id, ORDER_AMOUNT, quantizer, MIN_NOTIONAL,
+                                        LEVEL_PERCENT, LEVEL_PERCENT, exchange.fill("sell", min))
+            return cycle
+
+        return Benchmark(name, setup)
+
+    return [bench("order_update.sl_then_tp_cycle", 3)] + [
+        bench(f"order_update.sl_then_tp_cycle[{count}]", count) for count in DEEP_GRID_LEVELS
+    ]
+
+def crud_benchmarks():
+    from database import crud
+    from database.database import SessionLocal
+    from utils.trade_normalizers import normalize_binance
+
+    # Built through the normalizer so the record is exactly what the handlers pass in
+    record = normalize_binance(BINANCE_EXECUTION_REPORT, 1)
+
+    def setup():
+        db_session = SessionLocal()
+        return lambda: crud.create_trade_record(db_session, record)
+
+    return [Benchmark("crud.create_trade_record", setup)]
+
+def status_benchmarks():
+    from grid_logic.grid_strategy import GridBot
+
+    exchanges = ("binance", "bybit", "gateio", "bitmart")
+    benches = []
+    for grids in STATUS_GRID_COUNTS:
+        def setup(grids=grids):
+            bot = GridBot()
+            socket = _ConnectedSocket()
+            for i in range(grids):
+                bot.websocket_connections[(exchanges[i % len(exchanges)], f"SYM{i // len(exchanges):05d}/USDT")] = socket
+            return bot.get_all_symbols_status
+        benches.append(Benchmark(f"status.get_all_symbols_status[{grids}]", setup))
+    return benches
+
+
+def all_benchmarks():
+    return (decode_benchmarks() + normalize_benchmarks() + quantize_benchmarks()
+            + order_update_benchmarks() + crud_benchmarks() + status_benchmarks())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times the per-fill / per-message code paths. Save a baseline on one commit and compare on another."
+    )
+    parser.add_argument("--only", action="append", default=[],
+                        help="run benchmarks whose name contains this text (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME, help="seconds per repeat")
+    parser.add_argument("--save", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown counted as a regression (exit status 1)")
+    parser.add_argument("--log-level", default="WARNING",
+                        help="bot log level while timing; the default keeps handler output out of the numbers")
+    args = parser.parse_args()
+
+    # The benchmarks write to the database, so they never touch the bot's own one
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='gridbot-bench-'), 'bench.db')}"
+    # Configured first so the bot modules' basicConfig(level=INFO) does not apply
+    logging.basicConfig(level=args.log_level.upper())
+
+    from database import models
+    from database.database import engine
+    models.Base.metadata.create_all(bind=engine)
+
+    benches = all_benchmarks()
+    if args.only:
+        benches = [b for b in benches if any(text in b.name for text in args.only)]
+    if args.list:
+        for bench in benches:
+            print(bench.name)
+        return
+
+    results = {}
+    for bench in benches:
+        results[bench.name] = run_benchmark(bench, args.repeat, args.min_time)
+        print(f"  {bench.name}: {results[bench.name]['min_us']:.2f} us", file=sys.stderr)
+
+    print_results(results)
+    if args.save:
+        save_results(args.save, results)
+        print(f"Saved baseline to {args.save}", file=sys.stderr)
+    if args.compare:
+        print()
+        regressions = compare_results(load_results(args.compare), results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than the baseline by more than "
+                  f"{args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Cold-start measurements for the API: where `import main` spends its time and how long a fresh
+uvicorn process takes to answer its first request. Every number comes from a new interpreter,
+so nothing is warm:
+
+    PYTHONPATH=src:. python -m benchmarks.startup [--repeat 5] [--json out.json]
+
+Exits with status 1 when a budget below is exceeded; tests/test_startup.py enforces the same ones.
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from benchmarks.harness import environment
+
+BACKEND = Path(__file__).resolve().parents[1]
+SRC = BACKEND / "src"
+
+# Dependencies `import main` must not load; each is imported where it is first used
+DEFERRED_MODULES = ("ccxt", "cryptography", "requests", "websocket")
+
+IMPORT_BUDGET = 3.0  # seconds for `import main` in a fresh interpreter
+FIRST_REQUEST_BUDGET = 6.0  # seconds from spawning uvicorn to the first 200
+FIRST_REQUEST_PATH = "/grid-bot/status"
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def _env(database_dir):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(SRC), str(BACKEND)])
+    # Measured against an empty scratch database, never the bot's own one
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(database_dir, 'startup.db')}"
+    for name in ("ENGINE_SOCKET", "GRID_WORKERS", "GRID_LEASES"):
+        env.pop(name, None)
+    return env
+
+def import_breakdown(module="main"):
+    """
+    Imports `module` in a fresh interpreter under -X importtime. Returns the total seconds,
+    the cumulative seconds per top-level package and the deferred modules that got loaded.
+    """
+    probe = f"import sys, {module}; print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    with tempfile.TemporaryDirectory(prefix="gridbot-startup-") as scratch:
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=SRC, env=_env(scratch),
+                              capture_output=True, text=True, timeout=120)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_us = 0
+    packages = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), len(match[3]), match[4]
+        if name == module and indent == 0:
+            total_us = cumulative_us
+        # Self time summed per top-level package attributes nested imports to whoever owns them
+        top = name.split(".", 1)[0]
+        packages[top] = packages.get(top, 0) + self_us
+    loaded = [name for name in proc.stdout.strip().split(",") if name]
+    return {
+        "import_seconds": total_us / 1e6,
+        "packages": {name: us / 1e6 for name, us in sorted(packages.items(), key=lambda item: -item[1])},
+        "deferred_loaded": loaded,
+    }
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_first_request(path=FIRST_REQUEST_PATH, timeout=60):
+    """Seconds from spawning `uvicorn main:app` until `path` returns 200."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}{path}"
+    with tempfile.TemporaryDirectory(prefix="gridbot-startup-") as scratch:
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=SRC, env=_env(scratch), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        try:
+            while time.perf_counter() - started < timeout:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {proc.returncode}:\n{proc.stderr.read().decode()[-2000:]}")
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        if response.status == 200:
+                            return time.perf_counter() - started
+                except OSError:
+                    pass
+                time.sleep(0.01)
+            raise TimeoutError(f"{url} did not answer within {timeout}s")
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+def measure(repeat=3):
+    """Best of `repeat` cold starts for both numbers, plus the breakdown of the fastest import."""
+    imports = min((import_breakdown() for _ in range(repeat)), key=lambda r: r["import_seconds"])
+    first_request = min(time_to_first_request() for _ in range(repeat))
+    return {**imports, "first_request_seconds": first_request}
+
+def over_budget(result, import_budget=IMPORT_BUDGET, first_request_budget=FIRST_REQUEST_BUDGET):
+    """Human-readable budget violations; empty when startup is within budget."""
+    problems = []
+    if result["deferred_loaded"]:
+        problems.append(f"import main loaded deferred modules: {', '.join(result['deferred_loaded'])}")
+    if result["import_seconds"] > import_budget:
+        problems.append(f"import main took {result['import_seconds']:.2f}s (budget {import_budget}s)")
+    if result["first_request_seconds"] > first_request_budget:
+        problems.append(f"first request after {result['first_request_seconds']:.2f}s (budget {first_request_budget}s)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures API cold start: import-time breakdown and time to first request.")
+    parser.add_argument("--repeat", type=int, default=3, help="cold starts per measurement; the best one counts")
+    parser.add_argument("--top", type=int, default=15, help="packages to list in the breakdown")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET)
+    parser.add_argument("--first-request-budget", type=float, default=FIRST_REQUEST_BUDGET)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    result = measure(args.repeat)
+    print(f"import main        {result['import_seconds'] * 1000:8.1f} ms")
+    print(f"first request      {result['first_request_seconds'] * 1000:8.1f} ms  (GET {FIRST_REQUEST_PATH})")
+    print("import time by package (self time):")
+    for name, seconds in list(result["packages"].items())[:args.top]:
+        print(f"  {name:<24} {seconds * 1000:8.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"environment": environment(), "results": result}, f, indent=2)
+
+    problems = over_budget(result, args.import_budget, args.first_request_budget)
+    for problem in problems:
+        print(f"OVER BUDGET: {problem}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
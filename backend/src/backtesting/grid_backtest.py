@@ -0,0 +1,246 @@
+import bisect
+import logging
+import time
+
+import numpy as np
+
+from exchanges.quantizer import Quantizer
+
+logger = logging.getLogger(__name__)
+
+# Bars scanned per vectorized search step; grows while no level is crossed
+_MIN_WINDOW = 256
+_MAX_WINDOW = 1 << 16
+
+
+def ohlcv_columns(ohlcv):
+    """
+    Splits a ccxt-style OHLCV array ([ts, open, high, low, close, volume] rows) into column arrays.
+    """
+    data = np.asarray(ohlcv, dtype=np.float64)
+    return data[:, 0], data[:, 1], data[:, 2], data[:, 3], data[:, 4]
+
+def load_ohlcv_csv(path):
+    """
+    Loads a CSV with timestamp,open,high,low,close[,volume] columns (header optional).
+    """
+    with open(path) as f:
+        first = f.readline()
+    skip = 0 if first[:1].isdigit() else 1
+    return ohlcv_columns(np.loadtxt(path, delimiter=",", skiprows=skip, ndmin=2))
+
+
+class GridBacktester:
+    """
+    Replays the live TP/SL grid rules over price bars:
+
+    - reset: market buy `amount` of quote, one TP sell for the whole position at +tp_percent,
+      `sl_levels` limit buys of `amount` each at price * (1 - sl_percent) ** k
+    - SL fill: buy, add a new SL below the lowest one and a rebound sell at +tp_percent
+    - TP fill (not the top one): sell, add an SL at -sl_percent under it and drop the lowest SL
+    - top TP fill: everything is sold and the grid is reset at that price
+
+    Between fills the levels are constant, so the next crossing bar is found with vectorized
+    NumPy scans and only fills run through the (sequential) state machine. Within a bar the path
+    is assumed to be open -> low -> high -> close for up bars and open -> high -> low -> close otherwise.
+    """
+
+    def __init__(self, tp_percent, sl_percent, amount, sl_levels=3, fee_rate=0.001,
+                 tick_size=None, step_size=None, min_notional=0.0):
+        if tp_percent <= 0 or sl_percent <= 0:
+            raise ValueError("tp_percent and sl_percent must be positive")
+        self.tp_percent = tp_percent
+        self.sl_percent = sl_percent
+        self.amount = amount
+        self.sl_level_count = sl_levels
+        self.fee_rate = fee_rate
+        self.min_notional = min_notional or 0.0
+        self.quantizer = Quantizer(tick_size, step_size) if tick_size and step_size else None
+
+    # --- helpers -------------------------------------------------------------
+
+    def _price(self, price):
+        return self.quantizer.round_price(price) if self.quantizer else price
+
+    def _below(self, price):
+        """SL price one sl_percent under `price`, at least one tick lower so cascades always end."""
+        new_price = self._price(price * (1 - self.sl_percent / 100))
+        if self.quantizer and new_price >= price:
+            new_price = self.quantizer.ticks_to_price(self.quantizer.price_to_ticks(price) - 1)
+        return new_price
+
+    def _qty(self, qty):
+        return self.quantizer.floor_amount(qty) if self.quantizer else qty
+
+    def _fill(self, side, qty, price):
+        notional = qty * price
+        fee = notional * self.fee_rate
+        self.fees += fee
+        if side == "buy":
+            self.cash -= notional + fee
+            self.base += qty
+        else:
+            self.cash += notional - fee
+            self.base -= qty
+
+    def _add_sl(self, price):
+        if price <= 0:
+            return
+        qty = self._qty(self.amount / price)
+        if qty <= 0 or (self.min_notional and qty * price < self.min_notional):
+            # Live code keeps the level but never places the order
+            self.skipped += 1
+            qty = 0.0
+        bisect.insort(self.sls, (price, qty))
+
+    def _reset(self, price):
+        # close_and_sell_all: cancel everything and sell the remaining position at market
+        if self.base > 0:
+            self._fill("sell", self.base, price)
+        self.tps = []
+        self.sls = []
+
+        qty = self._qty(self.amount / price)
+        if qty <= 0 or (self.min_notional and qty * price < self.min_notional):
+            self.halted = True
+            return
+        self._fill("buy", qty, price)
+        self.resets += 1
+        self.tps.append((self._price(price * (1 + self.tp_percent / 100)), self.base))
+        for i in range(self.sl_level_count):
+            self._add_sl(self._price(price * (1 - self.sl_percent / 100) ** (i + 1)))
+
+    # --- per-bar phases ------------------------------------------------------
+
+    def _sl_phase(self, low):
+        # Highest SL first; each fill adds a lower SL, which may fill in the same bar too
+        while self.sls and self.sls[-1][0] >= low:
+            sl_price, qty = self.sls.pop()
+            lowest = self.sls[0][0] if self.sls else sl_price
+            self._add_sl(self._below(lowest))
+            if qty > 0:
+                self._fill("buy", qty, sl_price)
+            self.sl_fills += 1
+            bisect.insort(self.tps, (self._price(sl_price * (1 + self.tp_percent / 100)), qty))
+
+    def _tp_phase(self, high):
+        if not self.tps or self.tps[0][0] > high:
+            return
+        if self.tps[-1][0] <= high:
+            # The top TP filled: every TP is gone and the grid resets at that price
+            for tp_price, qty in self.tps:
+                if qty > 0:
+                    self._fill("sell", min(qty, self.base), tp_price)
+            self.tp_fills += len(self.tps)
+            self._reset(self.tps[-1][0])
+            return
+
+        crossed = bisect.bisect_right(self.tps, (high, float("inf")))
+        for tp_price, qty in self.tps[:crossed]:
+            if qty > 0:
+                self._fill("sell", min(qty, self.base), tp_price)
+            self.tp_fills += 1
+            if self.sls:
+                self.sls.pop(0)  # cancel the lowest SL
+            self._add_sl(self._below(tp_price))
+        del self.tps[:crossed]
+
+    # --- main loop -----------------------------------------------------------
+
+    def run(self, high, low, close, open_=None):
+        """
+        Runs the grid over bar arrays. For trade ticks pass the same price array three times.
+        Returns a report dict with PnL, drawdown and fill counts.
+        """
+        started = time.perf_counter()
+        high = np.ascontiguousarray(high, dtype=np.float64)
+        low = np.ascontiguousarray(low, dtype=np.float64)
+        close = np.ascontiguousarray(close, dtype=np.float64)
+        open_ = close if open_ is None else np.ascontiguousarray(open_, dtype=np.float64)
+        n = len(close)
+
+        self.cash = 0.0
+        self.base = 0.0
+        self.fees = 0.0
+        self.tps, self.sls = [], []
+        self.sl_fills = self.tp_fills = self.resets = self.skipped = 0
+        self.halted = False
+
+        # State snapshots: from bar change_idx[k] on, the account holds cash_seg[k] / base_seg[k]
+        change_idx, cash_seg, base_seg = [], [], []
+
+        if n:
+            self._reset(open_[0])
+            change_idx.append(0); cash_seg.append(self.cash); base_seg.append(self.base)
+
+        i = 0
+        window = _MIN_WINDOW
+        while i < n and not self.halted:
+            tp_min = self.tps[0][0] if self.tps else np.inf
+            sl_max = self.sls[-1][0] if self.sls else -np.inf
+
+            end = min(i + window, n)
+            hits = np.flatnonzero((high[i:end] >= tp_min) | (low[i:end] <= sl_max))
+            if not len(hits):
+                i = end
+                window = min(window * 2, _MAX_WINDOW)
+                continue
+            window = _MIN_WINDOW
+            i += int(hits[0])
+
+            if close[i] >= open_[i]:
+                self._sl_phase(low[i])
+                self._tp_phase(high[i])
+            else:
+                self._tp_phase(high[i])
+                self._sl_phase(low[i])
+
+            change_idx.append(i); cash_seg.append(self.cash); base_seg.append(self.base)
+            i += 1
+
+        report = self._report(close, change_idx, cash_seg, base_seg)
+        report["elapsed"] = round(time.perf_counter() - started, 4)
+        return report
+
+    def _report(self, close, change_idx, cash_seg, base_seg):
+        n = len(close)
+        if not n:
+            return {"bars": 0, "pnl": 0.0, "fills": {}}
+
+        # Expand the piecewise-constant state to per-bar equity without a Python loop
+        bounds = np.append(np.asarray(change_idx, dtype=np.int64), n)
+        lengths = np.diff(bounds)
+        cash = np.repeat(np.asarray(cash_seg), lengths)
+        base = np.repeat(np.asarray(base_seg), lengths)
+        equity = cash + base * close
+
+        peak = np.maximum.accumulate(equity)
+        drawdowns = peak - equity
+        worst = int(np.argmax(drawdowns))
+        capital = max(-float(np.min(cash)), self.amount)
+
+        return {
+            "bars": n,
+            "pnl": float(equity[-1]),
+            "return_pct": float(equity[-1]) / capital * 100,
+            "capital_used": capital,
+            "fees": float(self.fees),
+            "max_drawdown": float(drawdowns[worst]),
+            "max_drawdown_pct": float(drawdowns[worst]) / capital * 100,
+            "open_position": float(self.base),
+            "halted": self.halted,
+            "fills": {
+                "sl": self.sl_fills,
+                "tp": self.tp_fills,
+                "resets": self.resets,
+                "skipped_orders": self.skipped,
+            },
+        }
+
+
+def run_backtest(ohlcv, tp_percent, sl_percent, amount, **kwargs):
+    """
+    Convenience wrapper: backtests a ccxt-style OHLCV array with GridBacktester.
+    """
+    _, open_, high, low, close = ohlcv_columns(ohlcv)
+    return GridBacktester(tp_percent, sl_percent, amount, **kwargs).run(high, low, close, open_)
@@ -0,0 +1,218 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import time
+import sys
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtesting.grid_backtest import GridBacktester, load_ohlcv_csv
+
+logger = logging.getLogger(__name__)
+
+RANK_METRICS = ("return_pct", "pnl", "pnl_per_drawdown")
+TASK_CHUNK = 16  # parameter sets per worker task
+
+
+def param_grid(tp_percents, sl_percents, sl_levels=(3,), amounts=(10.0,), samples=None, seed=None):
+    """
+    Cartesian product of the given values, or `samples` random picks from it when set.
+    Returns a list of dicts with tp_percent, sl_percent, sl_levels and amount keys.
+    """
+    combos = [
+        {"tp_percent": tp, "sl_percent": sl, "sl_levels": levels, "amount": amount}
+        for tp, sl, levels, amount in itertools.product(tp_percents, sl_percents, sl_levels, amounts)
+    ]
+    if samples is not None and samples < len(combos):
+        combos = random.Random(seed).sample(combos, samples)
+    return combos
+
+
+class SharedPriceStore:
+    """
+    Holds each symbol's open/high/low/close columns in one shared memory block,
+    so pool workers map the same pages instead of receiving pickled copies.
+    """
+
+    def __init__(self, data):
+        self.blocks = {}
+        self.descriptors = {}
+        for symbol, (open_, high, low, close) in data.items():
+            columns = np.vstack([open_, high, low, close]).astype(np.float64)
+            block = shared_memory.SharedMemory(create=True, size=max(columns.nbytes, 1))
+            np.ndarray(columns.shape, dtype=np.float64, buffer=block.buf)[:] = columns
+            self.blocks[symbol] = block
+            self.descriptors[symbol] = (block.name, columns.shape)
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Per-worker-process state, filled by _init_worker
+_worker_arrays = {}
+_worker_blocks = []
+
+def _attach(name):
+    # The parent owns (and unlinks) the blocks. Before 3.13 pool workers share the parent's
+    # resource tracker, where registering an existing block again is a no-op.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+def _init_worker(descriptors):
+    for symbol, (name, shape) in descriptors.items():
+        block = _attach(name)
+        _worker_blocks.append(block)
+        _worker_arrays[symbol] = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+
+def _run_chunk(symbol, combos, market_rules, fee_rate):
+    open_, high, low, close = _worker_arrays[symbol]
+    results = []
+    for params in combos:
+        report = GridBacktester(fee_rate=fee_rate, **params, **market_rules).run(high, low, close, open_)
+        drawdown = report.get("max_drawdown") or 0.0
+        report["pnl_per_drawdown"] = report["pnl"] / drawdown if drawdown else report["pnl"]
+        results.append({"symbol": symbol, **params, **report})
+    return results
+
+
+def run_sweep(data, combos, market_rules=None, fee_rate=0.001, max_workers=None, rank_by="return_pct"):
+    """
+    Backtests every parameter set in `combos` on every symbol of `data`
+    ({symbol: (open, high, low, close)}) across a process pool.
+    `market_rules` optionally maps symbol -> {"tick_size", "step_size", "min_notional"}.
+    Returns all results ranked by `rank_by`, best first. Symbols without bars have nothing to
+    rank and are left out.
+    """
+    if rank_by not in RANK_METRICS:
+        raise ValueError(f"rank_by must be one of {RANK_METRICS}")
+    market_rules = market_rules or {}
+    started = time.perf_counter()
+
+    results = []
+    with SharedPriceStore(data) as store:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(store.descriptors,)) as pool:
+            futures = [
+                pool.submit(_run_chunk, symbol, combos[i:i + TASK_CHUNK],
+                            market_rules.get(symbol, {}), fee_rate)
+                for symbol in data
+                for i in range(0, len(combos), TASK_CHUNK)
+            ]
+            for future in as_completed(futures):
+                results.extend(future.result())
+
+    empty = sorted({r["symbol"] for r in results if not r["bars"]})
+    if empty:
+        logger.warning(f"Sweep: no bars for {', '.join(empty)}; left out of the ranking")
+    results = [r for r in results if r["bars"]]
+    results.sort(key=lambda r: r[rank_by], reverse=True)
+    logger.info(
+        f"Sweep: {len(combos)} parameter sets x {len(data)} symbols in "
+        f"{time.perf_counter() - started:.2f}s"
+    )
+    return results
+
+def best_per_symbol(results):
+    """
+    First (best ranked) result for each symbol, keeping the ranking order.
+    """
+    best = {}
+    for result in results:
+        best.setdefault(result["symbol"], result)
+    return list(best.values())
+
+def to_symbols_request(results, stored=None):
+    """
+    Builds a POST /symbols/ body from the best parameter set of each symbol. POST /symbols/
+    makes the stored symbols exactly those in the body, so the symbols in `stored` (a GET
+    /symbols/ response) that the sweep did not cover are kept with their current TP/SL.
+    Each swept symbol also carries its best sl_levels and amount; the API ignores them (the
+    grid depth is GRID_SL_LEVELS, the amount the API key's balance), but they are what the
+    ranking assumed.
+    """
+    symbols = {}
+    for entry in (stored or {}).get("symbols", []):
+        configs = entry.get("configs") or [{}]
+        symbols[entry["symbol"].upper()] = {
+            "symbol": entry["symbol"].upper(),
+            "tp_percent": configs[0].get("tp_percent", 2.0),  # the bot config defaults
+            "sl_percent": configs[0].get("sl_percent", 1.0),
+        }
+    for r in best_per_symbol(results):
+        symbols[r["symbol"].upper()] = {
+            "symbol": r["symbol"].upper(), "tp_percent": r["tp_percent"], "sl_percent": r["sl_percent"],
+            "sl_levels": r["sl_levels"], "amount": r["amount"],
+        }
+    return {"symbols": list(symbols.values())}
+
+def load_stored_symbols(source):
+    """A GET /symbols/ response from a URL (e.g. http://0.0.0.0:8000/symbols/) or a saved file."""
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=30) as response:
+            return json.load(response)
+    with open(source) as f:
+        return json.load(f)
+
+
+def _float_list(value):
+    return [float(v) for v in value.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid parameter sweep over historical OHLCV CSV files.")
+    parser.add_argument("--data", nargs="+", required=True, metavar="SYMBOL=CSV",
+                        help="e.g. BTC/USDT=btc_1m.csv")
+    parser.add_argument("--tp", type=_float_list, required=True, help="comma separated tp_percent values")
+    parser.add_argument("--sl", type=_float_list, required=True, help="comma separated sl_percent values")
+    parser.add_argument("--levels", type=lambda v: [int(x) for x in v.split(",")], default=[3])
+    parser.add_argument("--amounts", type=_float_list, default=[10.0])
+    parser.add_argument("--samples", type=int, default=None, help="random subset size instead of the full grid")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--fee", type=float, default=0.001)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--rank-by", choices=RANK_METRICS, default="return_pct")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", help="write the POST /symbols/ body for the best settings to this file")
+    parser.add_argument("--stored", help="GET /symbols/ URL or saved response; its other symbols are kept in --out")
+    args = parser.parse_args()
+    if args.out and not args.stored:
+        parser.error("--out needs --stored: POST /symbols/ deletes every stored symbol missing from the body")
+
+    data = {}
+    for item in args.data:
+        symbol, path = item.split("=", 1)
+        _, open_, high, low, close = load_ohlcv_csv(path)
+        data[symbol.upper()] = (open_, high, low, close)
+
+    combos = param_grid(args.tp, args.sl, args.levels, args.amounts, args.samples, args.seed)
+    results = run_sweep(data, combos, fee_rate=args.fee, max_workers=args.workers, rank_by=args.rank_by)
+
+    print(f"{'symbol':<12}{'tp%':>7}{'sl%':>7}{'lvls':>6}{'amount':>9}{'pnl':>12}{'ret%':>9}{'maxdd':>10}{'fills':>8}")
+    for r in results[:args.top]:
+        fills = r["fills"].get("sl", 0) + r["fills"].get("tp", 0)
+        print(f"{r['symbol']:<12}{r['tp_percent']:>7}{r['sl_percent']:>7}{r['sl_levels']:>6}{r['amount']:>9}"
+              f"{r['pnl']:>12.2f}{r['return_pct']:>9.2f}{r['max_drawdown']:>10.2f}{fills:>8}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(to_symbols_request(results, load_stored_symbols(args.stored)), f, indent=2)
+        print(f"Wrote POST /symbols/ body to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
+from sqlalchemy import bindparam, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from . import models, schemas
 import json
+from datetime import datetime, timedelta
 from typing import Optional
 
 # === API Key Management ===
@@ -51,6 +54,73 @@ def remove_symbol(db: Session, symbol: str):
 def get_all_symbols(db: Session):
     return db.query(models.Symbol).all()
 
+def sync_symbols(db: Session, settings: dict):
+    """
+    Makes the stored symbols exactly those in {symbol: (tp_percent, sl_percent)}, each with a
+    bot config per exchange carrying those percentages (no commit). A handful of set-based
+    statements whatever the number of symbols and exchanges: one insert for the new symbols,
+    one for the missing configs, one executemany for the changed ones, one delete per table.
+    A removed symbol takes its configs, order levels and grid leases with it; stopping its
+    running grids is up to the caller.
+    Returns (added, updated, removed) symbol names; updated are the kept symbols whose
+    configs changed or were created.
+    """
+    symbols, configs = models.Symbol.__table__, models.ExchangeBotConfig.__table__
+    levels, leases = models.OrderLevel.__table__, models.GridLease.__table__
+    settings = {symbol.upper(): percents for symbol, percents in settings.items()}
+
+    stored = {row.symbol: row.id for row in db.execute(select(symbols.c.id, symbols.c.symbol))}
+    added = sorted(set(settings) - set(stored))
+    removed = sorted(set(stored) - set(settings))
+    if added:
+        result = db.execute(insert(symbols).returning(symbols.c.id, symbols.c.symbol, sort_by_parameter_order=True),
+                            [{"symbol": symbol} for symbol in added])
+        stored.update({row.symbol: row.id for row in result})
+
+    names = {symbol_id: symbol for symbol, symbol_id in stored.items() if symbol in settings}
+    existing = db.execute(
+        select(configs.c.id, configs.c.symbol_id, configs.c.exchange_id, configs.c.tp_percent, configs.c.sl_percent)
+        .where(configs.c.symbol_id.in_(list(names)))
+    ).all()
+    exchanges = db.execute(select(models.ExchangeAPIKey.id, models.ExchangeAPIKey.balance)).all()
+    updated = set()
+
+    changed = []
+    for row in existing:
+        symbol = names[row.symbol_id]
+        tp_percent, sl_percent = settings[symbol]
+        if (row.tp_percent, row.sl_percent) != (tp_percent, sl_percent):
+            changed.append({"config_id": row.id, "new_tp": tp_percent, "new_sl": sl_percent})
+            updated.add(symbol)
+    if changed:
+        db.execute(update(configs).where(configs.c.id == bindparam("config_id"))
+                   .values(tp_percent=bindparam("new_tp"), sl_percent=bindparam("new_sl")), changed)
+
+    configured = {(row.symbol_id, row.exchange_id) for row in existing}
+    missing = []
+    for symbol_id, symbol in names.items():
+        tp_percent, sl_percent = settings[symbol]
+        for exchange in exchanges:
+            if (symbol_id, exchange.id) not in configured:
+                # The amount comes from the API key's balance
+                missing.append({"exchange_id": exchange.id, "symbol_id": symbol_id, "amount": exchange.balance,
+                                "tp_percent": tp_percent, "sl_percent": sl_percent,
+                                "tp_levels_json": '[]', "sl_levels_json": '[]'})
+                updated.add(symbol)
+    if missing:
+        db.execute(insert(configs), missing)
+
+    if removed:
+        removed_ids = [stored[symbol] for symbol in removed]
+        removed_configs = select(configs.c.id).where(configs.c.symbol_id.in_(removed_ids))
+        # Their levels and leases go with the configs, so nothing is left pointing at a deleted grid
+        db.execute(levels.delete().where(levels.c.bot_config_id.in_(removed_configs)))
+        db.execute(leases.delete().where(leases.c.symbol.in_(removed)))
+        db.execute(configs.delete().where(configs.c.symbol_id.in_(removed_ids)))
+        db.execute(symbols.delete().where(symbols.c.id.in_(removed_ids)))
+
+    return added, sorted(updated - set(added)), removed
+
 # === BOT CONFIG MANAGEMENT ===
 
 def create_bot_config(db: Session, config_data: schemas.ExchangeBotConfigCreate):
@@ -111,6 +181,13 @@ def delete_bot_config(db: Session, config_id: int):
 # === Helper methods for TP and SL arrays ===
 
 def get_stored_levels(db: Session, config_id: int):
+    """
+    Returns (tp_levels, sl_levels) of a grid, highest price first, from its open order levels
+    (or the legacy JSON arrays of a grid not yet moved to order_levels).
+    """
+    levels = get_stored_levels_by_config(db, [config_id])
+    if config_id in levels:
+        return levels[config_id]
     bot_config = get_bot_config_by_id(db, config_id)
     if bot_config:
         tp_levels = json.loads(bot_config.tp_levels_json) if bot_config.tp_levels_json else []
@@ -118,14 +195,20 @@ def get_stored_levels(db: Session, config_id: int):
         return tp_levels, sl_levels
     return [], []
 
-def update_stored_levels(db: Session, config_id: int, tp_levels: list, sl_levels: list):
-    bot_config = get_bot_config_by_id(db, config_id)
-    if bot_config:
-        bot_config.tp_levels_json = json.dumps(tp_levels)
-        bot_config.sl_levels_json = json.dumps(sl_levels)
-        db.commit()
-        db.refresh(bot_config)
-    return bot_config
+def get_stored_levels_by_config(db: Session, config_ids=None):
+    """
+    {bot_config_id: (tp_levels, sl_levels)} from the open order levels, highest price first,
+    in one query. Grids without open levels are left out.
+    """
+    query = db.query(models.OrderLevel.bot_config_id, models.OrderLevel.order_type, models.OrderLevel.price)\
+              .filter(models.OrderLevel.status == "open")
+    if config_ids is not None:
+        query = query.filter(models.OrderLevel.bot_config_id.in_(config_ids))
+    levels = {}
+    for config_id, order_type, price in query.order_by(models.OrderLevel.price.desc()):
+        tps, sls = levels.setdefault(config_id, ([], []))
+        (tps if order_type == "tp" else sls).append(price)
+    return levels
 
 # === TRADE RECORD MANAGEMENT ===
 def create_trade_record(db: Session, trade: schemas.TradeRecordBase):
@@ -159,10 +242,13 @@ def get_trade_records_by_symbol(db: Session, symbol: str, skip: int = 0, limit:
 
 def create_order_level(db: Session, order_level: schemas.OrderLevelBase):
     db_order = models.OrderLevel(
+        bot_config_id=order_level.bot_config_id,
         exchange_api_key_id=order_level.exchange_api_key_id,
         symbol=order_level.symbol,
         price=order_level.price,
+        price_ticks=order_level.price_ticks,
         order_type=order_level.order_type,
+        side=order_level.side,
         order_id=order_level.order_id,
         status=order_level.status
     )
@@ -188,9 +274,178 @@ def update_order_level_status(db: Session, order_id: str, status: str):
         db.refresh(order)
     return order
 
+# The grid engine reads and writes levels on every fill, so these use Core statements on the
+# table and plain rows rather than ORM objects and the unit of work.
+
+def get_open_order_levels(db: Session, bot_config_id: int):
+    """
+    The open levels of a grid as read-only (id, order_type, side, price, price_ticks, order_id, generation) rows.
+    """
+    table = models.OrderLevel.__table__
+    return db.execute(
+        select(table.c.id, table.c.order_type, table.c.side, table.c.price, table.c.price_ticks, table.c.order_id,
+               table.c.generation)
+        .where(table.c.bot_config_id == bot_config_id, table.c.status == "open")
+    ).all()
+
+def add_order_levels(db: Session, levels: list):
+    """
+    Inserts order levels given as column dicts in one statement (no commit). Returns their
+    ids in the same order.
+    """
+    if not levels:
+        return []
+    table = models.OrderLevel.__table__
+    now = datetime.utcnow()
+    result = db.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True),
+        [dict(level, created_at=now, updated_at=now) for level in levels],
+    )
+    return [row.id for row in result]
+
+def set_order_levels_status(db: Session, level_ids, status: str):
+    """One UPDATE moving the levels in `level_ids` to `status` (no commit)."""
+    if not level_ids:
+        return 0
+    table = models.OrderLevel.__table__
+    return db.execute(
+        update(table).where(table.c.id.in_(list(level_ids))).values(status=status, updated_at=datetime.utcnow())
+    ).rowcount
+
+def update_order_level_order(db: Session, level_id: int, price: float, price_ticks: int, order_id: Optional[str]):
+    """Points a level at a re-placed order (no commit)."""
+    db.query(models.OrderLevel).filter(models.OrderLevel.id == level_id)\
+      .update({models.OrderLevel.price: price, models.OrderLevel.price_ticks: price_ticks,
+               models.OrderLevel.order_id: order_id}, synchronize_session=False)
+
+def next_order_level_generation(db: Session, level_ids):
+    """
+    Moves the levels in `level_ids` to their next generation before they are re-placed, so the
+    new orders get new client order ids (no commit).
+    """
+    if not level_ids:
+        return 0
+    table = models.OrderLevel.__table__
+    return db.execute(
+        update(table).where(table.c.id.in_(list(level_ids)))
+        .values(generation=table.c.generation + 1, updated_at=datetime.utcnow())
+    ).rowcount
+
+def last_order_level_id(db: Session, bot_config_id: int):
+    """The id of the newest level the grid ever had (0 for none); it changes with every grid reset."""
+    table = models.OrderLevel.__table__
+    return db.execute(select(func.max(table.c.id)).where(table.c.bot_config_id == bot_config_id)).scalar() or 0
+
+def close_order_levels(db: Session, bot_config_id: int, status: str = "cancelled"):
+    """
+    Moves every open level of a grid to `status` in one UPDATE (no commit), e.g. on a grid reset.
+    """
+    return db.query(models.OrderLevel).filter(
+        models.OrderLevel.bot_config_id == bot_config_id,
+        models.OrderLevel.status == "open"
+    ).update({models.OrderLevel.status: status, models.OrderLevel.updated_at: datetime.utcnow()},
+             synchronize_session=False)
+
+def link_order_levels(db: Session, order_ids: dict):
+    """
+    Records the exchange order id of each level in {level_id: order_id} once it is placed (no commit).
+    """
+    if not order_ids:
+        return
+    # Core rather than ORM update, so this is one executemany
+    table = models.OrderLevel.__table__
+    db.execute(
+        update(table).where(table.c.id == bindparam("level_id")).values(order_id=bindparam("placed_order_id")),
+        [{"level_id": level_id, "placed_order_id": order_id} for level_id, order_id in order_ids.items()],
+    )
+
 def delete_order_level(db: Session, order_id: str):
     order = db.query(models.OrderLevel).filter(models.OrderLevel.order_id == order_id).first()
     if order:
         db.delete(order)
         db.commit()
-    return order
\ No newline at end of file
+    return order
+
+# === GRID LEASES (multi-node ownership) ===
+# Claims and renewals are single conditional UPDATEs, so two nodes can never both win a lease,
+# on SQLite or PostgreSQL alike.
+
+def ensure_grid_lease(db: Session, exchange_api_key_id: int, symbol: str):
+    """Registers a grid that some node should run; returns its lease row."""
+    query = db.query(models.GridLease).filter(
+        models.GridLease.exchange_api_key_id == exchange_api_key_id, models.GridLease.symbol == symbol
+    )
+    lease = query.first()
+    if lease:
+        return lease
+    db.add(models.GridLease(exchange_api_key_id=exchange_api_key_id, symbol=symbol))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # another node registered it first
+    return query.first()
+
+def delete_grid_leases(db: Session, symbol: str, exchange_api_key_id: Optional[int] = None):
+    query = db.query(models.GridLease).filter(models.GridLease.symbol == symbol)
+    if exchange_api_key_id is not None:
+        query = query.filter(models.GridLease.exchange_api_key_id == exchange_api_key_id)
+    deleted = query.delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def get_grid_leases(db: Session):
+    return db.query(models.GridLease).order_by(models.GridLease.id).all()
+
+def existing_grid_lease_ids(db: Session, lease_ids) -> set:
+    """The ids in `lease_ids` whose lease rows still exist (whoever owns them)."""
+    lease_ids = list(lease_ids)
+    if not lease_ids:
+        return set()
+    return {row.id for row in db.query(models.GridLease.id).filter(models.GridLease.id.in_(lease_ids))}
+
+def get_claimable_grid_leases(db: Session, now: datetime, limit: int):
+    """Unowned or expired leases, oldest first."""
+    return db.query(models.GridLease).filter(
+        or_(models.GridLease.owner.is_(None), models.GridLease.expires_at < now)
+    ).order_by(models.GridLease.id).limit(limit).all()
+
+def claim_grid_lease(db: Session, lease_id: int, owner: str, now: datetime, ttl_seconds: float) -> bool:
+    claimed = db.query(models.GridLease).filter(
+        models.GridLease.id == lease_id,
+        or_(models.GridLease.owner.is_(None), models.GridLease.expires_at < now),
+    ).update({
+        models.GridLease.owner: owner,
+        models.GridLease.generation: models.GridLease.generation + 1,
+        models.GridLease.expires_at: now + timedelta(seconds=ttl_seconds),
+        models.GridLease.heartbeat_at: now,
+        models.GridLease.acquired_at: now,
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+def renew_grid_leases(db: Session, owner: str, lease_ids, now: datetime, ttl_seconds: float) -> set:
+    """Extends the owner's leases; returns the ids it still owns (deleted or taken-over ones are missing)."""
+    lease_ids = list(lease_ids)
+    if not lease_ids:
+        return set()
+    db.query(models.GridLease).filter(
+        models.GridLease.owner == owner, models.GridLease.id.in_(lease_ids)
+    ).update({
+        models.GridLease.expires_at: now + timedelta(seconds=ttl_seconds),
+        models.GridLease.heartbeat_at: now,
+    }, synchronize_session=False)
+    db.commit()
+    rows = db.query(models.GridLease.id).filter(
+        models.GridLease.owner == owner, models.GridLease.id.in_(lease_ids)
+    ).all()
+    return {row.id for row in rows}
+
+def release_grid_leases(db: Session, owner: str, lease_ids=None):
+    """Gives up the owner's leases (all of them by default) so other nodes can claim them at once."""
+    query = db.query(models.GridLease).filter(models.GridLease.owner == owner)
+    if lease_ids is not None:
+        query = query.filter(models.GridLease.id.in_(list(lease_ids)))
+    released = query.update({models.GridLease.owner: None, models.GridLease.expires_at: None},
+                            synchronize_session=False)
+    db.commit()
+    return released
@@ -1,11 +1,45 @@
-from sqlalchemy import create_engine
+import os
+import time
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-DATABASE_URL = "sqlite:///./trading_bot.db"
+from observability import metrics
+from observability.tracing import fill_tracer
+
+# Override to run against another database (e.g. a scratch SQLite file for load tests)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./trading_bot.db")
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine_options = {}
+if DATABASE_URL.startswith("sqlite"):
+    engine_options["connect_args"] = {"check_same_thread": False}
+if os.getenv("DB_POOL_SIZE"):
+    engine_options["pool_size"] = int(os.getenv("DB_POOL_SIZE"))
+    engine_options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+engine = create_engine(DATABASE_URL, **engine_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+
+# Commit latency (flush included) for the /metrics endpoint and the current fill trace
+@event.listens_for(SessionLocal, "before_commit")
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+
+@event.listens_for(SessionLocal, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        metrics.DB_COMMIT_SECONDS.observe(elapsed)
+        trace = fill_tracer.current()
+        if trace is not None:
+            ended_ns = time.time_ns()
+            trace.add_span("db_commit", ended_ns - int(elapsed * 1e9), ended_ns)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _rolled_back(session):
+    session.info.pop("commit_started", None)
+    metrics.DB_ROLLBACKS.inc()
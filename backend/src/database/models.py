@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, UniqueConstraint, Index, inspect, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -32,9 +32,9 @@ class ExchangeBotConfig(Base):
     tp_percent = Column(Float, default=2.0)
     sl_percent = Column(Float, default=1.0)
 
-    # === ADD THESE LINES TO STORE TP/SL ARRAYS ===
-    tp_levels_json = Column(Text, default='[]')  # Store TP levels
-    sl_levels_json = Column(Text, default='[]')  # Store SL levels
+    # Legacy TP/SL arrays; levels live in order_levels now and these are imported once, then cleared
+    tp_levels_json = Column(Text, default='[]')
+    sl_levels_json = Column(Text, default='[]')
 
     exchange_api_key = relationship("ExchangeAPIKey", backref="bot_configs")
     symbol = relationship("Symbol", backref="bot_configs")
@@ -65,16 +65,63 @@ class TradeRecord(Base):
     # REMOVED: symbol = relationship("Symbol") (no longer needed)
 
 class OrderLevel(Base):
+    """
+    One TP or SL level of a grid. The grid's current levels are its "open" rows; a level that
+    fills or is cancelled keeps its row with the new status.
+    """
     __tablename__ = "order_levels"
+    __table_args__ = (Index("ix_order_levels_grid_status", "bot_config_id", "status"),)
 
     id = Column(Integer, primary_key=True, index=True)
+    bot_config_id = Column(Integer, ForeignKey("exchange_bot_config.id"), nullable=False)
     exchange_api_key_id = Column(Integer, ForeignKey("exchange_api_keys.id"), nullable=False)
     symbol = Column(String, nullable=False)
     price = Column(Float, nullable=False)
+    price_ticks = Column(Integer, nullable=False)  # price in whole ticks of the market
     order_type = Column(String, nullable=False)  # "tp" or "sl"
-    order_id = Column(String, nullable=True)  # Exchange's order ID
+    side = Column(String, nullable=False)  # "sell" for TPs, "buy" for SLs
+    order_id = Column(String, nullable=True, index=True)  # Exchange's order ID, None until placed
+    generation = Column(Integer, default=0, nullable=False)  # re-placements so far; part of the client order id
     status = Column(String, default="open")  # "open", "filled", "cancelled"
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    exchange_api_key = relationship("ExchangeAPIKey")
\ No newline at end of file
+    exchange_api_key = relationship("ExchangeAPIKey")
+
+class GridLease(Base):
+    """
+    Which node runs a grid when several instances share the database. A node owns the grid
+    while `expires_at` is in the future and renews it on every heartbeat; `generation` goes up
+    on every claim, so a handover is visible and a stale owner can be told apart.
+    """
+    __tablename__ = "grid_leases"
+    __table_args__ = (UniqueConstraint("exchange_api_key_id", "symbol", name="uq_grid_lease_key_symbol"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    exchange_api_key_id = Column(Integer, ForeignKey("exchange_api_keys.id"), nullable=False)
+    symbol = Column(String, nullable=False)
+    owner = Column(String, nullable=True, index=True)  # node id, None while unclaimed
+    generation = Column(Integer, default=0, nullable=False)
+    expires_at = Column(DateTime, nullable=True, index=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    acquired_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    exchange_api_key = relationship("ExchangeAPIKey")
+
+
+def upgrade_order_levels(bind):
+    """
+    Drops an order_levels table created before the grid engine used it (nothing wrote to it
+    then), so create_all can rebuild it with the current columns, and adds the columns that
+    came later to one the engine already uses.
+    """
+    inspector = inspect(bind)
+    if not inspector.has_table(OrderLevel.__tablename__):
+        return
+    columns = {column["name"] for column in inspector.get_columns(OrderLevel.__tablename__)}
+    if "price_ticks" not in columns:
+        OrderLevel.__table__.drop(bind)
+    elif "generation" not in columns:
+        with bind.begin() as connection:
+            connection.execute(text("ALTER TABLE order_levels ADD COLUMN generation INTEGER NOT NULL DEFAULT 0"))
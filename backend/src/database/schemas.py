@@ -80,10 +80,13 @@ class PortfolioResponse(BaseModel):
     portfolio: List[PortfolioSymbol]
 
 class OrderLevelBase(BaseModel):
+    bot_config_id: int
     exchange_api_key_id: int
     symbol: str
     price: float
+    price_ticks: int
     order_type: str
+    side: str
     order_id: Optional[str] = None
     status: str = "open"
 
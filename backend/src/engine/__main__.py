@@ -0,0 +1,49 @@
+"""
+Runs the grid engine as its own long-lived process:
+
+    PYTHONPATH=src python -m engine [--socket /tmp/gridbot-engine.sock]
+
+Point the API at it with ENGINE_SOCKET=<same path>; the API can then restart or scale
+without touching live grids. GRID_WORKERS and GRID_WARM_START apply here, not to the API.
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+
+from engine import protocol
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid engine process serving a Unix socket control plane.")
+    parser.add_argument("--socket", default=protocol.DEFAULT_SOCKET, help="Unix socket path (default: ENGINE_SOCKET or %(default)s)")
+    args = parser.parse_args()
+
+    # This process hosts the grids; it must not proxy to itself
+    os.environ.pop("ENGINE_SOCKET", None)
+
+    from database import models
+    from database.database import engine
+    from engine.server import EngineServer
+    from grid_logic.grid_strategy import grid_bot, start_engine, stop_engine
+
+    logger = logging.getLogger("engine")
+    models.upgrade_order_levels(engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    server = EngineServer(grid_bot, args.socket).start()
+    start_engine(grid_bot)
+
+    stopped = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopped.set())
+    stopped.wait()
+
+    logger.info("Engine shutting down")
+    server.close()
+    stop_engine(grid_bot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import itertools
+import json
+import logging
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from engine import protocol
+
+logger = logging.getLogger(__name__)
+
+RUN_TIMEOUT = 120  # a start reconciles the grid before its socket opens; a stop liquidates it
+STATUS_TIMEOUT = 10
+DEBUG_TIMEOUT = 250  # a /debug profile samples for up to two minutes on every engine process
+RESUBSCRIBE_DELAY = 2
+
+
+class EngineUnavailable(RuntimeError):
+    pass
+
+class EngineError(RuntimeError):
+    """A command reached the engine and failed there."""
+
+
+class EngineClient:
+    """
+    GridBot's control API over the engine's Unix socket, for an HTTP tier that does not host
+    the grids itself. One persistent connection carries concurrent requests (matched by id);
+    it is re-opened on the next call after the engine restarts.
+    """
+
+    def __init__(self, path=protocol.DEFAULT_SOCKET, codec=protocol.DEFAULT_CODEC):
+        self.path = path
+        self.codec = codec
+        self._sock = None
+        self._pending = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def _connect(self):
+        """Open connection (under self._lock)."""
+        if self._sock is not None:
+            return self._sock
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise EngineUnavailable(f"Engine not reachable at {self.path}: {e}")
+        pending = {}
+        self._sock, self._pending = sock, pending
+        threading.Thread(target=self._read, args=(sock, pending), daemon=True, name="engine-client").start()
+        return sock
+
+    def _read(self, sock, pending):
+        error = "Engine closed the connection"
+        try:
+            while True:
+                message, _ = protocol.recv_message(sock)
+                if message is None:
+                    break
+                with self._lock:
+                    future = pending.pop(message.get("id"), None)
+                if future is None:
+                    continue
+                if message.get("ok"):
+                    future.set_result(message.get("result"))
+                else:
+                    future.set_exception(EngineError(message.get("error")))
+        except (OSError, protocol.ProtocolError) as e:
+            error = f"Engine connection lost: {e}"
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            orphaned = list(pending.values())
+            pending.clear()
+        sock.close()
+        for future in orphaned:
+            future.set_exception(EngineUnavailable(error))
+
+    def call(self, command, *args, timeout=STATUS_TIMEOUT):
+        future = Future()
+        with self._lock:
+            sock = self._connect()
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                sock.sendall(protocol.encode({"id": request_id, "cmd": command, "args": list(args)}, self.codec))
+        except OSError as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise EngineUnavailable(f"Engine connection lost: {e}")
+        return future.result(timeout)
+
+    def close(self):
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+
+    def subscribe(self, topics, callback):
+        """
+        Calls callback(topic, data) for engine events ("fill", "grid"; None for all) on a
+        dedicated connection and thread, re-subscribing after engine restarts. Returns the
+        Subscription; close() it to stop.
+        """
+        return Subscription(self.path, self.codec, topics, callback).start()
+
+    # ---------------- GridBot API ----------------
+
+    def start_symbol(self, exchange: str, symbol: str, db_session=None):
+        self.call("start_symbol", exchange.lower(), symbol)
+
+    def run_symbol(self, exchange: str, symbol: str) -> bool:
+        return self.call("run_symbol", exchange.lower(), symbol, timeout=RUN_TIMEOUT)
+
+    def stop_symbol(self, symbol: str, exchange: str = None):
+        # Cancels the grid's orders and sells its position: as slow as a start
+        self.call("stop_symbol", symbol, exchange, timeout=RUN_TIMEOUT)
+
+    def stop(self):
+        self.call("stop", timeout=RUN_TIMEOUT)
+
+    @property
+    def running(self):
+        return any(self.active_grid_counts().values())
+
+    def get_symbol_status(self, symbol: str):
+        return self.call("status", symbol)
+
+    def get_all_symbols_status(self):
+        return self.call("status")
+
+    def active_grid_counts(self) -> dict:
+        return self.call("active_grid_counts")
+
+    @property
+    def warm_start_report(self):
+        return self.call("warm_start_report")
+
+    def workers(self):
+        return self.call("workers")
+
+    def resize(self, count: int):
+        return self.call("resize", count, timeout=None)
+
+    def config(self, updates=None):
+        return self.call("config", updates)
+
+    def render_metrics(self) -> str:
+        return self.call("metrics")
+
+    def recent_fill_traces(self, limit=50, order_id=None, exchange=None, symbol=None):
+        return self.call("fill_traces", limit, order_id, exchange, symbol)
+
+    def debug(self, command, *args):
+        return self.call("debug", command, *args, timeout=DEBUG_TIMEOUT)
+
+
+class Subscription:
+    def __init__(self, path, codec, topics, callback):
+        self.path = path
+        self.codec = codec
+        self.topics = list(topics) if topics else None
+        self.callback = callback
+        self._sock = None
+        self._closed = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="engine-events").start()
+        return self
+
+    def close(self):
+        self._closed.set()
+        if self._sock is not None:
+            try:
+                # Wakes the reader blocked in recv; a bare close() would leave the engine subscribed
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+
+    def _run(self):
+        while not self._closed.is_set():
+            try:
+                self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._sock.connect(self.path)
+                self._sock.sendall(protocol.encode({"id": 0, "cmd": "subscribe", "args": [self.topics]}, self.codec))
+                while True:
+                    message, _ = protocol.recv_message(self._sock)
+                    if message is None:
+                        break
+                    if "event" in message:
+                        self.callback(message["event"], message.get("data"))
+            except (OSError, protocol.ProtocolError) as e:
+                if not self._closed.is_set():
+                    logger.debug(f"Engine event stream interrupted: {e}")
+            finally:
+                self._sock.close()
+            self._closed.wait(RESUBSCRIBE_DELAY)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Talk to a running grid engine over its Unix socket.")
+    parser.add_argument("--socket", default=protocol.DEFAULT_SOCKET)
+    parser.add_argument("command", choices=["status", "config", "workers", "events"])
+    parser.add_argument("topics", nargs="*", help="event topics for 'events' (default: all)")
+    args = parser.parse_args()
+
+    client = EngineClient(args.socket)
+    try:
+        if args.command == "events":
+            client.subscribe(args.topics, lambda topic, data: print(json.dumps({"event": topic, "data": data}), flush=True))
+            while True:
+                time.sleep(3600)
+        result = {"status": client.get_all_symbols_status, "config": client.config, "workers": client.workers}[args.command]()
+        print(json.dumps(result, indent=2, default=str))
+    except EngineUnavailable as e:
+        sys.exit(str(e))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
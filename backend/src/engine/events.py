@@ -0,0 +1,48 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """
+    In-process publish/subscribe for engine events ("fill", "grid"). Callbacks run on the
+    publisher's thread (a socket or timer thread), so they must only hand the event off.
+    Publishing with no subscribers costs one attribute check.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics, callback):
+        """`topics` is an iterable of topic names, or None for every topic. Returns a token."""
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            subscribers = dict(self._subscribers)
+            subscribers[token] = (frozenset(topics) if topics else None, callback)
+            self._subscribers = subscribers
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            subscribers = dict(self._subscribers)
+            subscribers.pop(token, None)
+            self._subscribers = subscribers
+
+    def publish(self, topic, data):
+        subscribers = self._subscribers  # replaced on change, never mutated: safe to read unlocked
+        if not subscribers:
+            return
+        for topics, callback in subscribers.values():
+            if topics is None or topic in topics:
+                try:
+                    callback(topic, data)
+                except Exception as e:
+                    logger.debug(f"Event subscriber failed on {topic}: {e}")
+
+
+# Process-wide bus; the engine server relays it to IPC subscribers
+engine_events = EventBus()
@@ -0,0 +1,64 @@
+import json
+import os
+import struct
+
+try:
+    import msgpack
+except ImportError:  # JSON framing still works, just larger and slower
+    msgpack = None
+
+DEFAULT_SOCKET = os.getenv("ENGINE_SOCKET") or "/tmp/gridbot-engine.sock"
+MAX_FRAME = 16 * 1024 * 1024
+
+MSGPACK = ord("M")
+JSON = ord("J")
+DEFAULT_CODEC = MSGPACK if msgpack is not None else JSON
+
+# Frame: 4-byte big-endian payload length, 1 codec byte, payload.
+#   request:  {"id": int, "cmd": str, "args": list}
+#   response: {"id": int, "ok": bool, "result": ...} or {"id": int, "ok": false, "error": str}
+#   event:    {"event": topic, "data": ...}  (only after a "subscribe" request)
+_HEADER = struct.Struct(">IB")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode(message, codec=DEFAULT_CODEC) -> bytes:
+    if codec == MSGPACK:
+        payload = msgpack.packb(message, use_bin_type=True, default=str)
+    else:
+        payload = json.dumps(message, default=str, separators=(",", ":")).encode()
+    return _HEADER.pack(len(payload), codec) + payload
+
+def decode(payload, codec):
+    if codec == MSGPACK:
+        if msgpack is None:
+            raise ProtocolError("Peer sent msgpack but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    if codec == JSON:
+        return json.loads(payload)
+    raise ProtocolError(f"Unknown codec byte {codec!r}")
+
+def _recv_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+def recv_message(sock):
+    """Next (message, codec) from the socket, or (None, None) when the peer closed it."""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None, None
+    size, codec = _HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ProtocolError(f"Frame of {size} bytes exceeds {MAX_FRAME}")
+    payload = _recv_exactly(sock, size)
+    if payload is None:
+        return None, None
+    return decode(payload, codec), codec
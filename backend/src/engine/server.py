@@ -0,0 +1,198 @@
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database.database import SessionLocal
+from engine import protocol
+from engine.events import engine_events
+from observability import metrics
+from observability.profiling import debug_result
+from observability.tracing import fill_tracer
+
+logger = logging.getLogger(__name__)
+
+COMMAND_THREADS = 32  # bulk starts block a thread each for seconds
+MAX_QUEUED_EVENTS = 10000  # per subscriber; a subscriber that falls further behind loses events
+
+IPC_EVENTS_DROPPED = metrics.Counter(
+    "gridbot_ipc_events_dropped_total", "Engine events dropped because an IPC subscriber fell behind.")
+
+
+class EngineServer:
+    """
+    Serves the grid engine over a Unix socket so the HTTP tier can restart or scale without
+    touching live grids. Each connection gets a reader (requests run on a shared pool, since
+    starts block) and a writer thread that owns the socket for responses and pushed events.
+    """
+
+    def __init__(self, bot, path=protocol.DEFAULT_SOCKET):
+        self.bot = bot
+        self.path = path
+        self.started_at = time.time()
+        self._pool = ThreadPoolExecutor(max_workers=COMMAND_THREADS, thread_name_prefix="engine-cmd")
+        self._listener = None
+        self._closed = threading.Event()
+        self.commands = {
+            "ping": lambda: "pong",
+            "start_symbol": self._start_symbol,
+            "run_symbol": bot.run_symbol,
+            "stop_symbol": bot.stop_symbol,
+            "stop": bot.stop,
+            "status": self._status,
+            "active_grid_counts": bot.active_grid_counts,
+            "warm_start_report": lambda: bot.warm_start_report,
+            "workers": self._workers,
+            "resize": self._resize,
+            "config": self._config,
+            "metrics": self._metrics,
+            "fill_traces": fill_tracer.recent,
+            "debug": self._debug,
+        }
+
+    # ---------------- commands ----------------
+
+    def _start_symbol(self, exchange, symbol):
+        db_session = SessionLocal()
+        try:
+            self.bot.start_symbol(exchange, symbol, db_session)
+        finally:
+            db_session.close()
+
+    def _status(self, symbol=None):
+        if symbol:
+            return self.bot.get_symbol_status(symbol)
+        return self.bot.get_all_symbols_status()
+
+    def _workers(self):
+        if not getattr(self.bot, "sharded", False):
+            return {"mode": "threads", "workers": []}
+        return {"mode": "processes", "workers": self.bot.shard_info()}
+
+    def _resize(self, count):
+        if not getattr(self.bot, "sharded", False):
+            raise ValueError("Engine is not running with engine workers; set GRID_WORKERS")
+        return {"mode": "processes", "workers": self.bot.resize(int(count))}
+
+    def _metrics(self):
+        if getattr(self.bot, "sharded", False):
+            return self.bot.render_metrics()
+        return metrics.REGISTRY.render()
+
+    def _debug(self, command, *args):
+        """A /debug command where the grids run: {process: result}, as ShardedGridBot.debug."""
+        bot = getattr(self.bot, "bot", self.bot)  # a LeaseManager runs its grids on the bot it wraps
+        if getattr(bot, "sharded", False):
+            return bot.debug(command, *args)
+        return {"engine": debug_result(command, *args)}
+
+    def _config(self, updates=None):
+        """Current engine settings; `updates` may change the ones that apply at runtime (log_level)."""
+        if updates and updates.get("log_level"):
+            logging.getLogger().setLevel(str(updates["log_level"]).upper())
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "socket": self.path,
+            "mode": "processes" if getattr(self.bot, "sharded", False) else "threads",
+            "log_level": logging.getLevelName(logging.getLogger().level),
+            "msgpack": protocol.msgpack is not None,
+        }
+
+    # ---------------- socket ----------------
+
+    def start(self):
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)  # left behind by an engine that died
+            else:
+                probe.close()
+                raise RuntimeError(f"Another engine is already listening on {self.path}")
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        os.chmod(self.path, 0o600)  # same-user access only: the socket can place orders
+        self._listener.listen(64)
+        threading.Thread(target=self._accept, daemon=True, name="engine-accept").start()
+        logger.info(f"Engine listening on {self.path}")
+        return self
+
+    def close(self):
+        self._closed.set()
+        if self._listener is not None:
+            self._listener.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        self._pool.shutdown(wait=False)
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True, name="engine-conn").start()
+
+    def _serve(self, conn):
+        outbox = queue.Queue()
+        writer = threading.Thread(target=self._write, args=(conn, outbox), daemon=True, name="engine-conn-writer")
+        writer.start()
+        subscriptions = []
+
+        def push_event(topic, data):
+            if outbox.qsize() >= MAX_QUEUED_EVENTS:
+                IPC_EVENTS_DROPPED.inc()
+                return
+            outbox.put(({"event": topic, "data": data}, codec))
+
+        codec = protocol.DEFAULT_CODEC
+        try:
+            while True:
+                message, codec = protocol.recv_message(conn)
+                if message is None:
+                    break
+                request_id, command, args = message.get("id"), message.get("cmd"), message.get("args") or []
+                if command == "subscribe":
+                    subscriptions.append(engine_events.subscribe(args[0] if args else None, push_event))
+                    outbox.put(({"id": request_id, "ok": True, "result": True}, codec))
+                    continue
+                self._pool.submit(self._execute, outbox, codec, request_id, command, args)
+        except (OSError, protocol.ProtocolError) as e:
+            logger.warning(f"Engine connection dropped: {e}")
+        finally:
+            for token in subscriptions:
+                engine_events.unsubscribe(token)
+            outbox.put(None)
+
+    def _execute(self, outbox, codec, request_id, command, args):
+        handler = self.commands.get(command)
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown engine command: {command}")
+            reply = {"id": request_id, "ok": True, "result": handler(*args)}
+        except Exception as e:
+            if handler is not None:
+                logger.exception(f"Engine command {command} failed")
+            reply = {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        outbox.put((reply, codec))
+
+    @staticmethod
+    def _write(conn, outbox):
+        try:
+            while True:
+                item = outbox.get()
+                if item is None:
+                    break
+                conn.sendall(protocol.encode(*item))
+        except OSError:
+            pass
+        finally:
+            conn.close()
@@ -0,0 +1,99 @@
+import functools
+import threading
+import time
+
+from observability import metrics
+from observability.tracing import fill_tracer
+
+# ccxt methods timed for the /metrics endpoint (unified calls the bot makes per grid or per fill)
+INSTRUMENTED_METHODS = (
+    "load_markets", "fetch_markets", "fetch_ticker", "fetch_balance", "fetch_order",
+    "fetch_open_orders", "fetch_closed_orders", "fetch_my_trades", "create_order",
+    "create_limit_buy_order", "create_limit_sell_order", "create_market_buy_order",
+    "create_market_sell_order", "cancel_order",
+)
+
+# Optional replacement for the ccxt factory, e.g. the local exchange simulator (src/simulator)
+_client_factory = None
+
+
+def set_client_factory(factory):
+    """
+    Routes create_exchange_client through `factory(key)`. Pass None to go back to ccxt.
+    """
+    global _client_factory
+    _client_factory = factory
+
+_in_call = threading.local()
+
+
+def _timed(exchange_id, method, call):
+    latency = metrics.REST_SECONDS.labels(exchange_id, method)
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        # Unified helpers call each other (create_limit_buy_order -> create_order); time the outer call only
+        if getattr(_in_call, "active", False):
+            return call(*args, **kwargs)
+        _in_call.active = True
+        trace = fill_tracer.current()  # set while a fill is being handled on this thread
+        started_ns = time.time_ns() if trace is not None else 0
+        started = time.perf_counter()
+        try:
+            result = call(*args, **kwargs)
+        except Exception as e:
+            metrics.REST_ERRORS.labels(exchange_id, method, type(e).__name__).inc()
+            if trace is not None:
+                trace.add_span("rest_submit" if method.startswith("create_") else "rest_call",
+                               started_ns, time.time_ns(), method=method, error=type(e).__name__)
+            raise
+        finally:
+            _in_call.active = False
+            latency.observe(time.perf_counter() - started)
+        if trace is not None:
+            if method.startswith("create_"):
+                trace.add_ack(method, started_ns, result)
+            else:
+                trace.add_span("rest_call", started_ns, time.time_ns(), method=method)
+        return result
+    return wrapper
+
+def instrument_client(exchange_instance):
+    """
+    Wraps the client's REST methods (on the instance only) with latency and error metrics.
+    """
+    exchange_id = exchange_instance.id
+    for method in INSTRUMENTED_METHODS:
+        call = getattr(exchange_instance, method, None)
+        if callable(call):
+            setattr(exchange_instance, method, _timed(exchange_id, method, call))
+    return exchange_instance
+
+def create_exchange_client(key):
+    """
+    Builds a ccxt client for a stored ExchangeAPIKey row.
+    """
+    return instrument_client(_build_client(key))
+
+def _build_client(key):
+    if _client_factory is not None:
+        return _client_factory(key)
+
+    # Imported with the first real client: ccxt loads every exchange module (~0.5s), which
+    # an API with no configured exchange, or one proxying to the engine, never needs
+    import ccxt
+
+    exchange = key.exchange.lower()
+    if exchange == "bitmart":
+        return ccxt.bitmart({
+            'apiKey': key.api_key,
+            'secret': key.api_secret,
+            'uid': "bua",
+            'enableRateLimit': True
+        })
+
+    exchange_instance = getattr(ccxt, exchange)()
+    exchange_instance.apiKey = key.api_key
+    exchange_instance.secret = key.api_secret
+    exchange_instance.options["defaultType"] = "spot"
+    return exchange_instance
@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+
+from exchanges.quantizer import Quantizer, TICK_SIZE
+
+logger = logging.getLogger(__name__)
+
+MARKETS_TTL = 3600  # seconds before an exchange's markets are fetched again
+
+
+class MarketRegistry:
+    """
+    Process-wide cache of ccxt markets and their precompiled quantizers, keyed by exchange id.
+    """
+
+    def __init__(self, ttl=MARKETS_TTL):
+        self.ttl = ttl
+        self._markets = {}      # exchange_id -> (loaded_at, {symbol: market})
+        self._quantizers = {}   # (exchange_id, symbol) -> Quantizer
+        self._lock = threading.Lock()
+
+    def load(self, exchange_instance, markets=None):
+        """
+        Stores a fetch_markets() result (fetching it if not given) and drops stale quantizers.
+        """
+        if markets is None:
+            markets = exchange_instance.fetch_markets()
+        by_symbol = {m["symbol"]: m for m in markets}
+        with self._lock:
+            self._markets[exchange_instance.id] = (time.monotonic(), by_symbol)
+            for key in [k for k in self._quantizers if k[0] == exchange_instance.id]:
+                del self._quantizers[key]
+        return by_symbol
+
+    def _markets_for(self, exchange_instance):
+        cached = self._markets.get(exchange_instance.id)
+        if cached is None or time.monotonic() - cached[0] > self.ttl:
+            return self.load(exchange_instance)
+        return cached[1]
+
+    def get_market(self, exchange_instance, symbol):
+        return self._markets_for(exchange_instance).get(symbol)
+
+    def get_quantizer(self, exchange_instance, symbol):
+        """
+        Returns the cached Quantizer for a market, building it once from the market's precision.
+        """
+        key = (exchange_instance.id, symbol)
+        quantizer = self._quantizers.get(key)
+        if quantizer is not None:
+            return quantizer
+
+        market = self.get_market(exchange_instance, symbol)
+        if market is None:
+            return None
+        quantizer = Quantizer.from_market(market, getattr(exchange_instance, "precisionMode", TICK_SIZE))
+        with self._lock:
+            self._quantizers[key] = quantizer
+        return quantizer
+
+
+market_registry = MarketRegistry()
@@ -0,0 +1,101 @@
+import math
+from decimal import Decimal
+
+# ccxt precision modes (ccxt.DECIMAL_PLACES / ccxt.SIGNIFICANT_DIGITS / ccxt.TICK_SIZE)
+DECIMAL_PLACES = 2
+SIGNIFICANT_DIGITS = 3
+TICK_SIZE = 4
+
+# Relative nudge (~18 ulps) that absorbs float error when dividing by a tick before flooring,
+# e.g. 0.29 / 0.01 == 28.999999999999996
+_FLOOR_NUDGE = 4e-15
+
+
+def _to_units(increment):
+    """
+    Splits a decimal increment into an exact integer pair (units, scale) with increment == units / 10**scale.
+    """
+    sign, digits, exponent = Decimal(str(increment)).normalize().as_tuple()
+    units = int(''.join(map(str, digits)))
+    if units <= 0 or sign:
+        raise ValueError(f"Invalid increment: {increment}")
+    if exponent >= 0:
+        return units * 10 ** exponent, 0
+    return units, -exponent
+
+def increment_from_precision(value, precision_mode=TICK_SIZE):
+    """
+    Converts a ccxt market precision value into an increment (tick or step) string.
+    """
+    if value is None:
+        return None
+    if precision_mode == DECIMAL_PLACES:
+        return str(Decimal(1).scaleb(-int(value)))
+    if precision_mode == TICK_SIZE:
+        return str(value)
+    raise ValueError(f"Unsupported ccxt precision mode: {precision_mode}")
+
+
+class Quantizer:
+    """
+    Precompiled price/amount rounding for a single market.
+    Prices and amounts are handled as integer multiples of tick/step, so rounding is exact
+    and needs no Decimal allocations or log10 calls on the order path.
+    """
+
+    __slots__ = ("tick_size", "step_size", "_tick_units", "_tick_pow", "_inv_tick",
+                 "_step_units", "_step_pow", "_inv_step")
+
+    def __init__(self, tick_size, step_size):
+        self._tick_units, tick_scale = _to_units(tick_size)
+        self._step_units, step_scale = _to_units(step_size)
+        self._tick_pow = 10 ** tick_scale
+        self._step_pow = 10 ** step_scale
+        # Exactly rounded float versions, kept for logging and legacy callers
+        self.tick_size = self._tick_units / self._tick_pow
+        self.step_size = self._step_units / self._step_pow
+        self._inv_tick = self._tick_pow / self._tick_units
+        self._inv_step = self._step_pow / self._step_units
+
+    @classmethod
+    def from_market(cls, market: dict, precision_mode=TICK_SIZE):
+        """
+        Builds a quantizer from a ccxt market dict, honoring the exchange's precisionMode.
+        Falls back to BitMart's quote_increment/base_min_size when precision is missing.
+        """
+        precision = market.get("precision") or {}
+        tick = increment_from_precision(precision.get("price"), precision_mode) \
+            or str(market.get("quote_increment", "0.00000001"))
+        step = increment_from_precision(precision.get("amount"), precision_mode) \
+            or str(market.get("base_min_size", "0.00000001"))
+        return cls(tick, step)
+
+    # --- prices ---------------------------------------------------------------
+
+    def price_to_ticks(self, price) -> int:
+        """Nearest whole number of ticks for a price."""
+        return round(price * self._inv_tick)
+
+    def ticks_to_price(self, ticks: int) -> float:
+        # int / int true division is correctly rounded, so this is the float closest to the exact price
+        return ticks * self._tick_units / self._tick_pow
+
+    def round_price(self, price) -> float:
+        return self.ticks_to_price(self.price_to_ticks(price))
+
+    # --- amounts --------------------------------------------------------------
+
+    def amount_to_steps(self, amount) -> int:
+        """Whole number of steps that fit in an amount (rounded down)."""
+        if amount <= 0:
+            return 0
+        return math.floor(amount * self._inv_step * (1 + _FLOOR_NUDGE))
+
+    def steps_to_amount(self, steps: int) -> float:
+        return steps * self._step_units / self._step_pow
+
+    def floor_amount(self, amount) -> float:
+        return self.steps_to_amount(self.amount_to_steps(amount))
+
+    def __repr__(self):
+        return f"Quantizer(tick_size={self.tick_size}, step_size={self.step_size})"
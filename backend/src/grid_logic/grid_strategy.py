@@ -1,118 +1,158 @@
 import logging
+import os
 import threading
-import ccxt
-from websocket_manager.websocket_manager import run_bot_with_websocket
+from exchanges.ccxt_integration import create_exchange_client
 from database import models, crud
+from database.database import SessionLocal
+from grid_logic.orchestrator import BulkOrchestrator
+from grid_logic.leases import LeaseManager
+from grid_logic.recovery import warm_start
+from grid_logic.sharding import ShardedGridBot, is_shard_worker
+from engine.client import EngineClient
+from engine.events import engine_events
+from observability import metrics
+from observability.logs import configure_logging
+from websocket_manager.market_data import market_data
+from websocket_manager.reconnect import reconnects
+from websocket_manager.resync import gap_recovery
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+configure_logging()  # queue-backed; a no-op when the caller configured logging first
 
 class GridBot:
     def __init__(self):
         self.websocket_connections = {}  # Tracks active WebSocket connections
+        self.warm_start_report = None  # Filled by grid_logic.recovery.warm_start at boot
 
-    def start_symbol(self, exchange: str, symbol: str, db_session):
+    def _load_exchange(self, exchange: str, db_session):
         """
-        Starts the WebSocket for a single symbol on a given exchange.
-        Retrieves the trading amount dynamically from the exchange's API key balance.
+        Looks up the API key for an exchange and builds its ccxt client.
+        Returns (exchange_instance, amount) or (None, None) on failure.
         """
-        exchange = exchange.lower()
-        
-        # Fetch API key and balance
         key = db_session.query(models.ExchangeAPIKey).filter(models.ExchangeAPIKey.exchange == exchange).first()
         if not key:
             logger.warning(f"No API key found for {exchange}. Cannot start symbol.")
-            return
+            return None, None
 
         amount = key.balance  # ✅ Use balance from API Key model
 
-        # Initialize CCXT connection
         try:
-            if exchange == "bitmart":
-                exchange_instance = ccxt.bitmart({
-                    'apiKey': key.api_key,
-                    'secret': key.api_secret,
-                    'uid': "bua",
-                    'enableRateLimit': True
-                })
-            else:
-                exchange_instance = getattr(ccxt, exchange)()
-                exchange_instance.apiKey = key.api_key
-                exchange_instance.secret = key.api_secret
-                exchange_instance.options["defaultType"] = "spot"
+            exchange_instance = create_exchange_client(key)
         except Exception as e:
             logger.error(f"Failed to create connection for {exchange}: {str(e)}")
+            return None, None
+
+        return exchange_instance, amount
+
+    def start_symbol(self, exchange: str, symbol: str, db_session):
+        """
+        Starts the WebSocket for a single symbol on a given exchange.
+        Retrieves the trading amount dynamically from the exchange's API key balance.
+        `db_session` is only used for the key lookup; the bot thread opens its own session.
+        """
+        exchange = exchange.lower()
+        exchange_instance, amount = self._load_exchange(exchange, db_session)
+        if exchange_instance is None:
             return
 
         thread = threading.Thread(
             target=self._start_websocket,
-            args=(exchange_instance, symbol, amount, db_session),
+            args=(exchange_instance, symbol, amount),
             daemon=True
         )
         thread.start()
         logger.info(f"Started WebSocket for {exchange} - {symbol} with amount {amount}")
-        
-        
-    def _start_websocket(self, exchange_instance, symbol, amount, db_session):
+
+    def run_symbol(self, exchange: str, symbol: str) -> bool:
+        """
+        Blocking variant of start_symbol used by the bulk orchestrator.
+        Owns its DB session and returns True once the grid is reconciled and its socket is up,
+        or right away if the grid already runs (a second socket would orphan the first).
+        """
+        exchange = exchange.lower()
+        if (exchange, symbol) in self.websocket_connections:
+            logger.info(f"{exchange} - {symbol} is already running")
+            return True
+        db_session = SessionLocal()
+        try:
+            exchange_instance, amount = self._load_exchange(exchange, db_session)
+        finally:
+            db_session.close()
+
+        if exchange_instance is None:
+            return False
+        return self._start_websocket(exchange_instance, symbol, amount) is not None
+
+    def _start_websocket(self, exchange_instance, symbol, amount):
         """
         Starts a WebSocket for a specific (exchange, symbol) pair.
         """
-        ws = run_bot_with_websocket(exchange_instance, symbol, amount, db_session, self)
-        
+        from websocket_manager.websocket_manager import run_bot_with_websocket  # deferred: websocket/requests are slow to import
+
+        ws = run_bot_with_websocket(exchange_instance, symbol, amount, SessionLocal(), self)
+        if ws is None:
+            logger.error(f"Failed to launch WebSocket for {exchange_instance.id} - {symbol}")
+            return None
+
         # Store the WebSocket reference
         self.websocket_connections[(exchange_instance.id, symbol)] = ws
         logger.info(f"WebSocket launched for {exchange_instance.id} - {symbol}")
+        engine_events.publish("grid", {"exchange": exchange_instance.id, "symbol": symbol, "status": "started"})
+        return ws
 
     def stop_symbol(self, symbol: str, exchange: str = None):
         """
-        Stops the WebSocket for a symbol on a specific exchange or all exchanges.
+        Stops the WebSocket for a symbol on a specific exchange or all exchanges, cancelling the
+        grid's orders and selling its position.
         Args:
             symbol: The trading pair symbol
             exchange: Optional exchange name. If provided, only stops the symbol on that exchange.
         """
+        self._close_symbol(symbol, exchange, liquidate=True)
+
+    def detach_symbol(self, symbol: str, exchange: str = None):
+        """
+        Like stop_symbol, but leaves the grid's orders resting and its levels stored, for whoever
+        runs the grid next (a restart, another engine shard or another node) to reconcile.
+        """
+        self._close_symbol(symbol, exchange, liquidate=False)
+
+    def _close_symbol(self, symbol, exchange, liquidate):
         if exchange:
-            # Stop specific exchange
-            key = (exchange.lower(), symbol)
-            ws = self.websocket_connections.get(key)
-            if ws:
-                # For Bybit, use the specialized close_socket method
-                if exchange.lower() == "bybit" and hasattr(ws, "close_socket"):
-                    ws.close_socket()
-                else:
-                    self._close_websocket_connection(key)
+            keys_to_stop = [(exchange.lower(), symbol)]
         else:
-            # Stop all exchanges (original behavior)
             keys_to_stop = [key for key in self.websocket_connections if key[1] == symbol]
             if not keys_to_stop:
                 logger.info(f"No active WebSocket for symbol {symbol}.")
                 return
 
-            for key in keys_to_stop:
-                ws = self.websocket_connections.get(key)
-                if ws:
-                    # For Bybit, use the specialized close_socket method
-                    if key[0].lower() == "bybit" and hasattr(ws, "close_socket"):
-                        ws.close_socket()
-                    else:
-                        self._close_websocket_connection(key)
+        for key in keys_to_stop:
+            if self.websocket_connections.get(key):
+                self._close_websocket_connection(key, liquidate)
+                engine_events.publish("grid", {"exchange": key[0], "symbol": symbol,
+                                               "status": "stopped" if liquidate else "detached"})
 
-    def _close_websocket_connection(self, key):
+    def _close_websocket_connection(self, key, liquidate=True):
         """
         Helper method to close a WebSocket connection properly.
-        Uses the specialized close method if available.
+        Uses the specialized close method if available. Without `liquidate` the socket is only
+        detached: its on_close leaves the orders resting.
         """
         ws = self.websocket_connections.get(key)
         if not ws:
             logger.info(f"No active WebSocket for {key}")
             return
             
+        reconnects.cancel(key)  # a reconnect may be waiting on its backoff
+        gap_recovery.forget(key)
+        market_data.unsubscribe(*key)
         try:
             logger.info(f"Closing WebSocket for {key}")
             
             # First use close_socket method if available (Bybit uses this)
             if hasattr(ws, "close_socket"):
                 logger.info(f"Using custom close_socket method for {key}")
-                ws.close_socket()
+                ws.close_socket(liquidate=liquidate)
                 
                 # We should NOT remove from dictionary here - the close_socket method will
                 # set flags to prevent reconnection, and the websocket's on_close will
@@ -120,6 +160,7 @@ class GridBot:
                 return
                 
             # For other WebSockets, disable all reconnection mechanisms before closing
+            ws.detached = not liquidate
             if hasattr(ws, "auto_reconnect"):
                 ws.auto_reconnect = False
             if hasattr(ws, "reconnection"):
@@ -177,6 +218,13 @@ class GridBot:
         self.websocket_connections.clear()
         logger.info("All WebSocket connections closed.")
 
+    def detach(self):
+        """Closes every WebSocket but leaves the grids' orders resting (process shutdown)."""
+        logger.info("Detaching all WebSocket connections; orders stay on the exchanges")
+        for key in list(self.websocket_connections.keys()):
+            self._close_websocket_connection(key, liquidate=False)
+        self.websocket_connections.clear()
+
     @property
     def running(self):
         # If there's at least one active WebSocket, we call it 'running'
@@ -198,6 +246,14 @@ class GridBot:
             'exchanges': running_exchanges
         }
 
+    def active_grid_counts(self) -> dict:
+        """Grids with a live WebSocket, per exchange."""
+        counts = {}
+        for (exchange, _), ws in list(self.websocket_connections.items()):
+            if ws is not None:
+                counts[exchange] = counts.get(exchange, 0) + 1
+        return counts
+
     def get_all_symbols_status(self):
         """
         Returns a dict of symbol -> {'status': 'running'/'stopped', 'exchanges': [exchange_names]} 
@@ -218,5 +274,61 @@ class GridBot:
         
         return status
 
+def create_grid_bot():
+    """
+    ENGINE_SOCKET hands every command to a separate engine process (see engine/, started with
+    `python -m engine`). Otherwise GRID_WORKERS > 0 spreads the grids over that many engine
+    processes (see grid_logic.sharding), and by default grids run as threads of this process.
+    GRID_LEASES=1 shares the grids with other nodes on the same database (see grid_logic.leases).
+    """
+    if is_shard_worker():
+        return GridBot()
+    if os.getenv("ENGINE_SOCKET"):
+        return EngineClient(os.getenv("ENGINE_SOCKET"))
+    workers = int(os.getenv("GRID_WORKERS", "0"))
+    bot = ShardedGridBot(workers) if workers > 0 else GridBot()
+    if os.getenv("GRID_LEASES", "0") == "1":
+        return LeaseManager(bot)
+    return bot
+
+def start_engine(bot):
+    """
+    Boot for the process that hosts the grids: warm start in the background, or spawn the
+    engine workers, which warm start their own share. GRID_WARM_START=0 skips recovery.
+    """
+    enabled = os.getenv("GRID_WARM_START", "1") != "0"
+    if not enabled:
+        logger.info("Warm start disabled via GRID_WARM_START=0")
+    if isinstance(bot, LeaseManager):
+        # Grids start as their leases are claimed, after reconciliation
+        if isinstance(bot.bot, ShardedGridBot):
+            bot.bot.start(warm_start=False)
+        bot.start(seed=enabled)
+    elif isinstance(bot, ShardedGridBot):
+        bot.start(warm_start=enabled)
+    elif enabled:
+        threading.Thread(target=warm_start, args=(bot,), daemon=True, name="warm-start").start()
+
+def stop_engine(bot):
+    """
+    Shutdown for the process that hosts the grids: closes the sockets but leaves every order
+    resting, so the next warm start (here or elsewhere) picks the grids up where they were.
+    """
+    if isinstance(bot, LeaseManager):
+        bot.stop()  # releases the leases for other nodes
+        bot = bot.bot
+    if isinstance(bot, ShardedGridBot):
+        bot.shutdown()
+    else:
+        bot.detach()
+
 # Global instance for API control
-grid_bot = GridBot()
\ No newline at end of file
+grid_bot = create_grid_bot()
+bulk_orchestrator = BulkOrchestrator(grid_bot)
+
+_local_bot = grid_bot.bot if isinstance(grid_bot, LeaseManager) else grid_bot
+if isinstance(_local_bot, GridBot):  # engine processes report their own grids
+    metrics.Gauge("gridbot_active_grids", "Grids with a live WebSocket.", ["exchange"],
+                  callback=_local_bot.active_grid_counts)
+metrics.Gauge("gridbot_bulk_queue_depth", "Bulk start/stop pairs waiting for a worker.", ["exchange"],
+              callback=bulk_orchestrator.pending_counts)
\ No newline at end of file
@@ -0,0 +1,277 @@
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import crud
+from database.database import SessionLocal
+from grid_logic.recovery import load_recoverable_grids
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 100
+DEFAULT_TTL = 30.0  # seconds; keep well above clock skew between nodes
+START_WORKERS = 8
+
+LEASES_CLAIMED = metrics.Counter(
+    "gridbot_leases_claimed_total", "Grid leases this node claimed (new grids and handovers).")
+LEASES_LOST = metrics.Counter(
+    "gridbot_leases_lost_total", "Grid leases this node lost: taken over, deleted, or fenced off after failed renewals.")
+
+
+def default_node_id():
+    return os.getenv("GRID_NODE_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseManager:
+    """
+    Runs grids on several nodes that share one database without two nodes trading the same
+    (exchange key, symbol). Every grid to run has a lease row; each node claims unowned or
+    expired leases up to its capacity, renews them every ttl/3 seconds and starts the claimed
+    grids through the wrapped bot, which reconciles stored levels against the exchange before
+    arming. A lease that is not renewed expires and another node takes the grid over.
+
+    A node that loses a lease closes that grid's socket at once; one that cannot reach the
+    database does so for all of its grids before its leases can expire, so a handover never
+    overlaps. Either way the orders stay on the exchange for the next owner to reconcile.
+    Offers GridBot's control API: starting a grid registers its lease, stopping deletes it,
+    and only then does the owner cancel the grid's orders and sell its position.
+    """
+
+    def __init__(self, bot, session_factory=SessionLocal, node_id=None, capacity=None, ttl=None):
+        self.bot = bot
+        self.session_factory = session_factory
+        self.node_id = node_id or default_node_id()
+        self.capacity = capacity or int(os.getenv("GRID_NODE_CAPACITY", DEFAULT_CAPACITY))
+        self.ttl = ttl or float(os.getenv("GRID_LEASE_TTL", DEFAULT_TTL))
+        self.heartbeat_interval = self.ttl / 3
+        self.owned = {}  # lease id -> (exchange, symbol)
+        self.warm_start_report = None  # the first claim round, in warm start report form
+        self._last_renewed = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._starts = ThreadPoolExecutor(max_workers=START_WORKERS, thread_name_prefix="lease-start")
+
+    # ---------------- lifecycle ----------------
+
+    def start(self, seed=True):
+        """
+        With `seed`, registers a lease for every stored grid first (the multi-node warm start).
+        """
+        if seed:
+            session = self.session_factory()
+            try:
+                for key, symbols in load_recoverable_grids(session).values():
+                    for symbol in symbols:
+                        crud.ensure_grid_lease(session, key.id, symbol)
+            finally:
+                session.close()
+        threading.Thread(target=self._run, daemon=True, name="lease-heartbeat").start()
+        logger.info(f"Node {self.node_id}: claiming up to {self.capacity} grids (lease ttl {self.ttl}s)")
+        return self
+
+    def stop(self):
+        """
+        Detaches this node's grids (orders left resting) and releases their leases so other nodes
+        take over right away.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        with self._lock:
+            owned, self.owned = dict(self.owned), {}
+        for exchange, symbol in owned.values():
+            self._stop_local(exchange, symbol)
+        session = self.session_factory()
+        try:
+            crud.release_grid_leases(session, self.node_id)
+        except SQLAlchemyError as e:
+            logger.error(f"Node {self.node_id}: could not release leases ({e}); they expire in {self.ttl}s")
+        finally:
+            session.close()
+        self._starts.shutdown(wait=False)
+
+    def _run(self):
+        first = True
+        while not self._stopping.is_set():
+            self.tick(first)
+            first = False
+            self._wakeup.wait(self.heartbeat_interval)
+            self._wakeup.clear()
+
+    # ---------------- heartbeat ----------------
+
+    def tick(self, first=False):
+        """One heartbeat: renew, drop lost leases, claim up to capacity and start what was claimed."""
+        now = datetime.utcnow()
+        claimed = {}
+        session = self.session_factory()
+        try:
+            with self._lock:
+                held = dict(self.owned)
+            renewed = crud.renew_grid_leases(session, self.node_id, held, now, self.ttl)
+            self._last_renewed = time.monotonic()
+            lost = set(held) - renewed
+            # A deleted lease is a stop through some node; a taken-over one now belongs to its new owner
+            remaining = crud.existing_grid_lease_ids(session, lost)
+            for lease_id in lost:
+                if lease_id in remaining:
+                    self._lose(lease_id, "taken over")
+                else:
+                    self._lose(lease_id, "stopped", liquidate=True)
+
+            free = self.capacity - len(renewed)
+            if free > 0 and not self._stopping.is_set():
+                for lease in crud.get_claimable_grid_leases(session, now, free * 2):
+                    if len(claimed) >= free:
+                        break
+                    if lease.id in held:
+                        continue
+                    grid = (lease.exchange_api_key.exchange, lease.symbol)
+                    if crud.claim_grid_lease(session, lease.id, self.node_id, now, self.ttl):
+                        claimed[lease.id] = grid
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"Node {self.node_id}: lease heartbeat failed: {e}")
+            self._fence_if_stale()
+            return
+        finally:
+            session.close()
+
+        if not claimed:
+            if first:
+                self.warm_start_report = self._report([], time.perf_counter())
+            return
+        LEASES_CLAIMED.inc(len(claimed))
+        with self._lock:
+            self.owned.update(claimed)
+        logger.info(f"Node {self.node_id}: claimed {len(claimed)} grids, now owns {len(self.owned)}")
+
+        started = time.perf_counter()
+        futures = [self._starts.submit(self._start_grid, lease_id, *grid) for lease_id, grid in claimed.items()]
+        if first:
+            threading.Thread(target=lambda: setattr(self, "warm_start_report", self._report(futures, started)),
+                             daemon=True, name="lease-report").start()
+
+    def _start_grid(self, lease_id, exchange, symbol):
+        """Reconciles and arms a claimed grid; a grid that fails to start goes back to the pool."""
+        try:
+            ok = self.bot.run_symbol(exchange, symbol)
+        except Exception as e:
+            logger.error(f"Node {self.node_id}: starting {exchange} - {symbol} failed: {e}")
+            ok = False
+        result = {"exchange": exchange, "symbol": symbol, "status": "armed" if ok else "failed"}
+        if not ok:
+            with self._lock:
+                self.owned.pop(lease_id, None)
+            session = self.session_factory()
+            try:
+                crud.release_grid_leases(session, self.node_id, [lease_id])
+            except SQLAlchemyError:
+                pass  # it expires on its own
+            finally:
+                session.close()
+        return result
+
+    @staticmethod
+    def _report(futures, started):
+        results = [future.result() for future in futures]
+        armed = sum(1 for r in results if r["status"] == "armed")
+        return {
+            "grids": len(results),
+            "accounts": len({r["exchange"] for r in results}),
+            "armed": armed,
+            "connected": armed,
+            "failed": len(results) - armed,
+            "reconcile_seconds": None,
+            "time_to_fully_armed": round(time.perf_counter() - started, 3),
+            "results": results,
+        }
+
+    def _lose(self, lease_id, reason, liquidate=False):
+        """
+        Drops a grid this node no longer owns. Only a stopped grid (`liquidate`) has its orders
+        cancelled; otherwise they may already be the next owner's.
+        """
+        with self._lock:
+            grid = self.owned.pop(lease_id, None)
+        if grid is None:
+            return
+        LEASES_LOST.inc()
+        logger.warning(f"Node {self.node_id}: lease for {grid[0]} - {grid[1]} lost ({reason}); "
+                       f"{'stopping' if liquidate else 'detaching'} it")
+        self._stop_local(*grid, liquidate=liquidate)
+
+    def _fence_if_stale(self):
+        """Without a renewal for ttl - heartbeat, other nodes may claim soon: detach everything first."""
+        if self._last_renewed is None or time.monotonic() - self._last_renewed > self.ttl - self.heartbeat_interval:
+            with self._lock:
+                held = list(self.owned)
+            for lease_id in held:
+                self._lose(lease_id, "could not renew")
+
+    def _stop_local(self, exchange, symbol, liquidate=False):
+        try:
+            if liquidate:
+                self.bot.stop_symbol(symbol, exchange)
+            else:
+                self.bot.detach_symbol(symbol, exchange)
+        except Exception as e:
+            logger.error(f"Node {self.node_id}: stopping {exchange} - {symbol} failed: {e}")
+
+    # ---------------- GridBot API ----------------
+
+    def _register(self, exchange, symbol):
+        session = self.session_factory()
+        try:
+            key = crud.get_api_key_by_exchange(session, exchange)
+            if not key:
+                logger.warning(f"No API key found for {exchange}. Cannot start symbol.")
+                return False
+            crud.ensure_grid_lease(session, key.id, symbol)
+        finally:
+            session.close()
+        self._wakeup.set()  # claim now instead of at the next heartbeat
+        return True
+
+    def start_symbol(self, exchange: str, symbol: str, db_session=None):
+        self._register(exchange.lower(), symbol)
+
+    def run_symbol(self, exchange: str, symbol: str) -> bool:
+        """Registers the grid; the first node with spare capacity (possibly this one) runs it."""
+        return self._register(exchange.lower(), symbol)
+
+    def stop_symbol(self, symbol: str, exchange: str = None):
+        session = self.session_factory()
+        try:
+            key = crud.get_api_key_by_exchange(session, exchange) if exchange else None
+            if exchange and not key:
+                return
+            crud.delete_grid_leases(session, symbol, key.id if key else None)
+        finally:
+            session.close()
+        # Other owners notice the deleted lease on their next heartbeat
+        with self._lock:
+            mine = [lease_id for lease_id, grid in self.owned.items()
+                    if grid[1] == symbol and (exchange is None or grid[0] == exchange.lower())]
+        for lease_id in mine:
+            self._lose(lease_id, "stopped", liquidate=True)
+
+    @property
+    def running(self):
+        return bool(self.owned)
+
+    def get_symbol_status(self, symbol: str):
+        return self.bot.get_symbol_status(symbol)
+
+    def get_all_symbols_status(self):
+        return self.bot.get_all_symbols_status()
+
+    def active_grid_counts(self) -> dict:
+        return self.bot.active_grid_counts()
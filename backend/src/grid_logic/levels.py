@@ -0,0 +1,187 @@
+import json
+import os
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+from database import crud
+
+# Levels placed when a grid (re)starts: TP sells above the entry and SL buys below it
+TP_LEVELS = max(1, int(os.getenv("GRID_TP_LEVELS", "1")))  # the top TP resets the grid, so at least one
+SL_LEVELS = int(os.getenv("GRID_SL_LEVELS", "3"))
+
+TP, SL = "tp", "sl"
+SIDES = {TP: "sell", SL: "buy"}
+
+# An open order_levels row, as read by crud.get_open_order_levels
+LevelRow = namedtuple("LevelRow", "id order_type side price price_ticks order_id generation")
+
+
+def tp_prices(price, tp_percent, count=None):
+    """Unrounded TP ladder above `price`: price * (1 + tp_percent) ** k for k = 1..count."""
+    return [price * (1 + tp_percent / 100) ** (i + 1) for i in range(TP_LEVELS if count is None else count)]
+
+def sl_prices(price, sl_percent, count=None):
+    """Unrounded SL ladder below `price`: price * (1 - sl_percent) ** k for k = 1..count."""
+    return [price * (1 - sl_percent / 100) ** (i + 1) for i in range(SL_LEVELS if count is None else count)]
+
+
+class GridLevels:
+    """
+    A grid's TP and SL prices, each kept as an ascending sorted list. The levels a price
+    crossed are then one bisect away and come off as a slice, so a fill costs O(log n) plus
+    the levels it actually crossed, whatever the grid size.
+
+    Stored as the grid's open order_levels rows. `load` reads them, the methods below record
+    what changed, and `save` writes only those rows.
+    """
+
+    __slots__ = ("tps", "sls", "_grid", "_rows", "_changes")
+
+    def __init__(self, tps=(), sls=()):
+        self.tps = sorted(map(float, tps))
+        self.sls = sorted(map(float, sls))
+        self._grid = None     # (bot_config, symbol, quantizer) of a grid loaded from or saved to the database
+        self._rows = {}       # (order_type, price) -> open level rows at that price, as loaded
+        self._changes = []    # (order_type, price, status, order_id); status "open" adds a level
+
+    @classmethod
+    def for_grid(cls, bot_config, symbol, quantizer):
+        """Empty levels that `save` writes as rows of this grid."""
+        levels = cls()
+        levels._grid = (bot_config, symbol, quantizer)
+        return levels
+
+    @classmethod
+    def load(cls, db, bot_config, symbol, quantizer):
+        levels = cls.for_grid(bot_config, symbol, quantizer)
+        rows = crud.get_open_order_levels(db, bot_config.id)
+        if not rows:
+            # A grid stored before order_levels: its JSON arrays become rows, linked to orders by reconciliation
+            for price in json.loads(bot_config.tp_levels_json or '[]'):
+                levels.add_tp(price)
+            for price in json.loads(bot_config.sl_levels_json or '[]'):
+                levels.add_sl(price)
+            rows = levels.save(db) if levels._changes else []
+            levels.tps, levels.sls = [], []
+        for row in rows:
+            levels._rows.setdefault((row.order_type, row.price), []).append(row)
+            (levels.tps if row.order_type == TP else levels.sls).append(row.price)
+        levels.tps.sort()
+        levels.sls.sort()
+        return levels
+
+    def save(self, db):
+        """
+        Writes the changes since `load` (no commit): one UPDATE for the rows that left the grid
+        and one INSERT for the new levels. Returns the new open levels as LevelRows, in the
+        order added.
+        """
+        bot_config, symbol, quantizer = self._grid
+        used = {}
+        added = []
+        left = {}  # status -> ids of loaded rows
+        for order_type, price, status, order_id in self._changes:
+            if status == "open":
+                added.append({
+                    "bot_config_id": bot_config.id, "exchange_api_key_id": bot_config.exchange_id, "symbol": symbol,
+                    "price": price, "price_ticks": quantizer.price_to_ticks(price), "order_type": order_type,
+                    "side": SIDES[order_type], "order_id": order_id, "status": "open", "generation": 0,
+                })
+                continue
+            key = (order_type, price)
+            rows = self._rows.get(key, [])
+            i = used.get(key, 0)
+            if i < len(rows):
+                left.setdefault(status, []).append(rows[i].id)
+                used[key] = i + 1
+            else:
+                # Added since load and gone again
+                for level in added:
+                    if level["order_type"] == order_type and level["price"] == price and level["status"] == "open":
+                        level["status"] = status
+                        break
+        for status, level_ids in left.items():
+            crud.set_order_levels_status(db, level_ids, status)
+        ids = crud.add_order_levels(db, added)
+        if bot_config.tp_levels_json not in (None, '[]') or bot_config.sl_levels_json not in (None, '[]'):
+            bot_config.tp_levels_json = bot_config.sl_levels_json = '[]'
+        self._changes = []
+        return [
+            LevelRow(level_id, level["order_type"], level["side"], level["price"], level["price_ticks"], level["order_id"], 0)
+            for level_id, level in zip(ids, added) if level["status"] == "open"
+        ]
+
+    def rows(self, order_type, prices):
+        """The loaded row behind each of `prices` (None for a level added since), in order."""
+        used = {}
+        found = []
+        for price in prices:
+            rows = self._rows.get((order_type, price), [])
+            i = used.get(price, 0)
+            used[price] = i + 1
+            found.append(rows[i] if i < len(rows) else None)
+        return found
+
+    def has_row(self, level_id):
+        """Whether the open row `level_id` was among those loaded."""
+        return any(row.id == level_id for rows in self._rows.values() for row in rows)
+
+    @property
+    def top_tp(self):
+        return self.tps[-1] if self.tps else None
+
+    @property
+    def lowest_sl(self):
+        return self.sls[0] if self.sls else None
+
+    def tps_crossed(self, price):
+        """Number of TPs at or below `price` (the lowest ones)."""
+        return bisect_right(self.tps, price)
+
+    def take_tps(self, price):
+        """Removes and returns the TPs at or below `price`, lowest first, as filled."""
+        crossed = bisect_right(self.tps, price)
+        taken = self.tps[:crossed]
+        del self.tps[:crossed]
+        self._changes.extend((TP, p, "filled", None) for p in taken)
+        return taken
+
+    def take_sls(self, price):
+        """Removes and returns the SLs at or above `price`, highest first, as filled."""
+        crossed = bisect_left(self.sls, price)
+        taken = self.sls[crossed:]
+        del self.sls[crossed:]
+        taken.reverse()
+        self._changes.extend((SL, p, "filled", None) for p in taken)
+        return taken
+
+    def restore_tps(self, prices):
+        """Puts taken TPs back, e.g. when their orders turn out to be still resting."""
+        self._restore(TP, self.tps, prices)
+
+    def restore_sls(self, prices):
+        self._restore(SL, self.sls, prices)
+
+    def _restore(self, order_type, levels, prices):
+        for price in prices:
+            self._changes.remove((order_type, price, "filled", None))
+            insort(levels, price)
+
+    def pop_lowest_sl(self):
+        """Removes the lowest SL as cancelled and returns it."""
+        if not self.sls:
+            return None
+        price = self.sls.pop(0)
+        self._changes.append((SL, price, "cancelled", None))
+        return price
+
+    def add_tp(self, price, order_id=None):
+        insort(self.tps, float(price))
+        self._changes.append((TP, float(price), "open", order_id))
+
+    def add_sl(self, price, order_id=None):
+        insort(self.sls, float(price))
+        self._changes.append((SL, float(price), "open", order_id))
+
+    def __repr__(self):
+        return f"GridLevels(tps={self.tps[::-1]}, sls={self.sls[::-1]})"
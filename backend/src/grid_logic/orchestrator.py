@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Max grids started/stopped at the same time per exchange (REST rate limits differ)
+EXCHANGE_CONCURRENCY = {
+    "binance": 4,
+    "bybit": 4,
+    "gateio": 2,
+    "bitmart": 2,
+}
+DEFAULT_CONCURRENCY = 2
+MAX_STORED_JOBS = 100
+
+
+class BulkOrchestrator:
+    """
+    Runs bulk start/stop requests for many (exchange, symbol) pairs.
+    Each exchange gets its own bounded worker pool, so a slow exchange never
+    delays the others, and each pair opens and closes its own DB session.
+    Work on one pair is serialized across jobs, so a start and a stop never interleave.
+    """
+
+    def __init__(self, bot, concurrency=None):
+        self.bot = bot
+        self.concurrency = dict(EXCHANGE_CONCURRENCY, **(concurrency or {}))
+        self.jobs = OrderedDict()
+        self._pools = {}
+        self._pair_locks = {}  # (exchange, symbol) -> lock held while a job works on the pair
+        self._lock = threading.Lock()
+
+    def _pool(self, exchange: str) -> ThreadPoolExecutor:
+        with self._lock:
+            pool = self._pools.get(exchange)
+            if pool is None:
+                pool = ThreadPoolExecutor(
+                    max_workers=self.concurrency.get(exchange, DEFAULT_CONCURRENCY),
+                    thread_name_prefix=f"bulk-{exchange}"
+                )
+                self._pools[exchange] = pool
+            return pool
+
+    def submit(self, action: str, pairs) -> dict:
+        """
+        Queues `action` ("start" or "stop") for each (exchange, symbol) pair and returns the job.
+        """
+        if action not in ("start", "stop"):
+            raise ValueError(f"Unknown bulk action: {action}")
+
+        job_id = uuid.uuid4().hex
+        entries = OrderedDict()
+        for exchange, symbol in pairs:
+            exchange = exchange.lower()
+            entries[f"{exchange}:{symbol}"] = {
+                "exchange": exchange,
+                "symbol": symbol,
+                "status": "queued",
+                "error": None,
+                "elapsed": None,
+            }
+
+        job = {
+            "job_id": job_id,
+            "action": action,
+            "status": "running" if entries else "done",
+            "created_at": time.time(),
+            "finished_at": None if entries else time.time(),
+            "pairs": entries,
+        }
+        with self._lock:
+            self.jobs[job_id] = job
+            while len(self.jobs) > MAX_STORED_JOBS:
+                self.jobs.popitem(last=False)
+
+        for entry in entries.values():
+            self._pool(entry["exchange"]).submit(self._run_pair, job, entry)
+
+        logger.info(f"Bulk {action} job {job_id} queued for {len(entries)} pairs")
+        return self.summary(job)
+
+    def _pair_lock(self, exchange: str, symbol: str) -> threading.Lock:
+        with self._lock:
+            return self._pair_locks.setdefault((exchange, symbol), threading.Lock())
+
+    def _run_pair(self, job, entry):
+        with self._pair_lock(entry["exchange"], entry["symbol"]):
+            self._run_pair_locked(job, entry)
+
+    def _run_pair_locked(self, job, entry):
+        entry["status"] = "running"
+        started = time.perf_counter()
+        try:
+            if job["action"] == "start":
+                ok = self.bot.run_symbol(entry["exchange"], entry["symbol"])
+                entry["status"] = "started" if ok else "failed"
+            else:
+                self.bot.stop_symbol(entry["symbol"], entry["exchange"])
+                entry["status"] = "stopped"
+        except Exception as e:
+            logger.error(f"Bulk {job['action']} failed for {entry['exchange']} - {entry['symbol']}: {e}")
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+        finally:
+            entry["elapsed"] = round(time.perf_counter() - started, 3)
+            self._finish_if_done(job)
+
+    def _finish_if_done(self, job):
+        with self._lock:
+            if job["finished_at"] is None and all(
+                e["status"] not in ("queued", "running") for e in job["pairs"].values()
+            ):
+                job["status"] = "done"
+                job["finished_at"] = time.time()
+                logger.info(f"Bulk {job['action']} job {job['job_id']} finished")
+
+    def pending_counts(self) -> dict:
+        """Pairs still waiting for a worker, per exchange."""
+        counts = {}
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if job["finished_at"] is None]
+        for job in jobs:
+            for entry in list(job["pairs"].values()):
+                if entry["status"] == "queued":
+                    counts[entry["exchange"]] = counts.get(entry["exchange"], 0) + 1
+        return counts
+
+    def get_job(self, job_id: str):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return self.summary(job) if job else None
+
+    @staticmethod
+    def summary(job) -> dict:
+        counts = {}
+        for entry in job["pairs"].values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return {
+            "job_id": job["job_id"],
+            "action": job["action"],
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "counts": counts,
+            "pairs": [dict(e) for e in job["pairs"].values()],
+        }
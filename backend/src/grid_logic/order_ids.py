@@ -0,0 +1,27 @@
+import re
+from collections import namedtuple
+
+# Level 0 stands for a grid's entry market buy; its generation is the last level id the grid had before it
+ENTRY_LEVEL = 0
+
+# Letters and digits only, well inside every exchange's limit (BitMart 32, Gate.io 28 after its "t-" prefix)
+_PATTERN = re.compile(r"^(?:t-)?gb(\d+)l(\d+)g(\d+)$")
+
+ClientOrderId = namedtuple("ClientOrderId", "grid level generation")
+
+
+def client_order_id(grid_id, level_id, generation=0):
+    """
+    The client order id of the order placed for order_levels row `level_id` of grid `grid_id`
+    (its bot config id), for the row's `generation`-th placement. A retry of the same placement
+    sends the same id, so the exchange or a lookup can tell it was already placed.
+    """
+    return f"gb{grid_id}l{level_id}g{generation}"
+
+
+def parse_client_order_id(value):
+    """The (grid, level, generation) a client order id was made from, or None for any other id."""
+    match = _PATTERN.match(value or "")
+    if match is None:
+        return None
+    return ClientOrderId(*map(int, match.groups()))
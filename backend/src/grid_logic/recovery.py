@@ -0,0 +1,192 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import crud, models
+from database.database import SessionLocal
+from exchanges.ccxt_integration import create_exchange_client
+from exchanges.market_registry import market_registry
+from websocket_manager.market_data import market_data
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_WORKERS_PER_ACCOUNT = 8
+ARM_TIMEOUT = 30  # seconds to wait for sockets to report connected
+
+
+def _has_legacy_levels(config) -> bool:
+    return (config.tp_levels_json or '[]') != '[]' or (config.sl_levels_json or '[]') != '[]'
+
+def load_recoverable_grids(db_session, grids=None):
+    """
+    Returns {exchange_api_key_id: (api_key_row, [symbol, ...])} for every config with stored levels,
+    limited to the (exchange, symbol) pairs in `grids` when given.
+    """
+    accounts = {}
+    configs = db_session.query(models.ExchangeBotConfig).all()
+    with_levels = set(crud.get_stored_levels_by_config(db_session))
+    for config in configs:
+        if not config.exchange_api_key or not config.symbol:
+            continue
+        if config.id not in with_levels and not _has_legacy_levels(config):
+            continue
+        key = config.exchange_api_key
+        if grids is not None and (key.exchange, config.symbol.symbol) not in grids:
+            continue
+        accounts.setdefault(key.id, (key, []))[1].append(config.symbol.symbol)
+    return accounts
+
+def fetch_account_open_orders(exchange_instance, symbols):
+    """
+    Fetches open orders for all symbols of an account with a single all-symbols call,
+    falling back to one call per symbol when the exchange does not support it.
+    """
+    by_symbol = {symbol: [] for symbol in symbols}
+    try:
+        if exchange_instance.id == "binance":
+            exchange_instance.options["warnOnFetchOpenOrdersWithoutSymbol"] = False
+        orders = exchange_instance.fetch_open_orders()
+    except Exception as e:
+        logger.warning(f"{exchange_instance.id}: all-symbols open orders unavailable ({e}); fetching per symbol")
+        for symbol in symbols:
+            by_symbol[symbol] = exchange_instance.fetch_open_orders(symbol)
+        return by_symbol
+
+    for order in orders:
+        if order.get('symbol') in by_symbol:
+            by_symbol[order['symbol']].append(order)
+    return by_symbol
+
+def _reconcile_account(bot, key, symbols):
+    """
+    Reconciles every grid of one account in parallel. Returns a list of grid result dicts.
+    """
+    from websocket_manager.websocket_manager import reconcile_grid
+
+    results = []
+    try:
+        exchange_instance = create_exchange_client(key)
+        market_registry.load(exchange_instance)  # one fetch_markets per account
+        open_orders = fetch_account_open_orders(exchange_instance, symbols)
+    except Exception as e:
+        logger.error(f"Warm start: failed to load account {key.exchange}: {e}")
+        return [{"exchange": key.exchange, "symbol": s, "status": "failed", "error": str(e)} for s in symbols]
+
+    def reconcile(symbol):
+        result = {"exchange": exchange_instance.id, "symbol": symbol, "status": "failed", "error": None}
+        if (exchange_instance.id, symbol) in bot.websocket_connections:
+            result["status"] = "already_running"
+            return result
+
+        # Streams in while the grid is reconciled, so a reset sizes from it rather than REST
+        market_data.subscribe(exchange_instance.id, symbol)
+        # Release the connection right away; 100+ grids would otherwise exhaust the pool
+        db_session = SessionLocal()
+        try:
+            reconciled = reconcile_grid(
+                exchange_instance, symbol, key.balance, db_session,
+                open_orders=open_orders.get(symbol, [])
+            )
+        except Exception as e:
+            logger.exception(f"Warm start: reconciliation failed for {exchange_instance.id} - {symbol}")
+            reconciled = None
+            result["error"] = str(e)
+        finally:
+            db_session.close()
+
+        if reconciled is None:
+            market_data.unsubscribe(exchange_instance.id, symbol)
+            return result
+
+        result.update(
+            status="reconciled",
+            exchange_instance=exchange_instance,
+            amount=key.balance,
+            bot_config=reconciled[0],
+            market_params=reconciled[1],
+        )
+        return result
+
+    with ThreadPoolExecutor(max_workers=RECONCILE_WORKERS_PER_ACCOUNT,
+                            thread_name_prefix=f"warm-{exchange_instance.id}") as pool:
+        results.extend(pool.map(reconcile, symbols))
+    return results
+
+def _wait_until_armed(sockets, timeout=ARM_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    pending = list(sockets)
+    while pending and time.monotonic() < deadline:
+        pending = [ws for ws in pending if not (getattr(ws, "sock", None) and ws.sock.connected)]
+        if pending:
+            time.sleep(0.05)
+    return len(sockets) - len(pending)
+
+def warm_start(bot, grids=None) -> dict:
+    """
+    Boot-time recovery: reconciles every stored grid (accounts in parallel, one open-orders
+    call per account) and only then resumes the sockets. Stores and returns a timing report.
+    `grids` limits recovery to those (exchange, symbol) pairs, e.g. one engine worker's share.
+    """
+    started = time.perf_counter()
+    db_session = SessionLocal()
+    try:
+        accounts = load_recoverable_grids(db_session, grids)
+    finally:
+        db_session.close()
+
+    total = sum(len(symbols) for _, symbols in accounts.values())
+    logger.info(f"Warm start: recovering {total} grids across {len(accounts)} accounts")
+
+    results = []
+    if accounts:
+        with ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix="warm-account") as pool:
+            for account_results in pool.map(lambda item: _reconcile_account(bot, *item), accounts.values()):
+                results.extend(account_results)
+    reconciled_at = time.perf_counter()
+
+    # Sockets resume only after every grid has been reconciled
+    sockets = []
+    for result in results:
+        if result["status"] != "reconciled":
+            continue
+        from websocket_manager.websocket_manager import start_grid_websocket
+
+        db_session = SessionLocal()
+        try:
+            ws = start_grid_websocket(
+                result.pop("exchange_instance"), result["symbol"], result.pop("bot_config"),
+                result.pop("amount"), result.pop("market_params"), db_session, bot
+            )
+        except Exception as e:
+            logger.exception(f"Warm start: failed to start socket for {result['exchange']} - {result['symbol']}")
+            ws = None
+            result["error"] = str(e)
+        finally:
+            db_session.close()
+
+        if ws is None:
+            result["status"] = "failed"
+            market_data.unsubscribe(result["exchange"], result["symbol"])
+        else:
+            result["status"] = "armed"
+            sockets.append(ws)
+
+    connected = _wait_until_armed(sockets)
+    finished = time.perf_counter()
+
+    report = {
+        "grids": total,
+        "accounts": len(accounts),
+        "armed": len(sockets),
+        "connected": connected,
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "reconcile_seconds": round(reconciled_at - started, 3),
+        "time_to_fully_armed": round(finished - started, 3),
+        "results": results,
+    }
+    bot.warm_start_report = report
+    logger.info(
+        f"Warm start: {connected}/{total} grids armed in {report['time_to_fully_armed']}s "
+        f"(reconcile {report['reconcile_seconds']}s, {report['failed']} failed)"
+    )
+    return report
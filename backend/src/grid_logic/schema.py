@@ -8,4 +8,11 @@ class StartSymbolParams(BaseModel):
     
 class StopSymbolRequest(BaseModel):
     symbol: str
-    exchange: str
\ No newline at end of file
+    exchange: str
+
+class SymbolPair(BaseModel):
+    exchange: str
+    symbol: str
+
+class BulkSymbolsRequest(BaseModel):
+    pairs: List[SymbolPair]
@@ -0,0 +1,512 @@
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from database.database import SessionLocal
+from engine.events import engine_events
+from grid_logic.recovery import load_recoverable_grids
+from observability import metrics
+from observability.profiling import MAX_PROFILE_SECONDS, debug_result
+
+logger = logging.getLogger(__name__)
+
+WORKER_NAME_PREFIX = "grid-shard-"
+WORKER_COMMAND_THREADS = 16  # commands a worker runs at once (bulk starts block for seconds)
+RUN_TIMEOUT = 120  # seconds for a start, which reconciles the grid before opening its socket
+STATUS_TIMEOUT = 5
+SUPERVISE_INTERVAL = 1.0
+MAX_RESTART_BACKOFF = 30
+MAX_RESTARTS = 5  # within RESTART_WINDOW; past that the shard is dropped and its grids rebalanced
+RESTART_WINDOW = 300
+
+SHARD_RESTARTS = metrics.Counter(
+    "gridbot_shard_restarts_total", "Engine worker processes restarted after exiting.", ["shard"])
+
+
+class ShardUnavailable(RuntimeError):
+    pass
+
+
+def shard_index(exchange: str, symbol: str, shards: int) -> int:
+    """Stable shard for an (account, symbol) pair; one API key per exchange, so the exchange is the account."""
+    return zlib.crc32(f"{exchange.lower()}:{symbol}".encode()) % shards
+
+def is_shard_worker() -> bool:
+    return multiprocessing.current_process().name.startswith(WORKER_NAME_PREFIX)
+
+
+def _worker_main(slot, conn, grids):
+    """
+    Engine process entry point: runs commands from the supervisor against this process's own
+    GridBot (own ccxt clients, sockets and timers) until the pipe closes, then detaches every
+    grid, leaving its orders resting for the next warm start.
+    `grids` is the set of (exchange, symbol) pairs to warm start, or None to skip warm start.
+    """
+    from grid_logic.grid_strategy import grid_bot
+    from grid_logic.recovery import warm_start
+
+    commands = {
+        "run_symbol": grid_bot.run_symbol,
+        "stop_symbol": grid_bot.stop_symbol,
+        "detach_symbol": grid_bot.detach_symbol,
+        "stop": grid_bot.stop,
+        "get_all_symbols_status": grid_bot.get_all_symbols_status,
+        "active_grid_counts": grid_bot.active_grid_counts,
+        "warm_start_report": lambda: grid_bot.warm_start_report,
+        "metrics": metrics.REGISTRY.render,
+        "debug": debug_result,
+    }
+    send_lock = threading.Lock()
+
+    def execute(request_id, method, args):
+        try:
+            reply = (request_id, True, commands[method](*args))
+        except Exception as e:
+            reply = (request_id, False, f"{type(e).__name__}: {e}")
+        with send_lock:
+            try:
+                conn.send(reply)
+            except (OSError, ValueError):
+                pass  # supervisor is gone
+
+    def forward_event(topic, data):
+        with send_lock:
+            try:
+                conn.send((None, topic, data))
+            except (OSError, ValueError):
+                pass
+
+    engine_events.subscribe(None, forward_event)  # re-published by the supervisor's process
+    logger.info(f"Engine shard {slot} started")
+    if grids is not None:
+        threading.Thread(target=warm_start, args=(grid_bot, set(grids)), daemon=True, name="warm-start").start()
+
+    pool = ThreadPoolExecutor(max_workers=WORKER_COMMAND_THREADS, thread_name_prefix=f"shard{slot}-cmd")
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        pool.submit(execute, *message)
+
+    # No supervisor, no grids: never leave an engine trading on its own. The orders stay, so a
+    # restarted API or shard reconciles the grids instead of buying back in.
+    logger.info(f"Engine shard {slot} stopping")
+    grid_bot.detach()
+    pool.shutdown(wait=False)
+
+
+class _Shard:
+    """One engine process plus the request/response pipe to it."""
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.grids = set()  # (exchange, symbol) pairs this shard should be running
+        self.process = None
+        self.conn = None
+        self.restarts = deque()
+        self.restart_count = 0
+        self.restart_at = None
+        self._pending = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def spawn(self, context, warm_grids=None):
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(self.slot, child_conn, warm_grids),
+            name=f"{WORKER_NAME_PREFIX}{self.slot}", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        pending = {}
+        with self._lock:
+            self.conn, self._pending = parent_conn, pending
+        self.restart_at = None
+        threading.Thread(target=self._read, args=(parent_conn, pending), daemon=True,
+                         name=f"shard-{self.slot}-reader").start()
+
+    def _read(self, conn, pending):
+        while True:
+            try:
+                request_id, ok, value = conn.recv()
+            except (EOFError, OSError):
+                break
+            if request_id is None:  # an event: (None, topic, data)
+                engine_events.publish(ok, value)
+                continue
+            with self._lock:
+                future = pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(f"shard {self.slot}: {value}"))
+
+        with self._lock:
+            orphaned = list(pending.values())
+            pending.clear()
+        for future in orphaned:
+            future.set_exception(ShardUnavailable(f"Engine shard {self.slot} exited"))
+
+    def call(self, method, *args) -> Future:
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                future.set_exception(ShardUnavailable(f"Engine shard {self.slot} is not running"))
+                return future
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            try:
+                self.conn.send((request_id, method, args))
+            except (OSError, ValueError) as e:
+                self._pending.pop(request_id, None)
+                future.set_exception(ShardUnavailable(f"Engine shard {self.slot}: {e}"))
+        return future
+
+    def request(self, method, *args, timeout=STATUS_TIMEOUT):
+        return self.call(method, *args).result(timeout)
+
+    def shutdown(self, timeout=10):
+        if self.process is None:
+            return
+        with self._lock:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            logger.warning(f"Engine shard {self.slot} did not stop in {timeout}s; terminating")
+            self.process.terminate()
+            self.process.join(5)
+        self.conn.close()
+
+    def info(self):
+        return {
+            "shard": self.slot,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive,
+            "exitcode": self.process.exitcode if self.process else None,
+            "restarts": self.restart_count,
+            "grids": len(self.grids),
+        }
+
+
+class ShardedGridBot:
+    """
+    GridBot's control API over N engine processes. Grids are hash-partitioned by
+    (account, symbol) across the shards, so each process runs its own slice of sockets, timers
+    and ccxt clients on its own core. A supervisor thread restarts shards that exit, with
+    backoff, and re-arms their grids; a shard that keeps crashing is dropped and its grids are
+    rebalanced onto the rest, as they are on resize().
+    """
+
+    sharded = True
+
+    def __init__(self, workers: int):
+        if workers < 1:
+            raise ValueError("Need at least one engine worker")
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")  # no forking a process full of threads
+        self._shards = []
+        self._next_slot = 0
+        self._lock = threading.RLock()
+        self._rebalance_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    # ---------------- supervisor ----------------
+
+    def start(self, warm_start=True):
+        """
+        Spawns the workers. With `warm_start`, every stored grid is assigned to its shard,
+        which reconciles and re-arms it like the single-process warm start.
+        """
+        with self._lock:
+            self._shards = [self._new_shard() for _ in range(self.workers)]
+            recoverable = self._recoverable_grids() if warm_start else set()
+            for grid in recoverable:
+                self._route(*grid).grids.add(grid)
+            for shard in self._shards:
+                shard.spawn(self._context, set(shard.grids) if warm_start else None)
+        logger.info(f"Started {self.workers} engine shards ({len(recoverable)} stored grids assigned)")
+        threading.Thread(target=self._supervise, daemon=True, name="shard-supervisor").start()
+
+    def shutdown(self):
+        """Stops every worker process; their grids are detached, with orders left resting."""
+        self._stopping.set()
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            shard.shutdown()
+
+    def _new_shard(self):
+        shard = _Shard(self._next_slot)
+        self._next_slot += 1
+        return shard
+
+    @staticmethod
+    def _recoverable_grids():
+        db_session = SessionLocal()
+        try:
+            accounts = load_recoverable_grids(db_session)
+        finally:
+            db_session.close()
+        return {(key.exchange, symbol) for key, symbols in accounts.values() for symbol in symbols}
+
+    def _route(self, exchange, symbol):
+        with self._lock:
+            return self._shards[shard_index(exchange, symbol, len(self._shards))]
+
+    def _supervise(self):
+        while not self._stopping.wait(SUPERVISE_INTERVAL):
+            dropped = []
+            with self._lock:
+                for shard in list(self._shards):
+                    if shard.alive:
+                        continue
+                    if shard.restart_at is None:
+                        if self._on_exit(shard):
+                            dropped.append(shard)
+                    elif time.monotonic() >= shard.restart_at:
+                        logger.info(f"Restarting engine shard {shard.slot} with {len(shard.grids)} grids")
+                        shard.spawn(self._context, set(shard.grids))
+            if dropped:
+                threading.Thread(target=self._rebalance, args=(dropped,), daemon=True,
+                                 name="shard-rebalance").start()
+
+    def _on_exit(self, shard) -> bool:
+        """Schedules a restart; returns True when the shard was dropped instead."""
+        now = time.monotonic()
+        shard.restarts.append(now)
+        while shard.restarts and now - shard.restarts[0] > RESTART_WINDOW:
+            shard.restarts.popleft()
+        shard.restart_count += 1
+        SHARD_RESTARTS.labels(shard.slot).inc()
+
+        if len(shard.restarts) > MAX_RESTARTS and len(self._shards) > 1:
+            logger.error(f"Engine shard {shard.slot} exited {len(shard.restarts)} times in {RESTART_WINDOW}s; "
+                         f"moving its {len(shard.grids)} grids to the other shards")
+            self._shards.remove(shard)
+            return True
+
+        backoff = min(2 ** (len(shard.restarts) - 1), MAX_RESTART_BACKOFF)
+        shard.restart_at = now + backoff
+        logger.warning(f"Engine shard {shard.slot} exited (code {shard.process.exitcode}); restarting in {backoff}s")
+        return False
+
+    def _rebalance(self, retired=()):
+        """
+        Moves every grid whose shard changed (after a resize or a dropped shard): detach it on the
+        old shard if that still runs, leaving its orders resting, then start it on the new one,
+        which reconciles the stored levels against those orders as a warm start does.
+        """
+        with self._rebalance_lock:
+            with self._lock:
+                moves = []
+                for shard in list(self._shards) + list(retired):
+                    for grid in list(shard.grids):
+                        target = self._route(*grid)
+                        if target is not shard:
+                            shard.grids.discard(grid)
+                            target.grids.add(grid)
+                            moves.append((grid, shard, target))
+
+            logger.info(f"Rebalancing {len(moves)} grids across {len(self._shards)} engine shards")
+            for (exchange, symbol), source, target in moves:
+                try:
+                    if source.alive:
+                        source.request("detach_symbol", symbol, exchange)
+                    if not target.request("run_symbol", exchange, symbol, timeout=RUN_TIMEOUT):
+                        target.grids.discard((exchange, symbol))
+                        logger.error(f"Rebalance: {exchange} - {symbol} failed to start on shard {target.slot}")
+                except Exception as e:
+                    logger.error(f"Rebalance: moving {exchange} - {symbol} to shard {target.slot} failed: {e}")
+
+    def resize(self, workers: int):
+        """Grows or shrinks the pool and moves the grids whose shard changed."""
+        if workers < 1:
+            raise ValueError("Need at least one engine worker")
+        with self._lock:
+            retired = self._shards[workers:]
+            self._shards = self._shards[:workers]
+            while len(self._shards) < workers:
+                shard = self._new_shard()
+                shard.spawn(self._context, set())  # empty warm start, so its report is not pending
+                self._shards.append(shard)
+            self.workers = workers
+        self._rebalance(retired)
+        for shard in retired:
+            shard.shutdown()
+        return self.shard_info()
+
+    def shard_info(self):
+        with self._lock:
+            return [shard.info() for shard in self._shards]
+
+    def _gather(self, method, *args, timeout=STATUS_TIMEOUT):
+        """Calls every live shard at once; returns [(shard, result)] for the ones that answered."""
+        with self._lock:
+            calls = [(shard, shard.call(method, *args)) for shard in self._shards]
+        wait([future for _, future in calls], timeout)
+        results = []
+        for shard, future in calls:
+            if future.done() and future.exception() is None:
+                results.append((shard, future.result()))
+            else:
+                logger.debug(f"Engine shard {shard.slot} gave no {method} answer")
+        return results
+
+    # ---------------- GridBot API ----------------
+
+    def start_symbol(self, exchange: str, symbol: str, db_session=None):
+        """
+        Non-blocking start on the pair's shard; the worker reads the API key itself.
+        """
+        exchange = exchange.lower()
+        shard = self._route(exchange, symbol)
+        shard.grids.add((exchange, symbol))
+        shard.call("run_symbol", exchange, symbol).add_done_callback(
+            lambda future: self._start_done(shard, exchange, symbol, future))
+        logger.info(f"Starting {exchange} - {symbol} on engine shard {shard.slot}")
+
+    def _start_done(self, shard, exchange, symbol, future):
+        error = future.exception()
+        if isinstance(error, ShardUnavailable):
+            return  # stays assigned; the restarted shard arms it
+        if error is not None or not future.result():
+            shard.grids.discard((exchange, symbol))
+            logger.error(f"Engine shard {shard.slot} failed to start {exchange} - {symbol}: {error or 'see shard log'}")
+
+    def run_symbol(self, exchange: str, symbol: str) -> bool:
+        exchange = exchange.lower()
+        shard = self._route(exchange, symbol)
+        shard.grids.add((exchange, symbol))
+        try:
+            ok = shard.request("run_symbol", exchange, symbol, timeout=RUN_TIMEOUT)
+        except ShardUnavailable as e:
+            logger.warning(f"{exchange} - {symbol}: {e}; it starts when the shard is back")
+            return False
+        except Exception:
+            shard.grids.discard((exchange, symbol))
+            raise
+        if not ok:
+            shard.grids.discard((exchange, symbol))
+        return ok
+
+    def stop_symbol(self, symbol: str, exchange: str = None):
+        if exchange:
+            targets = [self._route(exchange.lower(), symbol)]
+        else:
+            with self._lock:
+                targets = list(self._shards)
+        for shard in targets:
+            shard.grids = {grid for grid in shard.grids
+                           if not (grid[1] == symbol and (exchange is None or grid[0] == exchange.lower()))}
+            try:
+                shard.request("stop_symbol", symbol, exchange)
+            except ShardUnavailable:
+                pass  # not running, and no longer assigned
+
+    def detach_symbol(self, symbol: str, exchange: str = None):
+        """Closes the grid's socket on its shard but leaves its orders resting (a handover)."""
+        if exchange:
+            targets = [self._route(exchange.lower(), symbol)]
+        else:
+            with self._lock:
+                targets = list(self._shards)
+        for shard in targets:
+            shard.grids = {grid for grid in shard.grids
+                           if not (grid[1] == symbol and (exchange is None or grid[0] == exchange.lower()))}
+            try:
+                shard.request("detach_symbol", symbol, exchange)
+            except ShardUnavailable:
+                pass
+
+    def stop(self):
+        """Stops every grid on every shard; the worker processes keep running."""
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            shard.grids.clear()
+        self._gather("stop", timeout=RUN_TIMEOUT)
+
+    @property
+    def running(self):
+        return any(self.active_grid_counts().values())
+
+    def get_symbol_status(self, symbol: str):
+        return self.get_all_symbols_status().get(symbol, {'status': 'stopped', 'exchanges': []})
+
+    def get_all_symbols_status(self):
+        status = {}
+        for _, shard_status in self._gather("get_all_symbols_status"):
+            for sym, entry in shard_status.items():
+                merged = status.setdefault(sym, {'exchanges': [], 'status': 'stopped'})
+                merged['exchanges'].extend(entry['exchanges'])
+                if entry['status'] == 'running':
+                    merged['status'] = 'running'
+        return status
+
+    def active_grid_counts(self) -> dict:
+        counts = {}
+        for _, shard_counts in self._gather("active_grid_counts"):
+            for exchange, n in shard_counts.items():
+                counts[exchange] = counts.get(exchange, 0) + n
+        return counts
+
+    @property
+    def warm_start_report(self):
+        """The shards' warm start reports combined; None until every shard has one."""
+        with self._lock:
+            expected = len(self._shards)
+        reports = [report for _, report in self._gather("warm_start_report") if report is not None]
+        if not reports or len(reports) < expected:
+            return None
+        results = [result for report in reports for result in report["results"]]
+        return {
+            "grids": sum(r["grids"] for r in reports),
+            "accounts": len({r["exchange"] for r in results}),
+            "armed": sum(r["armed"] for r in reports),
+            "connected": sum(r["connected"] for r in reports),
+            "failed": sum(r["failed"] for r in reports),
+            "reconcile_seconds": max(r["reconcile_seconds"] for r in reports),
+            "time_to_fully_armed": max(r["time_to_fully_armed"] for r in reports),
+            "shards": len(reports),
+            "results": results,
+        }
+
+    def render_metrics(self) -> str:
+        """This process's metrics plus every shard's, labelled shard="<n>"."""
+        sources = [(None, metrics.REGISTRY.render())]
+        sources.extend(({"shard": shard.slot}, text) for shard, text in self._gather("metrics"))
+        return metrics.merge_expositions(sources)
+
+    def debug(self, command, *args):
+        """
+        Runs a /debug command (observability.profiling.DEBUG_COMMANDS) in this process and on
+        every shard at once. Returns {"supervisor" | "shard<n>": result}; a process that failed
+        or did not answer has {"error": ...}.
+        """
+        with self._lock:
+            calls = [(shard, shard.call("debug", command, *args)) for shard in self._shards]
+        results = {"supervisor": debug_result(command, *args)}  # a profile samples here meanwhile
+        wait([future for _, future in calls], STATUS_TIMEOUT + MAX_PROFILE_SECONDS)
+        for shard, future in calls:
+            if future.done() and future.exception() is None:
+                results[f"shard{shard.slot}"] = future.result()
+            else:
+                results[f"shard{shard.slot}"] = {"error": str(future.exception()) if future.done() else "no answer"}
+        return results
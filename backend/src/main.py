@@ -1,23 +1,27 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from database import models, schemas, crud
 from database.database import SessionLocal, engine
-from grid_logic.grid_strategy import grid_bot
-from grid_logic.schema import StartSymbolParams, StopSymbolRequest
+from grid_logic.grid_strategy import grid_bot, bulk_orchestrator, start_engine, stop_engine
+from grid_logic.leases import LeaseManager
+from grid_logic.sharding import ShardedGridBot
+from engine.client import EngineClient, EngineError, EngineUnavailable
+from grid_logic.schema import StartSymbolParams, StopSymbolRequest, BulkSymbolsRequest
 from fastapi.middleware.cors import CORSMiddleware
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.backends import default_backend
+from observability import metrics
+from observability.tracing import fill_tracer
+from observability.profiling import ProfilerBusy, merge_profiles, run_debug_command, sampling_profiler
 import uvicorn
-import requests
+import json
 import logging 
-import ccxt
+import os
+import time
+from collections import Counter
 from typing import Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
-# Create tables if they don't exist
-models.Base.metadata.create_all(bind=engine)
-
 app = FastAPI(title="Trading Bot API")
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +30,47 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+@app.on_event("startup")
+def create_tables():
+    # Create tables if they don't exist (at startup rather than import, so importing stays cheap)
+    models.upgrade_order_levels(engine)
+    models.Base.metadata.create_all(bind=engine)
+
+@app.on_event("startup")
+def warm_start_grids():
+    """
+    Re-arms every grid with stored levels in the background. Disable with GRID_WARM_START=0.
+    With GRID_WORKERS set, starts the engine processes, each warm starting its own share.
+    With ENGINE_SOCKET set, the separate engine process does all of this itself.
+    """
+    if isinstance(grid_bot, EngineClient):
+        logger.info(f"Grids run in the engine process at {grid_bot.path}")
+        return
+    start_engine(grid_bot)
+
+@app.on_event("shutdown")
+def stop_grids():
+    if isinstance(grid_bot, EngineClient):
+        grid_bot.close()  # the engine and its grids keep running
+    else:
+        stop_engine(grid_bot)
+
+@app.exception_handler(EngineUnavailable)
+def engine_unavailable(request: Request, exc: EngineUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+def coinbase_raw_secret(pem_key: str) -> str:
+    """
+    Coinbase secrets arrive PEM-encoded; the client signs with the raw private value (hex).
+    """
+    # Only Coinbase keys need cryptography; importing it at startup costs every boot
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.backends import default_backend
+
+    private_key = serialization.load_pem_private_key(pem_key.encode(), password=None, backend=default_backend())
+    return private_key.private_numbers().private_value.to_bytes(32, byteorder='big').hex()
+
 # Dependency to get a DB session
 def get_db():
     db = SessionLocal()
@@ -46,12 +91,7 @@ def add_api_key(api_key: schemas.APIKeyCreate, db: Session = Depends(get_db)):
     # Convert PEM-encoded api_secret for Coinbase
     if api_key.exchange.lower() == "coinbase":
         try:
-            pem_key = api_key.api_secret
-            private_key = serialization.load_pem_private_key(
-                pem_key.encode(), password=None, backend=default_backend()
-            )
-            raw_private_key = private_key.private_numbers().private_value.to_bytes(32, byteorder='big')
-            api_key.api_secret = raw_private_key.hex()
+            api_key.api_secret = coinbase_raw_secret(api_key.api_secret)
         except Exception as e:
             raise HTTPException(
                 status_code=400,
@@ -77,12 +117,7 @@ def update_api_key(exchange: str, updated_key: schemas.APIKeyCreate, db: Session
     # Convert PEM-encoded api_secret for Coinbase if needed
     if exchange.lower() == "coinbase" and updated_key.api_secret:
         try:
-            pem_key = updated_key.api_secret
-            private_key = serialization.load_pem_private_key(
-                pem_key.encode(), password=None, backend=default_backend()
-            )
-            raw_private_key = private_key.private_numbers().private_value.to_bytes(32, byteorder='big')
-            updated_key.api_secret = raw_private_key.hex()
+            updated_key.api_secret = coinbase_raw_secret(updated_key.api_secret)
         except Exception as e:
             raise HTTPException(
                 status_code=400,
@@ -137,6 +172,90 @@ async def stop_symbol(request: StopSymbolRequest):
         logger.error(f"Error stopping WebSocket: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/grid-bot/bulk-start")
+def bulk_start_endpoint(request: BulkSymbolsRequest):
+    """
+    Starts many (exchange, symbol) pairs in the background with per-exchange concurrency limits.
+    Returns a job id; poll /grid-bot/jobs/{job_id} for per-pair progress.
+    """
+    if not request.pairs:
+        raise HTTPException(status_code=400, detail="Error: No symbols selected.")
+    return bulk_orchestrator.submit("start", [(p.exchange, p.symbol) for p in request.pairs])
+
+@app.post("/grid-bot/bulk-stop")
+def bulk_stop_endpoint(request: BulkSymbolsRequest):
+    """
+    Stops many (exchange, symbol) pairs in the background.
+    Returns a job id; poll /grid-bot/jobs/{job_id} for per-pair progress.
+    """
+    if not request.pairs:
+        raise HTTPException(status_code=400, detail="Error: No symbols selected.")
+    return bulk_orchestrator.submit("stop", [(p.exchange, p.symbol) for p in request.pairs])
+
+@app.get("/grid-bot/jobs/{job_id}")
+def get_bulk_job(job_id: str):
+    job = bulk_orchestrator.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job
+
+@app.get("/grid-bot/warm-start")
+def get_warm_start_report():
+    """
+    Returns the boot-time recovery report (time-to-fully-armed and per-grid results).
+    """
+    report = grid_bot.warm_start_report
+    if report is None:
+        return {"status": "pending"}
+    return {"status": "done", **report}
+
+@app.get("/grid-bot/workers")
+def get_engine_workers():
+    """
+    Engine processes when running with GRID_WORKERS (pid, liveness, restarts, assigned grids).
+    """
+    if isinstance(grid_bot, EngineClient):
+        return grid_bot.workers()
+    if not isinstance(grid_bot, ShardedGridBot):
+        return {"mode": "threads", "workers": []}
+    return {"mode": "processes", "workers": grid_bot.shard_info()}
+
+@app.post("/grid-bot/workers")
+def resize_engine_workers(count: int):
+    """
+    Grows or shrinks the engine process pool; grids whose shard changes are moved (stopped, then
+    started and reconciled on their new shard).
+    """
+    if count < 1:
+        raise HTTPException(status_code=400, detail="Need at least one engine worker.")
+    if isinstance(grid_bot, EngineClient):
+        try:
+            return grid_bot.resize(count)
+        except EngineError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not isinstance(grid_bot, ShardedGridBot):
+        raise HTTPException(status_code=400, detail="Not running with engine workers; set GRID_WORKERS.")
+    return {"mode": "processes", "workers": grid_bot.resize(count)}
+
+@app.get("/grid-bot/leases")
+def get_grid_leases(db: Session = Depends(get_db)):
+    """
+    Grid ownership across nodes (GRID_LEASES=1): owner node, handover generation and expiry per grid.
+    """
+    leases = [
+        {
+            "exchange": lease.exchange_api_key.exchange if lease.exchange_api_key else None,
+            "symbol": lease.symbol,
+            "owner": lease.owner,
+            "generation": lease.generation,
+            "expires_at": lease.expires_at,
+            "heartbeat_at": lease.heartbeat_at,
+        }
+        for lease in crud.get_grid_leases(db)
+    ]
+    node = grid_bot.node_id if isinstance(grid_bot, LeaseManager) else None
+    return {"node": node, "leases": leases}
+
 @app.get("/grid-bot/status")
 def get_grid_bot_status(symbol: Optional[str] = None):
     """
@@ -199,84 +318,26 @@ def restart_grid_bot(exchange_name: str, symbol: str, db: Session = Depends(get_
 def update_symbols(request: schemas.UpdateSymbolsRequest, db: Session = Depends(get_db)):
     """
     Updates TP/SL values for stored symbols. Does NOT store `amount`, as it comes from API Key balance.
+    The stored symbols become exactly those in the request, in one transaction. Running grids
+    use the new TP/SL from their next fill; grids of removed symbols are stopped like /stop_symbol.
     """
-    current_symbols = {s.symbol: s for s in crud.get_all_symbols(db)}
-    new_symbols_set = {s.symbol for s in request.symbols}
-
-    added_symbols = []
-    updated_symbols = []
-    removed_symbols = []
-
-    exchanges = db.query(models.ExchangeAPIKey).all()  # Fetch all exchange keys
-
-    for sym_update in request.symbols:
-        if sym_update.symbol not in current_symbols:
-            # ✅ Create new symbol
-            new_sym = crud.add_symbol(db, sym_update.symbol)
-            if new_sym:
-                added_symbols.append(new_sym.symbol)
-
-                # ✅ Create bot configurations for all exchanges with correct amount
-                for ex in exchanges:
-                    config_data = schemas.ExchangeBotConfigCreate(
-                        exchange_id=ex.id,
-                        symbol_id=new_sym.id,
-                        amount=ex.balance,  # ✅ Fetch the amount from exchange balance
-                        tp_percent=sym_update.tp_percent,
-                        sl_percent=sym_update.sl_percent,
-                        tp_levels_json='[]',
-                        sl_levels_json='[]'
-                    )
-                    crud.create_bot_config(db, config_data)
-        else:
-            # ✅ Update existing symbol's TP/SL values
-            symbol_obj = current_symbols[sym_update.symbol]
-            bot_configs = db.query(models.ExchangeBotConfig).filter(
-                models.ExchangeBotConfig.symbol_id == symbol_obj.id
-            ).all()
-
-            if bot_configs:
-                for config in bot_configs:
-                    config.tp_percent = sym_update.tp_percent
-                    config.sl_percent = sym_update.sl_percent
-                updated_symbols.append(sym_update.symbol)
-            else:
-                # ✅ Ensure a bot config exists for each exchange
-                for ex in exchanges:
-                    config_data = schemas.ExchangeBotConfigCreate(
-                        exchange_id=ex.id,
-                        symbol_id=symbol_obj.id,
-                        amount=ex.balance,  # ✅ Fetch the amount from exchange balance
-                        tp_percent=sym_update.tp_percent,
-                        sl_percent=sym_update.sl_percent,
-                        tp_levels_json='[]',
-                        sl_levels_json='[]'
-                    )
-                    crud.create_bot_config(db, config_data)
-                updated_symbols.append(sym_update.symbol)
-
+    started = time.perf_counter()
+    settings = {s.symbol.upper(): (s.tp_percent, s.sl_percent) for s in request.symbols}
+    added_symbols, updated_symbols, removed_symbols = crud.sync_symbols(db, settings)
     db.commit()
-
-    # ✅ Remove symbols not in the request
-    current_symbols_set = set(current_symbols.keys())
-    symbols_to_remove = current_symbols_set - new_symbols_set
-
-    for sym in symbols_to_remove:
-        removed = crud.remove_symbol(db, sym)
-        if removed:
-            removed_symbols.append(removed.symbol)
-            bot_configs = db.query(models.ExchangeBotConfig).filter(
-                models.ExchangeBotConfig.symbol_id == removed.id
-            ).all()
-            for config in bot_configs:
-                crud.delete_bot_config(db, config.id)
+    for symbol in removed_symbols:
+        grid_bot.stop_symbol(symbol)  # its config and levels are gone; close the grid on every exchange
+    elapsed = round(time.perf_counter() - started, 3)
+    logger.info(f"Symbols updated in {elapsed}s: {len(settings)} requested, {len(added_symbols)} added, "
+                f"{len(updated_symbols)} updated, {len(removed_symbols)} removed")
 
     return {
         "message": "Symbols updated successfully.",
         "added": added_symbols,
         "updated": updated_symbols,
         "removed": removed_symbols,
-        "current": list(new_symbols_set)
+        "current": list(settings),
+        "elapsed": elapsed
     }
   
 @app.get("/symbols/")
@@ -285,6 +346,7 @@ def get_symbols(db: Session = Depends(get_db)):
     Retrieve all stored symbols along with their bot configuration (TP/SL) for each exchange.
     """
     symbols = crud.get_all_symbols(db)
+    stored_levels = crud.get_stored_levels_by_config(db)
     result = []
     for s in symbols:
         # Retrieve bot configurations for each symbol
@@ -293,13 +355,14 @@ def get_symbols(db: Session = Depends(get_db)):
             .filter(models.Symbol.id == s.id).all()
         config_list = []
         for cfg in configs:
+            levels = stored_levels.get(cfg.id)  # None for a grid still on the legacy JSON arrays
             config_list.append({
                 "exchange": cfg.exchange_api_key.exchange,
                 "amount": cfg.amount,
                 "tp_percent": cfg.tp_percent,
                 "sl_percent": cfg.sl_percent,
-                "tp_levels": cfg.tp_levels_json,
-                "sl_levels": cfg.sl_levels_json
+                "tp_levels": json.dumps(levels[0]) if levels else cfg.tp_levels_json,
+                "sl_levels": json.dumps(levels[1]) if levels else cfg.sl_levels_json
             })
         result.append({
             "symbol": s.symbol,
@@ -315,6 +378,8 @@ def get_usdc_usdt_symbols():
     """
     Fetches all tradable USDC and USDT pairs from Binance exchangeInfo API.
     """
+    import requests  # deferred: only this endpoint uses it
+
     binance_url = "https://api.binance.com/api/v3/exchangeInfo"
 
     try:
@@ -364,5 +429,109 @@ def get_portfolio(db: Session = Depends(get_db)):
 
     return {"portfolio": portfolio_list}
 
+# ---------------- # Monitoring # ----------------
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Engine counters and histograms in the Prometheus text format.
+    """
+    if isinstance(grid_bot, EngineClient):
+        content = metrics.merge_expositions([({"process": "api"}, metrics.REGISTRY.render()),
+                                             (None, grid_bot.render_metrics())])
+        return Response(content=content, media_type=metrics.CONTENT_TYPE)
+    if isinstance(grid_bot, ShardedGridBot):
+        return Response(content=grid_bot.render_metrics(), media_type=metrics.CONTENT_TYPE)
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/traces/fills")
+def get_fill_traces(limit: int = 50, order_id: Optional[str] = None,
+                    exchange: Optional[str] = None, symbol: Optional[str] = None):
+    """
+    Latency breakdown of the most recent fills, newest first. `order_id` matches the filled
+    order or any replacement order it placed.
+    """
+    exchange = exchange.lower() if exchange else None
+    if isinstance(grid_bot, EngineClient):
+        traces = grid_bot.recent_fill_traces(limit, order_id, exchange, symbol)
+    else:
+        traces = fill_tracer.recent(limit, order_id, exchange, symbol)
+    return {"enabled": fill_tracer.enabled, "capacity": fill_tracer.capacity, "traces": traces}
+
+# ---------------- # Debug / profiling # ----------------
+
+def require_debug_endpoints():
+    """
+    The /debug endpoints are admin tools (a profile holds a worker for up to two minutes,
+    tracemalloc slows every allocation), so they are off unless DEBUG_ENDPOINTS=1.
+    """
+    if os.getenv("DEBUG_ENDPOINTS", "0") != "1":
+        raise HTTPException(status_code=404, detail="Not Found")
+
+def _debug(command, *args):
+    """
+    Runs a /debug command where the grids run. In this process the result comes back as is;
+    with ENGINE_SOCKET or GRID_WORKERS it is {"processes": {process: result}}, from the engine
+    process or every engine worker.
+    """
+    bot = grid_bot.bot if isinstance(grid_bot, LeaseManager) else grid_bot
+    if isinstance(bot, (EngineClient, ShardedGridBot)):
+        return {"processes": bot.debug(command, *args)}
+    try:
+        return run_debug_command(command, *args)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/debug/profile", dependencies=[Depends(require_debug_endpoints)])
+def profile_threads(seconds: float = 10.0, interval: float = 0.01, idle: bool = False):
+    """
+    Samples every thread's stack for `seconds` and returns collapsed stacks
+    (feed to flamegraph.pl or speedscope). Threads parked in waits are skipped unless idle=true.
+    Engine processes are sampled at the same time; their stacks start with "<process>/".
+    """
+    result = _debug("profile", seconds, interval, idle)
+    if "processes" not in result:
+        samples, stacks = result["samples"], Counter(result["stacks"])
+    else:
+        samples, stacks = merge_profiles(result["processes"])
+        errors = [p["error"] for p in result["processes"].values() if "error" in p]
+        if errors and not stacks:
+            busy = any(error.startswith(ProfilerBusy.__name__) for error in errors)
+            raise HTTPException(status_code=409 if busy else 502, detail="; ".join(errors))
+    return Response(content=sampling_profiler.collapsed(stacks), media_type="text/plain",
+                    headers={"X-Profile-Samples": str(samples)})
+
+@app.get("/debug/tracemalloc", dependencies=[Depends(require_debug_endpoints)])
+def tracemalloc_status():
+    return _debug("tracemalloc_status")
+
+@app.post("/debug/tracemalloc/start", dependencies=[Depends(require_debug_endpoints)])
+def tracemalloc_start(frames: int = 25):
+    return _debug("tracemalloc_start", frames)
+
+@app.post("/debug/tracemalloc/stop", dependencies=[Depends(require_debug_endpoints)])
+def tracemalloc_stop():
+    return _debug("tracemalloc_stop")
+
+@app.post("/debug/tracemalloc/snapshots", dependencies=[Depends(require_debug_endpoints)])
+def tracemalloc_snapshot(key_type: str = "lineno", limit: int = 25):
+    return _debug("tracemalloc_snapshot", key_type, limit)
+
+@app.get("/debug/tracemalloc/snapshots/{snapshot_id}", dependencies=[Depends(require_debug_endpoints)])
+def tracemalloc_top(snapshot_id: int, key_type: str = "lineno", limit: int = 25):
+    return _debug("tracemalloc_top", snapshot_id, key_type, limit)
+
+@app.get("/debug/tracemalloc/diff", dependencies=[Depends(require_debug_endpoints)])
+def tracemalloc_diff(base: int, against: Optional[int] = None, key_type: str = "lineno", limit: int = 25):
+    """
+    Allocation growth from snapshot `base` to `against` (default: a new snapshot taken now).
+    """
+    return _debug("tracemalloc_diff", base, against, key_type, limit)
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Reloading restarts the process and every grid in it, so it is opt-in for development
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=os.getenv("API_RELOAD", "0") == "1")
\ No newline at end of file
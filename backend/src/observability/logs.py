@@ -0,0 +1,110 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+from observability import metrics
+
+TEXT_FORMAT = "%(levelname)s:%(name)s:%(message)s"  # logging.basicConfig's default
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+LOG_RECORDS_DROPPED = metrics.Counter(
+    "gridbot_log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+_listener = None
+_queue = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, thread, message, extras and traceback."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the background writer without formatting them on the caller's thread.
+    The stock QueueHandler renders the message (and traceback) in prepare() so records can be
+    pickled; ours stay in-process, so only arguments that may still change (lists, dicts,
+    sets) are rendered up front. A full queue drops the record instead of blocking.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if args and any(isinstance(a, (list, dict, set)) for a in (args.values() if isinstance(args, dict) else args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def configure_logging(level=None, json_output=None, queue_size=None):
+    """
+    Routes the root logger through a bounded queue to one background writer thread, so slow
+    terminals or disks never stall a socket or timer thread.
+
+    LOG_LEVEL (default INFO), LOG_FORMAT ("text" or "json"), LOG_FILE (default stderr) and
+    LOG_QUEUE_SIZE (default 10000) configure it. Like logging.basicConfig, it does nothing when
+    the root logger already has handlers, so scripts that configure logging first keep theirs.
+    """
+    global _listener, _queue
+    root = logging.getLogger()
+    if root.handlers:
+        return False
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if json_output is None:
+        json_output = os.getenv("LOG_FORMAT", "text").lower() == "json"
+    queue_size = queue_size or int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    log_file = os.getenv("LOG_FILE")
+    writer = logging.FileHandler(log_file) if log_file else logging.StreamHandler(sys.stderr)
+    writer.setFormatter(JSONFormatter() if json_output else logging.Formatter(TEXT_FORMAT))
+
+    _queue = queue.Queue(maxsize=queue_size)
+    root.addHandler(DeferredQueueHandler(_queue))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _listener = logging.handlers.QueueListener(_queue, writer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return True
+
+def stop_logging():
+    """Flushes what is queued and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def queue_depth():
+    return _queue.qsize() if _queue is not None else 0
+
+
+metrics.Gauge("gridbot_log_queue_depth", "Log records waiting for the writer thread.", callback=queue_depth)
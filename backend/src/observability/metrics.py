@@ -0,0 +1,318 @@
+import bisect
+import math
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond handler work up to multi-second REST stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    Holds every metric and renders them in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def merge_expositions(sources) -> str:
+    """
+    Combines text expositions from several processes into one. `sources` is a list of
+    (labels, text); each family's HELP/TYPE is written once and every sample from a source
+    gets that source's labels (e.g. {"shard": "0"}; None or {} adds none).
+    """
+    families = {}
+    for labels, text in sources:
+        extra = ",".join(f'{k}="{_escape(v)}"' for k, v in (labels or {}).items())
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = families.setdefault(line.split(" ", 3)[2], {"HELP": None, "TYPE": None, "samples": []})
+                family[line[2:6]] = family[line[2:6]] or line
+                continue
+            if not line or line.startswith("#") or family is None:
+                continue
+            if extra:
+                brace, space = line.find("{"), line.find(" ")
+                if brace != -1 and brace < space:
+                    separator = "" if line[brace + 1] == "}" else ","
+                    line = f"{line[:brace + 1]}{extra}{separator}{line[brace + 1:]}"
+                else:
+                    line = f"{line[:space]}{{{extra}}}{line[space:]}"
+            family["samples"].append(line)
+
+    lines = []
+    for family in families.values():
+        lines.extend(header for header in (family["HELP"], family["TYPE"]) if header)
+        lines.extend(family["samples"])
+    return "\n".join(lines) + "\n"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        """
+        Child for one label combination. Look it up once and keep it on hot paths:
+        the child's update is a lock and an add, the lookup is an extra dict access.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use .labels()")
+        return self.labels()
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def samples(self):
+        for values, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self._value = float(value)
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. With `callback`, the value is read at scrape time instead:
+    the callback returns a number, or {label values tuple: number} for labelled gauges.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY, callback=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default().dec(amount)
+
+    def samples(self):
+        if self.callback is None:
+            items = [(values, child.value) for values, child in self._items()]
+        else:
+            try:
+                current = self.callback()
+            except Exception:
+                return
+            if isinstance(current, dict):
+                items = [(tuple(k) if isinstance(k, tuple) else (k,), v) for k, v in current.items()]
+            else:
+                items = [((), current)]
+        for values, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+
+class _HistogramChild:
+    __slots__ = ("_upper_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, upper_bounds):
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * (len(upper_bounds) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Timer:
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY, buckets=DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        bounds = self.upper_bounds + (math.inf,)
+        for values, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, values)} {cumulative}"
+
+
+def _thread_counts():
+    counts = {"timer": 0, "other": 0}
+    for thread in threading.enumerate():
+        counts["timer" if isinstance(thread, threading.Timer) else "other"] += 1
+    return {(kind,): n for kind, n in counts.items()}
+
+
+# --- engine metrics ------------------------------------------------------------
+WS_MESSAGES_RECEIVED = Counter(
+    "gridbot_ws_messages_received_total", "WebSocket frames received from the exchange.", ["exchange"])
+WS_MESSAGES_DROPPED = Counter(
+    "gridbot_ws_messages_dropped_total", "WebSocket frames that could not be decoded or handled.", ["exchange", "reason"])
+WS_RECONNECTS = Counter(
+    "gridbot_ws_reconnects_total", "WebSocket reconnects scheduled after a lost connection.", ["exchange"])
+FILLS = Counter(
+    "gridbot_fills_total", "Fills handed to the TP/SL logic.", ["exchange"])
+FILL_TO_REPLACEMENT_SECONDS = Histogram(
+    "gridbot_fill_to_replacement_seconds", "Time from a fill reaching the TP/SL logic until its replacement order is acknowledged.",
+    ["exchange", "side"])
+REST_SECONDS = Histogram(
+    "gridbot_rest_request_seconds", "Exchange REST call latency by ccxt method.", ["exchange", "method"])
+REST_ERRORS = Counter(
+    "gridbot_rest_errors_total", "Exchange REST calls that raised, by ccxt method and error class.", ["exchange", "method", "error"])
+DB_COMMIT_SECONDS = Histogram(
+    "gridbot_db_commit_seconds", "Session commit latency, flush included.")
+DB_ROLLBACKS = Counter(
+    "gridbot_db_rollbacks_total", "Session rollbacks.")
+THREADS = Gauge(
+    "gridbot_threads", "Live threads; 'timer' are pending delayed placements and reconnects.", ["kind"],
+    callback=_thread_counts)
@@ -0,0 +1,246 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+
+MAX_PROFILE_SECONDS = 120.0
+MAX_SNAPSHOTS = 10
+
+# Innermost frames of threads that are parked waiting (sockets, timers, queues, locks).
+# They dominate every sample of an I/O-bound bot, so they are left out unless asked for.
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker"),
+    ("socket.py", "readinto"), ("socket.py", "accept"), ("_socket.py", "_recv"),
+}
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Wall-clock sampler for every Python thread: reads sys._current_frames() at a fixed
+    interval from its own thread, so nothing is instrumented and the engine threads pay
+    only for the GIL hand-off. Output is the collapsed-stack format flamegraph.pl and
+    speedscope read: "thread;outer;...;inner count" per line.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds, interval=0.01, include_idle=False):
+        seconds = min(max(float(seconds), 0.1), MAX_PROFILE_SECONDS)
+        interval = max(float(interval), 0.001)
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            return self._sample(seconds, interval, include_idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds, interval, include_idle):
+        me = threading.get_ident()
+        stacks = Counter()
+        labels = {}  # code object -> label, so each function is formatted once
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        next_tick = time.perf_counter()
+        while True:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                code = frame.f_code
+                if not include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    parts.append(label)
+                    frame = frame.f_back
+                parts.append(names.get(thread_id, f"thread-{thread_id}").replace(";", ":"))
+                stacks[";".join(reversed(parts))] += 1
+            samples += 1
+            next_tick += interval
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if next_tick > now:
+                time.sleep(next_tick - now)
+            else:
+                next_tick = now  # fell behind; do not burst to catch up
+        return samples, stacks
+
+    @staticmethod
+    def collapsed(stacks):
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class MemoryTracker:
+    """
+    tracemalloc snapshots kept by id, for top-allocation listings and growth diffs
+    (e.g. sets or caches that never shrink in a long-running socket handler).
+    """
+
+    def __init__(self, max_snapshots=MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._snapshots = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=25):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.status()
+
+    def stop(self):
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+        return self.status()
+
+    def status(self):
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        with self._lock:
+            snapshots = list(self._snapshots)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "overhead_kb": round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+            "snapshots": snapshots,
+        }
+
+    def _take(self):
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running; start it first")
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def snapshot(self):
+        """Takes and stores a snapshot; returns its id."""
+        snapshot = self._take()
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def _get(self, snapshot_id):
+        with self._lock:
+            snapshot = self._snapshots.get(snapshot_id)
+        if snapshot is None:
+            raise KeyError(f"No snapshot {snapshot_id}")
+        return snapshot
+
+    @staticmethod
+    def _location(stat):
+        frame = stat.traceback[0]
+        return {
+            "file": frame.filename,
+            "line": frame.lineno,
+            "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback] if len(stat.traceback) > 1 else None,
+        }
+
+    def top(self, snapshot_id, key_type="lineno", limit=25):
+        stats = self._get(snapshot_id).statistics(key_type)
+        return [
+            dict(self._location(stat), size_kb=round(stat.size / 1024, 1), count=stat.count)
+            for stat in stats[:limit]
+        ]
+
+    def diff(self, old_id, new_id=None, key_type="lineno", limit=25):
+        """
+        Largest growth between two snapshots; without `new_id` a fresh snapshot is taken and stored.
+        """
+        old = self._get(old_id)
+        if new_id is None:
+            new_id = self.snapshot()
+        stats = self._get(new_id).compare_to(old, key_type)
+        return new_id, [
+            dict(self._location(stat), size_diff_kb=round(stat.size_diff / 1024, 1), count_diff=stat.count_diff,
+                 size_kb=round(stat.size / 1024, 1), count=stat.count)
+            for stat in stats[:limit]
+        ]
+
+
+# Process-wide instances behind the /debug endpoints
+sampling_profiler = SamplingProfiler()
+memory_tracker = MemoryTracker()
+
+
+# ---------------- /debug commands ----------------
+# The grids may run in other processes (the engine process, engine workers), so the /debug
+# endpoints run these by name wherever the grids are and merge the answers.
+
+def _profile(seconds, interval=0.01, include_idle=False):
+    samples, stacks = sampling_profiler.profile(seconds, interval, include_idle)
+    return {"samples": samples, "stacks": dict(stacks)}
+
+def _snapshot(key_type="lineno", limit=25):
+    snapshot_id = memory_tracker.snapshot()
+    return {"snapshot_id": snapshot_id, "top": memory_tracker.top(snapshot_id, key_type, limit)}
+
+def _top(snapshot_id, key_type="lineno", limit=25):
+    return {"snapshot_id": snapshot_id, "top": memory_tracker.top(snapshot_id, key_type, limit)}
+
+def _diff(base, against=None, key_type="lineno", limit=25):
+    snapshot_id, growth = memory_tracker.diff(base, against, key_type, limit)
+    return {"base": base, "against": snapshot_id, "growth": growth}
+
+DEBUG_COMMANDS = {
+    "profile": _profile,
+    "tracemalloc_status": memory_tracker.status,
+    "tracemalloc_start": memory_tracker.start,
+    "tracemalloc_stop": memory_tracker.stop,
+    "tracemalloc_snapshot": _snapshot,
+    "tracemalloc_top": _top,
+    "tracemalloc_diff": _diff,
+}
+
+
+def run_debug_command(command, *args):
+    """Runs a /debug command in this process; raises as the underlying profiler or tracker does."""
+    return DEBUG_COMMANDS[command](*args)
+
+def debug_result(command, *args):
+    """run_debug_command for another process: failures come back as {"error": "<type>: <message>"}."""
+    try:
+        return run_debug_command(command, *args)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+def merge_profiles(profiles):
+    """
+    Combines {process: profile result} into (samples, stacks), rooting each stack at
+    "<process>/<thread>". Processes that answered with an error are left out.
+    """
+    samples, stacks = 0, Counter()
+    for process, profile in profiles.items():
+        if "error" in profile:
+            continue
+        samples = max(samples, profile["samples"])
+        for stack, count in profile["stacks"].items():
+            stacks[f"{process}/{stack}"] += count
+    return samples, stacks
@@ -0,0 +1,377 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# How many finished fill traces stay queryable in memory (0 turns tracing off)
+TRACE_CAPACITY = int(os.getenv("FILL_TRACE_CAPACITY", "1000"))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "gridbot")
+
+
+def _to_ns(timestamp_ms):
+    """Exchange timestamp in milliseconds (int, float or numeric string) -> ns, or None."""
+    try:
+        value = float(timestamp_ms)
+    except (TypeError, ValueError):
+        return None
+    # Via whole microseconds: exact in a float for epoch times, unlike ns
+    return int(round(value * 1000)) * 1000 if value > 0 else None
+
+def _new_id(size):
+    return os.urandom(size).hex()
+
+
+class Span:
+    __slots__ = ("span_id", "name", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name, start_ns, end_ns, attributes):
+        self.span_id = _new_id(8)
+        self.name = name
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.attributes = attributes
+
+
+class FillTrace:
+    """
+    One fill's way through the pipeline: exchange event -> receive -> decode -> state update
+    (level bookkeeping, DB commits, cancels) -> timer wait -> REST submit -> ack, for every
+    replacement order the fill schedules. Finishes once the last scheduled placement returns.
+    """
+
+    def __init__(self, tracer, exchange, symbol, order_id=None, exchange_ts_ms=None, received_ns=None):
+        self.tracer = tracer
+        self.trace_id = _new_id(16)
+        self.root_span_id = _new_id(8)
+        self.exchange = exchange
+        self.symbol = symbol
+        self.order_id = str(order_id) if order_id is not None else None
+        self.exchange_ns = _to_ns(exchange_ts_ms)
+        self.received_ns = received_ns or time.time_ns()
+        self.finished_ns = None
+        self.error = None
+        self.placed_by = tracer.trace_for_order(self.order_id)
+        self.replacement_order_ids = []
+        self.spans = []
+        self.scheduled_ns = None
+        self._pending = 1  # the synchronous part, released by settle()
+        self._lock = threading.Lock()
+        if self.exchange_ns is not None and self.exchange_ns <= self.received_ns:
+            self.spans.append(Span("receive", self.exchange_ns, self.received_ns, {}))
+
+    def add_span(self, name, start_ns, end_ns, **attributes):
+        with self._lock:
+            self.spans.append(Span(name, start_ns, end_ns, attributes))
+
+    @contextmanager
+    def span(self, name, **attributes):
+        started = time.time_ns()
+        try:
+            yield attributes
+        except Exception as e:
+            attributes["error"] = repr(e)
+            raise
+        finally:
+            self.add_span(name, started, time.time_ns(), **attributes)
+
+    def add_ack(self, method, started_ns, response):
+        """REST submit span for an order placement; the response's order id correlates later fills."""
+        order_id = response.get("id") if isinstance(response, dict) else None
+        self.add_span("rest_submit", started_ns, time.time_ns(), method=method,
+                      **({"ack.order_id": str(order_id)} if order_id is not None else {}))
+        if order_id is not None:
+            with self._lock:
+                self.replacement_order_ids.append(str(order_id))
+            self.tracer.remember_order(str(order_id), self.trace_id)
+
+    def expect_placement(self):
+        """Called when a delayed placement is scheduled; the trace stays open until it reports back."""
+        with self._lock:
+            self._pending += 1
+            self.scheduled_ns = time.time_ns()
+
+    def placement_done(self):
+        with self._lock:
+            self._pending -= 1
+            pending = self._pending
+        if pending <= 0:
+            self.finish()
+
+    def settle(self, error=None):
+        """End of the synchronous part; finishes now unless placements are still scheduled."""
+        if error is not None:
+            self.error = repr(error)
+        self.placement_done()
+
+    def finish(self):
+        with self._lock:
+            if self.finished_ns is not None:
+                return
+            self.finished_ns = time.time_ns()
+        self.tracer._finished(self)
+
+    @property
+    def start_ns(self):
+        return self.exchange_ns if self.exchange_ns is not None and self.exchange_ns <= self.received_ns else self.received_ns
+
+    def as_dict(self):
+        start = self.start_ns
+        end = self.finished_ns or time.time_ns()
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        return {
+            "trace_id": self.trace_id,
+            "exchange": self.exchange,
+            "symbol": self.symbol,
+            "order_id": self.order_id,
+            "placed_by_trace": self.placed_by,
+            "replacement_order_ids": list(self.replacement_order_ids),
+            "exchange_time_ns": self.exchange_ns,
+            "received_ns": self.received_ns,
+            "finished": self.finished_ns is not None,
+            "total_ms": round((end - start) / 1e6, 3),
+            "received_to_done_ms": round((end - self.received_ns) / 1e6, 3),
+            "error": self.error,
+            "spans": [
+                {
+                    "name": s.name,
+                    "offset_ms": round((s.start_ns - start) / 1e6, 3),
+                    "duration_ms": round((s.end_ns - s.start_ns) / 1e6, 3),
+                    "attributes": s.attributes,
+                }
+                for s in spans
+            ],
+        }
+
+
+class _NoopTrace:
+    """Stand-in used when tracing is off, so callers never need to check."""
+    trace_id = None
+    received_ns = None
+    scheduled_ns = None
+    error = None
+
+    def add_span(self, *args, **kwargs):
+        pass
+
+    @contextmanager
+    def span(self, name, **attributes):
+        yield attributes
+
+    def add_ack(self, *args):
+        pass
+
+    def expect_placement(self):
+        pass
+
+    def placement_done(self):
+        pass
+
+    def settle(self, error=None):
+        pass
+
+    def finish(self):
+        pass
+
+
+NOOP_TRACE = _NoopTrace()
+
+
+class FillTracer:
+    """
+    Keeps the last `capacity` finished fill traces in memory and hands them to an exporter.
+    The trace of the fill being processed is bound to the current thread with activate(), so
+    REST wrappers and DB hooks can attach spans without having it passed in.
+    """
+
+    def __init__(self, capacity=TRACE_CAPACITY, exporter=None):
+        self.capacity = capacity
+        self.exporter = exporter
+        self._traces = deque(maxlen=max(capacity, 1))
+        self._order_traces = OrderedDict()  # replacement order id -> trace that placed it
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def start(self, exchange, symbol, order_id=None, exchange_ts_ms=None, received_ns=None):
+        if not self.enabled:
+            return NOOP_TRACE
+        return FillTrace(self, exchange, symbol, order_id, exchange_ts_ms, received_ns)
+
+    @contextmanager
+    def activate(self, trace):
+        previous = getattr(self._local, "trace", None)
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            self._local.trace = previous
+
+    def current(self):
+        return getattr(self._local, "trace", None)
+
+    def remember_order(self, order_id, trace_id):
+        with self._lock:
+            self._order_traces[order_id] = trace_id
+            while len(self._order_traces) > self.capacity * 4:
+                self._order_traces.popitem(last=False)
+
+    def trace_for_order(self, order_id):
+        if order_id is None:
+            return None
+        with self._lock:
+            return self._order_traces.get(order_id)
+
+    def _finished(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+        if self.exporter is not None:
+            self.exporter.submit(trace)
+
+    def recent(self, limit=50, order_id=None, exchange=None, symbol=None):
+        """
+        Newest first. `order_id` matches the filled order or any replacement it placed.
+        """
+        with self._lock:
+            traces = list(self._traces)
+        result = []
+        for trace in reversed(traces):
+            if exchange and trace.exchange != exchange:
+                continue
+            if symbol and trace.symbol != symbol:
+                continue
+            if order_id and trace.order_id != order_id and order_id not in trace.replacement_order_ids:
+                continue
+            result.append(trace.as_dict())
+            if len(result) >= limit:
+                break
+        return result
+
+
+# --- OTLP export -----------------------------------------------------------------
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes):
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+def otlp_spans(trace):
+    """A finished trace as OTLP/JSON spans: a root 'fill' span with one child per stage."""
+    root_attributes = {
+        "exchange": trace.exchange, "symbol": trace.symbol, "order.id": trace.order_id,
+        "placed_by_trace": trace.placed_by, "error": trace.error,
+        "replacement.order_ids": ",".join(trace.replacement_order_ids) or None,
+    }
+    spans = [{
+        "traceId": trace.trace_id,
+        "spanId": trace.root_span_id,
+        "name": "fill",
+        "kind": 1,
+        "startTimeUnixNano": str(trace.start_ns),
+        "endTimeUnixNano": str(trace.finished_ns),
+        "attributes": _otlp_attributes(root_attributes),
+        "status": {"code": 2, "message": trace.error} if trace.error else {},
+    }]
+    for span in trace.spans:
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": trace.root_span_id,
+            "name": span.name,
+            "kind": 3 if span.name == "rest_submit" else 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _otlp_attributes(span.attributes),
+        })
+    return spans
+
+
+class OTLPExporter:
+    """
+    Batches finished traces and POSTs them as OTLP/HTTP JSON from a background thread,
+    so exporting never runs on a socket or timer thread. Drops traces when the queue is full.
+    """
+
+    def __init__(self, endpoint, headers=None, batch_size=256, interval=2.0, max_queue=10000, timeout=5.0):
+        self.endpoint = endpoint
+        self.headers = dict(headers or {}, **{"Content-Type": "application/json"})
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self.dropped = 0
+        self.exported = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        threading.Thread(target=self._run, daemon=True, name="otlp-exporter").start()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Exporter for OTEL_EXPORTER_OTLP_TRACES_ENDPOINT (full URL) or OTEL_EXPORTER_OTLP_ENDPOINT
+        (base URL, /v1/traces appended), or None when neither is set.
+        """
+        endpoint = os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT")
+        if not endpoint and os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT").rstrip("/") + "/v1/traces"
+        if not endpoint:
+            return None
+        headers = {}
+        for pair in os.getenv("OTEL_EXPORTER_OTLP_HEADERS", "").split(","):
+            if "=" in pair:
+                key, value = pair.split("=", 1)
+                headers[key.strip()] = value.strip()
+        logger.info(f"Exporting fill traces to {endpoint}")
+        return cls(endpoint, headers)
+
+    def submit(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        import requests
+
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            payload = {"resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{
+                    "scope": {"name": "gridbot.fills"},
+                    "spans": [span for trace in batch for span in otlp_spans(trace)],
+                }],
+            }]}
+            try:
+                response = requests.post(self.endpoint, json=payload, headers=self.headers, timeout=self.timeout)
+                response.raise_for_status()
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"OTLP export of {len(batch)} fill traces failed: {e}")
+
+
+# Process-wide tracer used by the fill pipeline
+fill_tracer = FillTracer(TRACE_CAPACITY, OTLPExporter.from_env() if TRACE_CAPACITY > 0 else None)
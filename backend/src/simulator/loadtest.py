@@ -0,0 +1,259 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXCHANGES = ("binance", "bybit")
+
+
+def latency_summary(values, points=(50, 90, 99)):
+    """Latency summary in milliseconds."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 2) for p in points}
+    summary["max"] = round(ordered[-1] * 1000, 2)
+    summary["count"] = len(ordered)
+    return summary
+
+def _seed_database(models, SessionLocal, exchanges, symbols, grids, accounts, amount, tp_percent, sl_percent):
+    """
+    Stores one API key per exchange and a bot config per grid. Returns the (exchange, symbol) pairs.
+    """
+    db_session = SessionLocal()
+    try:
+        keys = {}
+        for exchange in exchanges:
+            api_key, secret = accounts[exchange]
+            keys[exchange] = models.ExchangeAPIKey(exchange=exchange, api_key=api_key, api_secret=secret, balance=amount)
+            db_session.add(keys[exchange])
+        symbol_rows = [models.Symbol(symbol=symbol) for symbol in symbols]
+        db_session.add_all(symbol_rows)
+        db_session.flush()
+
+        pairs = []
+        for i in range(grids):
+            exchange = exchanges[i % len(exchanges)]
+            symbol_row = symbol_rows[i // len(exchanges)]
+            db_session.add(models.ExchangeBotConfig(
+                exchange_id=keys[exchange].id, symbol_id=symbol_row.id, amount=amount,
+                tp_percent=tp_percent, sl_percent=sl_percent,
+            ))
+            pairs.append((exchange, symbol_row.symbol))
+        db_session.commit()
+        return pairs
+    finally:
+        db_session.close()
+
+def _wait_for(condition, timeout, interval=0.1):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
+
+
+def targeted_driver(venues, pairs, fill_rate, duration, tp_ratio=0.5, seed=None):
+    """
+    Produces about `fill_rate` fills per second: each step picks a random grid and moves its
+    price onto the nearest resting sell (TP, with probability `tp_ratio`) or buy (SL) level.
+    """
+    rng = random.Random(seed)
+    interval = 1.0 / fill_rate
+    deadline = time.monotonic() + duration
+    next_step = time.monotonic()
+    fills = 0
+    while time.monotonic() < deadline:
+        exchange, symbol = rng.choice(pairs)
+        venue = venues[exchange]
+        best_buy, best_sell = venue.nearest_levels(symbol)
+        target = best_sell if best_sell is not None and (best_buy is None or rng.random() < tp_ratio) else best_buy
+        if target is not None:
+            fills += venue.set_price(symbol, target)
+
+        next_step += interval
+        delay = next_step - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    return fills
+
+def replay_driver(venues, pairs, closes, speed, duration):
+    """
+    Replays a close-price series on every market, scaled to each market's start price
+    and offset per market so grids do not all move in lockstep. `speed` is steps per second.
+    """
+    rng = random.Random(0)
+    markets = {}
+    for exchange, symbol in pairs:
+        markets.setdefault((exchange, symbol), (venues[exchange].prices[symbol] / closes[0], rng.randrange(len(closes))))
+
+    interval = 1.0 / speed
+    deadline = time.monotonic() + duration
+    next_step = time.monotonic()
+    step = fills = 0
+    while time.monotonic() < deadline:
+        for (exchange, symbol), (scale, offset) in markets.items():
+            fills += venues[exchange].set_price(symbol, closes[(step + offset) % len(closes)] * scale)
+        step += 1
+        next_step += interval
+        delay = next_step - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    return fills
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Runs the grid bot end to end against the local exchange simulator and reports throughput and latency."
+    )
+    parser.add_argument("--grids", type=int, default=1000)
+    parser.add_argument("--exchanges", default="binance,bybit", help=f"comma separated, from {SUPPORTED_EXCHANGES}")
+    parser.add_argument("--fill-rate", type=float, default=20.0, help="targeted fills per second")
+    parser.add_argument("--tp-ratio", type=float, default=0.5, help="share of targeted fills that hit a TP")
+    parser.add_argument("--path", help="replay this OHLCV CSV's close prices instead of targeted fills")
+    parser.add_argument("--speed", type=float, default=1.0, help="replayed price steps per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of price action")
+    parser.add_argument("--drain", type=float, default=10.0, help="seconds to wait for follow-up orders afterwards")
+    parser.add_argument("--amount", type=float, default=20.0, help="quote amount per order")
+    parser.add_argument("--tp", type=float, default=1.0, help="tp_percent of every grid")
+    parser.add_argument("--sl", type=float, default=1.0, help="sl_percent of every grid")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="seconds added to every simulated REST call")
+    parser.add_argument("--start-concurrency", type=int, default=32, help="grids started at once per exchange")
+    parser.add_argument("--arm-timeout", type=float, default=600.0)
+    parser.add_argument("--db-url", help="scratch database URL (default: a temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    exchanges = [e.strip().lower() for e in args.exchanges.split(",") if e.strip()]
+    unsupported = [e for e in exchanges if e not in SUPPORTED_EXCHANGES]
+    if unsupported:
+        parser.error(f"no simulated stream for {unsupported}")
+
+    # Database settings are read at import time, so they must be set before the bot is imported
+    if not args.db_url:
+        scratch_dir = tempfile.mkdtemp(prefix="gridbot-loadtest-")
+        args.db_url = f"sqlite:///{os.path.join(scratch_dir, 'loadtest.db')}"
+    os.environ["DATABASE_URL"] = args.db_url
+    os.environ.setdefault("DB_POOL_SIZE", str(args.start_concurrency * len(exchanges) + 20))
+    os.environ.setdefault("DB_MAX_OVERFLOW", "100")
+    logging.basicConfig(level=args.log_level.upper())
+
+    from database import models
+    from database.database import SessionLocal, engine
+    from exchanges.ccxt_integration import set_client_factory
+    from grid_logic.grid_strategy import GridBot
+    from grid_logic.orchestrator import BulkOrchestrator
+    from simulator.server import SimulatorServer
+    from simulator.venue import SimulatedExchange, SimulatedVenue
+    import websocket_manager.market_data as market_data
+    import websocket_manager.websocket_manager as websocket_manager
+
+    rng = random.Random(args.seed)
+    models.Base.metadata.create_all(bind=engine)
+
+    symbols = [f"SIM{i:04d}/USDT" for i in range((args.grids + len(exchanges) - 1) // len(exchanges))]
+    venues = {}
+    accounts = {}
+    for exchange in exchanges:
+        venue = SimulatedVenue(exchange, rest_latency=args.rest_latency)
+        for symbol in symbols:
+            venue.add_market(symbol, round(rng.uniform(0.5, 200.0), 4))
+        accounts[exchange] = (f"sim-{exchange}-{uuid.uuid4().hex[:8]}", uuid.uuid4().hex)
+        venue.add_account(*accounts[exchange])
+        venues[exchange] = venue
+
+    pairs = _seed_database(models, SessionLocal, exchanges, symbols, args.grids, accounts,
+                           args.amount, args.tp, args.sl)
+
+    server = SimulatorServer(venues).start()
+    websocket_manager.BINANCE_API_URL = server.http_url
+    websocket_manager.BINANCE_WS_URL = server.binance_ws_url
+    websocket_manager.BYBIT_WS_URL = server.bybit_ws_url
+    market_data.BINANCE_PUBLIC_WS_URL = server.binance_public_ws_url
+    market_data.BYBIT_PUBLIC_WS_URL = server.bybit_public_ws_url
+    set_client_factory(lambda key: SimulatedExchange(venues[key.exchange], key.api_key, key.api_secret))
+
+    bot = GridBot()
+    orchestrator = BulkOrchestrator(bot, concurrency={e: args.start_concurrency for e in exchanges})
+
+    # --- arm every grid ------------------------------------------------------
+    started = time.perf_counter()
+    job = orchestrator.submit("start", pairs)
+    _wait_for(lambda: orchestrator.get_job(job["job_id"])["status"] == "done", args.arm_timeout, 0.5)
+    started_ok = orchestrator.get_job(job["job_id"])["counts"].get("started", 0)
+    _wait_for(lambda: server.subscribed_streams() >= started_ok, 60)
+    time_to_armed = time.perf_counter() - started
+    print(f"Armed {started_ok}/{len(pairs)} grids in {time_to_armed:.1f}s", file=sys.stderr)
+
+    startup_calls = {exchange: dict(venue.rest_calls) for exchange, venue in venues.items()}
+    for venue in venues.values():
+        venue.rest_calls.clear()
+        venue.counters.clear()
+        venue.replacement_latencies.clear()
+    frames_before = server.counters["frames_sent"]
+
+    # --- price action --------------------------------------------------------
+    armed_pairs = [p for p in pairs if bot.websocket_connections.get(p) is not None]
+    driven = time.perf_counter()
+    if not armed_pairs:
+        fills = 0
+    elif args.path:
+        from backtesting.grid_backtest import load_ohlcv_csv
+        closes = load_ohlcv_csv(args.path)[4]
+        fills = replay_driver(venues, armed_pairs, closes, args.speed, args.duration)
+    else:
+        fills = targeted_driver(venues, armed_pairs, args.fill_rate, args.duration, args.tp_ratio, args.seed)
+    drive_seconds = time.perf_counter() - driven
+
+    _wait_for(lambda: not any(v.unanswered_fills() for v in venues.values()), args.drain, 0.2)
+    total_seconds = time.perf_counter() - driven
+
+    latencies = [l for venue in venues.values() for l in venue.replacement_latencies]
+    rest_calls = {exchange: dict(venue.rest_calls) for exchange, venue in venues.items()}
+    report = {
+        "grids": len(pairs),
+        "armed": len(armed_pairs),
+        "exchanges": exchanges,
+        "time_to_armed": round(time_to_armed, 3),
+        "startup_rest_calls": startup_calls,
+        "mode": "replay" if args.path else "targeted",
+        "drive_seconds": round(drive_seconds, 3),
+        "fills": fills,
+        "fills_per_second": round(fills / drive_seconds, 2) if drive_seconds else 0.0,
+        "answered_fills": len(latencies),
+        "unanswered_fills": sum(v.unanswered_fills() for v in venues.values()),
+        "answered_per_second": round(len(latencies) / total_seconds, 2) if total_seconds else 0.0,
+        "fill_to_replacement_ms": latency_summary(latencies),
+        "orders_created": sum(v.counters["orders_created"] for v in venues.values()),
+        "orders_canceled": sum(v.counters["orders_canceled"] for v in venues.values()),
+        "rest_calls": rest_calls,
+        "rest_calls_per_second": round(sum(sum(c.values()) for c in rest_calls.values()) / total_seconds, 2),
+        "ws_frames_sent": server.counters["frames_sent"] - frames_before,
+        "ws_public_frames_sent": server.counters["public_frames_sent"],
+        "ws_connections": server.counters["ws_connections"],
+        "database": args.db_url,
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    # Stop the grids before the venue goes away so no reconnect timers are left behind
+    bot.stop()
+    set_client_factory(None)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_OP_TEXT, _OP_BINARY, _OP_CLOSE, _OP_PING, _OP_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+
+_BINANCE_STATUS = {"new": ("NEW", "NEW"), "fill": ("TRADE", "FILLED"), "cancel": ("CANCELED", "CANCELED")}
+_BYBIT_STATUS = {"new": "New", "fill": "Filled", "cancel": "Cancelled"}
+
+
+def _num(value):
+    return f"{value or 0:.8f}"
+
+def binance_execution_report(market, event, order, trade):
+    """Binance spot user-data `executionReport` for a simulated order event."""
+    exec_type, status = _BINANCE_STATUS[event]
+    now = int(time.time() * 1000)
+    fee = (trade or {}).get("fee") or {}
+    return {
+        "e": "executionReport",
+        "E": now,
+        "s": market["id"],
+        "c": order["clientOrderId"],
+        "S": order["side"].upper(),
+        "o": order["type"].upper(),
+        "f": "GTC",
+        "q": _num(order["amount"]),
+        "p": _num(order["price"] if order["type"] == "limit" else 0),
+        "x": exec_type,
+        "X": status,
+        "r": "NONE",
+        "i": int(order["id"]),
+        "l": _num(trade and trade["amount"]),
+        "z": _num(order["filled"]),
+        "L": _num(trade and trade["price"]),
+        "n": _num(fee.get("cost")),
+        "N": fee.get("currency"),
+        "T": now,
+        "t": int(trade["id"]) if trade else -1,
+        "w": order["status"] == "open",
+        "m": bool(trade) and order["type"] == "limit",
+        "O": order["timestamp"],
+        "Z": _num(order["cost"]),
+        "Y": _num(trade and trade["cost"]),
+    }
+
+def bybit_order_message(market, event, order, trade):
+    """Bybit v5 private `order` topic message for a simulated order event."""
+    status = _BYBIT_STATUS[event]
+    now = int(time.time() * 1000)
+    fee = order.get("fee") or {}
+    return {
+        "id": uuid.uuid4().hex,
+        "topic": "order",
+        "creationTime": now,
+        "data": [{
+            "category": "spot",
+            "symbol": market["id"],
+            "orderId": order["id"],
+            "orderLinkId": order["clientOrderId"],
+            "side": order["side"].capitalize(),
+            "orderType": order["type"].capitalize(),
+            "price": str(order["price"]) if order["type"] == "limit" else "0",
+            "qty": str(order["amount"]),
+            "timeInForce": "GTC",
+            "orderStatus": status,
+            "avgPrice": str(order["average"]) if order["average"] else "",
+            "leavesQty": str(order["remaining"]),
+            "cumExecQty": str(order["filled"]),
+            "cumExecValue": str(order["cost"]),
+            "cumExecFee": str(fee.get("cost", 0)),
+            "feeCurrency": fee.get("currency", market["quote"]),
+            "createdTime": str(order["timestamp"]),
+            "updatedTime": str(now),
+        }],
+    }
+
+_FORMATTERS = {"binance": binance_execution_report, "bybit": bybit_order_message}
+
+
+def binance_book_ticker(market, price):
+    """Binance `bookTicker` stream message, one tick either side of the simulated price."""
+    tick = market["precision"]["price"]
+    return {"u": int(time.time() * 1000), "s": market["id"], "b": _num(price - tick), "B": "1.00000000",
+            "a": _num(price + tick), "A": "1.00000000"}
+
+def bybit_ticker(market, price):
+    """Bybit v5 public spot `tickers` topic message for the simulated price."""
+    now = int(time.time() * 1000)
+    return {"topic": f"tickers.{market['id']}", "ts": now, "type": "snapshot", "cs": now,
+            "data": {"symbol": market["id"], "lastPrice": str(price)}}
+
+# exchange -> (public stream path, quote formatter)
+_PUBLIC = {"binance": ("/ws", binance_book_ticker), "bybit": ("/v5/public/spot", bybit_ticker)}
+
+
+def _frame(payload: bytes, opcode=_OP_TEXT) -> bytes:
+    header = bytearray([0x80 | opcode])
+    n = len(payload)
+    if n < 126:
+        header.append(n)
+    elif n < 1 << 16:
+        header.append(126)
+        header += n.to_bytes(2, "big")
+    else:
+        header.append(127)
+        header += n.to_bytes(8, "big")
+    return bytes(header) + payload
+
+async def _read_frame(reader):
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    n = second & 0x7F
+    if n == 126:
+        n = int.from_bytes(await reader.readexactly(2), "big")
+    elif n == 127:
+        n = int.from_bytes(await reader.readexactly(8), "big")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(n)
+    if mask and n:
+        key = (mask * (n // 4 + 1))[:n]
+        payload = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(n, "big")
+    return opcode, payload
+
+
+class SimulatorServer:
+    """
+    Localhost HTTP + WebSocket endpoint for simulated venues ({exchange_id: SimulatedVenue}):
+
+    - POST/PUT/DELETE /api/v3/userDataStream   Binance listenKey management
+    - /ws/<listenKey>                          Binance user-data stream (executionReport)
+    - /v5/private                              Bybit private stream (auth, subscribe "order", ping)
+    - /ws                                      Binance public stream (SUBSCRIBE "<id>@bookTicker")
+    - /v5/public/spot                          Bybit public stream (subscribe "tickers.<id>", ping)
+
+    Runs its own asyncio loop in a background thread. Every event is serialized and framed
+    once per account and then written to all of that account's subscribed sockets; every
+    price move likewise once per market. A public subscription is answered with the current
+    quote right away.
+    """
+
+    def __init__(self, venues, host="127.0.0.1", port=0):
+        self.venues = venues
+        self.host = host
+        self.port = port
+        self.counters = Counter()
+        self._listen_keys = {}       # listenKey -> api_key
+        self._account_keys = {}      # api_key -> listenKey
+        self._streams = {}           # (exchange_id, api_key) -> set of StreamWriters
+        self._quotes = {}            # (exchange_id, market id) -> set of StreamWriters
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+        for venue in venues.values():
+            venue.listeners.append(self._on_venue_event)
+            venue.price_listeners.append(self._on_price)
+
+    # --- lifecycle -----------------------------------------------------------
+
+    @property
+    def http_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def binance_ws_url(self):
+        return f"ws://{self.host}:{self.port}/ws"
+
+    @property
+    def bybit_ws_url(self):
+        return f"ws://{self.host}:{self.port}/v5/private"
+
+    @property
+    def binance_public_ws_url(self):
+        return f"ws://{self.host}:{self.port}/ws"
+
+    @property
+    def bybit_public_ws_url(self):
+        return f"ws://{self.host}:{self.port}/v5/public/spot"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="simulator-server")
+        self._thread.start()
+        if not self._ready.wait(10):
+            raise RuntimeError("Simulator server did not start")
+        logger.info(f"Simulator listening on {self.http_url}")
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        for venue in self.venues.values():
+            if self._on_venue_event in venue.listeners:
+                venue.listeners.remove(self._on_venue_event)
+            if self._on_price in venue.price_listeners:
+                venue.price_listeners.remove(self._on_price)
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def subscribed_streams(self):
+        return sum(len(writers) for writers in self._streams.values())
+
+    # --- venue events --------------------------------------------------------
+
+    def _on_venue_event(self, venue, api_key, event, order, trade):
+        formatter = _FORMATTERS.get(venue.id)
+        if formatter is None or not self._streams.get((venue.id, api_key)):
+            return
+        message = formatter(venue.markets[order["symbol"]], event, order, trade)
+        frame = _frame(json.dumps(message, separators=(",", ":")).encode())
+        self._loop.call_soon_threadsafe(self._broadcast, (venue.id, api_key), frame)
+
+    def _on_price(self, venue, symbol, price):
+        market = venue.markets[symbol]
+        if venue.id not in _PUBLIC or not self._quotes.get((venue.id, market["id"])):
+            return
+        frame = _frame(json.dumps(_PUBLIC[venue.id][1](market, price), separators=(",", ":")).encode())
+        self._loop.call_soon_threadsafe(self._broadcast, (venue.id, market["id"]), frame, self._quotes, "public_")
+
+    def _broadcast(self, stream, frame, streams=None, counter=""):
+        writers = (self._streams if streams is None else streams).get(stream, ())
+        for writer in list(writers):
+            if writer.is_closing():
+                writers.discard(writer)
+                continue
+            writer.write(frame)
+        self.counters[counter + "frames_sent"] += len(writers)
+        self.counters[counter + "bytes_sent"] += len(frame) * len(writers)
+
+    # --- connection handling -------------------------------------------------
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            method, target, _ = request_line.split(" ", 2)
+            path, _, query = target.partition("?")
+            if headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(path, headers, reader, writer)
+            else:
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                await self._http(method, path, parse_qs(query or body.decode()), headers, writer)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception:
+            logger.exception("Simulator connection failed")
+        finally:
+            writer.close()
+
+    def _respond(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+
+    async def _http(self, method, path, params, headers, writer):
+        self.counters[f"http {method} {path}"] += 1
+        venue = self.venues.get("binance")
+        if path != "/api/v3/userDataStream" or venue is None:
+            self._respond(writer, "404 Not Found", {"code": -1, "msg": "Not found"})
+        else:
+            api_key = headers.get("x-mbx-apikey")
+            if api_key not in venue.accounts:
+                self._respond(writer, "401 Unauthorized", {"code": -2015, "msg": "Invalid API-key"})
+            elif method == "POST":
+                # Like Binance, an account keeps the same listenKey while it is valid
+                listen_key = self._account_keys.get(api_key)
+                if listen_key is None:
+                    listen_key = uuid.uuid4().hex + uuid.uuid4().hex
+                    self._account_keys[api_key] = listen_key
+                    self._listen_keys[listen_key] = api_key
+                self._respond(writer, "200 OK", {"listenKey": listen_key})
+            elif (params.get("listenKey") or [None])[0] not in self._listen_keys:
+                self._respond(writer, "400 Bad Request", {"code": -1125, "msg": "This listenKey does not exist."})
+            elif method == "DELETE":
+                listen_key = params["listenKey"][0]
+                self._account_keys.pop(self._listen_keys.pop(listen_key), None)
+                self._respond(writer, "200 OK", {})
+            else:
+                self._respond(writer, "200 OK", {})
+        await writer.drain()
+
+    async def _websocket(self, path, headers, reader, writer):
+        public = next((e for e, (p, _) in _PUBLIC.items() if p == path and e in self.venues), None)
+        if public is not None:
+            stream = None  # quotes are bound per subscribed market
+        elif path.startswith("/ws/") and "binance" in self.venues:
+            api_key = self._listen_keys.get(path[len("/ws/"):])
+            if api_key is None:
+                self._respond(writer, "400 Bad Request", {"code": -1125, "msg": "Invalid listenKey"})
+                return
+            stream = ("binance", api_key)
+        elif path == "/v5/private" and "bybit" in self.venues:
+            stream = None  # bound after a successful auth op
+        else:
+            self._respond(writer, "404 Not Found", {"code": -1, "msg": "Not found"})
+            return
+
+        accept = base64.b64encode(
+            hashlib.sha1((headers.get("sec-websocket-key", "") + _WS_GUID).encode()).digest()
+        ).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        await writer.drain()
+        self.counters["ws_connections"] += 1
+
+        if stream is not None:
+            self._streams.setdefault(stream, set()).add(writer)
+        conn = {"id": uuid.uuid4().hex, "api_key": None, "stream": stream, "quotes": set()}
+        try:
+            while True:
+                opcode, payload = await _read_frame(reader)
+                if opcode == _OP_CLOSE:
+                    writer.write(_frame(payload[:2], _OP_CLOSE))
+                    break
+                if opcode == _OP_PING:
+                    writer.write(_frame(payload, _OP_PONG))
+                elif opcode == _OP_TEXT and public is not None:
+                    self._public_op(public, conn, payload, writer)
+                elif opcode == _OP_TEXT and path == "/v5/private":
+                    self._bybit_op(conn, payload, writer)
+        finally:
+            if conn["stream"] is not None:
+                self._streams.get(conn["stream"], set()).discard(writer)
+            for quote in conn["quotes"]:
+                self._quotes.get(quote, set()).discard(writer)
+
+    def _public_op(self, exchange, conn, payload, writer):
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            return
+        venue = self.venues[exchange]
+        markets = {m["id"]: m for m in venue.markets.values()}
+        if exchange == "binance":
+            op = (msg.get("method") or "").lower()
+            ids = [p.split("@")[0].upper() for p in msg.get("params") or [] if p.endswith("@bookTicker")]
+            reply = {"result": None, "id": msg.get("id")}
+        else:
+            op = msg.get("op")
+            ids = [a[len("tickers."):] for a in msg.get("args") or [] if a.startswith("tickers.")]
+            reply = {"success": True, "ret_msg": "", "op": op, "conn_id": conn["id"]}
+            if op == "ping":
+                reply = {"op": "pong", "args": [str(int(time.time() * 1000))], "conn_id": conn["id"]}
+        writer.write(_frame(json.dumps(reply).encode()))
+
+        formatter = _PUBLIC[exchange][1]
+        for market_id in ids:
+            quote = (exchange, market_id)
+            if op == "subscribe" and market_id in markets:
+                self._quotes.setdefault(quote, set()).add(writer)
+                conn["quotes"].add(quote)
+                market = markets[market_id]
+                writer.write(_frame(json.dumps(formatter(market, venue.prices[market["symbol"]])).encode()))
+            elif op == "unsubscribe":
+                self._quotes.get(quote, set()).discard(writer)
+                conn["quotes"].discard(quote)
+
+    def _bybit_op(self, conn, payload, writer):
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            return
+        op = msg.get("op")
+        venue = self.venues["bybit"]
+        reply = {"success": True, "ret_msg": "", "op": op, "conn_id": conn["id"]}
+        if "req_id" in msg:
+            reply["req_id"] = msg["req_id"]
+
+        if op == "auth":
+            api_key, expires, signature = (msg.get("args") or [None, 0, ""])[:3]
+            account = venue.accounts.get(api_key)
+            expected = account and hmac.new(
+                account["secret"].encode(), f"GET/realtime{expires}".encode(), hashlib.sha256
+            ).hexdigest()
+            if not account or signature != expected or int(expires) < time.time() * 1000:
+                reply.update(success=False, ret_msg="Invalid apikey or signature")
+            else:
+                conn["api_key"] = api_key
+        elif op == "subscribe":
+            if conn["api_key"] is None:
+                reply.update(success=False, ret_msg="Request not authorized")
+            elif "order" in (msg.get("args") or []):
+                conn["stream"] = ("bybit", conn["api_key"])
+                self._streams.setdefault(conn["stream"], set()).add(writer)
+        elif op == "ping":
+            reply = {"op": "pong", "args": [str(int(time.time() * 1000))], "conn_id": conn["id"]}
+        writer.write(_frame(json.dumps(reply).encode()))
@@ -0,0 +1,423 @@
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+
+from ccxt.base.errors import BadSymbol, AuthenticationError, DuplicateOrderId, InsufficientFunds, InvalidOrder, OrderNotFound
+
+from exchanges.quantizer import TICK_SIZE
+
+logger = logging.getLogger(__name__)
+
+QUOTE_ASSETS = ("USDT", "USDC")
+DEFAULT_QUOTE_BALANCE = 1_000_000.0
+DEFAULT_FEE_RATE = 0.001
+_BALANCE_EPSILON = 1e-9  # float slack when comparing balances with order sizes
+# A reused client order id, worded as ccxt reports each venue's rejection (an InvalidOrder)
+_DUPLICATE_ORDER_ERRORS = {
+    "binance": 'binance {"code":-2010,"msg":"Duplicate order sent."}',
+    "bybit": 'bybit {"retCode":110072,"retMsg":"OrderLinkedID is duplicate","result":{}}',
+}
+
+
+class SimulatedVenue:
+    """
+    In-memory spot exchange with markets, per-account balances and resting limit orders.
+
+    Limit orders rest until `set_price` crosses them and then fill at their own price;
+    marketable limit orders and market orders fill immediately at the last price.
+    Every order change is passed to `listeners` as listener(venue, api_key, event, order, trade),
+    with event one of "new", "fill" or "cancel" (see simulator.server for the stream side).
+    Every price move is passed to `price_listeners` as listener(venue, symbol, price), ahead of
+    the fills it causes.
+    """
+
+    def __init__(self, exchange_id, fee_rate=DEFAULT_FEE_RATE,
+                 quote_balance=DEFAULT_QUOTE_BALANCE, rest_latency=0.0):
+        self.id = exchange_id
+        self.fee_rate = fee_rate
+        self.quote_balance = quote_balance
+        self.rest_latency = rest_latency  # seconds added to every client call
+
+        self.markets = {}    # symbol -> ccxt market dict
+        self.prices = {}     # symbol -> last price
+        self.accounts = {}   # api_key -> {"secret": str, "balances": {asset: [free, used]}}
+        self.orders = {}     # order id -> order dict (open and closed)
+        self.books = {}      # symbol -> {order id: order} with the resting orders
+        self.listeners = []
+        self.price_listeners = []
+
+        self.rest_calls = Counter()
+        self.counters = Counter()
+        # Fill -> first follow-up order of the same grid, in seconds
+        self.replacement_latencies = []
+        self._pending_fills = {}  # (api_key, symbol) -> monotonic time of the oldest unanswered fill
+
+        self._order_ids = itertools.count(1)
+        self._trade_ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    # --- setup ---------------------------------------------------------------
+
+    def add_market(self, symbol, price, tick_size="0.0001", step_size="0.01", min_notional=5.0):
+        base, quote = symbol.split("/")
+        self.markets[symbol] = {
+            "id": base + quote,
+            "symbol": symbol,
+            "base": base,
+            "quote": quote,
+            "type": "spot",
+            "spot": True,
+            "active": True,
+            "precision": {"price": float(tick_size), "amount": float(step_size)},
+            "limits": {
+                "amount": {"min": float(step_size), "max": None},
+                "price": {"min": float(tick_size), "max": None},
+                "cost": {"min": min_notional, "max": None},
+            },
+            "info": {},
+        }
+        self.prices[symbol] = float(price)
+        self.books.setdefault(symbol, {})
+
+    def add_account(self, api_key, secret):
+        self.accounts[api_key] = {"secret": secret, "balances": {}}
+
+    # --- internals -----------------------------------------------------------
+
+    def _market(self, symbol):
+        market = self.markets.get(symbol)
+        if market is None:
+            raise BadSymbol(f"{self.id} does not have market symbol {symbol}")
+        return market
+
+    def _account(self, api_key):
+        account = self.accounts.get(api_key)
+        if account is None:
+            raise AuthenticationError(f"{self.id}: invalid api key")
+        return account
+
+    def _balance(self, account, asset):
+        start = self.quote_balance if asset in QUOTE_ASSETS else 0.0
+        return account["balances"].setdefault(asset, [start, 0.0])
+
+    def _lock_funds(self, account, asset, amount):
+        balance = self._balance(account, asset)
+        if balance[0] + _BALANCE_EPSILON * max(1.0, amount) < amount:
+            raise InsufficientFunds(f"{self.id}: insufficient {asset} balance ({balance[0]} < {amount})")
+        amount = min(amount, balance[0])
+        balance[0] -= amount
+        balance[1] += amount
+        return amount
+
+    def _release_funds(self, account, asset, amount):
+        balance = self._balance(account, asset)
+        amount = min(amount, balance[1])
+        balance[1] -= amount
+        balance[0] += amount
+
+    def _public(self, order):
+        return {k: v for k, v in order.items() if not k.startswith("_")}
+
+    def _fill(self, order, price, events, resting=False):
+        """
+        Fills the whole remaining amount of `order` at `price`. Fills of resting orders
+        start the fill -> follow-up order latency clock of their grid.
+        """
+        account = self.accounts[order["_api_key"]]
+        market = self.markets[order["symbol"]]
+        qty = order["remaining"]
+        cost = qty * price
+        fee = cost * self.fee_rate
+        base = self._balance(account, market["base"])
+        quote = self._balance(account, market["quote"])
+
+        # Fees are charged in the quote asset so base balances stay whole steps
+        if order["side"] == "buy":
+            if order["type"] == "limit":
+                quote[1] -= min(order["_locked"], quote[1])
+                quote[0] += order["_locked"] - cost
+            else:
+                quote[0] -= cost
+            quote[0] -= fee
+            base[0] += qty
+        else:
+            if order["type"] == "limit":
+                base[1] -= min(order["_locked"], base[1])
+                base[0] += order["_locked"] - qty
+            else:
+                base[0] -= qty
+            quote[0] += cost - fee
+
+        now = int(time.time() * 1000)
+        order.update(
+            status="closed", filled=order["amount"], remaining=0.0, average=price,
+            cost=cost, fee={"cost": fee, "currency": market["quote"]}, lastTradeTimestamp=now,
+        )
+        self.books[order["symbol"]].pop(order["id"], None)
+        trade = {
+            "id": str(next(self._trade_ids)),
+            "order": order["id"],
+            "symbol": order["symbol"],
+            "side": order["side"],
+            "price": price,
+            "amount": qty,
+            "cost": cost,
+            "fee": {"cost": fee, "currency": market["quote"]},
+            "timestamp": now,
+        }
+        self.counters["fills"] += 1
+        if resting:
+            self._pending_fills.setdefault((order["_api_key"], order["symbol"]), time.monotonic())
+        events.append((order["_api_key"], "fill", self._public(order), trade))
+
+    def _crosses(self, order, price):
+        return (order["side"] == "buy" and price <= order["price"]) or \
+               (order["side"] == "sell" and price >= order["price"])
+
+    def _emit(self, events):
+        for api_key, event, order, trade in events:
+            for listener in self.listeners:
+                try:
+                    listener(self, api_key, event, order, trade)
+                except Exception:
+                    logger.exception(f"{self.id}: simulator listener failed")
+
+    # --- exchange operations -------------------------------------------------
+
+    def create_order(self, api_key, symbol, order_type, side, amount, price=None, client_order_id=None):
+        events = []
+        with self._lock:
+            account = self._account(api_key)
+            market = self._market(symbol)
+            amount = float(amount)
+            if amount <= 0:
+                raise InvalidOrder(f"{self.id}: amount must be positive, got {amount}")
+            if order_type == "limit" and (price is None or float(price) <= 0):
+                raise InvalidOrder(f"{self.id}: limit orders need a positive price")
+            # Like Binance, a client order id is unique among the account's open orders
+            if client_order_id and any(o["clientOrderId"] == client_order_id and o["_api_key"] == api_key
+                                       for o in self.books[symbol].values()):
+                if self.id not in _DUPLICATE_ORDER_ERRORS:
+                    raise DuplicateOrderId(f"{self.id}: duplicate client order id {client_order_id}")
+                raise InvalidOrder(_DUPLICATE_ORDER_ERRORS[self.id])
+
+            last = self.prices[symbol]
+            order_id = str(next(self._order_ids))
+            order = {
+                "id": order_id,
+                "clientOrderId": client_order_id or f"sim{order_id}",
+                "symbol": symbol,
+                "type": order_type,
+                "side": side,
+                "price": float(price) if order_type == "limit" else last,
+                "amount": amount,
+                "filled": 0.0,
+                "remaining": amount,
+                "status": "open",
+                "average": None,
+                "cost": 0.0,
+                "fee": None,
+                "timestamp": int(time.time() * 1000),
+                "lastTradeTimestamp": None,
+                "_api_key": api_key,
+                "_locked": 0.0,
+            }
+
+            if order_type == "market":
+                needed = amount * last * (1 + self.fee_rate) if side == "buy" else amount
+                asset = market["quote"] if side == "buy" else market["base"]
+                if self._balance(account, asset)[0] + _BALANCE_EPSILON * max(1.0, needed) < needed:
+                    raise InsufficientFunds(f"{self.id}: insufficient {asset} balance for market {side}")
+            elif side == "buy":
+                order["_locked"] = self._lock_funds(account, market["quote"], amount * order["price"])
+            else:
+                order["_locked"] = self._lock_funds(account, market["base"], amount)
+
+            self.orders[order_id] = order
+            self.counters["orders_created"] += 1
+            self._note_follow_up(api_key, symbol)
+
+            if order_type == "market":
+                self._fill(order, last, events)
+            else:
+                self.books[symbol][order_id] = order
+                events.append((api_key, "new", self._public(order), None))
+                if self._crosses(order, last):
+                    self._fill(order, order["price"], events)
+            result = self._public(order)
+
+        self._emit(events)
+        return result
+
+    def _note_follow_up(self, api_key, symbol):
+        filled_at = self._pending_fills.pop((api_key, symbol), None)
+        if filled_at is not None:
+            self.replacement_latencies.append(time.monotonic() - filled_at)
+
+    def cancel_order(self, api_key, order_id, symbol=None):
+        events = []
+        with self._lock:
+            order = self.orders.get(str(order_id))
+            if order is None or order["_api_key"] != api_key or order["status"] != "open":
+                raise OrderNotFound(f"{self.id}: order {order_id} not found")
+            market = self.markets[order["symbol"]]
+            account = self.accounts[api_key]
+            asset = market["quote"] if order["side"] == "buy" else market["base"]
+            self._release_funds(account, asset, order["_locked"])
+            order.update(status="canceled", _locked=0.0)
+            self.books[order["symbol"]].pop(order["id"], None)
+            self.counters["orders_canceled"] += 1
+            events.append((api_key, "cancel", self._public(order), None))
+            result = self._public(order)
+
+        self._emit(events)
+        return result
+
+    def open_orders(self, api_key, symbol=None):
+        with self._lock:
+            self._account(api_key)
+            books = [self.books.get(symbol, {})] if symbol else self.books.values()
+            return [self._public(o) for book in books for o in book.values() if o["_api_key"] == api_key]
+
+    def closed_orders(self, api_key, symbol=None, since=None):
+        """Filled and cancelled orders of the account, oldest first; `since` (ms) on the last update."""
+        with self._lock:
+            self._account(api_key)
+            orders = [o for o in self.orders.values() if o["_api_key"] == api_key and o["status"] != "open"
+                      and (symbol is None or o["symbol"] == symbol)
+                      and (since is None or (o["lastTradeTimestamp"] or o["timestamp"]) >= since)]
+            return [self._public(o) for o in orders]
+
+    def get_order(self, api_key, order_id):
+        with self._lock:
+            order = self.orders.get(str(order_id))
+            if order is None or order["_api_key"] != api_key:
+                raise OrderNotFound(f"{self.id}: order {order_id} not found")
+            return self._public(order)
+
+    def balance(self, api_key):
+        with self._lock:
+            account = self._account(api_key)
+            for asset in QUOTE_ASSETS:
+                self._balance(account, asset)
+            result = {"free": {}, "used": {}, "total": {}, "info": {}}
+            for asset, (free, used) in account["balances"].items():
+                result[asset] = {"free": free, "used": used, "total": free + used}
+                result["free"][asset] = free
+                result["used"][asset] = used
+                result["total"][asset] = free + used
+            return result
+
+    # --- price path ----------------------------------------------------------
+
+    def set_price(self, symbol, price):
+        """
+        Moves the last price of a market and fills every resting order it crosses.
+        Returns the number of fills.
+        """
+        events = []
+        with self._lock:
+            self._market(symbol)
+            price = float(price)
+            self.prices[symbol] = price
+            crossed = [o for o in self.books[symbol].values() if self._crosses(o, price)]
+            for order in crossed:
+                self._fill(order, order["price"], events, resting=True)
+        for listener in self.price_listeners:
+            try:
+                listener(self, symbol, price)
+            except Exception:
+                logger.exception(f"{self.id}: simulator price listener failed")
+        self._emit(events)
+        return len(crossed)
+
+    def nearest_levels(self, symbol):
+        """
+        Returns (highest resting buy price, lowest resting sell price); either may be None.
+        """
+        with self._lock:
+            buys = [o["price"] for o in self.books.get(symbol, {}).values() if o["side"] == "buy"]
+            sells = [o["price"] for o in self.books.get(symbol, {}).values() if o["side"] == "sell"]
+        return (max(buys) if buys else None), (min(sells) if sells else None)
+
+    def unanswered_fills(self):
+        with self._lock:
+            return len(self._pending_fills)
+
+
+class SimulatedExchange:
+    """
+    ccxt-compatible client bound to one account of a SimulatedVenue.
+    Implements the subset of the ccxt unified API the bot uses.
+    """
+
+    precisionMode = TICK_SIZE
+
+    def __init__(self, venue, api_key, secret=None):
+        self.venue = venue
+        self.id = venue.id
+        self.name = venue.id.capitalize()
+        self.apiKey = api_key
+        self.secret = secret
+        self.options = {"defaultType": "spot"}
+
+    def _call(self, method):
+        self.venue.rest_calls[method] += 1
+        if self.venue.rest_latency:
+            time.sleep(self.venue.rest_latency)
+
+    def fetch_markets(self, params=None):
+        self._call("fetch_markets")
+        return [dict(m) for m in self.venue.markets.values()]
+
+    def load_markets(self, reload=False, params=None):
+        return {m["symbol"]: m for m in self.fetch_markets()}
+
+    def fetch_ticker(self, symbol, params=None):
+        self._call("fetch_ticker")
+        last = self.venue.prices[self.venue._market(symbol)["symbol"]]
+        return {
+            "symbol": symbol, "last": last, "close": last, "bid": last, "ask": last,
+            "timestamp": int(time.time() * 1000),
+        }
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._call("fetch_open_orders")
+        return self.venue.open_orders(self.apiKey, symbol)
+
+    def fetch_closed_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._call("fetch_closed_orders")
+        orders = self.venue.closed_orders(self.apiKey, symbol, since)
+        return orders[-limit:] if limit else orders
+
+    def fetch_order(self, id, symbol=None, params=None):
+        self._call("fetch_order")
+        return self.venue.get_order(self.apiKey, id)
+
+    def fetch_balance(self, params=None):
+        self._call("fetch_balance")
+        return self.venue.balance(self.apiKey)
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self._call("create_order")
+        params = params or {}
+        client_order_id = params.get("clientOrderId") or params.get("newClientOrderId") or params.get("orderLinkId")
+        return self.venue.create_order(self.apiKey, symbol, type, side, amount, price, client_order_id)
+
+    def create_market_buy_order(self, symbol, amount, params=None):
+        return self.create_order(symbol, "market", "buy", amount, None, params)
+
+    def create_market_sell_order(self, symbol, amount, params=None):
+        return self.create_order(symbol, "market", "sell", amount, None, params)
+
+    def create_limit_buy_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, "limit", "buy", amount, price, params)
+
+    def create_limit_sell_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, "limit", "sell", amount, price, params)
+
+    def cancel_order(self, id, symbol=None, params=None):
+        self._call("cancel_order")
+        return self.venue.cancel_order(self.apiKey, id, symbol)
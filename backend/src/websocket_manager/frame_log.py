@@ -0,0 +1,105 @@
+import atexit
+import logging
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# File layout: MAGIC, then records of _RECORD header + body.
+#   kind STREAM: body is the utf-8 stream name for `stream_id` (written once per stream)
+#   kind TEXT / BINARY: body is the raw frame exactly as received (BitMart stays deflated)
+MAGIC = b"GBFL\x01"
+_RECORD = struct.Struct("<BqHI")  # kind, receive time (ns since epoch), stream id, body length
+KIND_STREAM, KIND_TEXT, KIND_BINARY = 0, 1, 2
+
+CAPTURE_ENV = "WS_CAPTURE_PATH"
+
+
+class FrameRecorder:
+    """
+    Appends raw WebSocket frames with their receive timestamps to a compact binary log.
+    Safe to call from every socket thread; writes are buffered and flushed at exit.
+    """
+
+    def __init__(self, path, buffer_size=1 << 20):
+        self.path = path
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab", buffering=buffer_size)
+        if new_file:
+            self._file.write(MAGIC)
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.frames = 0
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls):
+        """Recorder for WS_CAPTURE_PATH, or None when capture is off."""
+        path = os.getenv(CAPTURE_ENV)
+        if not path:
+            return None
+        logger.info(f"Capturing raw WebSocket frames to {path}")
+        return cls(path)
+
+    def record(self, stream, message):
+        received = time.time_ns()
+        if isinstance(message, str):
+            kind, body = KIND_TEXT, message.encode("utf-8")
+        else:
+            kind, body = KIND_BINARY, bytes(message)
+
+        with self._lock:
+            if self._file.closed:
+                return
+            stream_id = self._streams.get(stream)
+            if stream_id is None:
+                # A log appended to by a later run starts its own numbering; readers keep the latest name
+                stream_id = self._streams[stream] = len(self._streams)
+                name = stream.encode("utf-8")
+                self._file.write(_RECORD.pack(KIND_STREAM, received, stream_id, len(name)) + name)
+            self._file.write(_RECORD.pack(kind, received, stream_id, len(body)))
+            self._file.write(body)
+            self.frames += 1
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def read_frames(path):
+    """
+    Yields (received_ns, stream, is_binary, payload) for every frame of a capture log.
+    Binary payloads are bytes, text payloads str, both exactly as the socket delivered them.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a frame capture log")
+        streams = {}
+        header_size = _RECORD.size
+        while True:
+            header = f.read(header_size)
+            if len(header) < header_size:
+                return
+            kind, received, stream_id, length = _RECORD.unpack(header)
+            body = f.read(length)
+            if len(body) < length:
+                logger.warning(f"{path}: truncated final record")
+                return
+            if kind == KIND_STREAM:
+                streams[stream_id] = body.decode("utf-8")
+            elif kind == KIND_BINARY:
+                yield received, streams[stream_id], True, body
+            else:
+                yield received, streams[stream_id], False, body.decode("utf-8")
+
+
+# Process-wide recorder used by the on_message handlers (None unless WS_CAPTURE_PATH is set)
+frame_recorder = FrameRecorder.from_env()
@@ -0,0 +1,115 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICK = 1.0  # seconds between heartbeat rounds
+
+# Per exchange, in seconds: (silence before a ping, silence before the stream counts as dead)
+HEARTBEATS = {
+    "binance": (30, 120),  # protocol-level pings; the server also pings us
+    "bitmart": (10, 60),
+    "gateio": (15, 60),
+    "bybit": (20, 60),
+}
+
+WS_STALE = metrics.Counter(
+    "gridbot_ws_stale_total", "Sockets dropped for staying silent past their stale limit; each then reconnects.", ["exchange"])
+
+
+class _Connection:
+    __slots__ = ("key", "ping", "interval", "stale_after", "last_seen", "last_ping")
+
+    def __init__(self, key, ping, interval, stale_after, now):
+        self.key = key
+        self.ping = ping
+        self.interval = interval
+        self.stale_after = stale_after
+        self.last_seen = now
+        self.last_ping = now
+
+
+class HeartbeatService:
+    """
+    Keeps every exchange socket alive from one thread. Each registered socket records when it last
+    heard from the exchange (`seen`, called for every frame). Once a tick, every socket silent for
+    its interval is sent its exchange's ping, and a socket silent for `stale_after` (connected, but
+    the stream is dead) has its connection shut down. Its on_close then hands it to the reconnect
+    logic like any other lost connection.
+    """
+
+    def __init__(self, tick=None, clock=time.monotonic):
+        self.tick_seconds = tick or float(os.getenv("HEARTBEAT_TICK", DEFAULT_TICK))
+        self._clock = clock
+        self._connections = {}  # app -> _Connection
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, ws, key, ping, interval, stale_after):
+        """
+        Watches `ws` (an open WebSocketApp) for the connection `key` = (exchange id, symbol).
+        `ping(ws)` sends the exchange's ping after `interval` seconds of silence.
+        """
+        with self._lock:
+            self._connections[ws] = _Connection(key, ping, interval, stale_after, self._clock())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="ws-heartbeat")
+                self._thread.start()
+
+    def unregister(self, ws):
+        with self._lock:
+            self._connections.pop(ws, None)
+
+    def seen(self, ws):
+        connection = self._connections.get(ws)
+        if connection is not None:
+            connection.last_seen = self._clock()
+
+    def tick(self):
+        """One heartbeat round: the pings due go out together, then stale sockets are shut down."""
+        now = self._clock()
+        pings, stale = [], []
+        with self._lock:
+            for ws, connection in self._connections.items():
+                silent = now - connection.last_seen
+                if silent >= connection.stale_after:
+                    stale.append((ws, connection))
+                elif silent >= connection.interval and now - connection.last_ping >= connection.interval:
+                    connection.last_ping = now
+                    pings.append((ws, connection))
+            for ws, _ in stale:
+                del self._connections[ws]
+
+        for ws, connection in pings:
+            try:
+                connection.ping(ws)
+            except Exception as e:
+                logger.error(f"❌ Error sending ping on {connection.key[0]} {connection.key[1]}: {e}")
+        for ws, connection in stale:
+            exchange, symbol = connection.key
+            logger.warning(f"{exchange} {symbol}: no frames for {now - connection.last_seen:.0f}s, reconnecting")
+            WS_STALE.labels(exchange).inc()
+            raw = getattr(ws.sock, "sock", None)
+            if raw is not None:
+                try:
+                    # Wakes run_forever with EOF (closing the fd would not), so it runs on_close
+                    raw.shutdown(socket.SHUT_RDWR)
+                except OSError as e:
+                    logger.error(f"❌ Error shutting down stale socket: {e}")
+        return len(pings), len(stale)
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick_seconds)
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Heartbeat round failed")
+
+
+heartbeats = HeartbeatService()
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+
+import requests
+
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_INTERVAL = 1800  # seconds; Binance expires a listenKey 60 minutes after its last keep-alive
+RETRY_DELAY = 60           # seconds before a failed keep-alive is tried again
+
+
+class ListenKeyManager:
+    """
+    The listenKey of one Binance API key, shared by every user-data socket of that key.
+
+    `acquire` hands out the current key, creating one only when there is none or it is overdue
+    a keep-alive, and `release` drops a socket again. While any socket holds the key, ListenKeys
+    keeps it alive. `expired` drops a key Binance reported gone, so the next `acquire` creates
+    a new one; Binance returns the same key while it is still valid.
+    """
+
+    def __init__(self, api_key, api_url, session, clock=time.monotonic):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.listen_key = None
+        self.owners = set()
+        self._session = session
+        self._clock = clock
+        self._renewed_at = None
+        self._retry_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def _url(self):
+        return f"{self.api_url}/api/v3/userDataStream"
+
+    def acquire(self, owner):
+        """Returns the listenKey for `owner`'s socket, creating it with one POST if needed. Raises RuntimeError."""
+        with self._lock:
+            # A key not kept alive for an interval (no owners meanwhile) is renewed by the POST
+            if self.listen_key is None or self._clock() - self._renewed_at >= KEEPALIVE_INTERVAL:
+                self.listen_key = self._create()
+                self._renewed_at = self._clock()
+                self._retry_at = None
+            self.owners.add(owner)
+            return self.listen_key
+
+    def release(self, owner):
+        """`owner` no longer uses the key. Without owners it is no longer kept alive and lapses."""
+        with self._lock:
+            self.owners.discard(owner)
+
+    def expired(self, listen_key):
+        with self._lock:
+            if listen_key == self.listen_key:
+                logger.warning(f"listenKey {listen_key} expired; the next socket gets a new one")
+                self.listen_key = None
+
+    def next_keepalive(self):
+        """When the key is next due a keep-alive, or None if nothing holds it."""
+        with self._lock:
+            if self.listen_key is None or not self.owners:
+                return None
+            return self._retry_at or self._renewed_at + KEEPALIVE_INTERVAL
+
+    def keepalive(self):
+        with self._lock:
+            listen_key = self.listen_key
+        if listen_key is None:
+            return
+        try:
+            with metrics.REST_SECONDS.labels("binance", "listen_key_keepalive").time():
+                response = self._session.put(self._url, headers={"X-MBX-APIKEY": self.api_key},
+                                             params={"listenKey": listen_key}, timeout=5)
+            if response.status_code == 400:
+                # -1125: the key does not exist any more
+                metrics.REST_ERRORS.labels("binance", "listen_key_keepalive", "ListenKeyExpired").inc()
+                self.expired(listen_key)
+                return
+            response.raise_for_status()
+            with self._lock:
+                if self.listen_key == listen_key:
+                    self._renewed_at = self._clock()
+                    self._retry_at = None
+            logger.info(f"✅ Successfully kept listenKey alive: {listen_key}")
+        except Exception as e:
+            metrics.REST_ERRORS.labels("binance", "listen_key_keepalive", type(e).__name__).inc()
+            logger.error(f"❌ Failed to keep listenKey alive: {e}")
+            with self._lock:
+                self._retry_at = self._clock() + RETRY_DELAY
+
+    def _create(self):
+        """POST /api/v3/userDataStream."""
+        try:
+            with metrics.REST_SECONDS.labels("binance", "listen_key_create").time():
+                response = self._session.post(self._url, headers={"X-MBX-APIKEY": self.api_key}, timeout=5)
+            response.raise_for_status()
+            return response.json()["listenKey"]
+        except Exception as e:
+            metrics.REST_ERRORS.labels("binance", "listen_key_create", type(e).__name__).inc()
+            raise RuntimeError(f"Error fetching listenKey: {e}")
+
+
+class ListenKeys:
+    """
+    Process-wide ListenKeyManager per Binance API key. All of them share one pooled HTTP session
+    and one keep-alive thread, so threads and REST calls do not grow with the number of symbols.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.session = requests.Session()
+        self._clock = clock
+        self._managers = {}  # (api_url, api_key) -> ListenKeyManager
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def manager(self, api_key, api_url):
+        with self._lock:
+            manager = self._managers.get((api_url, api_key))
+            if manager is None:
+                manager = self._managers[(api_url, api_key)] = ListenKeyManager(api_key, api_url, self.session, self._clock)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="listen-key-keepalive")
+                self._thread.start()
+            return manager
+
+    def keepalive_due(self):
+        """Keeps alive every held key that is due; returns when the next one is due, or None."""
+        with self._lock:
+            managers = list(self._managers.values())
+        now = self._clock()
+        upcoming = []
+        for manager in managers:
+            due = manager.next_keepalive()
+            if due is not None and due <= now:
+                manager.keepalive()
+                due = manager.next_keepalive()
+            if due is not None:
+                upcoming.append(due)
+        return min(upcoming) if upcoming else None
+
+    def _run(self):
+        while True:
+            due = self.keepalive_due()
+            # A key acquired meanwhile is due a full interval after this wait starts at the latest
+            time.sleep(KEEPALIVE_INTERVAL if due is None else min(max(due - self._clock(), 1), KEEPALIVE_INTERVAL))
+
+
+listen_keys = ListenKeys()
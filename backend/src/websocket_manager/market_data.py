@@ -0,0 +1,374 @@
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+from observability import metrics
+from websocket_manager.heartbeat import HEARTBEATS, heartbeats
+from websocket_manager.reconnect import reconnects
+
+logger = logging.getLogger(__name__)
+
+# Public market-data endpoints; override to point at another venue (e.g. src/simulator)
+BINANCE_PUBLIC_WS_URL = os.getenv("BINANCE_PUBLIC_WS_URL", "wss://stream.binance.com:9443/ws")
+BITMART_PUBLIC_WS_URL = os.getenv("BITMART_PUBLIC_WS_URL", "wss://ws-manager-compress.bitmart.com/api?protocol=1.1")
+GATEIO_PUBLIC_WS_URL = os.getenv("GATEIO_PUBLIC_WS_URL", "wss://api.gateio.ws/ws/v4/")
+BYBIT_PUBLIC_WS_URL = os.getenv("BYBIT_PUBLIC_WS_URL", "wss://stream.bybit.com/v5/public/spot")
+
+SUBSCRIBE_DELAY = 0.2  # seconds; subscriptions requested meanwhile go out as one message
+DEFAULT_MAX_QUOTE_AGE = 30.0  # seconds without an update before a quote is not trusted
+
+PRICE_LOOKUPS = metrics.Counter(
+    "gridbot_price_lookups_total",
+    "Prices read for sizing and grid resets, by source (stream cache, REST, or REST over a stale quote).",
+    ["exchange", "source"])
+
+_request_ids = itertools.count(1)
+
+
+class Quote(namedtuple("Quote", "bid ask last updated_at")):
+    __slots__ = ()
+
+    @property
+    def price(self):
+        """The last trade price, or the mid of the book when the channel carries none."""
+        if self.last is not None:
+            return self.last
+        return (self.bid + self.ask) / 2
+
+
+class PriceCache:
+    """
+    Latest top of book / last price per (exchange id, symbol), as streamed. A quote stays valid
+    while its stream is connected and for at most `max_age` seconds after its last update; the
+    stream drops its quotes when the connection goes.
+    """
+
+    def __init__(self, clock=time.monotonic, max_age=None):
+        self._quotes = {}
+        self._clock = clock
+        self.max_age = max_age or float(os.getenv("PRICE_MAX_QUOTE_AGE", DEFAULT_MAX_QUOTE_AGE))
+
+    def update(self, exchange, symbol, bid=None, ask=None, last=None):
+        self._quotes[(exchange, symbol)] = Quote(bid, ask, last, self._clock())
+
+    def get(self, exchange, symbol):
+        return self._quotes.get((exchange, symbol))
+
+    def drop(self, exchange, symbols):
+        for symbol in symbols:
+            self._quotes.pop((exchange, symbol), None)
+
+    def price(self, exchange_instance, symbol):
+        """
+        The streamed price of `symbol`, or a REST ticker while the stream has none yet or its
+        quote is older than `max_age` (a socket still up but no longer sending updates).
+        """
+        quote = self._quotes.get((exchange_instance.id, symbol))
+        if quote is not None and self._clock() - quote.updated_at <= self.max_age:
+            PRICE_LOOKUPS.labels(exchange_instance.id, "stream").inc()
+            return quote.price
+        PRICE_LOOKUPS.labels(exchange_instance.id, "rest" if quote is None else "stale").inc()
+        return exchange_instance.fetch_ticker(symbol)['last']
+
+
+def _number(value):
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+# --- per-exchange channels -------------------------------------------------------
+# Each one gives the market id of a symbol, the (un)subscribe messages for a batch of ids,
+# the ping, and the quotes in a decoded message as (market id, bid, ask, last). `rate` is the
+# (un)subscribe requests sent per second on one connection, `max_streams` the symbols one
+# connection carries (None: no limit); more symbols open further connections.
+
+class _Binance:
+    url = staticmethod(lambda: BINANCE_PUBLIC_WS_URL)
+    batch = 200  # streams per SUBSCRIBE
+    rate = 4  # Binance takes 5 messages a second, pings and pongs included
+    max_streams = 1024
+
+    @staticmethod
+    def market_id(symbol):
+        return symbol.replace("/", "")
+
+    @staticmethod
+    def requests(ids, subscribe):
+        return [{"method": "SUBSCRIBE" if subscribe else "UNSUBSCRIBE",
+                 "params": [f"{i.lower()}@bookTicker" for i in ids], "id": next(_request_ids)}]
+
+    @staticmethod
+    def ping(ws):
+        ws.sock.ping()
+
+    @staticmethod
+    def quotes(msg):
+        if "s" in msg and "b" in msg:
+            yield msg["s"], _number(msg["b"]), _number(msg["a"]), None
+
+
+class _BitMart:
+    url = staticmethod(lambda: BITMART_PUBLIC_WS_URL)
+    batch = 20
+    rate = 10
+    max_streams = None
+
+    @staticmethod
+    def market_id(symbol):
+        return symbol.replace("/", "_")
+
+    @staticmethod
+    def requests(ids, subscribe):
+        return [{"op": "subscribe" if subscribe else "unsubscribe", "args": [f"spot/ticker:{i}" for i in ids]}]
+
+    @staticmethod
+    def ping(ws):
+        ws.send("ping")
+
+    @staticmethod
+    def quotes(msg):
+        if msg.get("table") == "spot/ticker":
+            for item in msg.get("data") or []:
+                yield item.get("symbol"), _number(item.get("bid_px")), _number(item.get("ask_px")), _number(item.get("last_price"))
+
+
+class _GateIO:
+    url = staticmethod(lambda: GATEIO_PUBLIC_WS_URL)
+    batch = 100
+    rate = 10
+    max_streams = None
+
+    @staticmethod
+    def market_id(symbol):
+        return symbol.replace("/", "_")
+
+    @staticmethod
+    def requests(ids, subscribe):
+        return [{"time": int(time.time()), "channel": "spot.book_ticker",
+                 "event": "subscribe" if subscribe else "unsubscribe", "payload": list(ids)}]
+
+    @staticmethod
+    def ping(ws):
+        ws.send(json.dumps({"time": int(time.time()), "channel": "spot.ping"}))
+
+    @staticmethod
+    def quotes(msg):
+        result = msg.get("result")
+        if msg.get("channel") == "spot.book_ticker" and msg.get("event") == "update" and isinstance(result, dict):
+            yield result.get("s"), _number(result.get("b")), _number(result.get("a")), None
+
+
+class _Bybit:
+    url = staticmethod(lambda: BYBIT_PUBLIC_WS_URL)
+    batch = 10  # args per request on the spot public stream
+    rate = 10
+    max_streams = None
+
+    @staticmethod
+    def market_id(symbol):
+        return symbol.replace("/", "")
+
+    @staticmethod
+    def requests(ids, subscribe):
+        return [{"op": "subscribe" if subscribe else "unsubscribe", "args": [f"tickers.{i}" for i in ids]}]
+
+    @staticmethod
+    def ping(ws):
+        ws.send(json.dumps({"op": "ping"}))
+
+    @staticmethod
+    def quotes(msg):
+        data = msg.get("data")
+        if str(msg.get("topic", "")).startswith("tickers.") and isinstance(data, dict):
+            yield data.get("symbol"), None, None, _number(data.get("lastPrice"))
+
+
+CHANNELS = {"binance": _Binance, "bitmart": _BitMart, "gateio": _GateIO, "bybit": _Bybit}
+
+
+class MarketDataStream:
+    """
+    One public socket carrying the ticker channel of its subscribed symbols into a PriceCache.
+    Subscriptions requested within SUBSCRIBE_DELAY go out together, batched to the exchange's
+    limit and paced to its message rate. The socket reconnects and resubscribes through the
+    shared reconnect manager, and the heartbeat service keeps it alive.
+    """
+
+    def __init__(self, exchange, cache, shard=0, clock=time.monotonic, sleep=time.sleep):
+        self.exchange = exchange
+        self.channel = CHANNELS[exchange]
+        self.cache = cache
+        self.key = (exchange, "market-data" if shard == 0 else f"market-data-{shard}")
+        self.symbols = {}      # market id -> symbol
+        self.ws = None
+        self._open = False
+        self._queued = {True: set(), False: set()}  # subscribe flag -> market ids not yet sent
+        self._flush_timer = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()  # one flush sends at a time, so the pacing holds
+        self._next_send = 0.0
+        self._clock = clock
+        self._sleep = sleep
+
+    @property
+    def full(self):
+        return self.channel.max_streams is not None and len(self.symbols) >= self.channel.max_streams
+
+    def subscribe(self, symbol):
+        market_id = self.channel.market_id(symbol)
+        with self._lock:
+            if market_id in self.symbols:
+                return
+            self.symbols[market_id] = symbol
+            self._queue(market_id, True)
+            if self.ws is None:
+                self.ws = self._connect()
+
+    def unsubscribe(self, symbol):
+        market_id = self.channel.market_id(symbol)
+        with self._lock:
+            if self.symbols.pop(market_id, None) is None:
+                return
+            self._queue(market_id, False)
+        self.cache.drop(self.exchange, [symbol])
+
+    def _queue(self, market_id, subscribe):
+        if market_id in self._queued[not subscribe]:
+            self._queued[not subscribe].discard(market_id)  # the two cancel out before either is sent
+            return
+        self._queued[subscribe].add(market_id)
+        if self._open:
+            self._schedule_flush(SUBSCRIBE_DELAY)
+
+    def _schedule_flush(self, delay):
+        # Called with self._lock held
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(delay, self._flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush(self):
+        with self._send_lock:
+            with self._lock:
+                self._flush_timer = None
+                batches = {flag: sorted(ids) for flag, ids in self._queued.items()}
+                self._queued = {True: set(), False: set()}
+                ws = self.ws
+            try:
+                for subscribe in (False, True):
+                    ids = batches[subscribe]
+                    for i in range(0, len(ids), self.channel.batch):
+                        for request in self.channel.requests(ids[i:i + self.channel.batch], subscribe):
+                            self._send_paced(ws, request)
+            except Exception as e:
+                logger.error(f"❌ {self.exchange} market data: subscribe failed: {e}")
+
+    def _send_paced(self, ws, request):
+        wait = self._next_send - self._clock()
+        if wait > 0:
+            self._sleep(wait)
+        ws.send(json.dumps(request))
+        self._next_send = max(self._next_send, self._clock()) + 1.0 / self.channel.rate
+
+    def _connect(self):
+        import websocket  # deferred: websocket-client is slow to import
+
+        def on_open(ws):
+            logger.info(f"✅ {self.exchange} market data connected")
+            reconnects.connected(self.key)
+            heartbeats.register(ws, self.key, self.channel.ping, *HEARTBEATS[self.exchange])
+            with self._lock:
+                self._open = True
+                self._queued = {True: set(self.symbols), False: set()}
+                self._schedule_flush(0)  # paced sends stay off the socket's reader thread
+
+        def on_message(ws, message):
+            heartbeats.seen(ws)
+            try:
+                if isinstance(message, bytes):
+                    message = zlib.decompress(message, -zlib.MAX_WBITS)
+                msg = json.loads(message)
+            except (ValueError, zlib.error):
+                return  # "pong" and the like
+            if not isinstance(msg, dict):
+                return
+            for market_id, bid, ask, last in self.channel.quotes(msg):
+                symbol = self.symbols.get(market_id)
+                if symbol is not None and (last is not None or (bid is not None and ask is not None)):
+                    self.cache.update(self.exchange, symbol, bid, ask, last)
+
+        def on_error(ws, error):
+            logger.error(f"🚨 {self.exchange} market data error: {error}")
+
+        def on_close(ws, close_status_code, close_msg):
+            heartbeats.unregister(ws)
+            with self._lock:
+                self._open = False
+                symbols = list(self.symbols.values())
+                if self.ws is ws:
+                    self.ws = None
+            self.cache.drop(self.exchange, symbols)  # quotes from a dead stream are not trusted
+            if symbols:
+                reconnects.schedule(self.key, self._reconnect)
+
+        ws = websocket.WebSocketApp(self.channel.url(), on_open=on_open, on_message=on_message,
+                                    on_error=on_error, on_close=on_close,
+                                    on_ping=lambda ws, data: heartbeats.seen(ws),
+                                    on_pong=lambda ws, data: heartbeats.seen(ws))
+        threading.Thread(target=ws.run_forever, daemon=True, name=f"{self.key[1]}-{self.exchange}").start()
+        return ws
+
+    def _reconnect(self):
+        with self._lock:
+            if not self.symbols:
+                reconnects.cancel(self.key)  # every symbol was unsubscribed meanwhile
+                return True
+            if self.ws is None:
+                self.ws = self._connect()
+            return self.ws
+
+
+class MarketData:
+    """
+    The shared PriceCache and the MarketDataStreams of each exchange, started on first
+    subscription. A symbol goes to the first stream with room; when every one is at the
+    exchange's per-connection limit, another connection is opened.
+    """
+
+    def __init__(self):
+        self.cache = PriceCache()
+        self._streams = {}  # exchange id -> [MarketDataStream, ...]
+        self._lock = threading.Lock()
+
+    def subscribe(self, exchange, symbol):
+        if exchange not in CHANNELS:
+            return
+        market_id = CHANNELS[exchange].market_id(symbol)
+        with self._lock:
+            streams = self._streams.setdefault(exchange, [])
+            stream = next((s for s in streams if market_id in s.symbols), None) or \
+                next((s for s in streams if not s.full), None)
+            if stream is None:
+                stream = MarketDataStream(exchange, self.cache, shard=len(streams))
+                streams.append(stream)
+            stream.subscribe(symbol)
+
+    def unsubscribe(self, exchange, symbol):
+        market_id = CHANNELS[exchange].market_id(symbol) if exchange in CHANNELS else None
+        with self._lock:
+            stream = next((s for s in self._streams.get(exchange, ()) if market_id in s.symbols), None)
+        if stream is not None:
+            stream.unsubscribe(symbol)
+
+    def price(self, exchange_instance, symbol):
+        return self.cache.price(exchange_instance, symbol)
+
+
+market_data = MarketData()
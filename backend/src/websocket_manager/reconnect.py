@@ -0,0 +1,186 @@
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_DELAY = 1.0          # seconds; the first retry lands within this
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_MAX_HANDSHAKES = 4        # per exchange
+DEFAULT_HANDSHAKE_TIMEOUT = 30.0  # seconds before a handshake's slot is given back
+STABLE_AFTER = 60.0               # seconds up before a drop no longer counts as a failure
+
+
+class _Attempt:
+    __slots__ = ("key", "connect", "due", "started")
+
+    def __init__(self, key, connect, due):
+        self.key = key
+        self.connect = connect
+        self.due = due
+        self.started = None  # when its handshake slot was taken
+
+
+class ReconnectManager:
+    """
+    Schedules the reconnects of every exchange socket so that a venue-wide blip does not turn
+    into a reconnect storm. Connections are keyed by (exchange id, symbol).
+
+    A dropped connection waits a full-jitter backoff, uniform in [0, min(max_delay, base_delay * 2**n)),
+    where n is the larger of the exchange's failed handshakes since its last good one and the
+    connection's own run of failures. A drop counts as a failure unless the connection had been
+    up for STABLE_AFTER seconds. Once due, at most max_handshakes connections per exchange are
+    opening at a time; the rest queue until the socket reports `connected` (its login or
+    subscription was acknowledged), drops again, or the handshake times out.
+    """
+
+    def __init__(self, base_delay=None, max_delay=None, max_handshakes=None, handshake_timeout=None,
+                 stable_after=STABLE_AFTER, rng=random.random, clock=time.monotonic):
+        self.base_delay = base_delay or float(os.getenv("WS_RECONNECT_BASE_DELAY", DEFAULT_BASE_DELAY))
+        self.max_delay = max_delay or float(os.getenv("WS_RECONNECT_MAX_DELAY", DEFAULT_MAX_DELAY))
+        self.max_handshakes = max_handshakes or int(os.getenv("WS_RECONNECT_HANDSHAKES", DEFAULT_MAX_HANDSHAKES))
+        self.handshake_timeout = handshake_timeout or float(os.getenv("WS_HANDSHAKE_TIMEOUT", DEFAULT_HANDSHAKE_TIMEOUT))
+        self.stable_after = stable_after
+        self._rng = rng
+        self._clock = clock
+        self._attempts = {}     # key -> _Attempt, scheduled or handshaking
+        self._heap = []         # (due, seq, attempt)
+        self._seq = itertools.count()
+        self._waiting = {}      # exchange -> deque of due attempts without a handshake slot
+        self._handshaking = {}  # exchange -> {key: attempt}
+        self._failures = {}     # exchange -> failed handshakes since the last good one
+        self._streaks = {}      # key -> consecutive failed connections
+        self._up = {}           # key -> when its current connection completed its handshake
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, key, connect):
+        """
+        Reconnects `key` after its backoff by calling `connect()` on a new thread. `connect` opens
+        the socket and returns the new app, or None if it could not (which is retried the same way).
+        Returns the delay in seconds.
+        """
+        with self._cond:
+            delay = self._schedule(key, connect)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="ws-reconnect")
+                self._thread.start()
+            self._cond.notify()
+        metrics.WS_RECONNECTS.labels(key[0]).inc()
+        logger.info(f"⭮ Reconnecting {key[0]} {key[1]} in {delay:.1f}s")
+        return delay
+
+    def connected(self, key):
+        """The socket for `key` completed its handshake: frees its slot and resets the exchange's backoff."""
+        with self._cond:
+            self._release(key)
+            self._attempts.pop(key, None)
+            self._up[key] = self._clock()
+            self._failures[key[0]] = 0
+            self._cond.notify()
+
+    def cancel(self, key):
+        """Drops any pending reconnect of `key` and forgets its history (the grid was stopped)."""
+        with self._cond:
+            self._release(key)
+            self._attempts.pop(key, None)
+            self._up.pop(key, None)
+            self._streaks.pop(key, None)
+            self._cond.notify()
+
+    def pending(self):
+        """{(exchange, state): count} of reconnects "waiting" for their delay or a slot and "handshaking"."""
+        with self._cond:
+            counts = {}
+            for key, attempt in self._attempts.items():
+                state = "waiting" if attempt.started is None else "handshaking"
+                counts[(key[0], state)] = counts.get((key[0], state), 0) + 1
+            return counts
+
+    # ---------------- internals (called with the lock held) ----------------
+
+    def _schedule(self, key, connect):
+        now = self._clock()
+        exchange = key[0]
+        up_since = self._up.pop(key, None)
+        if up_since is not None and now - up_since >= self.stable_after:
+            self._streaks[key] = 0
+        else:
+            self._streaks[key] = self._streaks.get(key, 0) + 1
+            self._failures[exchange] = self._failures.get(exchange, 0) + 1
+        self._release(key)
+
+        exponent = min(max(self._failures.get(exchange, 0), self._streaks[key]) - 1, 30)
+        delay = self._rng() * min(self.max_delay, self.base_delay * 2 ** max(exponent, 0))
+        attempt = _Attempt(key, connect, now + delay)
+        self._attempts[key] = attempt
+        heapq.heappush(self._heap, (attempt.due, next(self._seq), attempt))
+        return delay
+
+    def _release(self, key):
+        slots = self._handshaking.get(key[0])
+        if slots:
+            slots.pop(key, None)
+
+    def _current(self, attempt):
+        return self._attempts.get(attempt.key) is attempt
+
+    def _run(self):
+        with self._cond:
+            while True:
+                now = self._clock()
+                while self._heap and self._heap[0][0] <= now:
+                    attempt = heapq.heappop(self._heap)[2]
+                    if self._current(attempt):
+                        self._waiting.setdefault(attempt.key[0], deque()).append(attempt)
+
+                for exchange, slots in self._handshaking.items():
+                    for key, attempt in list(slots.items()):
+                        if now - attempt.started >= self.handshake_timeout:
+                            logger.warning(f"Handshake of {key[0]} {key[1]} still pending after {self.handshake_timeout:.0f}s")
+                            del slots[key]
+                            if self._current(attempt):
+                                # No longer tracked: a late `connected` or drop is handled as usual
+                                del self._attempts[key]
+
+                for exchange, queue in self._waiting.items():
+                    slots = self._handshaking.setdefault(exchange, {})
+                    while queue and len(slots) < self.max_handshakes:
+                        attempt = queue.popleft()
+                        if not self._current(attempt):
+                            continue
+                        attempt.started = now
+                        slots[attempt.key] = attempt
+                        threading.Thread(target=self._connect, args=(attempt,), daemon=True,
+                                         name=f"ws-reconnect-{exchange}").start()
+
+                wakeups = [self._heap[0][0]] if self._heap else []
+                wakeups.extend(a.started + self.handshake_timeout
+                               for slots in self._handshaking.values() for a in slots.values())
+                self._cond.wait(max(min(wakeups) - now, 0.01) if wakeups else None)
+
+    def _connect(self, attempt):
+        try:
+            app = attempt.connect()
+        except Exception as e:
+            logger.error(f"❌ Reconnect of {attempt.key[0]} {attempt.key[1]} failed: {e}")
+            app = None
+        if app is None:
+            with self._cond:
+                if self._current(attempt):
+                    self._schedule(attempt.key, attempt.connect)
+                    self._cond.notify()
+
+
+reconnects = ReconnectManager()
+
+RECONNECTS_PENDING = metrics.Gauge(
+    "gridbot_ws_reconnects_pending", "Sockets waiting to reconnect or mid-handshake, per exchange.",
+    ["exchange", "state"], callback=reconnects.pending)
@@ -0,0 +1,232 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+
+# Nothing here may import the database at module level: main() points DATABASE_URL at a
+# scratch database first, and grid_logic.levels (via crud) would bind the bot's own one
+from websocket_manager import frame_log
+from websocket_manager.frame_log import read_frames
+
+logger = logging.getLogger(__name__)
+
+REPLAY_PRICE_TICK = "0.00000001"
+
+
+def frame_price(exchange, is_binary, payload):
+    """
+    Best-effort fill price of a recorded frame, used to seed grid levels and move the venue.
+    """
+    try:
+        if is_binary:
+            payload = zlib.decompress(payload, -zlib.MAX_WBITS)
+        msg = json.loads(payload)
+    except (ValueError, zlib.error):
+        return None
+    if not isinstance(msg, dict):
+        return None
+
+    if exchange == "binance":
+        value = msg.get("L")
+    else:
+        items = msg.get("result") if exchange == "gateio" else msg.get("data")
+        item = items[0] if isinstance(items, list) and items and isinstance(items[0], dict) else {}
+        value = item.get("price") or item.get("last_fill_price") or item.get("avgPrice")
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+def scan_log(path):
+    """
+    Returns ({stream: first price or None}, frame count, first/last receive time in ns).
+    """
+    streams = {}
+    frames = 0
+    first = last = None
+    for received, stream, is_binary, payload in read_frames(path):
+        frames += 1
+        first = received if first is None else first
+        last = received
+        if streams.get(stream) is None:
+            streams[stream] = frame_price(stream.split(":", 1)[0], is_binary, payload)
+    return streams, frames, first, last
+
+
+def _ensure_grid(models, db_session, exchange, symbol, price, amount, tp_percent, sl_percent):
+    """
+    Returns the bot config for (exchange, symbol), creating the key/symbol/config rows if needed.
+    Empty levels are seeded around the first recorded price so fills reach the TP/SL logic.
+    """
+    from exchanges.quantizer import Quantizer
+    from grid_logic.levels import GridLevels, sl_prices, tp_prices
+
+    key = db_session.query(models.ExchangeAPIKey).filter(models.ExchangeAPIKey.exchange == exchange).first()
+    if key is None:
+        key = models.ExchangeAPIKey(exchange=exchange, api_key=f"replay-{exchange}", api_secret="replay", balance=amount)
+        db_session.add(key)
+    symbol_row = db_session.query(models.Symbol).filter(models.Symbol.symbol == symbol).first()
+    if symbol_row is None:
+        symbol_row = models.Symbol(symbol=symbol)
+        db_session.add(symbol_row)
+    db_session.flush()
+
+    config = db_session.query(models.ExchangeBotConfig).filter(
+        models.ExchangeBotConfig.exchange_id == key.id,
+        models.ExchangeBotConfig.symbol_id == symbol_row.id,
+    ).first()
+    if config is None:
+        config = models.ExchangeBotConfig(exchange_id=key.id, symbol_id=symbol_row.id, amount=key.balance,
+                                          tp_percent=tp_percent, sl_percent=sl_percent)
+        db_session.add(config)
+        db_session.flush()
+    levels = GridLevels.load(db_session, config, symbol, Quantizer(REPLAY_PRICE_TICK, REPLAY_PRICE_TICK))
+    if price and not levels.tps and not levels.sls:
+        for tp in tp_prices(price, config.tp_percent):
+            levels.add_tp(tp)
+        for sl in sl_prices(price, config.sl_percent):
+            levels.add_sl(sl)
+        levels.save(db_session)
+    db_session.commit()
+    return key, config
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Feeds a WebSocket capture log (WS_CAPTURE_PATH) back through the bot's on_message handlers."
+    )
+    parser.add_argument("log", help="capture log written with WS_CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="multiple of the recorded pace")
+    parser.add_argument("--max-speed", action="store_true", help="no pacing, feed frames back to back")
+    parser.add_argument("--drain", type=float, default=1.0, help="seconds to let delayed order placements finish")
+    parser.add_argument("--amount", type=float, default=20.0, help="quote amount for grids created by the replay")
+    parser.add_argument("--tp", type=float, default=1.0)
+    parser.add_argument("--sl", type=float, default=1.0)
+    parser.add_argument("--db-url", help="scratch database URL (default: a temporary SQLite file)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    # The replay writes to the database, so it never defaults to the bot's own one
+    if not args.db_url:
+        args.db_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='gridbot-replay-'), 'replay.db')}"
+    os.environ["DATABASE_URL"] = args.db_url
+    frame_log.frame_recorder = None  # never re-record what is being replayed
+    logging.basicConfig(level=args.log_level.upper())
+
+    from database import models
+    from database.database import SessionLocal, engine
+    from exchanges.market_registry import market_registry
+    from simulator.loadtest import latency_summary
+    from simulator.venue import SimulatedExchange, SimulatedVenue
+    import websocket_manager.websocket_manager as wm
+
+    builders = {
+        "binance": wm.start_binance_websocket,
+        "bitmart": wm.start_bitmart_websocket,
+        "gateio": wm.start_gateio_websocket,
+    }
+
+    models.Base.metadata.create_all(bind=engine)
+    streams, total_frames, first_ns, last_ns = scan_log(args.log)
+    print(f"{args.log}: {total_frames} frames on {len(streams)} streams, "
+          f"{(last_ns - first_ns) / 1e9 if first_ns else 0:.1f}s recorded", file=sys.stderr)
+
+    # One simulated venue per exchange serves the REST calls the handlers make
+    venues, apps = {}, {}
+    db_session = SessionLocal()
+    try:
+        for stream, price in streams.items():
+            exchange, symbol = stream.split(":", 1)
+            if exchange not in venues:
+                venues[exchange] = SimulatedVenue(exchange)
+            venues[exchange].add_market(symbol, price or 1.0, REPLAY_PRICE_TICK, REPLAY_PRICE_TICK, 0.0)
+            key, config = _ensure_grid(models, db_session, exchange, symbol, price, args.amount, args.tp, args.sl)
+            if key.api_key not in venues[exchange].accounts:
+                venues[exchange].add_account(key.api_key, key.api_secret)
+            apps[stream] = (exchange, symbol, (key.api_key, key.api_secret, key.balance),
+                            config.id, config.tp_percent, config.sl_percent)
+    finally:
+        db_session.close()
+
+    for stream, (exchange, symbol, (api_key, secret, amount), config_id, tp_percent, sl_percent) in list(apps.items()):
+        exchange_instance = SimulatedExchange(venues[exchange], api_key, secret)
+        market_registry.load(exchange_instance)
+        quantizer, min_notional = wm.load_market_params(exchange_instance, symbol)
+        handler_session = SessionLocal()
+        if exchange == "bybit":
+            app = wm.start_bybit_websocket(
+                exchange_instance, symbol, config_id, amount, quantizer, min_notional, {},
+                sl_buffer_percent=sl_percent, sell_rebound_percent=tp_percent,
+                auto_reconnect=False, db_session=handler_session, connect=False
+            )
+        else:
+            app = builders[exchange](
+                exchange_instance, symbol, config_id, amount, quantizer, min_notional,
+                sl_percent, tp_percent, auto_reconnect=False, db_session=handler_session, connect=False
+            )
+        app.send = lambda *a, **kw: None  # replies (pong, subscribe) go nowhere
+        apps[stream] = (exchange, symbol, app)
+
+    # --- feed ----------------------------------------------------------------
+    handler_times = []
+    per_stream = Counter()
+    errors = 0
+    frame_bytes = 0
+    pace = None if args.max_speed or args.speed <= 0 else args.speed
+    started = time.perf_counter()
+    for received, stream, is_binary, payload in read_frames(args.log):
+        exchange, symbol, app = apps[stream]
+        if pace:
+            due = started + (received - first_ns) / 1e9 / pace
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        price = frame_price(exchange, is_binary, payload)
+        if price:
+            venues[exchange].set_price(symbol, price)
+
+        t0 = time.perf_counter()
+        try:
+            app.on_message(app, payload)
+        except Exception:
+            errors += 1
+            logger.exception(f"Replay: handler failed for {stream}")
+        handler_times.append(time.perf_counter() - t0)
+        per_stream[stream] += 1
+        frame_bytes += len(payload)
+    fed_seconds = time.perf_counter() - started
+    time.sleep(args.drain)
+
+    busy = sum(handler_times)
+    report = {
+        "log": args.log,
+        "frames": len(handler_times),
+        "bytes": frame_bytes,
+        "streams": len(apps),
+        "mode": "max-speed" if pace is None else f"{pace}x",
+        "recorded_seconds": round((last_ns - first_ns) / 1e9, 3) if first_ns else 0.0,
+        "replay_seconds": round(fed_seconds, 3),
+        "handler_seconds": round(busy, 3),
+        "frames_per_handler_second": round(len(handler_times) / busy, 1) if busy else 0.0,
+        "handler_ms": latency_summary(handler_times),
+        "handler_errors": errors,
+        "frames_per_stream": dict(per_stream.most_common()),
+        "rest_calls": {exchange: dict(venue.rest_calls) for exchange, venue in venues.items()},
+        "database": args.db_url,
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
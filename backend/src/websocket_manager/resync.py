@@ -0,0 +1,183 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OVERLAP = 5.0  # seconds before the drop the backfill also covers (frames in flight, clock skew)
+DEFAULT_RETRIES = 5    # failed backfills retried on a healthy socket before waiting for the next reconnect
+DEFAULT_RETRY_DELAY = 2.0  # seconds before the first retry, doubling per failure
+MAX_RETRY_DELAY = 60.0
+SEEN_CAPACITY = 1000   # order ids remembered per stream for de-duplication
+
+GAP_FILLS = metrics.Counter(
+    "gridbot_ws_gap_fills_total", "Fills missed while a socket was down and recovered over REST.", ["exchange"])
+
+
+class _Cursor:
+    __slots__ = ("last_ms", "last_order_id", "down_ms", "seen", "resyncing", "queued", "failures")
+
+    def __init__(self):
+        self.last_ms = None        # event time of the newest fill processed
+        self.last_order_id = None
+        self.down_ms = None        # when the socket dropped, until a resync covers the gap
+        self.seen = OrderedDict()  # order ids processed, oldest first
+        self.resyncing = False
+        self.queued = []           # live fills held back until the backfill is done
+        self.failures = 0          # failed backfills of the current gap
+
+    def record(self, order_id, event_ms):
+        """Marks a fill processed; False if its order was processed already."""
+        if order_id is not None:
+            if order_id in self.seen:
+                return False
+            self.seen[order_id] = None
+            while len(self.seen) > SEEN_CAPACITY:
+                self.seen.popitem(last=False)
+            self.last_order_id = order_id
+        if event_ms is not None and (self.last_ms is None or event_ms > self.last_ms):
+            self.last_ms = event_ms
+        return True
+
+
+def _ms(value):
+    try:
+        return int(float(value)) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class GapRecovery:
+    """
+    Backfills the fills a grid's socket missed while it was down. Every fill a stream processes
+    goes through `fill`, which records its event time and order id (and drops an order seen
+    already); `disconnected` notes when the socket dropped. Once the new socket is subscribed,
+    `reconnected` fetches the orders closed since the later of the last fill and the drop (less
+    the overlap) and feeds those not seen yet through the fill pipeline, oldest first. Live
+    fills arriving meanwhile wait and follow them, so the levels see every fill in order.
+    A failed backfill is retried on a timer with a doubling delay, up to `retries` times, since
+    a socket that stays up never calls `reconnected` again.
+    """
+
+    def __init__(self, overlap=None, clock=time.time, retries=None, retry_delay=None):
+        self.overlap = overlap or float(os.getenv("WS_RESYNC_OVERLAP", DEFAULT_OVERLAP))
+        self.retries = int(os.getenv("WS_RESYNC_RETRIES", DEFAULT_RETRIES)) if retries is None else retries
+        self.retry_delay = retry_delay or float(os.getenv("WS_RESYNC_RETRY_DELAY", DEFAULT_RETRY_DELAY))
+        self._clock = clock
+        self._cursors = {}  # (exchange id, symbol) -> _Cursor
+        self._lock = threading.Lock()
+
+    def fill(self, key, order_id, event_ms, apply):
+        """
+        Runs `apply()` for a live fill of `key`'s stream, unless its order was processed already.
+        While the stream is being backfilled it is queued instead. Returns False for a duplicate.
+        """
+        with self._lock:
+            cursor = self._cursors.setdefault(key, _Cursor())
+            if not cursor.record(None if order_id is None else str(order_id), _ms(event_ms)):
+                return False
+            if cursor.resyncing:
+                cursor.queued.append(apply)
+                return True
+        apply()
+        return True
+
+    def disconnected(self, key):
+        with self._lock:
+            cursor = self._cursors.setdefault(key, _Cursor())
+            if cursor.down_ms is None:  # a failed reconnect does not move the start of the gap
+                cursor.down_ms = int(self._clock() * 1000)
+                cursor.failures = 0
+
+    def forget(self, key):
+        """Drops the stream's state (its grid was stopped)."""
+        with self._lock:
+            self._cursors.pop(key, None)
+
+    def reconnected(self, key, exchange, symbol, apply_order):
+        """Backfills `key` on a new thread if its socket was down; returns the thread, if any."""
+        with self._lock:
+            cursor = self._cursors.get(key)
+            if cursor is None or cursor.down_ms is None or cursor.resyncing:
+                return None
+            cursor.resyncing = True
+        thread = threading.Thread(target=self._resync, args=(key, cursor, exchange, symbol, apply_order),
+                                  daemon=True, name=f"resync-{key[0]}-{key[1]}")
+        thread.start()
+        return thread
+
+    def _resync(self, key, cursor, exchange, symbol, apply_order):
+        since = max(cursor.last_ms or 0, cursor.down_ms - int(self.overlap * 1000))
+        recovered = 0
+        retry_in = None
+        try:
+            for order in fetch_filled_orders(exchange, symbol, since):
+                with self._lock:
+                    if not cursor.record(str(order["id"]), _ms(order.get("lastTradeTimestamp") or order.get("timestamp"))):
+                        continue
+                recovered += 1
+                GAP_FILLS.labels(key[0]).inc()
+                try:
+                    apply_order(order)
+                except Exception:
+                    logger.exception(f"{key[0]} {symbol}: recovered fill of order {order['id']} failed")
+            cursor.down_ms = None
+            cursor.failures = 0
+            if recovered:
+                logger.info(f"{key[0]} {symbol}: recovered {recovered} fill(s) missed while disconnected")
+        except Exception as e:
+            # The gap stays open: retried below, and by the next reconnect in any case
+            cursor.failures += 1
+            if cursor.failures <= self.retries:
+                retry_in = min(self.retry_delay * 2 ** (cursor.failures - 1), MAX_RETRY_DELAY)
+            logger.error(f"❌ {key[0]} {symbol}: could not fetch the fills missed while disconnected: {e}"
+                         + (f"; retrying in {retry_in:.0f}s" if retry_in is not None else ""))
+        finally:
+            while True:
+                with self._lock:
+                    queued, cursor.queued = cursor.queued, []
+                    if not queued:
+                        cursor.resyncing = False
+                        break
+                for apply in queued:
+                    try:
+                        apply()
+                    except Exception:
+                        logger.exception(f"{key[0]} {symbol}: queued fill failed")
+
+        if retry_in is not None:
+            timer = threading.Timer(retry_in, self._retry, args=(key, cursor, exchange, symbol, apply_order))
+            timer.daemon = True
+            timer.start()
+
+    def _retry(self, key, cursor, exchange, symbol, apply_order):
+        # A no-op if the grid was stopped, or a reconnect closed the gap or is backfilling it now
+        with self._lock:
+            if self._cursors.get(key) is not cursor:
+                return
+        self.reconnected(key, exchange, symbol, apply_order)
+
+
+def fetch_filled_orders(exchange, symbol, since):
+    """
+    The orders of `symbol` that filled at or after `since` (ms), oldest fill first, as ccxt
+    orders. Without fetchClosedOrders each traded order counts as filled at its last trade.
+    """
+    if getattr(exchange, "has", {}).get("fetchClosedOrders", True):
+        orders = [o for o in exchange.fetch_closed_orders(symbol, since=since)
+                  if o.get("status") == "closed" and o.get("filled")]
+    else:
+        last_trades = {}
+        for trade in exchange.fetch_my_trades(symbol, since=since):
+            last_trades[trade["order"]] = trade
+        orders = [{"id": order_id, "clientOrderId": None, "price": trade["price"], "average": trade["price"],
+                   "timestamp": trade["timestamp"], "lastTradeTimestamp": trade["timestamp"]}
+                  for order_id, trade in last_trades.items()]
+    return sorted(orders, key=lambda o: o.get("lastTradeTimestamp") or o.get("timestamp") or 0)
+
+
+gap_recovery = GapRecovery()
@@ -3,217 +3,295 @@ from websocket import WebSocketApp  # Add this import
 import threading
 import logging
 import json
-import math
+import os
 import time
-import requests
 import hashlib
 import hmac
 import zlib  # added for decompression
+from collections import Counter, OrderedDict
+from ccxt.base.errors import DuplicateOrderId, InvalidOrder, NetworkError
 from src.utils.trade_normalizers import process_trade_message
 from database import crud, models, schemas
 from database.database import SessionLocal
-from decimal import Decimal, ROUND_DOWN
+from engine.events import engine_events
+from exchanges.market_registry import market_registry
+from grid_logic.levels import GridLevels, sl_prices, tp_prices
+from grid_logic.order_ids import ENTRY_LEVEL, client_order_id, parse_client_order_id
+from observability import metrics
+from observability.tracing import fill_tracer
+from websocket_manager import frame_log
+from websocket_manager.heartbeat import HEARTBEATS, heartbeats
+from websocket_manager.listen_keys import listen_keys
+from websocket_manager.market_data import market_data
+from websocket_manager.reconnect import reconnects
+from websocket_manager.resync import fetch_filled_orders, gap_recovery
 
 logger = logging.getLogger(__name__)
 
+# Exchange endpoints; override to point the bot at another venue (e.g. src/simulator)
+BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com")
+BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443/ws")
+BITMART_WS_URL = os.getenv("BITMART_WS_URL", "wss://ws-manager-compress.bitmart.com/user?protocol=1.1")
+GATEIO_WS_URL = os.getenv("GATEIO_WS_URL", "wss://api.gateio.ws/ws/v4/")
+BYBIT_WS_URL = os.getenv("BYBIT_WS_URL", "wss://stream.bybit.com/v5/private")
+
+# Limit orders carry client order ids, so a timed-out placement is looked up and retried safely
+ORDER_RETRIES = int(os.getenv("ORDER_RETRIES", "2"))
+ORDER_RETRY_DELAY = float(os.getenv("ORDER_RETRY_DELAY", "0.5"))  # seconds, times the attempt number
+ORDER_LOOKUP_SLACK_MS = 60_000  # filled orders are looked up from this long before the first attempt
+# ccxt maps these client order id reuses to a plain InvalidOrder, not DuplicateOrderId:
+# Binance -2010 "Duplicate order sent." and Bybit 110072 "OrderLinkedID is duplicate"
+DUPLICATE_ORDER_MARKERS = ("Duplicate order sent", "110072")
+
+# order_levels rows whose replacement orders are scheduled but not yet placed (see _split_resting),
+# and {level id: order id} of those placed since, written with the next level update
+_pending_levels = set()
+_placed_orders = {}
+_pending_lock = threading.Lock()
+
+
+def load_market_params(exchange_instance, symbol):
+    """
+    Returns (quantizer, min_notional) for a symbol, or None if the market is unknown.
+    Markets come from the shared market registry, so they are fetched once per exchange.
+    """
+    symbol_info = market_registry.get_market(exchange_instance, symbol)
 
-def round_price(price, tick_size):
-    # Calculate the number of decimals from tick_size (e.g. tick_size=0.01 -> 2 decimals)
-    decimals = int(round(-math.log10(tick_size)))
-    return round(price, decimals)
-
-def run_bot_with_websocket(exchange_instance, symbol, amount, db_session, bot_instance):
-    try:
-        # Fetch all markets
-        markets = exchange_instance.fetch_markets()
+    # Check if the symbol exists
+    if not symbol_info:
+        logger.error(f"Symbol {symbol} not found on {exchange_instance.name or exchange_instance.id}.")
+        return None
 
-        # Find the symbol info for the specific symbol
-        symbol_info = next((m for m in markets if m["symbol"] == symbol), None)
+    # Tick/step rounding precompiled from ccxt's precision (or BitMart's quote_increment/base_min_size)
+    quantizer = market_registry.get_quantizer(exchange_instance, symbol)
 
-        # Check if the symbol exists
-        if not symbol_info:
-            logger.error(f"Symbol {symbol} not found on {exchange_instance.name or exchange_instance.id}.")
-            return None
+    # Use ccxt's limits.cost.min if available, otherwise fall back to BitMart's min_buy_amount
+    min_notional = float(symbol_info["limits"]["cost"].get("min") or symbol_info.get("min_buy_amount", 0.0))
 
-        # Extract step_size, tick_size, and min_notional
-        # Use ccxt's precision.amount if available, otherwise fall back to BitMart's base_min_size
-        step_size = float(symbol_info["precision"].get("amount", symbol_info.get("base_min_size", 0.00000001)))
+    return quantizer, min_notional
 
-        # Use ccxt's precision.price if available, otherwise fall back to BitMart's quote_increment
-        tick_size = float(symbol_info["precision"].get("price", symbol_info.get("quote_increment", 0.00000001)))
+def reconcile_grid(exchange_instance, symbol, amount, db_session, open_orders=None):
+    """
+    Loads (or creates) the bot config and reconciles stored TP/SL levels with the exchange.
+    `open_orders` may be prefetched by the caller to avoid per-symbol REST calls.
+    Returns (bot_config, (quantizer, min_notional)) or None on failure.
+    """
+    market_params = load_market_params(exchange_instance, symbol)
+    if market_params is None:
+        return None
+    quantizer, min_notional = market_params
 
-        # Use ccxt's limits.cost.min if available, otherwise fall back to BitMart's min_buy_amount
-        min_notional = float(symbol_info["limits"]["cost"].get("min", symbol_info.get("min_buy_amount", 0.0)))
+    bot_config = crud.get_bot_config_by_exchange_symbol(db_session, exchange_instance.id, symbol)
 
-        # Log or use the extracted values
-        bot_config = crud.get_bot_config_by_exchange_symbol(db_session, exchange_instance.id, symbol)
+    if not bot_config:
+        api_key = crud.get_api_key_by_exchange(db_session, exchange_instance.id)
+        if not api_key:
+            logger.error(f"No API key found for exchange {exchange_instance.id}. Please create an API key first.")
+            return None
 
-        if not bot_config:
-            api_key = crud.get_api_key_by_exchange(db_session, exchange_instance.id)
-            if not api_key:
-                logger.error(f"No API key found for exchange {exchange_instance.id}. Please create an API key first.")
-                return None
-
-            symbol_record = crud.add_symbol(db_session, symbol)
-            if symbol_record is None:
-                symbol_record = db_session.query(models.Symbol).filter(models.Symbol.symbol == symbol).first()
-
-            existing_bot_config = db_session.query(models.ExchangeBotConfig).first()
-            if existing_bot_config:
-                config_data = schemas.ExchangeBotConfigCreate(
-                    exchange_id=api_key.id,
-                    symbol_id=symbol_record.id,
-                    amount=existing_bot_config.amount,
-                    tp_percent=existing_bot_config.tp_percent,
-                    sl_percent=existing_bot_config.sl_percent,
-                    tp_levels_json=existing_bot_config.tp_levels_json,
-                    sl_levels_json=existing_bot_config.sl_levels_json
-                )
+        symbol_record = crud.add_symbol(db_session, symbol)
+        if symbol_record is None:
+            symbol_record = db_session.query(models.Symbol).filter(models.Symbol.symbol == symbol).first()
+
+        existing_bot_config = db_session.query(models.ExchangeBotConfig).first()
+        if existing_bot_config:
+            config_data = schemas.ExchangeBotConfigCreate(
+                exchange_id=api_key.id,
+                symbol_id=symbol_record.id,
+                amount=existing_bot_config.amount,
+                tp_percent=existing_bot_config.tp_percent,
+                sl_percent=existing_bot_config.sl_percent,
+                tp_levels_json=existing_bot_config.tp_levels_json,
+                sl_levels_json=existing_bot_config.sl_levels_json
+            )
 
-            bot_config = crud.create_bot_config(db_session, config_data)
+        bot_config = crud.create_bot_config(db_session, config_data)
 
-        tp_percent = bot_config.tp_percent
-        sl_percent = bot_config.sl_percent
+    tp_percent = bot_config.tp_percent
+    sl_percent = bot_config.sl_percent
 
+    if open_orders is None:
         open_orders = exchange_instance.fetch_open_orders(symbol)
-        open_order_prices = {float(o.get('price', 0)) for o in open_orders}
-        tp_levels = json.loads(bot_config.tp_levels_json or '[]')
-        sl_levels = json.loads(bot_config.sl_levels_json or '[]')
-
-        # If no TP/SL levels exist, reset the grid.
-        initialization_success = True
-        if not tp_levels and not sl_levels:
-            logger.info("No TP/SL levels found. Resetting orders.")
+    placed = _write_placed_orders(db_session)
+    levels = GridLevels.load(db_session, bot_config, symbol, quantizer)
+    tp_levels, sl_levels = levels.tps[::-1], levels.sls[::-1]
+
+    # If no TP/SL levels exist, reset the grid.
+    initialization_success = True
+    if not tp_levels and not sl_levels:
+        logger.info("No TP/SL levels found. Resetting orders.")
+        initialization_success = initialize_orders(
+            exchange_instance, symbol, amount, tp_percent, sl_percent,
+            quantizer, min_notional, db_session, bot_config
+        )
+    else:
+        logger.info(f"Checking stored TP: {tp_levels}, stored SL: {sl_levels}")
+        logger.info(f"Open orders found: {[o.get('price', 0) for o in open_orders]}")
+
+        tp_rows = levels.rows('tp', tp_levels)
+        sl_rows = levels.rows('sl', sl_levels)
+        resting, links = _link_open_orders(tp_rows + sl_rows, open_orders, quantizer, bot_config.id)
+        crud.link_order_levels(db_session, links)
+        db_session.commit()
+        _forget_placed_orders(placed)
+        tp_missing = [row for row in tp_rows if row.id not in resting]
+        sl_missing = [row for row in sl_rows if row.id not in resting]
+
+        logger.info(f"tp_missing = {[r.price for r in tp_missing]}, sl_missing = {[r.price for r in sl_missing]}")
+
+        # If no TP levels exist, we need to reset the grid.
+        if not tp_levels:
+            logger.info("No TP levels stored; resetting the grid.")
+            for order in open_orders:
+                order_id = order.get('id')
+                if order_id:
+                    logger.info(f"Cancelling order ID: {order_id} at price {order.get('price', 0)}")
+                    exchange_instance.cancel_order(order_id, symbol)
             initialization_success = initialize_orders(
                 exchange_instance, symbol, amount, tp_percent, sl_percent,
-                step_size, tick_size, min_notional, db_session, bot_config
+                quantizer, min_notional, db_session, bot_config
             )
-        else:
-            logger.info(f"Checking stored TP: {tp_levels}, stored SL: {sl_levels}")
-            logger.info(f"Open orders found: {[o.get('price', 0) for o in open_orders]}")
-
-            tp_missing = [p for p in tp_levels if p not in open_order_prices]
-            sl_missing = [p for p in sl_levels if p not in open_order_prices]
+        # If TP levels exist and all are missing (i.e. fully filled)
+        elif len(tp_missing) == len(tp_levels):
+            logger.info("TP filled; cancelling SL orders & resetting grid.")
+            for order in open_orders:
+                order_id = order.get('id')
+                if order_id:
+                    logger.info(f"Cancelling order ID: {order_id} at price {order.get('price', 0)}")
+                    exchange_instance.cancel_order(order_id, symbol)
+            initialization_success = initialize_orders(
+                exchange_instance, symbol, amount, tp_percent, sl_percent,
+                quantizer, min_notional, db_session, bot_config
+            )
+        # Otherwise, if SL orders are missing, update them...
+        elif sl_missing:
+            logger.info(f"Missing SL detected: {[r.price for r in sl_missing]}")
+            # A re-placement is a new order, so it takes the level's next generation (and client order id)
+            crud.next_order_level_generation(db_session, [r.id for r in sl_missing])
+            db_session.commit()
+            order_ids = []
+            updated_sl_prices = place_limit_buys(exchange_instance, symbol, amount, [r.price for r in sl_missing],
+                                                 quantizer, min_notional, order_ids,
+                                                 [client_order_id(bot_config.id, r.id, r.generation + 1) for r in sl_missing])
+            for row, new_price, order_id in zip(sl_missing, updated_sl_prices, order_ids):
+                crud.update_order_level_order(db_session, row.id, new_price, quantizer.price_to_ticks(new_price), order_id)
+            db_session.commit()
+        # And if only TP orders are missing...
+        elif tp_missing and not sl_missing:
+            logger.info(f"Re-placing missing TP order(s): {[r.price for r in tp_missing]}")
+            base_asset, _ = symbol.split('/')
+            balance = exchange_instance.fetch_balance()
+            base_balance = balance.get(base_asset, {}).get('free')
+            if base_balance > 0:
+                row = tp_missing[0]
+                crud.next_order_level_generation(db_session, [row.id])
+                db_session.commit()
+                order_ids = []
+                new_price = place_limit_sell(exchange_instance, symbol, base_balance, row.price, quantizer, order_ids,
+                                             client_order_id(bot_config.id, row.id, row.generation + 1))
+                crud.update_order_level_order(db_session, row.id, new_price, quantizer.price_to_ticks(new_price),
+                                              order_ids[0] if order_ids else None)
+                db_session.commit()
+            else:
+                logger.warning(f"Insufficient balance for {base_asset} to place TP order.")
 
-            logger.info(f"tp_missing = {tp_missing}, sl_missing = {sl_missing}")
+    # If initialization failed, don't start the websocket
+    if not initialization_success:
+        logger.error("Order initialization failed. Not starting WebSocket.")
+        return None
 
-            # If no TP levels exist, we need to reset the grid.
-            if not tp_levels:
-                logger.info("No TP levels stored; resetting the grid.")
-                for order in open_orders:
-                    order_id = order.get('id')
-                    if order_id:
-                        logger.info(f"Cancelling order ID: {order_id} at price {order.get('price', 0)}")
-                        exchange_instance.cancel_order(order_id, symbol)
-                initialization_success = initialize_orders(
-                    exchange_instance, symbol, amount, tp_percent, sl_percent,
-                    step_size, tick_size, min_notional, db_session, bot_config
-                )
-            # If TP levels exist and all are missing (i.e. fully filled)
-            elif len(tp_missing) == len(tp_levels):
-                logger.info("TP filled; cancelling SL orders & resetting grid.")
-                for order in open_orders:
-                    order_id = order.get('id')
-                    if order_id:
-                        logger.info(f"Cancelling order ID: {order_id} at price {order.get('price', 0)}")
-                        exchange_instance.cancel_order(order_id, symbol)
-                initialization_success = initialize_orders(
-                    exchange_instance, symbol, amount, tp_percent, sl_percent,
-                    step_size, tick_size, min_notional, db_session, bot_config
-                )
-            # Otherwise, if SL orders are missing, update them...
-            elif sl_missing:
-                logger.info(f"Missing SL detected: {sl_missing}")
-                updated_sl_prices = place_limit_buys(exchange_instance, symbol, amount, sl_missing, step_size, min_notional)
-                for i, old_price in enumerate(sl_missing):
-                    new_price = updated_sl_prices[i]
-                    index_in_sl = sl_levels.index(old_price)
-                    sl_levels[index_in_sl] = new_price
-                bot_config.sl_levels_json = json.dumps(sl_levels)
-                db_session.commit()
-            # And if only TP orders are missing...
-            elif tp_missing and not sl_missing:
-                logger.info(f"Re-placing missing TP order(s): {tp_missing}")
-                base_asset, _ = symbol.split('/')
-                balance = exchange_instance.fetch_balance()
-                base_balance = balance.get(base_asset, {}).get('free')
-                if base_balance > 0:
-                    missing_tp_price = tp_missing[0]
-                    new_price = place_limit_sell(exchange_instance, symbol, base_balance, missing_tp_price, step_size)
-                    idx = tp_levels.index(missing_tp_price)
-                    tp_levels[idx] = new_price
-                    bot_config.tp_levels_json = json.dumps(tp_levels)
-                    db_session.commit()
-                else:
-                    logger.warning(f"Insufficient balance for {base_asset} to place TP order.")
+    return bot_config, market_params
 
-        # If initialization failed, don't start the websocket
-        if not initialization_success:
-            logger.error("Order initialization failed. Not starting WebSocket.")
-            return None
+def start_grid_websocket(exchange_instance, symbol, bot_config, amount, market_params, db_session, bot_instance):
+    """
+    Opens the user-data WebSocket for an already reconciled grid and registers it on the bot.
+    """
+    quantizer, min_notional = market_params
+    tp_percent = bot_config.tp_percent
+    sl_percent = bot_config.sl_percent
+    exchange_id = exchange_instance.id.lower()
+
+    if exchange_id == "binance":
+        ws = start_binance_websocket(
+            exchange_instance, symbol, bot_config.id, amount,
+            quantizer, min_notional, sl_percent, tp_percent, True, db_session,
+            registry=bot_instance.websocket_connections
+        )
+    elif exchange_id == "bitmart":
+        ws = start_bitmart_websocket(
+            exchange_instance, symbol, bot_config.id, amount,
+            quantizer, min_notional, sl_percent, tp_percent,
+            registry=bot_instance.websocket_connections
+        )
+    elif exchange_id == "gateio":
+        ws = start_gateio_websocket(
+            exchange_instance, symbol, bot_config.id, amount,
+            quantizer, min_notional, sl_percent, tp_percent,
+            registry=bot_instance.websocket_connections
+        )
+    elif exchange_id == "bybit":
+        ws = start_bybit_websocket(
+            exchange_instance,
+            symbol,
+            bot_config.id,
+            amount,
+            quantizer,
+            min_notional,
+            bot_instance.websocket_connections,      # ← registry dict
+            sl_buffer_percent=sl_percent,    # now floats go into the right params
+            sell_rebound_percent=tp_percent,
+            auto_reconnect=True,
+            db_session=db_session
+        )
+    else:
+        logger.warning(f"No websocket method implemented for exchange: {exchange_id}")
+        return None
 
-        exchange_id = exchange_instance.id.lower()
-        
-        if exchange_id == "binance":
-            ws = start_binance_websocket(
-                exchange_instance, symbol, bot_config.id, amount,
-                step_size, tick_size, min_notional, sl_percent, tp_percent, True, db_session
-            )
-        elif exchange_id == "bitmart":
-            ws = start_bitmart_websocket(
-                exchange_instance, symbol, bot_config.id, amount,
-                step_size, tick_size, min_notional, sl_percent, tp_percent
-            )
-        elif exchange_id == "gateio":
-            ws = start_gateio_websocket(
-                exchange_instance, symbol, bot_config.id, amount,
-                step_size, tick_size, min_notional, sl_percent, tp_percent
-            )
-        elif exchange_id == "bybit":
-            ws = start_bybit_websocket(
-                exchange_instance,
-                symbol,
-                bot_config.id,
-                amount,
-                step_size,
-                tick_size,
-                min_notional,
-                bot_instance.websocket_connections,      # ← registry dict
-                sl_buffer_percent=sl_percent,    # now floats go into the right params
-                sell_rebound_percent=tp_percent,
-                auto_reconnect=True,
-                db_session=db_session
-            )
-        else:
-            logger.warning(f"No websocket method implemented for exchange: {exchange_id}")
-            return None
+    if ws is None:
+        return None
+    if not hasattr(bot_instance, 'websocket_connections'):
+        bot_instance.websocket_connections = {}
+    bot_instance.websocket_connections[(exchange_instance.id, symbol)] = ws
 
-        if not hasattr(bot_instance, 'websocket_connections'):
-            bot_instance.websocket_connections = {}
-        bot_instance.websocket_connections[(exchange_instance.id, symbol)] = ws
+    return ws
 
+def run_bot_with_websocket(exchange_instance, symbol, amount, db_session, bot_instance):
+    try:
+        market_data.subscribe(exchange_instance.id, symbol)  # streams in while the grid is reconciled
+        reconciled = reconcile_grid(exchange_instance, symbol, amount, db_session)
+        ws = None
+        if reconciled is not None:
+            bot_config, market_params = reconciled
+            ws = start_grid_websocket(
+                exchange_instance, symbol, bot_config, amount, market_params, db_session, bot_instance
+            )
+        if ws is None:
+            market_data.unsubscribe(exchange_instance.id, symbol)
         return ws
     except Exception as e:
         logger.exception(f"Error encountered: {repr(e)}")
+        market_data.unsubscribe(exchange_instance.id, symbol)
         return None
 
     finally:
         db_session.close()
 
 def initialize_orders(exchange, symbol, amount, tp_percent, sl_percent,
-                      step_size, tick_size, min_notional, db_session, bot_config):
+                      quantizer, min_notional, db_session, bot_config):
     """
-    Creates fresh orders (1 Market Buy, 1 TP, 3 SL).
+    Creates fresh orders: 1 market buy, GRID_TP_LEVELS TPs and GRID_SL_LEVELS SLs (1 and 3 by default).
     """
     base_asset, quote_asset = symbol.split('/')
-    current_price = exchange.fetch_ticker(symbol)['last']
-    order_size = math.floor((amount / current_price) / step_size) * step_size
+    current_price = market_data.price(exchange, symbol)
+    order_size = quantizer.floor_amount(amount / current_price)
 
     if min_notional and order_size * current_price < min_notional:
         logger.error("Order size below min_notional; cannot proceed.")
         return False
 
-    params = {}
+    # The entry buy is level 0; the newest level id makes its client order id differ per reset
+    params = {'clientOrderId': client_order_id(bot_config.id, ENTRY_LEVEL,
+                                               crud.last_order_level_id(db_session, bot_config.id))}
     if exchange.id == 'gateio' or exchange.id == 'bitmart':
         params['createMarketBuyOrderRequiresPrice'] = False
 
@@ -242,6 +320,10 @@ def initialize_orders(exchange, symbol, amount, tp_percent, sl_percent,
         return False
 
     # --- Proceed with market buy ---
+    if exchange.id not in ('bitmart', 'gateio'):
+        # Re-size from the price as of now, not as of before the close-out above
+        current_price = market_data.price(exchange, symbol)
+        order_size = quantizer.floor_amount(amount / current_price)
     try:
         market_order = exchange.create_market_buy_order(symbol, order_size, params=params)
         logger.info(f"{exchange.id}: Market buy executed: {order_size} {base_asset} @ {current_price}")
@@ -251,173 +333,270 @@ def initialize_orders(exchange, symbol, amount, tp_percent, sl_percent,
         return False
 
     # The "intended" prices
-    intended_tp = round_price(current_price * (1 + tp_percent / 100), tick_size)
-    intended_sls = [
-        round_price(current_price * (1 - sl_percent / 100) ** (i + 1), tick_size)
-        for i in range(3)
-    ]
-    
+    intended_tps = [quantizer.round_price(p) for p in tp_prices(current_price, tp_percent)]
+    intended_sls = [quantizer.round_price(p) for p in sl_prices(current_price, sl_percent)]
+
     # Wait briefly for the market order to settle
     time.sleep(1)
-    
+
     balance = exchange.fetch_balance()
     base_balance = balance.get(base_asset, {}).get('free', order_size)  # Avoid KeyError
     logger.info(f"Base balance after market buy: {base_balance} {base_asset}")
 
-    # Place TP & SL orders, then store them directly in the bot config
-    actual_tp_price = place_limit_sell(exchange, symbol, base_balance, intended_tp, step_size)
-    actual_sl_prices = place_limit_buys(exchange, symbol, amount, intended_sls, step_size, min_notional)
-
-    # Update bot config with arrays directly
-    bot_config.tp_levels_json = json.dumps([actual_tp_price])
-    bot_config.sl_levels_json = json.dumps(actual_sl_prices)
-
-    logger.info(f"Started Grid: TP Level: {bot_config.tp_levels_json} / Stop Loss Levels: {bot_config.sl_levels_json}")
+    # Store the TP & SL levels first, so each order is placed with its level's client order id
+    levels = GridLevels.for_grid(bot_config, symbol, quantizer)
+    for price in intended_tps:
+        levels.add_tp(price)
+    for price in intended_sls:
+        levels.add_sl(price)
+    crud.close_order_levels(db_session, bot_config.id)  # the previous grid's levels
+    added = levels.save(db_session)
+    db_session.commit()
+    tp_rows = [row for row in added if row.order_type == 'tp']
+    sl_rows = [row for row in added if row.order_type == 'sl']
+
+    # Place them (the position split evenly over the TPs), then record the orders on the levels
+    tp_amount = base_balance / len(intended_tps)
+    tp_ids, sl_ids = [], []
+    actual_tp_prices = place_limit_sells(exchange, symbol, [(tp_amount, p) for p in intended_tps], quantizer, tp_ids,
+                                         [client_order_id(bot_config.id, row.id) for row in tp_rows])
+    actual_sl_prices = place_limit_buys(exchange, symbol, amount, intended_sls, quantizer, min_notional, sl_ids,
+                                        [client_order_id(bot_config.id, row.id) for row in sl_rows])
+    for row, price, order_id in zip(tp_rows + sl_rows, actual_tp_prices + actual_sl_prices, tp_ids + sl_ids):
+        if order_id is not None or price != row.price:
+            crud.update_order_level_order(db_session, row.id, price, quantizer.price_to_ticks(price), order_id)
+
+    logger.info(f"Started Grid: {levels!r}")
     db_session.commit()
     return True
 
 
-def place_limit_sell(exchange, symbol, amount, price, step_size):
-    # Convert values to Decimal for precise comparisons and calculations
-    amount = Decimal(str(amount)).quantize(Decimal(str(step_size)), rounding=ROUND_DOWN)  # Fix precision
-    price = Decimal(str(price))  # Convert price to Decimal
-    min_amount = Decimal(str(step_size))  # Minimum valid amount
-    
+def _link_open_orders(rows, open_orders, quantizer, grid_id=None):
+    """
+    Joins level rows to the exchange's open orders by order id. Returns the ids of the rows
+    whose order is still open and {level_id: order_id} for rows linked here: a row whose
+    order id was never written (e.g. a crash right after placing) takes the open order
+    carrying its client order id, and a row with no order id at all (e.g. moved from the
+    legacy JSON arrays) an unclaimed open order on its side at the same price in ticks.
+    """
+    open_ids = {str(o['id']) for o in open_orders if o.get('id') is not None}
+    resting = {row.id for row in rows if row.order_id in open_ids}
+    claimed = {row.order_id for row in rows if row.order_id}
+    links = {}
+    if grid_id is not None:
+        placed = {(row.id, row.generation): row for row in rows if row.id not in resting}
+        for o in open_orders:
+            ids = parse_client_order_id(o.get('clientOrderId'))
+            row = placed.pop((ids.level, ids.generation), None) if ids and ids.grid == grid_id else None
+            if row is not None and str(o['id']) not in claimed:
+                links[row.id] = str(o['id'])
+                claimed.add(str(o['id']))
+                resting.add(row.id)
+    unlinked = {}
+    for row in rows:
+        if row.order_id is None and row.id not in resting:
+            unlinked.setdefault((row.side, row.price_ticks), []).append(row)
+    if not unlinked:
+        return resting, links
+    for o in open_orders:
+        order_id = str(o.get('id'))
+        key = ((o.get('side') or '').lower(), quantizer.price_to_ticks(float(o.get('price') or 0)))
+        if order_id in claimed or not unlinked.get(key):
+            continue
+        row = unlinked[key].pop()
+        links[row.id] = order_id
+        claimed.add(order_id)
+        resting.add(row.id)
+    return resting, links
+
+def place_limit_sell(exchange, symbol, amount, price, quantizer, order_ids=None, client_id=None):
+    """
+    Places a limit sell and returns its price as placed. The order id, if one is placed, is
+    appended to `order_ids` when given. With a `client_id` a failed attempt is retried safely
+    (see _create_limit_order).
+    """
+    # Work in whole steps so the amount is exact without building Decimals
+    steps = quantizer.amount_to_steps(amount)
+    price = float(price)
+
     # Check for minimum valid amount (prevent zero or very small amounts)
-    if amount <= Decimal('0') or amount < min_amount:
-        logger.error(f"{exchange.id}: Cannot place sell order - amount {amount} is too small (minimum: {step_size})")
-        return float(price)  # Return original price without placing order
+    if steps < 1:
+        logger.error("%s: Cannot place sell order - amount %s is too small (minimum: %s)", exchange.id, amount, quantizer.step_size)
+        return price  # Return original price without placing order
+    amount = quantizer.steps_to_amount(steps)
     
     params = {}
     if exchange.id == "bybit":
         params["timeInForce"] = "GTC"  # Ensure order stays active until filled
     
     try:
-        logger.info(f"{exchange.id}: Attempting to place sell order: {float(amount)} @ {float(price)}")
-        order = exchange.create_limit_sell_order(symbol, float(amount), float(price), params=params)
+        logger.info("%s: Attempting to place sell order: %s @ %s", exchange.id, amount, price)
+        order = _create_limit_order(exchange, symbol, "sell", amount, price, params, client_id)
+        if order_ids is not None and isinstance(order, dict) and order.get("id") is not None:
+            order_ids.append(str(order["id"]))
         # Special handling for Bybit
         if exchange.id == "bybit":
-            logger.info(f"{exchange.id}: Limit sell placed: {amount} @ {float(price)}")
-            return float(price)  # Always return the original price for Bybit
+            logger.info("%s: Limit sell placed: %s @ %s", exchange.id, amount, price)
+            return price  # Always return the original price for Bybit
         elif order and isinstance(order, dict) and "price" in order:
             final_price = float(order["price"])
-            logger.info(f"{exchange.id}: Limit sell placed: {amount} @ {final_price}")
+            logger.info("%s: Limit sell placed: %s @ %s", exchange.id, amount, final_price)
             return final_price
         else:
-            logger.error(f"Limit sell order creation returned unexpected response: {order}")
-            return float(price)  # Fallback
+            logger.error("Limit sell order creation returned unexpected response: %s", order)
+            return price  # Fallback
     except Exception as e:
-        logger.error(f"{exchange.id}: Limit sell error {amount} @ {price}: {repr(e)}")
-        return float(price)  # Fallback
+        logger.error("%s: Limit sell error %s @ %s: %r", exchange.id, amount, price, e)
+        return price  # Fallback
     
-def place_limit_buys(exchange, symbol, total_usdt, prices, step_size, min_notional):
+def place_limit_sells(exchange, symbol, orders, quantizer, order_ids=None, client_ids=None):
+    """
+    Places an (amount, price) limit sell per entry in `orders`. Returns the prices as placed;
+    `order_ids`, when given, gets the order id of each entry (None where nothing was placed).
+    `client_ids`, when given, are the entries' client order ids.
+    """
     final_prices = []
+    client_ids = list(client_ids or ())
+    for i, (amount, price) in enumerate(orders):
+        placed = []
+        client_id = client_ids[i] if i < len(client_ids) else None
+        final_prices.append(place_limit_sell(exchange, symbol, amount, price, quantizer, placed, client_id))
+        if order_ids is not None:
+            order_ids.append(placed[0] if placed else None)
+    return final_prices
+
+def place_limit_buys(exchange, symbol, total_usdt, prices, quantizer, min_notional, order_ids=None, client_ids=None):
+    """
+    Splits `total_usdt` into a limit buy at each price. Returns the prices as placed;
+    `order_ids`, when given, gets the order id of each price (None where nothing was placed).
+    `client_ids`, when given, are the prices' client order ids.
+    """
+    final_prices = []
+    placed_ids = {}
+    client_ids = list(client_ids or ())
     
     # Validate inputs to prevent downstream errors
     if not prices or len(prices) == 0:
-        logger.error(f"{exchange.id}: No prices provided for limit buys")
+        logger.error("%s: No prices provided for limit buys", exchange.id)
         return []
         
     if total_usdt <= 0:
-        logger.error(f"{exchange.id}: Invalid total_usdt amount: {total_usdt}")
+        logger.error("%s: Invalid total_usdt amount: %s", exchange.id, total_usdt)
+        if order_ids is not None:
+            order_ids.extend(None for _ in prices)
         return [float(p) for p in prices]
     
     for p in prices:
-        p = Decimal(str(p))  # Ensure price is also a Decimal
+        p = float(p)
         
         # Skip invalid prices
         if p <= 0:
-            logger.error(f"{exchange.id}: Invalid price {p} for limit buy")
-            final_prices.append(float(p))
+            logger.error("%s: Invalid price %s for limit buy", exchange.id, p)
+            final_prices.append(p)
             continue
             
-        amount = Decimal(total_usdt) / p  # Convert total_usdt to Decimal before division
-        amount = amount.quantize(Decimal(str(step_size)), rounding=ROUND_DOWN)  # Fix precision
+        steps = quantizer.amount_to_steps(total_usdt / p)  # Whole steps, rounded down
         
         # Check for minimum valid amount
-        if amount <= Decimal('0') or amount < Decimal(str(step_size)):
-            logger.error(f"{exchange.id}: Cannot place buy order @ {p} - calculated amount {amount} is too small (minimum: {step_size})")
-            final_prices.append(float(p))  # Add the original price without placing an order
+        if steps < 1:
+            logger.error("%s: Cannot place buy order @ %s - calculated amount %s is too small (minimum: %s)", exchange.id, p, total_usdt / p, quantizer.step_size)
+            final_prices.append(p)  # Add the original price without placing an order
             continue
+        amount = quantizer.steps_to_amount(steps)
         
         params = {}
         if exchange.id == "bybit":
             params["timeInForce"] = "GTC"  # Ensure order stays active until filled
         
-        min_notional_decimal = Decimal(str(min_notional)) if min_notional else Decimal('0')
-        if not min_notional_decimal or (amount * p) >= min_notional_decimal:  # Convert min_notional to Decimal
+        if not min_notional or amount * p >= min_notional:
             try:
-                logger.info(f"{exchange.id}: Attempting to place buy order: {float(amount)} @ {float(p)}")
-                order = exchange.create_limit_buy_order(symbol, float(amount), float(p), params=params)
+                logger.info("%s: Attempting to place buy order: %s @ %s", exchange.id, amount, p)
+                i = len(final_prices)
+                order = _create_limit_order(exchange, symbol, "buy", amount, p, params,
+                                            client_ids[i] if i < len(client_ids) else None)
+                if isinstance(order, dict) and order.get("id") is not None:
+                    placed_ids[len(final_prices)] = str(order["id"])
                 # Special handling for Bybit
                 if exchange.id == "bybit":
-                    logger.info(f"{exchange.id}: Limit buy placed: {amount} @ {float(p)}")
-                    final_prices.append(float(p))  # Always return the original price for Bybit
+                    logger.info("%s: Limit buy placed: %s @ %s", exchange.id, amount, p)
+                    final_prices.append(p)  # Always return the original price for Bybit
                 elif order and isinstance(order, dict) and "price" in order:
                     final_price = float(order["price"])
-                    logger.info(f"{exchange.id}: Limit buy placed: {amount} @ {final_price}")
+                    logger.info("%s: Limit buy placed: %s @ %s", exchange.id, amount, final_price)
                     final_prices.append(final_price)
                 else:
-                    logger.error(f"Limit buy order creation returned unexpected response: {order}")
-                    final_prices.append(float(p))  # Fallback
+                    logger.error("Limit buy order creation returned unexpected response: %s", order)
+                    final_prices.append(p)  # Fallback
             except Exception as e:
-                logger.error(f"{exchange.id}: Limit buy error @ {p}: {repr(e)}")
-                final_prices.append(float(p))  # Convert Decimal back to float for consistency
+                logger.error("%s: Limit buy error @ %s: %r", exchange.id, p, e)
+                final_prices.append(p)
         else:
-            logger.warning(f"Skipping SL @ {p} due to min_notional check.")
-            final_prices.append(float(p))
+            logger.warning("Skipping SL @ %s due to min_notional check.", p)
+            final_prices.append(p)
 
+    if order_ids is not None:
+        order_ids.extend(placed_ids.get(i) for i in range(len(final_prices)))
     return final_prices
 
-def get_binance_listen_key(api_key):
-    """ Get a listenKey from Binance via POST /api/v3/userDataStream. """
-    url = "https://api.binance.com/api/v3/userDataStream"
-    headers = {
-        "X-MBX-APIKEY": api_key
-    }
-    try:
-        response = requests.post(url, headers=headers, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        return data["listenKey"]
-    except Exception as e:
-        raise RuntimeError(f"Error fetching listenKey: {e}")
-
-def keepalive_binance_listen_key(api_key, listen_key):
-    """ Keep a listenKey alive via PUT /api/v3/userDataStream """
-    url = "https://api.binance.com/api/v3/userDataStream"
-    headers = {
-        "X-MBX-APIKEY": api_key
-    }
-    params = {
-        "listenKey": listen_key
-    }
-    try:
-        response = requests.put(url, headers=headers, params=params, timeout=5)
-        response.raise_for_status()
-        logger.info(f"✅ Successfully kept listenKey alive: {listen_key}")
-    except Exception as e:
-        logger.error(f"❌ Failed to keep listenKey alive: {e}")
-
-def schedule_listen_key_keepalive(api_key, listen_key, interval=1800):
+def _create_limit_order(exchange, symbol, side, amount, price, params, client_id=None):
     """
-    Schedule the keep-alive call every `interval` seconds (default 30 min).
-    Continues until program exit or you stop it manually.
+    Places a limit order. With a `client_id`, network errors and timeouts are retried up to
+    ORDER_RETRIES times under the same id. Each retry first looks the id up among the open
+    orders and those filled since the first attempt, as does an exchange's duplicate-id
+    rejection, so an attempt that did reach the exchange (even one that filled at once) is
+    returned instead of placed twice.
     """
-    def keepalive_loop():
-        while True:
-            keepalive_binance_listen_key(api_key, listen_key)
-            time.sleep(interval)
-
-    t = threading.Thread(target=keepalive_loop, daemon=True)
-    t.start()
+    create = exchange.create_limit_buy_order if side == "buy" else exchange.create_limit_sell_order
+    if client_id is None:
+        return create(symbol, amount, price, params=params)
+    params = dict(params, clientOrderId=client_id)
+    since = int(time.time() * 1000) - ORDER_LOOKUP_SLACK_MS
+    for attempt in range(ORDER_RETRIES + 1):
+        try:
+            if attempt:
+                time.sleep(ORDER_RETRY_DELAY * attempt)
+                order = _find_order(exchange, symbol, client_id, since)
+                if order is not None:
+                    logger.info("%s: %s order %s was placed after all", exchange.id, side, client_id)
+                    return order
+            return create(symbol, amount, price, params=params)
+        except InvalidOrder as e:
+            if not _is_duplicate_order(e):
+                raise
+            order = _find_order(exchange, symbol, client_id, since)
+            if order is None:
+                raise
+            return order
+        except NetworkError as e:
+            if attempt == ORDER_RETRIES:
+                raise
+            logger.warning("%s: %s order %s failed (%r); retrying", exchange.id, side, client_id, e)
+
+def _is_duplicate_order(error):
+    """Whether the exchange rejected an order for reusing a client order id."""
+    return isinstance(error, DuplicateOrderId) or any(marker in str(error) for marker in DUPLICATE_ORDER_MARKERS)
+
+def _find_order(exchange, symbol, client_id, since):
+    """The order placed with `client_id`, open or filled at or after `since` (ms), if any."""
+    wanted = parse_client_order_id(client_id)
+    for order in exchange.fetch_open_orders(symbol):
+        if parse_client_order_id(order.get('clientOrderId')) == wanted:
+            return order
+    # Replacement orders are often marketable, so the lost attempt may have filled already
+    for order in fetch_filled_orders(exchange, symbol, since):
+        if parse_client_order_id(order.get('clientOrderId')) == wanted:
+            return order
+    return None
 
 def start_binance_websocket(exchange_instance, symbol, bot_config_id, amount,
-                            step_size, tick_size, min_notional,
+                            quantizer, min_notional,
                             sl_buffer_percent=2.0, sell_rebound_percent=1.5,
-                            auto_reconnect=True, db_session=None):
+                            auto_reconnect=True, db_session=None, connect=True, registry=None):
     """
     Starts a Binance WebSocket connection for user data stream.
+    With connect=False the app is only built (no listenKey, no thread), e.g. for frame replay.
+    The listenKey comes from the API key's ListenKeyManager, shared with its other sockets.
+    Reconnects go through `reconnects` and replace the app in `registry`, if given.
     """
 
     # ✅ Fetch bot config from the database
@@ -432,28 +611,46 @@ def start_binance_websocket(exchange_instance, symbol, bot_config_id, amount,
 
     api_key = bot_config.exchange_api_key.api_key  # ✅ Get the API key correctly
 
-    # 🔥 Get listenKey manually
-    try:
-        listen_key = get_binance_listen_key(api_key)
-    except Exception as e:
-        logger.error(f"❌ Failed to get listenKey: {e}")
-        session.close()
-        return None
-
-    # ✅ Start the keep-alive scheduling in the background
-    schedule_listen_key_keepalive(api_key, listen_key, interval=1800)  # 30 min
+    key = (exchange_instance.id, symbol)
+    listen_key = "replay"
+    keys = None
+    if connect:
+        # 🔥 One listenKey per API key, kept alive once for all of its sockets
+        keys = listen_keys.manager(api_key, BINANCE_API_URL)
+        try:
+            listen_key = keys.acquire(key)
+        except Exception as e:
+            logger.error(f"❌ Failed to get listenKey: {e}")
+            session.close()
+            return None
 
-    ws_url = f"wss://stream.binance.com:9443/ws/{listen_key}"
+    ws_url = f"{BINANCE_WS_URL}/{listen_key}"
     session.close()  # ✅ Close session after fetching config
+    opened = {"value": False}
+    recover = _recovered_fill(exchange_instance, symbol, bot_config_id, amount, quantizer, min_notional,
+                              sl_buffer_percent, sell_rebound_percent)
 
     def on_open(ws):
         logger.info(f"✅ WebSocket connected to {ws_url}")
+        opened["value"] = True
+        reconnects.connected(key)
+        gap_recovery.reconnected(key, exchange_instance, symbol, recover)
+        heartbeats.register(ws, key, lambda ws: ws.sock.ping(), *HEARTBEATS["binance"])
+
+    stream_name = f"binance:{symbol}"
+    received = metrics.WS_MESSAGES_RECEIVED.labels("binance")
 
     def on_message(ws, message):
+        received_ns = time.time_ns()
+        if frame_log.frame_recorder is not None:
+            frame_log.frame_recorder.record(stream_name, message)
+        received.inc()
+        heartbeats.seen(ws)
         try:
             data = json.loads(message)
         except Exception as e:
-            logger.error(f"❌ Error parsing message: {e}")
+            metrics.WS_MESSAGES_DROPPED.labels("binance", "decode").inc()
+            logger.error("❌ Error parsing message: %s", e)
             return
 
         # Respond to ping messages.
@@ -461,31 +658,44 @@ def start_binance_websocket(exchange_instance, symbol, bot_config_id, amount,
             ws.send(json.dumps({"pong": data["ping"]}))
             return
 
+        # The stream ends with its key; the reconnect gets a new one
+        if data.get("e") == "listenKeyExpired":
+            if keys is not None:
+                keys.expired(listen_key)
+            ws.close()
+            return
+
         # Only process executionReport events with FILLED status.
         if data.get("e") != "executionReport" or data.get("X") != "FILLED" or data.get("s") != symbol.replace("/", ""):
             return
 
         try:
-            logger.info(f"Binance: Order filled: {data}")
+            logger.info("Binance: Order filled: %s", data)
             current_price = float(data.get("L"))
         except Exception as e:
-            logger.error(f"❌ Error extracting current price: {e}")
+            metrics.WS_MESSAGES_DROPPED.labels("binance", "error").inc()
+            logger.error("❌ Error extracting current price: %s", e)
             return
 
-        process_order_update(
-            exchange_instance, symbol, bot_config_id, amount,
-            step_size, tick_size, min_notional,
-            sl_buffer_percent, sell_rebound_percent,
-            current_price
-        )
-        # Now, process the trade record: normalize and store the trade (with PnL calculation, etc.)
-        try:
-            
-            # Use the API key's id from the bot config since it's stored there:
-            exchange_api_key_id = bot_config.exchange_api_key.id
-            process_trade_message("binance", data, db_session, exchange_api_key_id)
-        except Exception as e:
-            logger.error(f"Error processing trade message: {e}")
+        def apply():
+            trace = fill_tracer.start("binance", symbol, data.get("i"), data.get("T") or data.get("E"), received_ns)
+            trace.add_span("decode", received_ns, time.time_ns())
+            process_order_update(
+                exchange_instance, symbol, bot_config_id, amount,
+                quantizer, min_notional,
+                sl_buffer_percent, sell_rebound_percent,
+                current_price, trace=trace, client_id=data.get("c")
+            )
+            # Now, process the trade record: normalize and store the trade (with PnL calculation, etc.)
+            try:
+
+                # Use the API key's id from the bot config since it's stored there:
+                exchange_api_key_id = bot_config.exchange_api_key.id
+                process_trade_message("binance", data, db_session, exchange_api_key_id)
+            except Exception as e:
+                logger.error("Error processing trade message: %s", e)
+
+        gap_recovery.fill(key, data.get("i"), data.get("T") or data.get("E"), apply)
             
     def on_error(ws, error):
         logger.error(f"🚨 Binance WebSocket error: {error}")
@@ -495,38 +705,51 @@ def start_binance_websocket(exchange_instance, symbol, bot_config_id, amount,
 
     def on_close(ws, close_status_code, close_msg):
         logger.info(f"❌ Binance WebSocket closed: {close_status_code}, {close_msg}")
+        heartbeats.unregister(ws)
 
         # ✅ Close WebSocket connection explicitly
         ws.close()
+        if keys is not None:
+            if not opened["value"]:
+                keys.expired(listen_key)  # the key may be what was refused
+            keys.release(key)
 
         # If auto_reconnect is disabled, close orders and stop
         if not getattr(ws, "auto_reconnect", True):
             logger.info("Binance: Forced closure detected; closing orders.")
-            close_and_sell_all(exchange_instance, symbol)
+            _close_grid(ws, exchange_instance, symbol)
             return
         else:
             logger.info("Binance: Connection lost but auto-reconnect is enabled; preserving orders.")
+            gap_recovery.disconnected(key)
 
-        reconnect_delay = 5  # seconds
-        logger.info(f"Binance: Attempting to reconnect in {reconnect_delay} seconds...")
-        
-        threading.Timer(
-            reconnect_delay,
-            lambda: start_binance_websocket(
+        def reconnect():
+            if not getattr(ws, "auto_reconnect", True):
+                return ws  # stopped while waiting
+            new_ws = start_binance_websocket(
                 exchange_instance, symbol, bot_config_id, amount,
-                step_size, tick_size, min_notional,
+                quantizer, min_notional,
                 sl_buffer_percent, sell_rebound_percent,
                 auto_reconnect=auto_reconnect,
-                db_session=db_session  
+                db_session=db_session,
+                registry=registry
             )
-        ).start()
+            if new_ws is not None and registry is not None:
+                registry[key] = new_ws
+            return new_ws
+
+        reconnects.schedule(key, reconnect)
 
     ws = websocket.WebSocketApp(ws_url,
                                 on_open=on_open,
                                 on_message=on_message,
                                 on_error=on_error,
-                                on_close=on_close)
+                                on_close=on_close,
+                                on_ping=lambda ws, data: heartbeats.seen(ws),
+                                on_pong=lambda ws, data: heartbeats.seen(ws))
     ws.auto_reconnect = auto_reconnect
+    if not connect:
+        return ws
 
     wst = threading.Thread(target=ws.run_forever, daemon=True)
     wst.start()
@@ -535,11 +758,13 @@ def start_binance_websocket(exchange_instance, symbol, bot_config_id, amount,
     return ws
 
 def start_bitmart_websocket(exchange_instance, symbol, bot_config_id, amount,
-                              step_size, tick_size, min_notional, 
+                              quantizer, min_notional, 
                               sl_buffer_percent=2.0, sell_rebound_percent=1.5,
-                              auto_reconnect=True, db_session=None):
+                              auto_reconnect=True, db_session=None, connect=True, registry=None):
     """
     Starts a BitMart WebSocket connection with authentication.
+    With connect=False the app is only built and not run, e.g. for frame replay.
+    Reconnects go through `reconnects` and replace the app in `registry`, if given.
     """
     # Retrieve API credentials from DB.
     session = db_session or SessionLocal()
@@ -554,15 +779,12 @@ def start_bitmart_websocket(exchange_instance, symbol, bot_config_id, amount,
     api_secret = bot_config.exchange_api_key.api_secret
     api_memo = "bua"  # as defined in your original logic
     session.close()
+    key = (exchange_instance.id, symbol)
+    recover = _recovered_fill(exchange_instance, symbol, bot_config_id, amount, quantizer, min_notional,
+                              sl_buffer_percent, sell_rebound_percent)
 
-    # Ping/Pong configuration
-    PING_INTERVAL = 10  # Reduced from 15 to 10 seconds
-    PONG_TIMEOUT = 20   # Increased from 15 to 20 seconds
-    MAX_RETRIES = 3     # Maximum number of consecutive pong timeouts before closing
-
-    # Add a set to track processed order IDs
-    processed_orders = set()
-    pong_timeout_count = 0  # Track consecutive pong timeouts
+    # Processed order IDs, oldest first, so the cap evicts old ones instead of forgetting all
+    processed_orders = OrderedDict()
 
     def generate_sign(timestamp: str, memo: str, secret: str) -> str:
         message = f"{timestamp}#{memo}#bitmart.WebSocket"
@@ -570,49 +792,7 @@ def start_bitmart_websocket(exchange_instance, symbol, bot_config_id, amount,
                         message.encode("utf-8"),
                         digestmod=hashlib.sha256).hexdigest()
 
-    def reset_ping_timer(ws):
-        if hasattr(ws, "ping_timer") and ws.ping_timer is not None:
-            ws.ping_timer.cancel()
-        ws.ping_timer = threading.Timer(PING_INTERVAL, lambda: ping_handler(ws))
-        ws.ping_timer.daemon = True
-        ws.ping_timer.start()
-
-    def ping_handler(ws):
-        try:
-            if not ws.sock or not ws.sock.connected:
-                logger.warning("WebSocket not connected, skipping ping")
-                return
-                
-            ws.send("ping")
-            ws.waiting_for_pong = True
-            ws.pong_timer = threading.Timer(PONG_TIMEOUT, lambda: pong_timeout_handler(ws))
-            ws.pong_timer.daemon = True
-            ws.pong_timer.start()
-        except Exception as e:
-            logger.error(f"Error sending ping: {e}")
-
-    def pong_timeout_handler(ws):
-        nonlocal pong_timeout_count
-        if getattr(ws, "waiting_for_pong", False):
-            pong_timeout_count += 1
-            logger.warning(f"Pong not received in time. Timeout count: {pong_timeout_count}/{MAX_RETRIES}")
-            
-            if pong_timeout_count >= MAX_RETRIES:
-                logger.error("Max pong timeouts reached, closing connection...")
-                ws.close()
-            else:
-                # Try to send another ping
-                try:
-                    if ws.sock and ws.sock.connected:
-                        ws.send("ping")
-                        ws.pong_timer = threading.Timer(PONG_TIMEOUT, lambda: pong_timeout_handler(ws))
-                        ws.pong_timer.daemon = True
-                        ws.pong_timer.start()
-                except Exception as e:
-                    logger.error(f"Error sending recovery ping: {e}")
-                    ws.close()
-
-    def message_handler(msg):
+    def message_handler(msg, received_ns=None):
         try:
             if "data" in msg and isinstance(msg["data"], list) and msg["data"]:
                 order_data = msg["data"][0]
@@ -621,7 +801,7 @@ def start_bitmart_websocket(exchange_instance, symbol, bot_config_id, amount,
                 
                 # Skip if we've already processed this order
                 if order_id in processed_orders:
-                    logger.debug(f"Skipping already processed order: {order_id}")
+                    logger.debug("Skipping already processed order: %s", order_id)
                     return
                     
                 if order_state in ["filled"]:
@@ -629,75 +809,84 @@ def start_bitmart_websocket(exchange_instance, symbol, bot_config_id, amount,
                     if price == 0:
                         price = float(order_data.get("last_fill_price", 0))
                     current_price = price
-                    logger.info(f"BitMart WebSocket: {order_data.get('side')} has been triggered at {order_data.get('price')} vs current price {current_price} | Placing new orders")
+                    logger.info("BitMart WebSocket: %s has been triggered at %s vs current price %s | Placing new orders", order_data.get('side'), order_data.get('price'), current_price)
                     
                     # Add order ID to processed set
-                    processed_orders.add(order_id)
+                    processed_orders[order_id] = None
                     
-                    # Clean up old processed orders to prevent memory growth
-                    if len(processed_orders) > 1000:
-                        processed_orders.clear()
+                    # Drop the oldest processed orders to prevent memory growth
+                    while len(processed_orders) > 1000:
+                        processed_orders.popitem(last=False)
                     
-                    process_order_update(
-                        exchange_instance, symbol, bot_config_id, amount,
-                        step_size, tick_size, min_notional, 
-                        sl_buffer_percent, sell_rebound_percent, 
-                        current_price
-                    )
-                    process_trade_message("bitmart", msg, db_session, bot_config.exchange_api_key.id)
+                    event_ms = order_data.get("last_fill_time") or order_data.get("update_time")
+
+                    def apply():
+                        trace = fill_tracer.start("bitmart", symbol, order_id, event_ms, received_ns)
+                        trace.add_span("decode", trace.received_ns, time.time_ns())
+                        process_order_update(
+                            exchange_instance, symbol, bot_config_id, amount,
+                            quantizer, min_notional,
+                            sl_buffer_percent, sell_rebound_percent,
+                            current_price, trace=trace, client_id=order_data.get("client_order_id")
+                        )
+                        process_trade_message("bitmart", msg, db_session, bot_config.exchange_api_key.id)
+
+                    gap_recovery.fill(key, order_id, event_ms, apply)
         except Exception as e:
-            logger.error(f"❌ Error processing BitMart WebSocket message: {e}")
+            logger.error("❌ Error processing BitMart WebSocket message: %s", e)
 
     def on_open(ws):
-        nonlocal pong_timeout_count
-        pong_timeout_count = 0  # Reset timeout count on new connection
         logger.info("WebSocket opened, sending login message...")
         timestamp = str(int(time.time() * 1000))
         sign = generate_sign(timestamp, api_memo, api_secret)
         login_payload = {"op": "login", "args": [api_key, timestamp, sign]}
         ws.send(json.dumps(login_payload))
         logger.info(f"Login message sent: {login_payload}")
-        reset_ping_timer(ws)
+        heartbeats.register(ws, key, lambda ws: ws.send("ping"), *HEARTBEATS["bitmart"])
+
+    stream_name = f"bitmart:{symbol}"
+    received = metrics.WS_MESSAGES_RECEIVED.labels("bitmart")
 
     def on_message(ws, message):
-        # Reset pong timeout count on any message
-        nonlocal pong_timeout_count
-        pong_timeout_count = 0
-        
+        received_ns = time.time_ns()
+        # Captured before decompression so the log keeps BitMart's deflated frames
+        if frame_log.frame_recorder is not None:
+            frame_log.frame_recorder.record(stream_name, message)
+        received.inc()
+        heartbeats.seen(ws)
+
         # Decompress if message is binary (compressed)
         if isinstance(message, bytes):
             try:
                 # Negative window bits indicates raw DEFLATE stream
                 message = zlib.decompress(message, -zlib.MAX_WBITS).decode("utf-8")
             except Exception as e:
-                logger.error(f"Error decompressing message: {e}")
-                reset_ping_timer(ws)
+                metrics.WS_MESSAGES_DROPPED.labels("bitmart", "decode").inc()
+                logger.error("Error decompressing message: %s", e)
                 return
 
         if message.strip() == "pong":
-            ws.waiting_for_pong = False
-            if hasattr(ws, "pong_timer") and ws.pong_timer is not None:
-                ws.pong_timer.cancel()
-            reset_ping_timer(ws)
             return
 
         try:
             msg = json.loads(message)
         except Exception as e:
-            logger.error(f"Error parsing message: {e}")
-            reset_ping_timer(ws)
+            metrics.WS_MESSAGES_DROPPED.labels("bitmart", "decode").inc()
+            logger.error("Error parsing message: %s", e)
             return
 
         if msg.get("event") == "login":
+            reconnects.connected(key)
             subscription_payload = {
                 "op": "subscribe",
                 "args": [f"spot/user/order:{symbol.replace('/', '_')}"]
             }
             ws.send(json.dumps(subscription_payload))
-            logger.info(f"Subscription message sent: {subscription_payload}")
+            logger.info("Subscription message sent: %s", subscription_payload)
+        elif msg.get("event") == "subscribe":
+            gap_recovery.reconnected(key, exchange_instance, symbol, recover)
 
-        message_handler(msg)
-        reset_ping_timer(ws)
+        message_handler(msg, received_ns)
 
     def on_error(ws, error):
         logger.error(f"🚨 BitMart WebSocket error: {error}")
@@ -706,6 +895,7 @@ def start_bitmart_websocket(exchange_instance, symbol, bot_config_id, amount,
 
     def on_close(ws, close_status_code, close_msg):
         logger.info(f"❌ BitMart WebSocket closed for {symbol}. Reason: {close_status_code} - {close_msg}")
+        heartbeats.unregister(ws)
         try:
             ws.close()
         except Exception as e:
@@ -714,27 +904,34 @@ def start_bitmart_websocket(exchange_instance, symbol, bot_config_id, amount,
         # Check the current instance attribute
         if not getattr(ws, "auto_reconnect", False):
             logger.info("Forced closure detected; closing orders.")
-            close_and_sell_all(exchange_instance, symbol)
+            _close_grid(ws, exchange_instance, symbol)
             return
 
         logger.info("Connection lost but auto-reconnect is enabled; preserving orders.")
-        reconnect_delay = 5  # seconds
-        logger.info(f"Attempting to reconnect in {reconnect_delay} seconds...")
-        # When reconnecting, we always pass auto_reconnect=True because a new connection should be healthy.
-        threading.Timer(
-            reconnect_delay,
-            lambda: start_bitmart_websocket(
+        gap_recovery.disconnected(key)
+
+        # The login is signed with a timestamp, so every connection signs a new one
+        def reconnect():
+            if not getattr(ws, "auto_reconnect", False):
+                return ws  # stopped while waiting
+            # When reconnecting, we always pass auto_reconnect=True because a new connection should be healthy.
+            new_ws = start_bitmart_websocket(
                 exchange_instance, symbol, bot_config_id, amount,
-                step_size, tick_size, min_notional,
+                quantizer, min_notional,
                 sl_buffer_percent, sell_rebound_percent,
                 auto_reconnect=True,
-                db_session=db_session
+                db_session=db_session,
+                registry=registry
             )
-        ).start()
+            if new_ws is not None and registry is not None:
+                registry[key] = new_ws
+            return new_ws
+
+        reconnects.schedule(key, reconnect)
 
     logger.info("Connecting to BitMart WebSocket via WebSocketApp...")
     ws_app = websocket.WebSocketApp(
-        "wss://ws-manager-compress.bitmart.com/user?protocol=1.1",
+        BITMART_WS_URL,
         on_open=on_open,
         on_message=on_message,
         on_error=on_error,
@@ -742,6 +939,8 @@ def start_bitmart_websocket(exchange_instance, symbol, bot_config_id, amount,
     )
     
     ws_app.auto_reconnect = auto_reconnect
+    if not connect:
+        return ws_app
 
     # Run the WebSocket in a background thread so that the call is non-blocking.
     ws_thread = threading.Thread(target=lambda: ws_app.run_forever(), daemon=True)
@@ -749,13 +948,15 @@ def start_bitmart_websocket(exchange_instance, symbol, bot_config_id, amount,
     return ws_app
 
 def start_gateio_websocket(exchange_instance, symbol, bot_config_id, amount,
-                           step_size, tick_size, min_notional, 
+                           quantizer, min_notional, 
                            sl_buffer_percent=2.0, sell_rebound_percent=1.5,
-                           auto_reconnect=True, db_session=None):
+                           auto_reconnect=True, db_session=None, connect=True, registry=None):
     """
     Starts a Gate.io WebSocket connection with authentication for trade updates.
+    With connect=False the app is only built and not run, e.g. for frame replay.
+    Reconnects go through `reconnects` and replace the app in `registry`, if given.
     """
-    ws_url = "wss://api.gateio.ws/ws/v4/"
+    ws_url = GATEIO_WS_URL
     channel_symbol = symbol.replace("/", "_")
 
     session = db_session or SessionLocal()
@@ -769,6 +970,9 @@ def start_gateio_websocket(exchange_instance, symbol, bot_config_id, amount,
     api_key = bot_config.exchange_api_key.api_key
     api_secret = bot_config.exchange_api_key.api_secret
     session.close()
+    key = (exchange_instance.id, symbol)
+    recover = _recovered_fill(exchange_instance, symbol, bot_config_id, amount, quantizer, min_notional,
+                              sl_buffer_percent, sell_rebound_percent)
 
     class GateWebSocketApp(WebSocketApp):
         def __init__(self, url, api_key, api_secret, **kwargs):
@@ -776,7 +980,6 @@ def start_gateio_websocket(exchange_instance, symbol, bot_config_id, amount,
             self._api_key = api_key
             self._api_secret = api_secret
             self.auto_reconnect = auto_reconnect  # ✅ Ensure auto_reconnect is respected
-            self.last_ping_tm = time.time()  # Track last ping timestamp
 
         def get_sign(self, channel, event, timestamp):
             """Generate HMAC signature for authentication."""
@@ -802,37 +1005,37 @@ def start_gateio_websocket(exchange_instance, symbol, bot_config_id, amount,
             logger.info("🔐 Sent authentication request.")
 
         def send_ping(self):
-            """
-            Sends a 'ping' every 15 seconds to keep the connection alive.
-            """
-            while True:
-                time.sleep(15)
-                if time.time() - self.last_ping_tm > 15:
-                    try:
-                        self.send(json.dumps({"channel": "spot.ping", "event": None}))
-                    except Exception as e:
-                        logger.error(f"❌ Error sending ping: {e}")
-                        break
+            self.send(json.dumps({"channel": "spot.ping", "event": None}))
 
     def on_open(ws):
         """Handles WebSocket connection opening."""
         logger.info("✅ Gate.io WebSocket connected.")
         ws.send_auth_request()
-        threading.Thread(target=ws.send_ping, daemon=True).start()
+        heartbeats.register(ws, key, GateWebSocketApp.send_ping, *HEARTBEATS["gateio"])
+
+    stream_name = f"gateio:{symbol}"
+    received = metrics.WS_MESSAGES_RECEIVED.labels("gateio")
 
     def on_message(ws, message):
         """Processes incoming WebSocket messages."""
+        received_ns = time.time_ns()
+        if frame_log.frame_recorder is not None:
+            frame_log.frame_recorder.record(stream_name, message)
+        received.inc()
+        heartbeats.seen(ws)
         try:
             data = json.loads(message)
             
             # Handle ping response
-            if data.get("channel") == "spot.ping":
+            if data.get("channel") in ("spot.ping", "spot.pong"):
                 return
                 
             # Handle auth response
             if data.get("event") == "subscribe" and data.get("channel") == "spot.usertrades":
                 if data.get("result", {}).get("status") == "success":
                     logger.info("✅ Gate.io WebSocket authenticated successfully")
+                    reconnects.connected(key)
+                    gap_recovery.reconnected(key, exchange_instance, symbol, recover)
                 return
                 
             # Process trade data
@@ -849,20 +1052,32 @@ def start_gateio_websocket(exchange_instance, symbol, bot_config_id, amount,
                     
                 try:
                     current_price = float(price)
-                    process_order_update(
-                        exchange_instance, symbol, bot_config_id, amount, 
-                        step_size, tick_size, min_notional, 
-                        sl_buffer_percent, sell_rebound_percent, current_price
-                    )
-                    process_trade_message("gateio", data, db_session, bot_config.exchange_api_key.id)
+
+                    def apply():
+                        trace = fill_tracer.start("gateio", symbol, trade.get("order_id"),
+                                                  trade.get("create_time_ms"), received_ns)
+                        trace.add_span("decode", received_ns, time.time_ns())
+                        process_order_update(
+                            exchange_instance, symbol, bot_config_id, amount,
+                            quantizer, min_notional,
+                            sl_buffer_percent, sell_rebound_percent, current_price, trace=trace,
+                            client_id=trade.get("text")
+                        )
+                        process_trade_message("gateio", data, db_session, bot_config.exchange_api_key.id)
+
+                    gap_recovery.fill(key, trade.get("order_id"), trade.get("create_time_ms"), apply)
                 except (ValueError, TypeError) as e:
-                    logger.error(f"Error processing price data: {e}")
+                    metrics.WS_MESSAGES_DROPPED.labels("gateio", "error").inc()
+                    logger.error("Error processing price data: %s", e)
                 except Exception as e:
-                    logger.error(f"Error processing trade update: {e}")
+                    metrics.WS_MESSAGES_DROPPED.labels("gateio", "error").inc()
+                    logger.error("Error processing trade update: %s", e)
         except json.JSONDecodeError as e:
-            logger.error(f"Error decoding message: {e}")
+            metrics.WS_MESSAGES_DROPPED.labels("gateio", "decode").inc()
+            logger.error("Error decoding message: %s", e)
         except Exception as e:
-            logger.error(f"❌ Error processing Gate.io WebSocket message: {e}")
+            metrics.WS_MESSAGES_DROPPED.labels("gateio", "error").inc()
+            logger.error("❌ Error processing Gate.io WebSocket message: %s", e)
 
     def on_close(ws, close_status_code, close_msg):
         """Handles WebSocket closure logic."""
@@ -871,6 +1086,7 @@ def start_gateio_websocket(exchange_instance, symbol, bot_config_id, amount,
         if ws is None:
             logger.error("⚠️ WebSocket instance is None during closure.")
             return
+        heartbeats.unregister(ws)
 
         try:
             ws.close()
@@ -880,21 +1096,30 @@ def start_gateio_websocket(exchange_instance, symbol, bot_config_id, amount,
         # ✅ Prevent reconnection if auto_reconnect is disabled
         if not getattr(ws, "auto_reconnect", False):
             logger.info("Forced closure detected; closing orders.")
-            close_and_sell_all(exchange_instance, symbol)
+            _close_grid(ws, exchange_instance, symbol)
             return  # ✅ Stop execution
 
         # ✅ Handle reconnection
         logger.info("Connection lost but auto-reconnect is enabled; preserving orders.")
-        reconnect_delay = 5  # seconds
-        logger.info(f"🔄 Reconnecting in {reconnect_delay} seconds...")
-
-        threading.Timer(reconnect_delay, lambda: start_gateio_websocket(
-            exchange_instance, symbol, bot_config_id, amount,
-            step_size, tick_size, min_notional,
-            sl_buffer_percent, sell_rebound_percent,
-            auto_reconnect=auto_reconnect,
-            db_session=db_session
-        )).start()
+        gap_recovery.disconnected(key)
+
+        # The subscription is signed with a timestamp, so every connection signs a new one
+        def reconnect():
+            if not getattr(ws, "auto_reconnect", False):
+                return ws  # stopped while waiting
+            new_ws = start_gateio_websocket(
+                exchange_instance, symbol, bot_config_id, amount,
+                quantizer, min_notional,
+                sl_buffer_percent, sell_rebound_percent,
+                auto_reconnect=auto_reconnect,
+                db_session=db_session,
+                registry=registry
+            )
+            if new_ws is not None and registry is not None:
+                registry[key] = new_ws
+            return new_ws
+
+        reconnects.schedule(key, reconnect)
 
     def on_error(ws, error):
         """Handles WebSocket errors."""
@@ -914,6 +1139,8 @@ def start_gateio_websocket(exchange_instance, symbol, bot_config_id, amount,
     )
 
     ws.auto_reconnect = auto_reconnect  # ✅ Ensure WebSocket respects auto-reconnect
+    if not connect:
+        return ws
     threading.Thread(target=ws.run_forever, daemon=True).start()
     logger.info(f"🚀 Started Gate.io WebSocket for {symbol}. Listening for price movements...")
 
@@ -924,18 +1151,19 @@ def start_bybit_websocket(
     symbol: str,
     bot_config_id: int,
     amount: float,
-    step_size: float,
-    tick_size: float,
+    quantizer,
     min_notional: float,
     registry: dict,                   # <── self.websocket_connections
     sl_buffer_percent: float = 2.0,
     sell_rebound_percent: float = 1.5,
     auto_reconnect: bool = True,
-    db_session=None
+    db_session=None,
+    connect: bool = True
 ):
     """
     Opens a single, self healing Bybit Spot order stream and stores it in *registry*.
     Re uses the same key «(exchange_id, symbol)».
+    With connect=False the app is only built and not run, e.g. for frame replay.
     """
     # ── 1. fetch API creds ──────────────────────────────────────────────────────
     session = db_session or SessionLocal()
@@ -953,9 +1181,11 @@ def start_bybit_websocket(
     api_secret  = bot_cfg.exchange_api_key.api_secret
     session.close()
 
-    ws_url  = "wss://stream.bybit.com/v5/private"
+    ws_url  = BYBIT_WS_URL
     key     = (exchange_instance.id, symbol)          # registry key
     by_sym  = symbol.replace("/", "")                 # e.g. DOGE/USDC → DOGEUSDC
+    recover = _recovered_fill(exchange_instance, symbol, bot_config_id, amount, quantizer, min_notional,
+                              sl_buffer_percent, sell_rebound_percent)
 
     # Flag to track explicit closure
     is_closing = {"value": False}
@@ -975,27 +1205,21 @@ def start_bybit_websocket(
             "args": [api_key, expires, _sig(api_secret, expires)]
         }))
         ws.send(json.dumps({"op": "subscribe", "args": ["order"]}))
-        
-        # Start ping thread
-        def ping_thread():
-            while True:
-                try:
-                    if ws.sock and ws.sock.connected and not is_closing["value"]:
-                        ws.send(json.dumps({"op": "ping"}))
-                    time.sleep(20)  # Send ping every 20 seconds
-                except Exception as e:
-                    logger.error(f"Error in ping thread: {e}")
-                    break
-                except:
-                    break
-        
-        ws.ping_thread = threading.Thread(target=ping_thread, daemon=True)
-        ws.ping_thread.start()
+        heartbeats.register(ws, key, lambda ws: ws.send(json.dumps({"op": "ping"})), *HEARTBEATS["bybit"])
+
+    stream_name = f"bybit:{symbol}"
+    received = metrics.WS_MESSAGES_RECEIVED.labels("bybit")
 
     def on_message(ws, raw):
+        received_ns = time.time_ns()
+        if frame_log.frame_recorder is not None:
+            frame_log.frame_recorder.record(stream_name, raw)
+        received.inc()
+        heartbeats.seen(ws)
         try:
             msg = json.loads(raw)
         except json.JSONDecodeError:
+            metrics.WS_MESSAGES_DROPPED.labels("bybit", "decode").inc()
             logger.error("⚠️  bad JSON")
             return
 
@@ -1008,6 +1232,10 @@ def start_bybit_websocket(
         if msg.get("op") in {"auth", "subscribe"}:
             success = msg.get("success", False)
             logger.info("✅ %s %s", msg["op"], "ok" if success else "fail")
+            if msg["op"] == "auth" and success:
+                reconnects.connected(key)
+            elif msg["op"] == "subscribe" and success:
+                gap_recovery.reconnected(key, exchange_instance, symbol, recover)
             return
 
         data = (msg.get("data") or [])
@@ -1030,21 +1258,28 @@ def start_bybit_websocket(
 
         logger.info("✅ order filled %s @ %.10g", by_sym, price)
 
-        try:
-            process_order_update(
-                exchange_instance, symbol, bot_config_id, amount,
-                step_size, tick_size, min_notional,
-                sl_buffer_percent, sell_rebound_percent, price
-            )
-        except Exception as e:
-            logger.exception("❌ process_order_update failed: %s", e)
-
-        # trade stream is separate; guard the call
-        if msg.get("topic") == "trade":
+        def apply():
+            trace = fill_tracer.start("bybit", symbol, order.get("orderId"), order.get("updatedTime"), received_ns)
+            trace.add_span("decode", received_ns, time.time_ns())
             try:
-                process_trade_message("bybit", msg, db_session, bot_cfg.exchange_api_key.id)
+                process_order_update(
+                    exchange_instance, symbol, bot_config_id, amount,
+                    quantizer, min_notional,
+                    sl_buffer_percent, sell_rebound_percent, price, trace=trace,
+                    client_id=order.get("orderLinkId")
+                )
             except Exception as e:
-                logger.exception("❌ trade handler failed: %s", e)
+                metrics.WS_MESSAGES_DROPPED.labels("bybit", "error").inc()
+                logger.exception("❌ process_order_update failed: %s", e)
+
+            # trade stream is separate; guard the call
+            if msg.get("topic") == "trade":
+                try:
+                    process_trade_message("bybit", msg, db_session, bot_cfg.exchange_api_key.id)
+                except Exception as e:
+                    logger.exception("❌ trade handler failed: %s", e)
+
+        gap_recovery.fill(key, order.get("orderId"), order.get("updatedTime"), apply)
 
     def on_error(ws, err):
         logger.error("🚨 WS error: %s", err)
@@ -1052,15 +1287,7 @@ def start_bybit_websocket(
 
     def on_close(ws, code, msg):
         logger.warning("❌ WS closed (%s – %s)", code, msg)
-        
-        # Stop ping thread if it exists
-        if hasattr(ws, 'ping_thread') and ws.ping_thread is not None:
-            try:
-                if ws.ping_thread.is_alive():
-                    ws.ping_thread = None
-            except Exception as e:
-                logger.warning(f"Error checking ping thread: {e}")
-                ws.ping_thread = None
+        heartbeats.unregister(ws)
 
         # has already been removed, so this is a no-op
         registry.pop(key, None)
@@ -1068,32 +1295,25 @@ def start_bybit_websocket(
         # Only reconnect if auto_reconnect is True AND not explicitly closed
         # Check both the code (1000 = normal closure) and our explicit close flag
         if auto_reconnect and code != 1000 and not is_closing["value"]:
+            gap_recovery.disconnected(key)
+
             def _reconnect():
-                try:
-                    # Don't attempt to reconnect if we've explicitly closed
-                    if is_closing["value"]:
-                        logger.info("Reconnection canceled - WebSocket was explicitly closed")
-                        return
-                        
-                    logger.info("⭮ reconnecting %s in 5s", key)
-                    new_ws = build_ws()
-                    registry[key] = new_ws
-                    threading.Thread(
-                        target=lambda: new_ws.run_forever(
-                            ping_interval=20,
-                            ping_timeout=10,
-                            skip_utf8_validation=True
-                        ),
-                        daemon=True
-                    ).start()
-                except Exception as e:
-                    logger.error(f"Failed to reconnect: {e}")
-                    # Try again in 5 seconds if not explicitly closed
-                    if not is_closing["value"]:
-                        threading.Timer(5, _reconnect).start()
-        
-            # Schedule reconnection
-            threading.Timer(5, _reconnect).start()
+                # Don't attempt to reconnect if we've explicitly closed
+                if is_closing["value"]:
+                    logger.info("Reconnection canceled - WebSocket was explicitly closed")
+                    return ws
+
+                # The auth is signed with an expiry, so every connection signs a new one in on_open
+                new_ws = build_ws()
+                registry[key] = new_ws
+                threading.Thread(
+                    target=lambda: new_ws.run_forever(skip_utf8_validation=True),
+                    daemon=True
+                ).start()
+                return new_ws
+
+            # Schedule reconnection; a failed attempt is retried with backoff
+            reconnects.schedule(key, _reconnect)
         else:
             logger.info("WebSocket closed explicitly or auto_reconnect disabled - not reconnecting")
             # Only call close_and_sell_all if this wasn't an explicit closure through our API
@@ -1114,27 +1334,22 @@ def start_bybit_websocket(
     ws_app = build_ws()
     
     # Add a close method that marks the websocket as explicitly closing to prevent reconnection
-    def close_socket():
+    def close_socket(liquidate=True):
         try:
             # Set the flag to prevent reconnection
             is_closing["value"] = True
+            reconnects.cancel(key)
+            gap_recovery.forget(key)
+            market_data.unsubscribe(exchange_instance.id, symbol)
             logger.info(f"Explicitly closing WebSocket for {symbol}")
             
-            # First call close_and_sell_all to close positions
-            try:
-                logger.info(f"Closing all positions for {symbol}")
-                close_and_sell_all(exchange_instance, symbol)
-            except Exception as e:
-                logger.error(f"Error during close_and_sell_all: {e}")
-            
-            # Stop ping thread if it exists
-            if hasattr(ws_app, 'ping_thread') and ws_app.ping_thread is not None:
+            # First call close_and_sell_all to close positions, unless the grid is only detached
+            if liquidate:
                 try:
-                    if ws_app.ping_thread.is_alive():
-                        ws_app.ping_thread = None
+                    logger.info(f"Closing all positions for {symbol}")
+                    close_and_sell_all(exchange_instance, symbol)
                 except Exception as e:
-                    logger.warning(f"Error stopping ping thread: {e}")
-                    ws_app.ping_thread = None
+                    logger.error(f"Error during close_and_sell_all: {e}")
             
             # Force close the connection
             if hasattr(ws_app, "sock") and ws_app.sock is not None:
@@ -1160,145 +1375,299 @@ def start_bybit_websocket(
     # Attach our custom close method to the websocket object
     ws_app.close_socket = close_socket
     
+    if not connect:
+        return ws_app
+
     # Store in registry
     registry[key] = ws_app
 
     threading.Thread(
-        target=lambda: ws_app.run_forever(
-            ping_interval=20,
-            ping_timeout=10,
-            skip_utf8_validation=True
-        ),
+        target=lambda: ws_app.run_forever(skip_utf8_validation=True),
         daemon=True
     ).start()
 
     return ws_app
 
 
-def process_order_update(exchange_instance, symbol, bot_config_id, amount, step_size,
-                         tick_size, min_notional, sl_buffer_percent, sell_rebound_percent, current_price):
+def _recovered_fill(exchange_instance, symbol, bot_config_id, amount, quantizer, min_notional,
+                    sl_buffer_percent, sell_rebound_percent):
+    """The fill pipeline for a (ccxt) order that filled while the grid's socket was down."""
+    def apply(order):
+        price = float(order.get('price') or order.get('average') or 0)
+        trace = fill_tracer.start(exchange_instance.id, symbol, order.get('id'),
+                                  order.get('lastTradeTimestamp') or order.get('timestamp'))
+        process_order_update(
+            exchange_instance, symbol, bot_config_id, amount, quantizer, min_notional,
+            sl_buffer_percent, sell_rebound_percent, price, trace=trace, client_id=order.get('clientOrderId')
+        )
+    return apply
+
+def _place_replacement(fill_started, trace, side, bot_config_id, level_ids, place, *args):
+    """
+    Runs a delayed replacement placement, recording fill-to-replacement latency and its trace spans.
+    Each order carries the client order id of its `level_ids` row, and the order ids are then
+    recorded on those rows, one per order placed by `place`.
+    """
+    order_ids = []
+    try:
+        with fill_tracer.activate(trace):
+            trace.add_span("timer_wait", trace.scheduled_ns, time.time_ns(), side=side)
+            result = place(*args, order_ids=order_ids,
+                           client_ids=[client_order_id(bot_config_id, level_id) for level_id in level_ids])
+        metrics.FILL_TO_REPLACEMENT_SECONDS.labels(args[0].id, side).observe(time.perf_counter() - fill_started)
+        return result
+    finally:
+        with _pending_lock:
+            _placed_orders.update((level_id, order_id) for level_id, order_id in zip(level_ids, order_ids)
+                                  if order_id is not None)
+            _pending_levels.difference_update(level_ids)
+        trace.placement_done()
+
+def _write_placed_orders(db_session):
+    """
+    Records the order ids of replacements placed since the last level update, as part of
+    `db_session`'s transaction; `_forget_placed_orders` once it commits. Ids lost to a crash
+    are re-linked by price on reconciliation.
+    """
+    with _pending_lock:
+        placed = dict(_placed_orders)
+    crud.link_order_levels(db_session, placed)
+    return placed
+
+def _forget_placed_orders(placed):
+    with _pending_lock:
+        for level_id in placed:
+            _placed_orders.pop(level_id, None)
+
+def _level_order_id(row):
+    """The order id of a level row, including one placed but not written yet."""
+    return row.order_id or _placed_orders.get(row.id)
+
+def process_order_update(exchange_instance, symbol, bot_config_id, amount, quantizer,
+                         min_notional, sl_buffer_percent, sell_rebound_percent, current_price, trace=None,
+                         client_id=None):
+    """
+    Applies a fill to the stored TP/SL levels and schedules the replacement orders.
+    `trace` carries the receive/decode spans recorded by the socket handler, if any.
+    `client_id` is the filled order's client order id; one of ours names the level that filled.
+    The grid's stored TP/SL percentages override `sl_buffer_percent` and `sell_rebound_percent`.
+    """
+    if trace is None:
+        trace = fill_tracer.start(exchange_instance.id, symbol)
+    metrics.FILLS.labels(exchange_instance.id).inc()
+    engine_events.publish("fill", {"exchange": exchange_instance.id, "symbol": symbol, "price": current_price,
+                                   "order_id": getattr(trace, "order_id", None), "trace_id": trace.trace_id})
+    with fill_tracer.activate(trace), trace.span("state_update", price=current_price):
+        _update_levels(exchange_instance, symbol, bot_config_id, amount, quantizer, min_notional,
+                       sl_buffer_percent, sell_rebound_percent, current_price, time.perf_counter(), trace,
+                       parse_client_order_id(client_id))
+    trace.settle()
+
+def _update_levels(exchange_instance, symbol, bot_config_id, amount, quantizer, min_notional,
+                   sl_buffer_percent, sell_rebound_percent, current_price, fill_started, trace, filled=None):
     session = None
     try:
         session = SessionLocal()
         bot_config = session.query(models.ExchangeBotConfig).filter(models.ExchangeBotConfig.id == bot_config_id).first()
         if not bot_config:
-            logger.error(f"⚠️ Bot config with ID {bot_config_id} not found.")
+            logger.error("⚠️ Bot config with ID %s not found.", bot_config_id)
             return
+        # The stored percentages win over those the socket started with, so a TP/SL edit
+        # (POST /symbols/) reaches a running grid at its next fill, whichever process runs it
+        sl_buffer_percent, sell_rebound_percent = bot_config.sl_percent, bot_config.tp_percent
+
+        levels = GridLevels.load(session, bot_config, symbol, quantizer)
+        filled_level = None
+        if filled is not None:
+            # Our own order: skip the entry buy, and fills of levels already applied or of an earlier grid
+            if filled.grid != bot_config_id or filled.level == ENTRY_LEVEL:
+                return
+            if not levels.has_row(filled.level):
+                logger.info("%s: fill of level %s, which is no longer open; skipped", bot_config_id, filled.level)
+                return
+            filled_level = filled.level
+        new_buys, new_sells = [], []
+
+        # Every TP at or below the price filled; the top one resets the grid
+        crossed = levels.tps_crossed(current_price)
+        if crossed and crossed == len(levels.tps):
+            logger.info("🎯 Price %s hit top TP %s", current_price, levels.top_tp)
+            logger.info("All TPs filled! -> Resetting grid after delay.")
+            try:
+                open_orders = exchange_instance.fetch_open_orders(symbol)
+                for order in open_orders:
+                    exchange_instance.cancel_order(order['id'], symbol)
+                    logger.info("🛑 Cancelled order %s", order['id'])
+            except Exception as e:
+                logger.error("❌ Error cancelling orders: %s", e)
 
-        tp_levels = json.loads(bot_config.tp_levels_json)
-        sl_levels = json.loads(bot_config.sl_levels_json)
-
-        for i in range(len(tp_levels)):
-            if current_price >= tp_levels[i]:
-                triggered_tp = tp_levels.pop(i)
-                bot_config.tp_levels_json = json.dumps(tp_levels)
+            initialize_orders(
+                exchange_instance,
+                symbol,
+                amount,
+                bot_config.tp_percent,
+                bot_config.sl_percent,
+                quantizer,
+                min_notional,
+                session,
+                bot_config
+            )
+            return
+        if crossed:
+            triggered_tps = levels.take_tps(current_price)
+            if len(triggered_tps) > 1:
+                triggered_tps, resting = _split_resting(exchange_instance, symbol, levels.rows('tp', triggered_tps),
+                                                        triggered_tps, filled_level)
+                levels.restore_tps(resting)
+            logger.info("🎯 Price %s hit TP %s", current_price, triggered_tps)
+
+            # Each filled TP re-arms an SL under it in place of the lowest SL
+            replaced = [p for p in (levels.pop_lowest_sl() for _ in triggered_tps) if p is not None]
+            _cancel_levels(exchange_instance, symbol, levels.rows('sl', replaced), replaced)
+            for triggered_tp in triggered_tps:
+                new_sl_price = quantizer.round_price(triggered_tp * (1 - sl_buffer_percent / 100))
+                levels.add_sl(new_sl_price)
+                new_buys.append(new_sl_price)
+
+        # Every SL at or above the price filled, highest first
+        filled_sls = levels.take_sls(current_price)
+        if len(filled_sls) > 1:
+            filled_sls, resting = _split_resting(exchange_instance, symbol, levels.rows('sl', filled_sls), filled_sls,
+                                                 filled_level)
+            levels.restore_sls(resting)
+        if filled_sls:
+            base_asset, _ = symbol.split('/')
+            balance = exchange_instance.fetch_balance()
+            base_balance = balance.get(base_asset, {}).get('free', 0)
+            # Each fill bought amount / price, so the position splits over the rebound sells likewise
+            weights = [1 / sl_price for sl_price in filled_sls]
+            total_weight = sum(weights)
+            for sl_price, weight in zip(filled_sls, weights):
+                lowest = levels.lowest_sl if levels.sls else sl_price
+                new_sl_price = quantizer.round_price(lowest * (1 - sl_buffer_percent / 100))
+                new_sell_price = quantizer.round_price(sl_price * (1 + sell_rebound_percent / 100))
+                levels.add_sl(new_sl_price)
+                levels.add_tp(new_sell_price)
+                new_buys.append(new_sl_price)
+                new_sells.append((base_balance * weight / total_weight, new_sell_price))
+
+        if not new_buys and not new_sells:
+            if session.dirty:  # legacy levels moved to rows by load
                 session.commit()
-                logger.info(f"🎯 Price {current_price} hit TP {triggered_tp}")
-
-                # If i == 0, it means that was the last TP
-                if i == 0:
-                    logger.info("All TPs filled! -> Resetting grid after delay.")
-                    try:
-                        open_orders = exchange_instance.fetch_open_orders(symbol)
-                        for order in open_orders:
-                            exchange_instance.cancel_order(order['id'], symbol)
-                            logger.info(f"🛑 Cancelled order {order['id']}")
-                    except Exception as e:
-                        logger.error(f"❌ Error cancelling orders: {e}")
-                    
-                    initialize_orders(
-                        exchange_instance,
-                        symbol,
-                        amount,
-                        bot_config.tp_percent,
-                        bot_config.sl_percent,
-                        step_size,
-                        tick_size,
-                        min_notional,
-                        session,
-                        bot_config
-                    )
-                    return
+            return
+        # Writes start here, so the database is not locked while the exchange is called above
+        placed = _write_placed_orders(session)
+        # New rows come back in the order added: the SLs are new_buys and the TPs new_sells
+        added = levels.save(session)
+        buy_levels = [row.id for row in added if row.order_type == 'sl']
+        sell_levels = [row.id for row in added if row.order_type == 'tp']
+        with _pending_lock:
+            _pending_levels.update(buy_levels + sell_levels)
+        session.commit()
+        _forget_placed_orders(placed)
+        # The in-memory levels, not the rows: reading them after the commit would reload each one
+        logger.info("%s: Stored levels: %r", bot_config_id, levels)
+
+        # Replacements go out in one batch per side after 0.5s
+        if new_buys:
+            trace.expect_placement()
+            threading.Timer(
+                0.5,
+                _place_replacement,
+                args=(fill_started, trace, "buy", bot_config_id, buy_levels, place_limit_buys,
+                      exchange_instance, symbol, amount, new_buys, quantizer, min_notional)
+            ).start()
+        if new_sells:
+            trace.expect_placement()
+            threading.Timer(
+                0.5,
+                _place_replacement,
+                args=(fill_started, trace, "sell", bot_config_id, sell_levels, place_limit_sells,
+                      exchange_instance, symbol, new_sells, quantizer)
+            ).start()
 
-                new_sl_price = round_price(triggered_tp * (1 - sl_buffer_percent / 100), tick_size)
-
-                # Here we remove the old SL and cancel it before placing the new SL
-                if sl_levels:
-                    last_sl = min(sl_levels)
-                    sl_levels.remove(last_sl)
-
-                    # Cancel the buy order matching last_sl
-                    try:
-                        open_orders = exchange_instance.fetch_open_orders(symbol)
-                        buy_orders = [o for o in open_orders if o.get('side', '').lower() == 'buy']
-                        tolerance = 1e-8
-                        order_to_cancel = None
-                        for o in buy_orders:
-                            if abs(float(o.get('price', 0)) - last_sl) < tolerance:
-                                order_to_cancel = o
-                                break
-
-                        if order_to_cancel:
-                            exchange_instance.cancel_order(order_to_cancel['id'], symbol)
-                            logger.info(f"🛑 Cancelled last SL buy order {order_to_cancel['id']} @ {order_to_cancel['price']}")
-                        else:
-                            logger.warning(f"⚠️ No buy order found matching price {last_sl}")
-                    except Exception as e:
-                        logger.error(f"❌ Error cancelling last SL buy order @ {last_sl}: {e}")
-
-                sl_levels.insert(0, new_sl_price)
-                # Place the new limit buy in 0.5s
-                threading.Timer(
-                    0.5,
-                    place_limit_buys,
-                    args=(exchange_instance, symbol, amount, [new_sl_price], tick_size, min_notional)
-                ).start()
-                logger.info(f"{bot_config_id}: Checking stored TP: {tp_levels}, stored SL: {sl_levels}")
+    except Exception as e:
+        trace.error = repr(e)
+        logger.error("❌ Error processing order update: %s", e)
+    finally:
+        if session:
+            session.close()
 
-                bot_config.sl_levels_json = json.dumps(sl_levels)
-                session.commit()
-                break
+def _split_resting(exchange_instance, symbol, rows, prices, filled_level=None):
+    """
+    Splits crossed level `prices` into (filled, resting): a level rests while its row's order
+    is still open on the exchange or its replacement has not been placed yet. A fill can arrive
+    late (e.g. from before a grid reset), so crossing several levels does not prove they all
+    filled. Levels without an order count as filled, as do all of them if the open orders
+    cannot be fetched, and so does the row `filled_level` the fill named by client order id.
+    """
+    try:
+        open_orders = exchange_instance.fetch_open_orders(symbol)
+    except Exception as e:
+        logger.error("❌ Error fetching open orders for %s: %s", symbol, e)
+        return prices, []
+    open_ids = {str(o.get('id')) for o in open_orders}
+    with _pending_lock:
+        pending = set(_pending_levels)
+    filled, resting = [], []
+    for price, row in zip(prices, rows):
+        if row is not None and row.id != filled_level and (_level_order_id(row) in open_ids or row.id in pending):
+            resting.append(price)
+        else:
+            filled.append(price)
+    return filled, resting
 
-        # SL logic remains unchanged
-        for sl_price in sl_levels:
-            if current_price <= sl_price:
-                last_sl = min(sl_levels)
-                new_sl_price = round_price(last_sl * (1 - sl_buffer_percent / 100), tick_size)
-                new_sell_price = round_price(sl_price * (1 + sell_rebound_percent / 100), tick_size)
-                base_asset, _ = symbol.split('/')
-                balance = exchange_instance.fetch_balance()
-                base_balance = balance.get(base_asset, {}).get('free', 0)
-                
-                threading.Timer(
-                    0.5,
-                    place_limit_buys,
-                    args=(exchange_instance, symbol, amount, [new_sl_price], step_size, min_notional)
-                ).start()
-                threading.Timer(
-                    0.5,
-                    place_limit_sell,
-                    args=(exchange_instance, symbol, base_balance, new_sell_price, step_size)
-                ).start()
-                
-                sl_levels.remove(sl_price)
-                sl_levels.append(new_sl_price)
-                sl_levels.sort(reverse=True)
-                bot_config.sl_levels_json = json.dumps(sl_levels)
-
-                tp_levels.append(new_sell_price)
-                tp_levels.sort(reverse=True)
-                bot_config.tp_levels_json = json.dumps(tp_levels)
-                session.commit()
-                logger.info(f"{exchange_instance.id}: Checking stored TP: {tp_levels}, stored SL: {sl_levels}")
+def _cancel_levels(exchange_instance, symbol, rows, prices):
+    """
+    Cancels the buy orders of the level rows by order id; levels not linked to an order
+    fall back to matching resting buys by price.
+    """
+    unlinked = []
+    for price, row in zip(prices, rows):
+        order_id = _level_order_id(row) if row is not None else None
+        if order_id is None:
+            unlinked.append(price)
+            continue
+        try:
+            exchange_instance.cancel_order(order_id, symbol)
+            logger.info("🛑 Cancelled last SL buy order %s @ %s", order_id, price)
+        except Exception as e:
+            logger.warning("⚠️ Could not cancel SL buy order %s @ %s: %s", order_id, price, e)
+    _cancel_buys_at(exchange_instance, symbol, unlinked)
 
+def _cancel_buys_at(exchange_instance, symbol, prices):
+    """
+    Cancels one resting buy order per price in `prices`, with a single open-orders fetch.
+    """
+    if not prices:
+        return
+    wanted = Counter(round(price, 8) for price in prices)
+    try:
+        for o in exchange_instance.fetch_open_orders(symbol):
+            if not wanted:
                 break
-
+            key = round(float(o.get('price', 0)), 8)
+            if key in wanted and o.get('side', '').lower() == 'buy':
+                exchange_instance.cancel_order(o['id'], symbol)
+                logger.info("🛑 Cancelled last SL buy order %s @ %s", o['id'], o['price'])
+                wanted[key] -= 1
+                if not wanted[key]:
+                    del wanted[key]
+        for price in wanted:
+            logger.warning("⚠️ No buy order found matching price %s", price)
     except Exception as e:
-        logger.error(f"❌ Error processing order update: {e}")
-    finally:
-        if session:
-            session.close()
-         
+        logger.error("❌ Error cancelling last SL buy orders @ %s: %s", prices, e)
+
+def _close_grid(ws, exchange_instance, symbol):
+    """
+    The end of a socket closed on purpose: the grid is liquidated, unless the socket was only
+    detached (shutdown, or a handover to another shard or node), which leaves its orders resting.
+    """
+    if getattr(ws, "detached", False):
+        logger.info(f"{exchange_instance.id} {symbol}: socket detached; orders left resting")
+        return
+    close_and_sell_all(exchange_instance, symbol)
+
 def close_and_sell_all(exchange_instance, symbol):
     try:
         open_orders = exchange_instance.fetch_open_orders(symbol)
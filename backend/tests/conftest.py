@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+# The app imports its packages from backend/src (e.g. `from database import crud`); a few
+# modules and the benchmarks import from backend itself (`from src.utils ...`, `benchmarks`)
+sys.path[:0] = [str(BACKEND / "src"), str(BACKEND)]
+
+
+class FakeClock:
+    """A frozen monotonic clock; tests move `now` by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,123 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from engine import protocol
+from engine.client import EngineClient, EngineError, EngineUnavailable
+from engine.events import engine_events
+from engine.server import EngineServer
+
+
+def _bot():
+    noop = lambda *args: None
+    return SimpleNamespace(run_symbol=noop, stop_symbol=noop, stop=noop, active_grid_counts=dict,
+                           warm_start_report=None)
+
+
+@pytest.fixture
+def socket_path():
+    directory = tempfile.mkdtemp(prefix="gb-ipc-")  # Unix socket paths must stay short
+    yield os.path.join(directory, "engine.sock")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def server(socket_path):
+    server = EngineServer(_bot(), socket_path).start()
+    yield server
+    server.close()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_concurrent_calls_get_their_own_answers(server):
+    server.commands["echo"] = lambda value, delay: time.sleep(delay) or value
+    client = EngineClient(server.path)
+
+    # Later requests answer first, so replies arrive out of order on the one connection
+    with ThreadPoolExecutor(8) as pool:
+        answers = list(pool.map(lambda i: client.call("echo", i, (8 - i) * 0.02), range(8)))
+
+    assert answers == list(range(8))
+    assert client.call("ping") == "pong"
+    client.close()
+
+
+def test_command_errors_come_back_as_engine_errors(server):
+    def fail():
+        raise ValueError("bad symbol")
+    server.commands["fail"] = fail
+    client = EngineClient(server.path)
+
+    with pytest.raises(EngineError, match="ValueError: bad symbol"):
+        client.call("fail")
+    with pytest.raises(EngineError, match="Unknown engine command"):
+        client.call("nope")
+    assert client.call("ping") == "pong"  # the connection survives both
+
+
+def test_calls_in_flight_fail_when_the_engine_goes_away(socket_path):
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(1)
+
+    def hang_up():
+        conn, _ = listener.accept()
+        protocol.recv_message(conn)  # takes the request, never answers
+        conn.close()
+    threading.Thread(target=hang_up, daemon=True).start()
+    client = EngineClient(socket_path)
+
+    with pytest.raises(EngineUnavailable, match="closed the connection"):
+        client.call("run_symbol", "binance", "BTC/USDT")
+    listener.close()
+    os.unlink(socket_path)
+    with pytest.raises(EngineUnavailable, match="not reachable"):
+        client.call("ping")
+
+
+def test_subscribers_receive_their_topics_only(server):
+    received = []
+    subscription = EngineClient(server.path).subscribe(["fill"], lambda topic, data: received.append((topic, data)))
+    try:
+        assert _wait_for(lambda: engine_events._subscribers)
+        engine_events.publish("grid", {"status": "started"})
+        engine_events.publish("fill", {"symbol": "BTC/USDT", "price": 29700.0})
+        assert _wait_for(lambda: received)
+        time.sleep(0.05)
+        assert received == [("fill", {"symbol": "BTC/USDT", "price": 29700.0})]
+    finally:
+        subscription.close()
+    assert _wait_for(lambda: not engine_events._subscribers)  # dropped with the connection
+
+
+def test_json_framing_without_msgpack(server, monkeypatch):
+    monkeypatch.setattr(protocol, "msgpack", None)
+    frame = protocol.encode({"id": 1, "cmd": "ping", "args": []}, protocol.JSON)
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(frame + frame[:3])
+        assert protocol.recv_message(right) == ({"id": 1, "cmd": "ping", "args": []}, protocol.JSON)
+        left.close()
+        assert protocol.recv_message(right) == (None, None)  # a truncated frame reads as closed
+    with pytest.raises(protocol.ProtocolError, match="msgpack is not installed"):
+        protocol.decode(b"\x81", protocol.MSGPACK)
+
+    # The server answers in the codec the request came in
+    client = EngineClient(server.path, codec=protocol.JSON)
+    assert client.call("ping") == "pong" and client.call("active_grid_counts") == {}
+    assert client.call("debug", "tracemalloc_top", 99) == {"engine": {"error": "KeyError: 'No snapshot 99'"}}
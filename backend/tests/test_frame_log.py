@@ -0,0 +1,72 @@
+import zlib
+
+import pytest
+
+from websocket_manager.frame_log import FrameRecorder, read_frames
+
+
+def _deflate(text):
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(text.encode("utf-8")) + compressor.flush()
+
+
+def _frames(path):
+    return [(stream, is_binary, payload) for _, stream, is_binary, payload in read_frames(path)]
+
+
+def test_text_and_deflated_binary_frames_round_trip(tmp_path):
+    path = str(tmp_path / "capture.gbfl")
+    binary = _deflate('{"table":"spot/user/order","data":[]}')
+    recorder = FrameRecorder(path)
+    recorder.record("binance:BTC/USDT", '{"e":"executionReport","L":"29700"}')
+    recorder.record("bitmart:BTC/USDT", binary)
+    recorder.record("binance:BTC/USDT", "pong ✓")
+    recorder.close()
+
+    frames = list(read_frames(path))
+    assert [(stream, is_binary, payload) for _, stream, is_binary, payload in frames] == [
+        ("binance:BTC/USDT", False, '{"e":"executionReport","L":"29700"}'),
+        ("bitmart:BTC/USDT", True, binary),
+        ("binance:BTC/USDT", False, "pong ✓"),
+    ]
+    times = [received for received, *_ in frames]
+    assert times == sorted(times) and recorder.frames == 3
+    assert zlib.decompress(frames[1][3], -zlib.MAX_WBITS).startswith(b'{"table"')
+
+
+def test_an_appended_run_numbers_its_streams_afresh(tmp_path):
+    path = str(tmp_path / "capture.gbfl")
+    first = FrameRecorder(path)
+    first.record("binance:BTC/USDT", "a")
+    first.record("binance:ETH/USDT", "b")
+    first.close()
+
+    # Stream id 0 now names another stream; frames read after it belong to the new name
+    second = FrameRecorder(path)
+    second.record("bybit:SOL/USDT", "c")
+    second.record("binance:ETH/USDT", "d")
+    second.close()
+
+    assert _frames(path) == [("binance:BTC/USDT", False, "a"), ("binance:ETH/USDT", False, "b"),
+                             ("bybit:SOL/USDT", False, "c"), ("binance:ETH/USDT", False, "d")]
+
+
+def test_a_truncated_tail_ends_the_log_at_the_last_whole_frame(tmp_path):
+    path = tmp_path / "capture.gbfl"
+    recorder = FrameRecorder(str(path))
+    recorder.record("binance:BTC/USDT", "complete")
+    recorder.record("binance:BTC/USDT", "cut short by a crash")
+    recorder.close()
+    path.write_bytes(path.read_bytes()[:-5])
+
+    assert _frames(str(path)) == [("binance:BTC/USDT", False, "complete")]
+
+    path.write_bytes(path.read_bytes()[:-20])  # now inside the last header
+    assert _frames(str(path)) == [("binance:BTC/USDT", False, "complete")]
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "trades.json"
+    path.write_text("[]")
+    with pytest.raises(ValueError):
+        list(read_frames(str(path)))
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from backtesting.grid_backtest import GridBacktester, run_backtest
+
+# Ticks 100 -> 89 -> 100 -> 111 with a 10% grid of two SLs and no fees, worked by hand:
+#   reset at 100: buy 1 @ 100; TP 110 (qty 1); SLs 90, 81
+#   89:  SL 90 fills, buy 100/90 @ 90; new SL 81 * 0.9 = 72.9; rebound TP 99
+#   100: TP 99 fills, sell 100/90 @ 99 (+110); the lowest SL (72.9) goes, SL 99 * 0.9 = 89.1
+#   111: top TP 110 fills, sell 1 @ 110; reset at 110: buy 100/110 @ 110
+# Cash: -100, -200, -90, +20, -80; equity at the last close: -80 + 111 * 100/110
+TICKS = [100.0, 89.0, 100.0, 111.0]
+PNL = -80 + 111 * 100 / 110
+
+
+def _run(**kwargs):
+    ticks = np.array(TICKS)
+    return GridBacktester(10, 10, 100, sl_levels=2, **kwargs).run(ticks, ticks, ticks)
+
+
+def test_hand_worked_ticks():
+    report = _run(fee_rate=0)
+
+    assert report["fills"] == {"sl": 1, "tp": 2, "resets": 2, "skipped_orders": 0}
+    assert report["pnl"] == pytest.approx(PNL)
+    assert report["capital_used"] == pytest.approx(200) and report["return_pct"] == pytest.approx(PNL / 2)
+    # Worst point is the 89 tick: equity -200 + (1 + 100/90) * 89 against a peak of 0
+    assert report["max_drawdown"] == pytest.approx(200 - (1 + 100 / 90) * 89)
+    assert report["open_position"] == pytest.approx(100 / 110)
+
+
+def test_fees_and_skipped_orders():
+    report = _run(fee_rate=0.001)
+    # 0.1% of every notional traded: 100 + 100 + 110 + 110 + 100
+    assert report["fees"] == pytest.approx(0.52)
+    assert report["pnl"] == pytest.approx(PNL - 0.52)
+
+    # With whole-unit steps every SL is under min_notional: the levels move but never trade, and
+    # the reset at 110 cannot buy a whole unit with 100 of quote, so the grid halts holding nothing
+    ticks = np.array(TICKS)
+    report = GridBacktester(10, 10, 100, sl_levels=2, fee_rate=0, tick_size="0.01", step_size="1",
+                            min_notional=95).run(ticks, ticks, ticks)
+    assert report["fills"] == {"sl": 1, "tp": 2, "resets": 1, "skipped_orders": 4}
+    assert report["halted"] and report["open_position"] == 0 and report["pnl"] == pytest.approx(10)
+
+
+def test_ohlcv_bars_follow_the_same_path_as_ticks():
+    # Down bars run open -> high -> low, up bars open -> low -> high, so each bar crosses what its tick did
+    ohlcv = [[0, 100, 100, 100, 100, 1], [1, 100, 100, 89, 89, 1],
+             [2, 89, 100, 89, 100, 1], [3, 100, 111, 100, 111, 1]]
+    report = run_backtest(ohlcv, 10, 10, 100, sl_levels=2, fee_rate=0)
+    expected = _run(fee_rate=0)
+    report.pop("elapsed"), expected.pop("elapsed")
+    assert report == expected
+
+    empty = run_backtest(np.empty((0, 6)), 10, 10, 100)
+    assert (empty["bars"], empty["pnl"], empty["fills"]) == (0, 0.0, {})
@@ -0,0 +1,407 @@
+import json
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from ccxt.base.errors import InvalidOrder, RequestTimeout
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backtesting.grid_backtest import GridBacktester
+from database import crud, models
+from exchanges.quantizer import Quantizer
+from grid_logic.levels import GridLevels, sl_prices, tp_prices
+from grid_logic.order_ids import client_order_id, parse_client_order_id
+import websocket_manager.websocket_manager as wm
+
+SYMBOL = "BTC/USDT"
+PRICE = 30000.0
+AMOUNT = 20.0
+
+
+class FakeExchange:
+    """Resting orders in a dict; placements, cancels and the free balance are all observable."""
+
+    id = name = "binance"
+
+    def __init__(self, base_free=0.0):
+        self.orders = {}
+        self.placed = []
+        self.next_id = 0
+        self.cancelled = []
+        self.base_free = base_free
+
+    def _create(self, side, amount, price, params=None):
+        self.next_id += 1
+        order = {"id": str(self.next_id), "side": side, "amount": amount, "price": price,
+                 "clientOrderId": (params or {}).get("clientOrderId")}
+        self.orders[order["id"]] = order
+        self.placed.append(order)
+        return order
+
+    def create_limit_buy_order(self, symbol, amount, price, params=None):
+        return self._create("buy", amount, price, params)
+
+    def create_limit_sell_order(self, symbol, amount, price, params=None):
+        return self._create("sell", amount, price, params)
+
+    def fetch_open_orders(self, symbol=None):
+        return list(self.orders.values())
+
+    def cancel_order(self, order_id, symbol=None):
+        self.cancelled.append(self.orders.pop(order_id))
+
+    def fetch_balance(self):
+        return {"BTC": {"free": self.base_free}, "USDT": {"free": 1e6}}
+
+
+class InlineTimer:
+    def __init__(self, interval, function, args=None, kwargs=None):
+        self.function, self.args = function, args or ()
+
+    def start(self):
+        self.function(*self.args)
+
+
+@pytest.fixture
+def grid(tmp_path, monkeypatch):
+    """A stored grid on a scratch database, with replacement orders placed inline."""
+    Session = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'grid.db'}"))
+    models.Base.metadata.create_all(bind=Session.kw["bind"])
+    monkeypatch.setattr(wm, "SessionLocal", Session)
+    monkeypatch.setattr(wm, "threading", SimpleNamespace(Timer=InlineTimer))
+    monkeypatch.setattr(wm, "_pending_levels", set())
+    monkeypatch.setattr(wm, "_placed_orders", {})
+    quantizer = Quantizer("0.01", "0.00001")
+
+    def make(tps, sls, base_free=0.0):
+        session = Session()
+        config = models.ExchangeBotConfig(exchange_id=1, amount=AMOUNT, tp_percent=1.0, sl_percent=1.0)
+        session.add(config)
+        session.flush()
+        exchange = FakeExchange(base_free)
+        levels = GridLevels.for_grid(config, SYMBOL, quantizer)
+        for price in tps:
+            levels.add_tp(price, exchange.create_limit_sell_order(SYMBOL, 0.001, price)["id"])
+        for price in sls:
+            levels.add_sl(price, exchange.create_limit_buy_order(SYMBOL, 0.001, price)["id"])
+        levels.save(session)
+        session.commit()
+        exchange.placed.clear()
+
+        def fill(price, filled=(), client_id=None):
+            for order in [o for o in exchange.orders.values() if o["price"] in filled]:
+                del exchange.orders[order["id"]]
+            wm.process_order_update(exchange, SYMBOL, config.id, AMOUNT, quantizer, 5.0, 1.0, 1.0, price,
+                                    client_id=client_id)
+            session.expire_all()
+            return GridLevels.load(session, session.get(models.ExchangeBotConfig, config.id), SYMBOL, quantizer)
+        return exchange, fill
+
+    return make, quantizer, Session
+
+
+def test_levels_take_crossed_slices():
+    levels = GridLevels([30300, 30100, 30200], [29000, 29700, 29400])
+    assert levels.take_tps(30150) == [30100]
+    assert levels.take_sls(29400) == [29700, 29400]
+    assert levels.top_tp == 30300 and levels.lowest_sl == 29000
+
+    levels.restore_sls([29400])
+    assert levels.sls == [29000, 29400]
+
+
+def test_ladders_have_the_requested_depth():
+    assert len(sl_prices(PRICE, 1.0, 200)) == 200
+    assert tp_prices(PRICE, 1.0, 1) == [pytest.approx(30300)]
+    assert sl_prices(PRICE, 1.0, 2) == [pytest.approx(29700), pytest.approx(29403)]
+
+
+def test_gap_down_fills_every_crossed_sl_in_one_update(grid):
+    make, quantizer, _ = grid
+    sls = [quantizer.round_price(p) for p in sl_prices(PRICE, 1.0, 50)]
+    exchange, fill = make([30300.0], sls, base_free=0.003)
+
+    crossed = [p for p in sls if p >= 29000.0]
+    levels = fill(29000.0, filled=crossed)  # through the top three SLs
+
+    assert len(crossed) == 3
+    assert len(levels.sls) == 50 and not set(crossed) & set(levels.sls)
+    assert min(levels.sls) < min(sls)  # the replacements extend the grid downwards
+    rebounds = sorted(quantizer.round_price(p * 1.01) for p in crossed)
+    assert levels.tps == rebounds + [30300.0]
+
+    buys = [o for o in exchange.placed if o["side"] == "buy"]
+    sells = [o for o in exchange.placed if o["side"] == "sell"]
+    assert len(buys) == 3 and len(sells) == 3
+    assert sum(o["amount"] for o in sells) == pytest.approx(0.003, abs=3e-5)
+
+
+def test_rebound_tps_rearm_sls_and_drop_the_lowest(grid):
+    make, quantizer, _ = grid
+    sls = [29700.0, 29403.0, 29108.97, 28817.88]
+    exchange, fill = make([30300.0, 30000.0, 29997.0], sls)
+
+    levels = fill(30050.0, filled=[30000.0, 29997.0])  # both rebound TPs, not the top one
+
+    assert levels.tps == [30300.0]
+    assert sorted(o["price"] for o in exchange.cancelled) == [28817.88, 29108.97]
+    new_sls = sorted(quantizer.round_price(p * 0.99) for p in (29997.0, 30000.0))
+    assert levels.sls == sorted([29403.0, 29700.0] + new_sls)
+    assert sorted(o["price"] for o in exchange.placed) == new_sls
+
+
+def test_price_between_levels_changes_nothing(grid):
+    make, _, _ = grid
+    exchange, fill = make([30300.0], [29700.0, 29403.0])
+
+    levels = fill(30000.0)
+
+    assert levels.tps == [30300.0] and levels.sls == [29403.0, 29700.0]
+    assert not exchange.placed and not exchange.cancelled
+
+
+def test_late_fill_leaves_resting_levels_alone(grid):
+    make, quantizer, _ = grid
+    exchange, fill = make([30300.0], [29700.0, 29403.0, 29108.97], base_free=0.001)
+
+    levels = fill(29000.0, filled=[29108.97])  # only the lowest SL filled; the two above still rest
+
+    rearmed = quantizer.round_price(29403.0 * 0.99)
+    assert levels.sls == [rearmed, 29403.0, 29700.0]
+    assert levels.tps == [quantizer.round_price(29108.97 * 1.01), 30300.0]
+    assert [(o["side"], o["price"]) for o in exchange.placed] == [("buy", rearmed), ("sell", levels.tps[0])]
+
+
+def test_fill_writes_only_the_changed_level_rows(grid):
+    make, quantizer, Session = grid
+    exchange, fill = make([30300.0], [29700.0, 29403.0])
+
+    fill(29700.0, filled=[29700.0])
+    fill(29403.0, filled=[29403.0])  # the next update also writes the order ids placed since
+
+    session = Session()
+    rows = {(r.order_type, r.price): r for r in session.query(models.OrderLevel)}
+    assert rows[("sl", 29700.0)].status == "filled" and rows[("sl", 29403.0)].status == "filled"
+    assert rows[("tp", 30300.0)].status == "open"
+    rearmed = rows[("sl", quantizer.round_price(29403.0 * 0.99))]
+    assert rearmed.status == "open" and rearmed.side == "buy"
+    assert rearmed.price_ticks == quantizer.price_to_ticks(rearmed.price)
+    # The replacement's order id is recorded with the next update after it is placed
+    assert rearmed.order_id == next(o["id"] for o in exchange.placed if o["side"] == "buy")
+
+
+def test_legacy_json_levels_move_to_rows_and_link_by_price(grid):
+    make, quantizer, Session = grid
+    session = Session()
+    config = models.ExchangeBotConfig(exchange_id=1, tp_levels_json=json.dumps([30300.0]),
+                                      sl_levels_json=json.dumps([29700.0, 29403.0]))
+    session.add(config)
+    session.flush()
+    exchange = FakeExchange()
+    exchange.create_limit_buy_order(SYMBOL, 0.001, 29700.0)
+
+    levels = GridLevels.load(session, config, SYMBOL, quantizer)
+    resting, links = wm._link_open_orders(levels.rows("sl", levels.sls), exchange.fetch_open_orders(), quantizer)
+
+    assert levels.tps == [30300.0] and levels.sls == [29403.0, 29700.0]
+    assert config.tp_levels_json == "[]" and config.sl_levels_json == "[]"
+    linked = [r for r in levels.rows("sl", levels.sls) if r.id in resting]
+    assert [r.price for r in linked] == [29700.0] and links == {linked[0].id: "1"}
+    assert crud.get_stored_levels(session, config.id) == ([30300.0], [29700.0, 29403.0])
+
+
+class FlakyExchange(FakeExchange):
+    """
+    Places each order, but the first `timeouts` responses are lost; with `fills` those orders
+    filled at once. Reusing an open order's client id is rejected as Binance does.
+    """
+
+    def __init__(self, timeouts, fills=False):
+        super().__init__()
+        self.timeouts = timeouts
+        self.fills = fills
+        self.closed = []
+
+    def create_limit_buy_order(self, symbol, amount, price, params=None):
+        client_id = (params or {}).get("clientOrderId")
+        if client_id and any(o["clientOrderId"] == client_id for o in self.orders.values()):
+            raise InvalidOrder('binance {"code":-2010,"msg":"Duplicate order sent."}')
+        order = super().create_limit_buy_order(symbol, amount, price, params)
+        if self.timeouts:
+            self.timeouts -= 1
+            if self.fills:
+                del self.orders[order["id"]]
+                self.closed.append(dict(order, status="closed", filled=amount, timestamp=int(time.time() * 1000)))
+            raise RequestTimeout("read timed out")
+        return order
+
+    def fetch_closed_orders(self, symbol=None, since=None, limit=None, params=None):
+        return [o for o in self.closed if since is None or o["timestamp"] >= since]
+
+
+@pytest.mark.parametrize("fills", [False, True], ids=["resting", "filled"])
+def test_timed_out_placement_is_found_not_placed_twice(monkeypatch, fills):
+    monkeypatch.setattr(wm, "ORDER_RETRY_DELAY", 0)
+    exchange = FlakyExchange(timeouts=1, fills=fills)
+    quantizer = Quantizer("0.01", "0.00001")
+    order_ids = []
+
+    wm.place_limit_buys(exchange, SYMBOL, AMOUNT, [29700.0], quantizer, 5.0, order_ids, [client_order_id(7, 42)])
+
+    assert len(exchange.placed) == 1 and order_ids == [exchange.placed[0]["id"]]
+    assert len(exchange.closed) == int(fills)
+    assert parse_client_order_id("t-gb7l42g0") == (7, 42, 0) and parse_client_order_id("x-123") is None
+
+
+def test_duplicate_client_id_returns_the_order_already_resting(monkeypatch):
+    monkeypatch.setattr(wm, "ORDER_RETRY_DELAY", 0)
+    exchange = FlakyExchange(timeouts=0)
+    resting = exchange.create_limit_buy_order(SYMBOL, 0.00067, 29700.0, {"clientOrderId": client_order_id(7, 42)})
+    order_ids = []
+
+    wm.place_limit_buys(exchange, SYMBOL, AMOUNT, [29700.0], Quantizer("0.01", "0.00001"), 5.0, order_ids,
+                        [client_order_id(7, 42)])
+
+    assert exchange.placed == [resting] and order_ids == [resting["id"]]
+    assert wm._is_duplicate_order(InvalidOrder('bybit {"retCode":110072,"retMsg":"OrderLinkedID is duplicate"}'))
+    assert not wm._is_duplicate_order(InvalidOrder('binance {"code":-2010,"msg":"Account has insufficient balance"}'))
+
+
+def test_fill_by_client_id_is_applied_once(grid):
+    make, quantizer, Session = grid
+    exchange, fill = make([30300.0], [29700.0, 29403.0], base_free=0.001)
+    row = Session().query(models.OrderLevel).filter_by(price=29700.0).one()
+    client_id = client_order_id(row.bot_config_id, row.id)
+
+    levels = fill(29700.0, filled=[29700.0], client_id=client_id)
+    placed = list(exchange.placed)
+    again = fill(29700.0, client_id=client_id)  # the same fill, delivered twice
+    fill(29700.0, client_id=client_order_id(row.bot_config_id, 0, 5))  # the grid's entry buy
+
+    assert exchange.placed == placed and again.sls == levels.sls and again.tps == levels.tps
+    # The replacements carry their new levels' client order ids
+    assert all(parse_client_order_id(o["clientOrderId"]).grid == row.bot_config_id for o in placed)
+
+
+def test_order_placed_but_not_recorded_links_by_client_id(grid):
+    make, quantizer, Session = grid
+    session = Session()
+    config = models.ExchangeBotConfig(exchange_id=1)
+    session.add(config)
+    session.flush()
+    levels = GridLevels.for_grid(config, SYMBOL, quantizer)
+    levels.add_sl(29700.0)
+    levels.add_sl(29403.0)
+    rows = levels.save(session)
+    exchange = FakeExchange()
+    # The first level's order was placed just before a crash; the second links by price as before
+    exchange.create_limit_buy_order(SYMBOL, 0.001, 29403.0)
+    exchange.create_limit_buy_order(SYMBOL, 0.001, 29700.0, {"clientOrderId": client_order_id(config.id, rows[0].id)})
+
+    resting, links = wm._link_open_orders(rows, exchange.fetch_open_orders(), quantizer, config.id)
+
+    assert links == {rows[0].id: "2", rows[1].id: "1"} and resting == {rows[0].id, rows[1].id}
+
+
+def test_edited_percentages_reach_a_running_grid(grid):
+    make, quantizer, Session = grid
+    exchange, fill = make([30300.0], [29700.0, 29403.0], base_free=0.001)
+    session = Session()
+    session.query(models.ExchangeBotConfig).update({"tp_percent": 2.0, "sl_percent": 3.0})
+    session.commit()
+
+    levels = fill(29700.0, filled=[29700.0])  # the socket still passes the 1% it started with
+
+    assert levels.sls == [quantizer.round_price(29403.0 * 0.97), 29403.0]
+    assert levels.tps == [quantizer.round_price(29700.0 * 1.02), 30300.0]
+
+
+def test_backtester_replays_the_live_fill_rules(grid):
+    make, quantizer, _ = grid
+    ticks = [PRICE, 29650.0, 29400.0, 29900.0, 29050.0]  # two SLs, a rebound TP, then a gap through two SLs
+    exchange, fill = make([quantizer.round_price(p) for p in tp_prices(PRICE, 1.0, 1)],
+                          [quantizer.round_price(p) for p in sl_prices(PRICE, 1.0, 3)], base_free=1.0)
+    for price in ticks[1:]:
+        crossed = [o["price"] for o in exchange.orders.values()
+                   if (o["side"] == "buy" and o["price"] >= price) or (o["side"] == "sell" and o["price"] <= price)]
+        levels = fill(price, filled=crossed)
+
+    backtester = GridBacktester(1.0, 1.0, AMOUNT, sl_levels=3, tick_size="0.01", step_size="0.00001")
+    report = backtester.run(*[np.array(ticks)] * 3)
+
+    assert levels.tps == [price for price, _ in backtester.tps]
+    assert levels.sls == [price for price, _ in backtester.sls]
+    sides = [o["side"] for o in exchange.placed]
+    assert report["fills"]["sl"] == sides.count("sell") == 4  # each SL fill places its rebound TP
+    assert report["fills"]["tp"] == 1 and report["fills"]["resets"] == 1
+
+
+def test_symbols_sync_as_one_set_based_diff(tmp_path):
+    Session = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'symbols.db'}"))
+    models.Base.metadata.create_all(bind=Session.kw["bind"])
+    session = Session()
+    session.add_all([models.ExchangeAPIKey(exchange="binance", balance=50.0),
+                     models.ExchangeAPIKey(exchange="bybit", balance=20.0)])
+    session.commit()
+    crud.sync_symbols(session, {"BTC/USDT": (1.0, 1.0), "ETH/USDT": (1.0, 1.0)})
+    session.commit()
+    session.add(models.ExchangeAPIKey(exchange="gateio", balance=30.0))  # needs configs for the kept symbols
+    session.commit()
+
+    statements = []
+    event.listen(session.bind, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    result = crud.sync_symbols(session, {"btc/usdt": (2.0, 1.5), "ETH/USDT": (1.0, 1.0), "SOL/USDT": (1.0, 1.0)})
+    executed = len(statements)
+    session.commit()
+
+    assert result == (["SOL/USDT"], ["BTC/USDT", "ETH/USDT"], [])
+    configs = {(c.symbol.symbol, c.exchange_api_key.exchange): (c.amount, c.tp_percent, c.sl_percent)
+               for c in session.query(models.ExchangeBotConfig)}
+    assert len(configs) == 9
+    assert configs[("BTC/USDT", "bybit")] == (20.0, 2.0, 1.5) and configs[("ETH/USDT", "gateio")] == (30.0, 1.0, 1.0)
+    assert executed == 6  # the same handful of statements for any number of symbols
+
+    btc = session.query(models.ExchangeBotConfig).join(models.Symbol).filter(models.Symbol.symbol == "BTC/USDT").first()
+    session.add_all([models.OrderLevel(bot_config_id=btc.id, exchange_api_key_id=btc.exchange_id, symbol="BTC/USDT",
+                                       price=29700.0, price_ticks=2970000, order_type="sl", side="buy"),
+                     models.GridLease(exchange_api_key_id=btc.exchange_id, symbol="BTC/USDT"),
+                     models.GridLease(exchange_api_key_id=btc.exchange_id, symbol="SOL/USDT")])
+    session.commit()
+
+    assert crud.sync_symbols(session, {"SOL/USDT": (1.0, 1.0)}) == ([], [], ["BTC/USDT", "ETH/USDT"])
+    session.commit()
+    assert session.query(models.ExchangeBotConfig).count() == 3 and session.query(models.Symbol).count() == 1
+    # No levels or leases are left behind for a grid whose config is gone
+    assert session.query(models.OrderLevel).count() == 0
+    assert [lease.symbol for lease in session.query(models.GridLease)] == ["SOL/USDT"]
+
+
+def test_shutdown_detaches_sockets_and_leaves_orders_resting(monkeypatch):
+    from grid_logic.grid_strategy import GridBot, stop_engine
+
+    sold = []
+    monkeypatch.setattr(wm, "close_and_sell_all", lambda exchange, symbol: sold.append((exchange.id, symbol)))
+
+    class Socket:
+        sock = None
+
+        def close(self):  # as the exchange handlers' on_close does for a forced closure
+            wm._close_grid(self, FakeExchange(), SYMBOL)
+
+    class BybitSocket:
+        def __init__(self):
+            self.closes = []
+
+        def close_socket(self, liquidate=True):
+            self.closes.append(liquidate)
+
+    bot, bybit = GridBot(), BybitSocket()
+    bot.websocket_connections = {("binance", SYMBOL): Socket(), ("bybit", SYMBOL): bybit}
+    stop_engine(bot)
+    assert sold == [] and bybit.closes == [False] and not bot.websocket_connections
+
+    bot.websocket_connections = {("binance", SYMBOL): Socket()}
+    bot.stop_symbol(SYMBOL, "binance")  # an explicit stop still liquidates
+    assert sold == [("binance", SYMBOL)]
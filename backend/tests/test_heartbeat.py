@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from websocket_manager.heartbeat import HeartbeatService
+
+
+class FakeSocket:
+    def __init__(self):
+        self.shut = False
+
+    def shutdown(self, how):
+        self.shut = True
+
+
+class FakeApp:
+    def __init__(self):
+        self.sock = SimpleNamespace(sock=FakeSocket())
+        self.pings = 0
+
+
+def _ping(app):
+    app.pings += 1
+
+
+def _service(apps, clock, interval=10, stale_after=60):
+    service = HeartbeatService(tick=1, clock=clock)
+    service._thread = "not started"  # rounds are driven by tick() below
+    for i, app in enumerate(apps):
+        service.register(app, ("bybit", f"S{i}/USDT"), _ping, interval, stale_after)
+    return service
+
+
+def test_only_silent_sockets_are_pinged_once_per_interval(clock):
+    apps = [FakeApp() for _ in range(100)]
+    service = _service(apps, clock)
+
+    clock.now += 10
+    for app in apps[:40]:
+        service.seen(app)  # these just received a frame
+    assert service.tick() == (60, 0)
+    assert service.tick() == (0, 0)  # no second ping within the interval
+
+    clock.now += 10
+    assert service.tick() == (100, 0)
+    assert [app.pings for app in (apps[0], apps[99])] == [1, 2]
+
+
+def test_silent_stream_is_shut_down_and_forgotten(clock):
+    live, dead = FakeApp(), FakeApp()
+    service = _service([live, dead], clock)
+
+    for _ in range(6):
+        clock.now += 10
+        service.seen(live)
+        service.tick()
+
+    assert dead.sock.sock.shut and not live.sock.sock.shut
+    assert dead.pings == 5  # pinged every interval until it counted as dead
+    clock.now += 10
+    assert service.tick() == (1, 0)  # only the live one is still watched
+
+
+def test_unregistered_socket_is_left_alone(clock):
+    app = FakeApp()
+    service = _service([app], clock)
+    service.unregister(app)
+
+    clock.now += 120
+    assert service.tick() == (0, 0) and not app.sock.sock.shut
@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import crud, models
+from grid_logic.leases import LeaseManager
+
+SYMBOLS = [f"L{i}/USDT" for i in range(8)]
+TTL = 2.0
+
+
+class FakeBot:
+    """Stands in for GridBot: appends when each grid starts, stops or detaches on this node to a log file."""
+
+    def __init__(self, node, log_path):
+        self.node = node
+        self.log_path = log_path
+
+    def _record(self, action, symbol):
+        # A file per node rather than a shared queue: the test kills nodes mid-run
+        with open(self.log_path, "a") as log:
+            log.write(f"{self.node} {action} {symbol} {time.time()}\n")
+
+    def run_symbol(self, exchange, symbol):
+        self._record("start", symbol)
+        return True
+
+    def stop_symbol(self, symbol, exchange=None):
+        self._record("stop", symbol)
+
+    def detach_symbol(self, symbol, exchange=None):
+        self._record("detach", symbol)
+
+
+def _sessions(url):
+    return sessionmaker(bind=create_engine(url, connect_args={"check_same_thread": False, "timeout": 30}))
+
+def _seed(url):
+    Session = _sessions(url)
+    models.Base.metadata.create_all(bind=Session.kw["bind"])
+    session = Session()
+    key = models.ExchangeAPIKey(exchange="binance", api_key="k", api_secret="s", balance=10)
+    session.add(key)
+    session.commit()
+    for symbol in SYMBOLS:
+        crud.ensure_grid_lease(session, key.id, symbol)
+    session.close()
+    return Session
+
+def _owners(Session):
+    session = Session()
+    try:
+        return {lease.symbol: lease.owner for lease in crud.get_grid_leases(session)}
+    finally:
+        session.close()
+
+def _wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+def _read_log(path):
+    with open(path) as log:
+        for line in log:
+            fields = line.split()
+            if len(fields) == 4:
+                yield fields[0], fields[1], fields[2], float(fields[3])
+
+def _node(url, log_path, node_id, capacity, stop_path):
+    manager = LeaseManager(FakeBot(node_id, log_path), session_factory=_sessions(url),
+                           node_id=node_id, capacity=capacity, ttl=TTL).start(seed=False)
+    # A stop file rather than a multiprocessing.Event, whose set() blocks on a killed waiter
+    while not os.path.exists(stop_path):
+        time.sleep(0.1)
+    manager.stop()
+
+
+def test_nodes_split_grids_and_take_over_without_overlap(tmp_path):
+    url = f"sqlite:///{tmp_path / 'leases.db'}"
+    Session = _seed(url)
+    context = multiprocessing.get_context("spawn")
+    stop_path = tmp_path / "stop"
+    logs = {name: tmp_path / f"{name}.log" for name in ("a", "b", "c")}
+    nodes = {name: context.Process(target=_node, args=(url, str(logs[name]), name, 4, str(stop_path))) for name in logs}
+    for process in nodes.values():
+        process.start()
+
+    try:
+        assert _wait_for(lambda: all(_owners(Session).values()), 60), _owners(Session)
+        owners = _owners(Session)
+        per_node = {name: sum(1 for owner in owners.values() if owner == name) for name in nodes}
+        assert max(per_node.values()) <= 4
+
+        # Kill the busiest node without releasing anything: its leases must expire, then move
+        victim = max(per_node, key=per_node.get)
+        nodes[victim].kill()
+        killed_at = time.time()
+        assert _wait_for(lambda: all(owner not in (None, victim) for owner in _owners(Session).values()), TTL * 5 + 30)
+        taken_over_at = time.time()
+        assert taken_over_at - killed_at >= TTL * 0.5  # nobody claimed before the lease could expire
+    finally:
+        stop_path.touch()
+        for process in nodes.values():
+            process.join(30)
+
+    # Rebuild every node's run intervals per grid; no two nodes may run a grid at the same time
+    intervals = {}
+    open_runs = {}
+    events = sorted((event for path in logs.values() if path.exists() for event in _read_log(path)), key=lambda e: e[3])
+    for node, action, symbol, at in events:
+        if action == "start":
+            open_runs[(node, symbol)] = at
+        elif (node, symbol) in open_runs:  # a stop or a detach
+            intervals.setdefault(symbol, []).append((open_runs.pop((node, symbol)), at, node))
+    for (node, symbol), started in open_runs.items():
+        intervals.setdefault(symbol, []).append((started, killed_at if node == victim else time.time(), node))
+
+    assert set(intervals) == set(SYMBOLS)
+    for symbol, runs in intervals.items():
+        runs.sort()
+        for (_, ended, node), (started, _, other) in zip(runs, runs[1:]):
+            assert started >= ended, f"{symbol} ran on {node} and {other} at the same time"
+
+
+def test_deleted_lease_stops_the_owner(tmp_path):
+    Session = _seed(f"sqlite:///{tmp_path / 'leases.db'}")
+    log_path = tmp_path / "nodes.log"
+    a = LeaseManager(FakeBot("a", log_path), session_factory=Session, node_id="a", capacity=5, ttl=30)
+    b = LeaseManager(FakeBot("b", log_path), session_factory=Session, node_id="b", capacity=5, ttl=30)
+
+    a.tick()
+    b.tick()
+    assert len(a.owned) == 5 and len(b.owned) == 3
+    assert not set(a.owned) & set(b.owned)
+
+    # Stopping through node b deletes the lease; owner a stops the grid on its next heartbeat
+    symbol = next(iter(a.owned.values()))[1]
+    b.stop_symbol(symbol, "binance")
+    a.tick()
+    assert symbol not in {grid[1] for grid in a.owned.values()}
+    assert symbol not in _owners(Session)
+
+    stopped = [(node, event_symbol) for node, action, event_symbol, _ in _read_log(log_path) if action == "stop"]
+    assert ("a", symbol) in stopped
+
+
+def test_lost_lease_detaches_and_leaves_the_orders(tmp_path):
+    Session = _seed(f"sqlite:///{tmp_path / 'leases.db'}")
+    log_path = tmp_path / "nodes.log"
+    a = LeaseManager(FakeBot("a", log_path), session_factory=Session, node_id="a", capacity=8, ttl=30)
+    a.tick()
+
+    # Another node took one grid over (a's lease expired meanwhile); its orders are the new owner's now
+    lease_id, (_, symbol) = next(iter(a.owned.items()))
+    session = Session()
+    session.query(models.GridLease).filter(models.GridLease.id == lease_id).update({"owner": "b"})
+    session.commit()
+    session.close()
+    a.tick()
+    a.stop()  # a graceful handover of the rest
+
+    actions = [(action, event_symbol) for _, action, event_symbol, _ in _read_log(log_path) if action != "start"]
+    assert actions[0] == ("detach", symbol)
+    assert sorted(actions) == sorted(("detach", s) for s in SYMBOLS)
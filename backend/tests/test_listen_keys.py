@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from websocket_manager.listen_keys import KEEPALIVE_INTERVAL, ListenKeys
+
+
+class FakeSession:
+    """Answers the userDataStream calls and counts them."""
+
+    def __init__(self):
+        self.calls = []
+        self.keys = 0
+        self.put_status = 200
+
+    def post(self, url, headers=None, timeout=None):
+        self.calls.append(("POST", headers["X-MBX-APIKEY"]))
+        self.keys += 1
+        return SimpleNamespace(status_code=200, raise_for_status=lambda: None,
+                               json=lambda: {"listenKey": f"key{self.keys}"})
+
+    def put(self, url, headers=None, params=None, timeout=None):
+        self.calls.append(("PUT", params["listenKey"]))
+        return SimpleNamespace(status_code=self.put_status, raise_for_status=lambda: None)
+
+
+def _keys(clock):
+    keys = ListenKeys(clock=clock)
+    keys.session = FakeSession()
+    keys._thread = "not started"  # keep-alives are driven by keepalive_due() below
+    return keys
+
+
+def test_sockets_of_one_api_key_share_a_key_and_one_keepalive(clock):
+    keys = _keys(clock)
+    manager = keys.manager("k", "https://api")
+    symbols = [("binance", f"S{i}/USDT") for i in range(50)]
+
+    assert {manager.acquire(owner) for owner in symbols} == {"key1"}
+    assert keys.manager("other", "https://api").acquire(symbols[0]) == "key2"
+
+    clock.now += KEEPALIVE_INTERVAL
+    keys.keepalive_due()
+    keys.keepalive_due()  # nothing due again until the next interval
+    assert keys.session.calls == [("POST", "k"), ("POST", "other"), ("PUT", "key1"), ("PUT", "key2")]
+
+
+def test_released_key_is_not_kept_alive_and_renewed_on_reuse(clock):
+    keys = _keys(clock)
+    manager = keys.manager("k", "https://api")
+    manager.acquire("a")
+    manager.release("a")
+
+    clock.now += KEEPALIVE_INTERVAL
+    assert keys.keepalive_due() is None
+    assert manager.acquire("a") == "key2"  # overdue, so the POST renews it
+    assert [c[0] for c in keys.session.calls] == ["POST", "POST"]
+
+
+def test_expired_key_is_replaced_on_the_next_acquire(clock):
+    keys = _keys(clock)
+    manager = keys.manager("k", "https://api")
+    manager.acquire("a")
+    manager.acquire("b")
+
+    keys.session.put_status = 400  # Binance dropped the key
+    clock.now += KEEPALIVE_INTERVAL
+    assert keys.keepalive_due() is None
+    manager.expired("key1")  # a listenKeyExpired event for the old key changes nothing more
+
+    assert manager.acquire("a") == "key2"
+    assert manager.acquire("b") == "key2"
@@ -0,0 +1,87 @@
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+import pytest
+
+from observability.logs import LOG_RECORDS_DROPPED, DeferredQueueHandler
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append((threading.current_thread().name, self.format(record)))
+
+
+class Rendered:
+    """An argument that notes which thread turned it into text."""
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.current_thread().name)
+        return "rendered"
+
+
+@pytest.fixture
+def logger():
+    # Outside the logger tree, so pytest's capture handlers on the root never render the records
+    return logging.Logger("tests.deferred", logging.INFO)
+
+
+def _listen(logger, maxsize=0):
+    records = queue.Queue(maxsize=maxsize)
+    logger.addHandler(DeferredQueueHandler(records))
+    collect = Collect()
+    return records, collect, logging.handlers.QueueListener(records, collect)
+
+
+def test_mutable_arguments_are_rendered_where_they_are_logged(logger):
+    records, collect, listener = _listen(logger)
+    levels, prices, pending = [1, 2], {"buy": 99.0}, {"a"}
+    logger.info("levels %s prices %s pending %s", levels, prices, pending)
+    logger.info("named %(levels)s", {"levels": levels})
+    levels.append(3)
+    prices["sell"] = 101.0
+    pending.add("b")
+
+    listener.start()
+    listener.stop()
+    assert [line for _, line in collect.lines] == [
+        "levels [1, 2] prices {'buy': 99.0} pending {'a'}",
+        "named [1, 2]",
+    ]
+
+
+def test_other_arguments_are_formatted_on_the_writer_thread(logger):
+    records, collect, listener = _listen(logger)
+    argument = Rendered()
+    logger.info("fill %s at %d", argument, 5)
+    assert argument.threads == []  # nothing rendered on the caller's thread
+
+    listener.start()
+    listener.stop()
+    [(writer, line)] = collect.lines
+    assert line == "fill rendered at 5"
+    assert argument.threads == [writer] and writer != threading.current_thread().name
+
+
+def test_a_full_queue_drops_records_without_blocking(logger):
+    records, collect, listener = _listen(logger, maxsize=2)
+    dropped = LOG_RECORDS_DROPPED._default().value
+
+    started = time.perf_counter()
+    for n in range(5):
+        logger.info("record %d", n)
+    assert time.perf_counter() - started < 1
+
+    assert LOG_RECORDS_DROPPED._default().value == dropped + 3
+    listener.start()
+    listener.stop()
+    assert [line for _, line in collect.lines] == ["record 0", "record 1"]
@@ -0,0 +1,140 @@
+import json
+from types import SimpleNamespace
+
+from grid_logic import recovery
+from websocket_manager import websocket_manager as wm
+from websocket_manager.market_data import CHANNELS, MarketData, MarketDataStream, PriceCache
+
+
+class FakeExchange:
+    id = "binance"
+
+    def __init__(self):
+        self.tickers = 0
+
+    def fetch_ticker(self, symbol):
+        self.tickers += 1
+        return {"last": 100.0}
+
+
+class FakeApp:
+    def __init__(self, clock=None):
+        self.sent = []
+        self.sent_at = []
+        self.clock = clock
+
+    def send(self, message):
+        self.sent.append(json.loads(message))
+        if self.clock is not None:
+            self.sent_at.append(self.clock[0])
+
+
+def test_streamed_quote_is_used_and_rest_only_without_one():
+    cache, exchange = PriceCache(), FakeExchange()
+
+    assert cache.price(exchange, "BTC/USDT") == 100.0
+    cache.update("binance", "BTC/USDT", bid=101.0, ask=103.0)
+    assert cache.price(exchange, "BTC/USDT") == 102.0  # mid of the book ticker
+    cache.update("binance", "BTC/USDT", bid=101.0, ask=103.0, last=101.5)
+    assert cache.price(exchange, "BTC/USDT") == 101.5
+
+    cache.drop("binance", ["BTC/USDT"])  # the stream went down
+    assert cache.price(exchange, "BTC/USDT") == 100.0
+    assert exchange.tickers == 2
+
+
+def test_quote_older_than_max_age_falls_back_to_rest():
+    now = [0.0]
+    cache, exchange = PriceCache(clock=lambda: now[0], max_age=30), FakeExchange()
+    cache.update("binance", "BTC/USDT", last=101.5)
+
+    now[0] = 30.0
+    assert cache.price(exchange, "BTC/USDT") == 101.5
+    now[0] = 30.5  # the socket is up but the symbol's updates stopped
+    assert cache.price(exchange, "BTC/USDT") == 100.0 and exchange.tickers == 1
+
+
+def test_warm_start_subscribes_the_grids_it_recovers(monkeypatch):
+    calls = []
+    monkeypatch.setattr(recovery, "market_data", SimpleNamespace(subscribe=lambda *a: calls.append(("sub",) + a),
+                                                                 unsubscribe=lambda *a: calls.append(("unsub",) + a)))
+    monkeypatch.setattr(recovery, "create_exchange_client", lambda key: SimpleNamespace(id="binance"))
+    monkeypatch.setattr(recovery.market_registry, "load", lambda exchange: None)
+    monkeypatch.setattr(recovery, "fetch_account_open_orders", lambda exchange, symbols: {})
+    monkeypatch.setattr(wm, "reconcile_grid", lambda exchange, symbol, *args, **kwargs:
+                        ("config", "params") if symbol == "BTC/USDT" else None)
+    key = SimpleNamespace(exchange="binance", balance=10.0)
+    bot = SimpleNamespace(websocket_connections={})
+
+    results = recovery._reconcile_account(bot, key, ["BTC/USDT", "ETH/USDT"])
+
+    assert [r["status"] for r in results] == ["reconciled", "failed"]
+    assert sorted(calls) == [("sub", "binance", "BTC/USDT"), ("sub", "binance", "ETH/USDT"),
+                             ("unsub", "binance", "ETH/USDT")]
+
+
+def test_each_exchange_ticker_message_is_parsed():
+    binance = {"u": 1, "s": "BTCUSDT", "b": "101.5", "B": "1", "a": "102.5", "A": "2"}
+    bitmart = {"table": "spot/ticker", "data": [{"symbol": "BTC_USDT", "last_price": "102", "bid_px": "101.5",
+                                                 "ask_px": "102.5"}]}
+    gateio = {"channel": "spot.book_ticker", "event": "update", "result": {"s": "BTC_USDT", "b": "101.5", "a": "102.5"}}
+    bybit = {"topic": "tickers.BTCUSDT", "type": "snapshot", "data": {"symbol": "BTCUSDT", "lastPrice": "102"}}
+
+    assert list(CHANNELS["binance"].quotes(binance)) == [("BTCUSDT", 101.5, 102.5, None)]
+    assert list(CHANNELS["bitmart"].quotes(bitmart)) == [("BTC_USDT", 101.5, 102.5, 102.0)]
+    assert list(CHANNELS["gateio"].quotes(gateio)) == [("BTC_USDT", 101.5, 102.5, None)]
+    assert list(CHANNELS["bybit"].quotes(bybit)) == [("BTCUSDT", None, None, 102.0)]
+    assert list(CHANNELS["bybit"].quotes({"op": "pong"})) == []
+
+
+def test_subscriptions_go_out_batched_on_one_socket():
+    stream = MarketDataStream("bybit", PriceCache())
+    stream.ws = FakeApp()  # connected already, so nothing new is opened
+    for i in range(25):
+        stream.subscribe(f"S{i:02d}/USDT")
+    stream.unsubscribe("S00/USDT")
+    stream._flush()
+
+    sent = stream.ws.sent
+    assert [len(m["args"]) for m in sent] == [10, 10, 4]  # Bybit takes 10 topics per request
+    assert {m["op"] for m in sent} == {"subscribe"}
+    assert "tickers.S00USDT" not in {a for m in sent for a in m["args"]}
+
+
+def test_subscriptions_are_paced_to_the_exchange_message_rate():
+    now = [0.0]
+    stream = MarketDataStream("binance", PriceCache(), clock=lambda: now[0],
+                              sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+    stream.ws = FakeApp(clock=now)
+    for i in range(1000):
+        stream.subscribe(f"S{i:04d}/USDT")
+    stream._flush()
+
+    assert [len(m["params"]) for m in stream.ws.sent] == [200] * 5
+    assert stream.ws.sent_at == [0.0, 0.25, 0.5, 0.75, 1.0]  # under Binance's 5 messages a second
+
+    now[0] = 10.0  # a later flush after a quiet spell goes out at once
+    stream.subscribe("LATE/USDT")
+    stream._flush()
+    assert stream.ws.sent_at[-1] == 10.0
+
+
+def test_symbols_beyond_the_connection_limit_open_another_stream(monkeypatch):
+    monkeypatch.setattr(MarketDataStream, "_connect", lambda self: FakeApp())
+    data = MarketData()
+    for i in range(1030):
+        data.subscribe("binance", f"S{i:04d}/USDT")
+    data.subscribe("binance", "S0000/USDT")  # already carried
+
+    first, second = data._streams["binance"]
+    assert (len(first.symbols), len(second.symbols)) == (1024, 6)
+    assert first.key != second.key
+
+    data.unsubscribe("binance", "S0001/USDT")
+    data.unsubscribe("binance", "S1029/USDT")
+    data.subscribe("binance", "NEW/USDT")  # back into the room the first stream has again
+    assert "NEWUSDT" in first.symbols and len(second.symbols) == 5
+
+    for i in range(2000):
+        data.subscribe("bybit", f"S{i:04d}/USDT")
+    assert len(data._streams["bybit"]) == 1  # Bybit has no per-connection cap here
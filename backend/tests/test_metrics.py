@@ -0,0 +1,93 @@
+import pytest
+
+from observability.metrics import Counter, Gauge, Histogram, Registry, merge_expositions
+
+
+def _samples(registry):
+    return [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+
+def test_labelled_counters_and_gauges():
+    registry = Registry()
+    fills = Counter("fills_total", "Fills.", ["exchange"], registry=registry)
+    balance = Gauge("balance", "Balance.", ["asset"], registry=registry)
+    fills.labels("binance").inc()
+    fills.labels("binance").inc(2)
+    fills.labels("bybit").inc()
+    balance.labels('US"DT').set(10)
+    balance.labels('US"DT').dec(2.5)
+
+    assert registry.render().splitlines()[:2] == ["# HELP fills_total Fills.", "# TYPE fills_total counter"]
+    assert _samples(registry) == ['fills_total{exchange="binance"} 3.0', 'fills_total{exchange="bybit"} 1.0',
+                                  'balance{asset="US\\"DT"} 7.5']
+    with pytest.raises(ValueError):
+        fills.labels("binance").inc(-1)
+    with pytest.raises(ValueError):
+        fills.inc()  # labelled metrics need .labels()
+    with pytest.raises(ValueError):
+        fills.labels("binance", "extra")
+    with pytest.raises(ValueError):
+        Counter("fills_total", "Again.", registry=registry)
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    registry = Registry()
+    latency = Histogram("latency_seconds", "Latency.", buckets=(0.5, 0.1, 1.0), registry=registry)
+    for value in (0.1, 0.2, 0.5, 3.0):
+        latency.observe(value)
+
+    assert _samples(registry) == [
+        'latency_seconds_bucket{le="0.1"} 1',  # le is inclusive: 0.1 counts here
+        'latency_seconds_bucket{le="0.5"} 3',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 3.8",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_labelled_histogram_puts_le_after_the_labels():
+    registry = Registry()
+    rest = Histogram("rest_seconds", "REST.", ["method"], buckets=(1.0,), registry=registry)
+    with rest.labels("fetch_order").time():
+        pass
+
+    assert _samples(registry)[:2] == ['rest_seconds_bucket{method="fetch_order",le="1.0"} 1',
+                                      'rest_seconds_bucket{method="fetch_order",le="+Inf"} 1']
+    assert _samples(registry)[-1] == 'rest_seconds_count{method="fetch_order"} 1'
+
+
+def test_callback_gauges_are_read_at_scrape_time():
+    registry = Registry()
+    state = {"threads": {("timer",): 2, ("other",): 5}, "queue": 3}
+    Gauge("threads", "Threads.", ["kind"], registry=registry, callback=lambda: state["threads"])
+    Gauge("queue", "Queue.", registry=registry, callback=lambda: state["queue"])
+    Gauge("broken", "Broken.", registry=registry, callback=lambda: 1 / 0)
+
+    assert _samples(registry) == ['threads{kind="timer"} 2', 'threads{kind="other"} 5', "queue 3"]
+    state["queue"] = 4
+    assert _samples(registry)[-1] == "queue 4"
+    assert "# TYPE broken gauge" in registry.render()  # a failing callback drops only its samples
+
+
+def test_merge_labels_every_shard_series_once_per_family():
+    shard = ("# HELP fills_total Fills.\n# TYPE fills_total counter\n"
+             'fills_total{exchange="binance"} 2.0\nfills_total{} 1.0\n'
+             "# HELP commits Commits.\n# TYPE commits counter\ncommits 5.0\n")
+    supervisor = "# HELP fills_total Fills.\n# TYPE fills_total counter\nfills_total 7.0\n"
+
+    merged = merge_expositions([(None, supervisor), ({"shard": "0"}, shard), ({"shard": "1"}, shard)])
+
+    assert merged.splitlines() == [
+        "# HELP fills_total Fills.",
+        "# TYPE fills_total counter",
+        "fills_total 7.0",
+        'fills_total{shard="0",exchange="binance"} 2.0',
+        'fills_total{shard="0"} 1.0',
+        'fills_total{shard="1",exchange="binance"} 2.0',
+        'fills_total{shard="1"} 1.0',
+        "# HELP commits Commits.",
+        "# TYPE commits counter",
+        'commits{shard="0"} 5.0',
+        'commits{shard="1"} 5.0',
+    ]
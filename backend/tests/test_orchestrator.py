@@ -0,0 +1,109 @@
+import threading
+import time
+
+import grid_logic.orchestrator as orchestrator
+from grid_logic.grid_strategy import GridBot
+from grid_logic.orchestrator import BulkOrchestrator
+
+
+class FakeBot:
+    """Blocks every call until `release` is set and records how many ran at once per exchange."""
+
+    def __init__(self, fail=()):
+        self.release = threading.Event()
+        self.fail = set(fail)
+        self.running = {}
+        self.peak = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, action, exchange, symbol):
+        with self._lock:
+            self.calls.append((action, exchange, symbol))
+            self.running[exchange] = self.running.get(exchange, 0) + 1
+            self.peak[exchange] = max(self.peak.get(exchange, 0), self.running[exchange])
+        self.release.wait(5)
+        with self._lock:
+            self.running[exchange] -= 1
+            self.calls.append((action + " done", exchange, symbol))
+        if symbol in self.fail:
+            raise RuntimeError("exchange said no")
+        return True
+
+    def run_symbol(self, exchange, symbol):
+        return self._call("start", exchange, symbol)
+
+    def stop_symbol(self, symbol, exchange=None):
+        self._call("stop", exchange, symbol)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_each_exchange_runs_at_most_its_limit_at_once():
+    bot = FakeBot()
+    bulk = BulkOrchestrator(bot, concurrency={"binance": 3, "gateio": 1})
+    pairs = [("Binance", f"S{i}/USDT") for i in range(8)] + [("gateio", f"S{i}/USDT") for i in range(4)]
+
+    job = bulk.submit("start", pairs)
+
+    assert _wait_for(lambda: bot.running == {"binance": 3, "gateio": 1})
+    assert bulk.pending_counts() == {"binance": 5, "gateio": 3}
+    bot.release.set()
+    assert _wait_for(lambda: bulk.get_job(job["job_id"])["status"] == "done")
+    assert bot.peak == {"binance": 3, "gateio": 1}
+
+
+def test_job_reports_progress_per_pair():
+    bot = FakeBot(fail={"BAD/USDT"})
+    bulk = BulkOrchestrator(bot, concurrency={"binance": 1})
+
+    job = bulk.submit("start", [("binance", "BTC/USDT"), ("binance", "BAD/USDT")])
+    assert job["status"] == "running" and sum(job["counts"].values()) == 2
+    assert _wait_for(lambda: bulk.get_job(job["job_id"])["counts"] == {"running": 1, "queued": 1})
+
+    bot.release.set()
+    assert _wait_for(lambda: bulk.get_job(job["job_id"])["status"] == "done")
+    done = bulk.get_job(job["job_id"])
+    assert done["counts"] == {"started": 1, "failed": 1} and done["finished_at"] >= done["created_at"]
+    assert [(p["status"], p["error"]) for p in done["pairs"]] == [("started", None), ("failed", "exchange said no")]
+    assert bulk.submit("stop", [])["status"] == "done"
+
+
+def test_oldest_jobs_are_evicted(monkeypatch):
+    monkeypatch.setattr(orchestrator, "MAX_STORED_JOBS", 3)
+    bulk = BulkOrchestrator(FakeBot())
+
+    jobs = [bulk.submit("stop", [])["job_id"] for _ in range(5)]
+
+    assert list(bulk.jobs) == jobs[2:]
+    assert bulk.get_job(jobs[0]) is None and bulk.get_job(jobs[4])["status"] == "done"
+
+
+def test_start_and_stop_of_one_pair_never_interleave():
+    bot = FakeBot()
+    bulk = BulkOrchestrator(bot, concurrency={"binance": 4})
+
+    bulk.submit("start", [("binance", "BTC/USDT")])
+    stop = bulk.submit("stop", [("binance", "BTC/USDT"), ("binance", "ETH/USDT")])
+    assert _wait_for(lambda: ("stop", "binance", "ETH/USDT") in bot.calls)  # other pairs are not held up
+    bot.release.set()
+    assert _wait_for(lambda: bulk.get_job(stop["job_id"])["status"] == "done")
+
+    btc = [action for action, _, symbol in bot.calls if symbol == "BTC/USDT"]
+    assert btc == ["start", "start done", "stop", "stop done"]
+
+
+def test_starting_a_running_grid_keeps_its_socket():
+    bot = GridBot()
+    socket = object()
+    bot.websocket_connections[("binance", "BTC/USDT")] = socket
+
+    assert bot.run_symbol("Binance", "BTC/USDT") is True
+    assert bot.websocket_connections == {("binance", "BTC/USDT"): socket}
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from observability.profiling import ProfilerBusy, SamplingProfiler, merge_profiles
+
+
+def _spin_in_profiled_thread(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=_spin_in_profiled_thread, args=(stop,), name="busy;worker")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_busy_thread_shows_up_in_collapsed_stacks(busy_thread):
+    profiler = SamplingProfiler()
+
+    samples, stacks = profiler.profile(0.3, interval=0.005)
+    lines = profiler.collapsed(stacks).splitlines()
+
+    assert samples > 10
+    mine = [line for line in lines if line.startswith("busy:worker;")]  # ";" in a name would split the stack
+    assert mine and all("_spin_in_profiled_thread (test_profiling.py:" in line for line in mine)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in mine) >= samples * 0.9
+    assert not any(line.startswith("MainThread") for line in lines)  # the sampling thread leaves itself out
+    assert lines == sorted(lines, key=lambda line: -int(line.rsplit(" ", 1)[1]))  # hottest first
+
+
+def test_second_profile_is_refused_while_one_runs():
+    profiler = SamplingProfiler()
+    first = threading.Thread(target=profiler.profile, args=(0.5,))
+    first.start()
+    deadline = time.monotonic() + 5
+    while not profiler._lock.locked() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    with pytest.raises(ProfilerBusy):
+        profiler.profile(0.1)
+    first.join()
+    assert profiler.profile(0.1)[0] >= 1  # free again once the first one finished
+
+
+def test_profiles_of_several_processes_merge_by_process():
+    profiles = {"supervisor": {"samples": 10, "stacks": {"main;loop": 10}},
+                "shard0": {"samples": 12, "stacks": {"main;loop": 4, "ws;on_message": 8}},
+                "shard1": {"error": "ProfilerBusy: A profile is already running"}}
+
+    samples, stacks = merge_profiles(profiles)
+
+    assert samples == 12
+    assert stacks == {"supervisor/main;loop": 10, "shard0/main;loop": 4, "shard0/ws;on_message": 8}
+
+
+def test_debug_endpoints_are_off_unless_enabled(monkeypatch):
+    from fastapi import HTTPException
+    from main import require_debug_endpoints
+
+    monkeypatch.delenv("DEBUG_ENDPOINTS", raising=False)
+    with pytest.raises(HTTPException) as refused:
+        require_debug_endpoints()
+    assert refused.value.status_code == 404
+
+    monkeypatch.setenv("DEBUG_ENDPOINTS", "1")
+    require_debug_endpoints()
@@ -0,0 +1,81 @@
+import pytest
+
+from exchanges.market_registry import MarketRegistry
+from exchanges.quantizer import (DECIMAL_PLACES, SIGNIFICANT_DIGITS, TICK_SIZE, Quantizer,
+                                 increment_from_precision)
+
+
+class FakeExchange:
+    id = "binance"
+    precisionMode = TICK_SIZE
+
+    def __init__(self, markets):
+        self.markets = markets
+        self.fetches = 0
+
+    def fetch_markets(self):
+        self.fetches += 1
+        return self.markets
+
+
+def test_precision_modes_give_the_same_increments():
+    assert increment_from_precision(0.01, TICK_SIZE) == "0.01"
+    assert increment_from_precision(2, DECIMAL_PLACES) == "0.01"
+    assert increment_from_precision(0, DECIMAL_PLACES) == "1"
+    assert increment_from_precision(None, DECIMAL_PLACES) is None
+    with pytest.raises(ValueError):
+        increment_from_precision(4, SIGNIFICANT_DIGITS)
+
+    by_ticks = Quantizer.from_market({"precision": {"price": 0.01, "amount": 0.00001}}, TICK_SIZE)
+    by_places = Quantizer.from_market({"precision": {"price": 2, "amount": 5}}, DECIMAL_PLACES)
+    for quantizer in (by_ticks, by_places):
+        assert (quantizer.tick_size, quantizer.step_size) == (0.01, 0.00001)
+        assert quantizer.round_price(30000.006) == 30000.01
+        assert quantizer.floor_amount(0.1234567) == 0.12345
+
+
+def test_floor_absorbs_float_error_but_never_rounds_up():
+    cents = Quantizer("0.01", "0.01")
+    assert 0.29 / 0.01 < 29  # what a naive floor would get wrong
+    assert cents.amount_to_steps(0.29) == 29 and cents.floor_amount(0.29) == 0.29
+    assert cents.amount_to_steps(0.58) == 58 and cents.amount_to_steps(1.15) == 115
+    assert cents.amount_to_steps(0.2899999) == 28
+    assert cents.amount_to_steps(0) == 0 and cents.amount_to_steps(-1.0) == 0
+
+    satoshis = Quantizer("1e-8", "1e-8")
+    assert satoshis.amount_to_steps(3e-8) == 3 and satoshis.floor_amount(0.00012345678) == 0.00012345
+    assert satoshis.price_to_ticks(0.00000007) == 7 and satoshis.round_price(1.000000004) == 1.0
+
+    whole = Quantizer("5", "10")  # increments above one
+    assert whole.round_price(12.4) == 10.0 and whole.floor_amount(29.9) == 20.0
+
+    for bad in ("0", "-0.01"):
+        with pytest.raises(ValueError):
+            Quantizer(bad, "0.01")
+
+
+def test_bitmart_market_falls_back_to_its_increments():
+    market = {"symbol": "BTC/USDT", "precision": {"price": None, "amount": None},
+              "quote_increment": "0.0001", "base_min_size": "0.1"}
+    quantizer = Quantizer.from_market(market)
+    assert (quantizer.tick_size, quantizer.step_size) == (0.0001, 0.1)
+
+    bare = Quantizer.from_market({"symbol": "BTC/USDT"})
+    assert (bare.tick_size, bare.step_size) == (1e-8, 1e-8)
+
+
+def test_registry_builds_each_quantizer_once_per_load():
+    exchange = FakeExchange([{"symbol": "BTC/USDT", "precision": {"price": 0.01, "amount": 0.001}}])
+    registry = MarketRegistry()
+
+    quantizer = registry.get_quantizer(exchange, "BTC/USDT")
+    assert registry.get_quantizer(exchange, "BTC/USDT") is quantizer and exchange.fetches == 1
+    assert registry.get_quantizer(exchange, "ETH/USDT") is None
+
+    exchange.markets = [{"symbol": "BTC/USDT", "precision": {"price": 0.1, "amount": 0.001}}]
+    registry.load(exchange)  # new markets replace the cached quantizers
+    assert registry.get_quantizer(exchange, "BTC/USDT").tick_size == 0.1
+
+    registry.ttl = -1  # expired: the next lookup fetches again
+    registry.get_market(exchange, "BTC/USDT")
+    assert exchange.fetches == 3
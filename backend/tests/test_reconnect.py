@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+
+from websocket_manager.reconnect import ReconnectManager
+
+KEY = ("binance", "BTC/USDT")
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_backoff_doubles_per_failure_up_to_the_cap(clock):
+    # The clock is frozen, so nothing scheduled here ever comes due
+    manager = ReconnectManager(base_delay=1.0, max_delay=16.0, rng=lambda: 1.0, clock=clock)
+
+    delays = [manager.schedule(KEY, lambda: None) for _ in range(7)]
+
+    assert delays == [1.0, 2.0, 4.0, 8.0, 16.0, 16.0, 16.0]
+
+
+def test_failures_back_off_the_whole_exchange_until_a_handshake_succeeds(clock):
+    manager = ReconnectManager(base_delay=1.0, max_delay=60.0, rng=lambda: 1.0, clock=clock)
+    others = [("binance", f"S{i}/USDT") for i in range(3)]
+
+    assert [manager.schedule(key, lambda: None) for key in others] == [1.0, 2.0, 4.0]
+    assert manager.schedule(("gateio", "S0/USDT"), lambda: None) == 1.0  # other exchanges are unaffected
+
+    manager.connected(others[0])
+    assert manager.schedule(KEY, lambda: None) == 1.0
+
+
+def test_stable_connection_drop_starts_over_but_flapping_does_not(clock):
+    manager = ReconnectManager(base_delay=1.0, max_delay=60.0, stable_after=60.0, rng=lambda: 1.0, clock=clock)
+    for _ in range(3):
+        manager.schedule(KEY, lambda: None)
+
+    manager.connected(KEY)
+    clock.now += 5  # dropped soon after its handshake
+    assert manager.schedule(KEY, lambda: None) == 8.0
+
+    manager.connected(KEY)
+    clock.now += 60
+    assert manager.schedule(KEY, lambda: None) == 1.0
+
+
+def test_jitter_spreads_a_blip_over_the_window(clock):
+    draws = iter([0.1, 0.9, 0.5])
+    manager = ReconnectManager(base_delay=10.0, max_delay=60.0, stable_after=60.0, rng=lambda: next(draws), clock=clock)
+    keys = [("bitmart", f"S{i}/USDT") for i in range(3)]
+    for key in keys:
+        manager.connected(key)
+    clock.now += 60
+
+    assert [manager.schedule(key, lambda: None) for key in keys] == pytest.approx([1.0, 9.0, 5.0])
+
+
+def test_handshakes_are_limited_per_exchange():
+    manager = ReconnectManager(max_handshakes=2, rng=lambda: 0.0)
+    started = []
+    lock = threading.Lock()
+
+    def connect(key):
+        def run():
+            with lock:
+                started.append(key)
+            return object()
+        return run
+
+    keys = [("bybit", f"S{i}/USDT") for i in range(5)]
+    for key in keys:
+        manager.schedule(key, connect(key))
+
+    assert _wait_for(lambda: len(started) == 2)
+    time.sleep(0.1)
+    assert len(started) == 2
+    assert manager.pending() == {("bybit", "handshaking"): 2, ("bybit", "waiting"): 3}
+
+    manager.connected(started[0])
+    assert _wait_for(lambda: len(started) == 3)
+    manager.cancel(keys[4])  # stopped while queued
+    manager.connected(started[1])
+    manager.connected(started[2])
+    time.sleep(0.1)
+    assert sorted(started) == sorted(keys[:4])
+
+
+def test_failed_connect_is_retried_and_cancel_stops_it():
+    manager = ReconnectManager(base_delay=0.01, max_delay=0.02, rng=lambda: 1.0)
+    calls = []
+
+    def connect():
+        calls.append(time.monotonic())
+        return None if len(calls) < 3 else object()
+
+    manager.schedule(KEY, connect)
+    assert _wait_for(lambda: len(calls) == 3)
+    assert manager.pending() == {("binance", "handshaking"): 1}
+
+    manager.schedule(KEY, connect)  # the third connection dropped too
+    manager.cancel(KEY)
+    time.sleep(0.1)
+    assert len(calls) == 3 and manager.pending() == {}
+
+
+def test_timed_out_handshake_gives_back_its_slot_and_is_forgotten():
+    manager = ReconnectManager(max_handshakes=1, handshake_timeout=0.05, rng=lambda: 0.0)
+    release = threading.Event()
+    started = []
+
+    def connect(key):
+        def run():
+            started.append(key)
+            release.wait(5)  # the exchange never answers while the test is looking
+            return object()
+        return run
+
+    manager.schedule(KEY, connect(KEY))
+    manager.schedule(("binance", "ETH/USDT"), connect(("binance", "ETH/USDT")))
+
+    assert _wait_for(lambda: len(started) == 2)  # the second got the slot the first timed out of
+    assert _wait_for(lambda: manager.pending() == {})
+    release.set()
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+from grid_logic import recovery
+from websocket_manager import websocket_manager as wm
+
+
+class FakeExchange:
+    def __init__(self, exchange_id="binance", orders=(), all_symbols=True):
+        self.id = exchange_id
+        self.options = {}
+        self.orders = list(orders)
+        self.all_symbols = all_symbols
+        self.calls = []
+
+    def fetch_open_orders(self, symbol=None):
+        self.calls.append(symbol)
+        if symbol is None and not self.all_symbols:
+            raise Exception(f"{self.id} fetchOpenOrders() requires a symbol argument")
+        return [o for o in self.orders if symbol is None or o["symbol"] == symbol]
+
+
+ORDERS = [{"id": "1", "symbol": "BTC/USDT"}, {"id": "2", "symbol": "ETH/USDT"}, {"id": "3", "symbol": "BTC/USDT"},
+          {"id": "4", "symbol": "DOGE/USDT"}]  # not a grid of ours
+
+
+def test_one_call_fetches_the_open_orders_of_every_symbol():
+    exchange = FakeExchange(orders=ORDERS)
+    by_symbol = recovery.fetch_account_open_orders(exchange, ["BTC/USDT", "ETH/USDT", "SOL/USDT"])
+
+    assert exchange.calls == [None]
+    assert exchange.options["warnOnFetchOpenOrdersWithoutSymbol"] is False
+    assert {s: [o["id"] for o in orders] for s, orders in by_symbol.items()} == {
+        "BTC/USDT": ["1", "3"], "ETH/USDT": ["2"], "SOL/USDT": []}
+
+
+def test_venues_without_an_all_symbols_call_are_asked_per_symbol():
+    exchange = FakeExchange("bitmart", orders=ORDERS, all_symbols=False)
+    by_symbol = recovery.fetch_account_open_orders(exchange, ["BTC/USDT", "ETH/USDT"])
+
+    assert exchange.calls == [None, "BTC/USDT", "ETH/USDT"]
+    assert {s: [o["id"] for o in orders] for s, orders in by_symbol.items()} == {
+        "BTC/USDT": ["1", "3"], "ETH/USDT": ["2"]}
+
+
+class FakeSocket:
+    def __init__(self, connected=True):
+        self.sock = SimpleNamespace(connected=connected)
+
+
+def test_sockets_open_only_after_every_grid_is_reconciled(monkeypatch):
+    events = []
+    accounts = {
+        1: (SimpleNamespace(exchange="binance", balance=10.0), ["BTC/USDT", "ETH/USDT", "SOL/USDT"]),
+        2: (SimpleNamespace(exchange="bybit", balance=20.0), ["BTC/USDT", "XRP/USDT"]),
+        3: (SimpleNamespace(exchange="gateio", balance=30.0), ["ADA/USDT"]),
+    }
+
+    def create_exchange_client(key):
+        if key.exchange == "gateio":
+            raise ConnectionError("gateio is down")
+        return SimpleNamespace(id=key.exchange)
+
+    def reconcile_grid(exchange, symbol, amount, db_session, open_orders=None):
+        events.append(("reconcile", exchange.id, symbol))
+        if symbol == "ETH/USDT":
+            raise ValueError("no levels")
+        return f"config {symbol}", f"params {symbol}"
+
+    def start_grid_websocket(exchange, symbol, bot_config, amount, market_params, db_session, bot):
+        events.append(("socket", exchange.id, symbol))
+        assert bot_config == f"config {symbol}"
+        return None if symbol == "XRP/USDT" else FakeSocket()
+
+    monkeypatch.setattr(recovery, "SessionLocal", lambda: SimpleNamespace(close=lambda: None))
+    monkeypatch.setattr(recovery, "load_recoverable_grids", lambda db_session, grids: accounts)
+    monkeypatch.setattr(recovery, "create_exchange_client", create_exchange_client)
+    monkeypatch.setattr(recovery.market_registry, "load", lambda exchange: None)
+    monkeypatch.setattr(recovery, "fetch_account_open_orders", lambda exchange, symbols: {})
+    monkeypatch.setattr(recovery, "market_data", SimpleNamespace(subscribe=lambda *a: None, unsubscribe=lambda *a: None))
+    monkeypatch.setattr(wm, "reconcile_grid", reconcile_grid)
+    monkeypatch.setattr(wm, "start_grid_websocket", start_grid_websocket)
+    bot = SimpleNamespace(websocket_connections={("binance", "SOL/USDT"): object()}, warm_start_report=None)
+
+    report = recovery.warm_start(bot)
+
+    kinds = [kind for kind, *_ in events]
+    assert kinds.index("socket") > max(i for i, kind in enumerate(kinds) if kind == "reconcile")
+    assert sorted(e[1:] for e in events if e[0] == "socket") == [("binance", "BTC/USDT"), ("bybit", "BTC/USDT"),
+                                                                 ("bybit", "XRP/USDT")]
+    statuses = {(r["exchange"], r["symbol"]): r["status"] for r in report["results"]}
+    assert statuses == {
+        ("binance", "BTC/USDT"): "armed",
+        ("binance", "ETH/USDT"): "failed",           # reconciliation raised
+        ("binance", "SOL/USDT"): "already_running",
+        ("bybit", "BTC/USDT"): "armed",
+        ("bybit", "XRP/USDT"): "failed",             # its socket did not start
+        ("gateio", "ADA/USDT"): "failed",            # the account could not be loaded
+    }
+    assert (report["grids"], report["accounts"], report["armed"], report["connected"], report["failed"]) == (6, 3, 2, 2, 3)
+    assert 0 <= report["reconcile_seconds"] <= report["time_to_fully_armed"]
+    assert bot.warm_start_report is report
+
+
+def test_arming_counts_only_sockets_that_connected():
+    sockets = [FakeSocket(), FakeSocket(connected=False), SimpleNamespace(sock=None)]
+    assert recovery._wait_until_armed(sockets, timeout=0.1) == 1
@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+import sys
+import zlib
+from pathlib import Path
+
+import pytest
+
+from websocket_manager.frame_log import FrameRecorder
+from websocket_manager.replay import frame_price
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+FILL = {"e": "executionReport", "s": "BTCUSDT", "c": "web_1", "S": "BUY", "o": "LIMIT", "X": "FILLED",
+        "x": "TRADE", "i": 1, "l": "0.001", "z": "0.001", "L": "29700", "q": "0.001", "p": "29700"}
+
+
+def test_replay_never_touches_the_default_database(tmp_path):
+    capture = tmp_path / "capture.gbfl"
+    recorder = FrameRecorder(str(capture))
+    recorder.record("binance:BTC/USDT", json.dumps(FILL))
+    recorder.close()
+
+    # A fresh interpreter, as from the command line: nothing has imported the database yet
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(BACKEND / "src"), str(BACKEND)])}
+    env.pop("DATABASE_URL", None)
+    env.pop("WS_CAPTURE_PATH", None)
+    result = subprocess.run([sys.executable, "-m", "websocket_manager.replay", str(capture), "--max-speed",
+                             "--drain", "0"], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout)
+    assert report["frames"] == 1 and report["handler_errors"] == 0
+    assert "gridbot-replay-" in report["database"]
+    assert not (tmp_path / "trading_bot.db").exists()
+
+
+def _deflate(msg):
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(json.dumps(msg).encode("utf-8")) + compressor.flush()
+
+
+@pytest.mark.parametrize("exchange, is_binary, payload, price", [
+    ("binance", False, json.dumps(FILL), 29700.0),
+    ("bybit", False, json.dumps({"topic": "order", "data": [{"orderStatus": "Filled", "avgPrice": "61.5"}]}), 61.5),
+    ("gateio", False, json.dumps({"channel": "spot.usertrades", "event": "update",
+                                  "result": [{"currency_pair": "BTC_USDT", "price": "29650.1"}]}), 29650.1),
+    ("bitmart", True, _deflate({"table": "spot/user/order", "data": [{"last_fill_price": "0.251"}]}), 0.251),
+])
+def test_frame_price_reads_each_exchange_shape(exchange, is_binary, payload, price):
+    assert frame_price(exchange, is_binary, payload) == price
+
+
+@pytest.mark.parametrize("exchange, is_binary, payload", [
+    ("binance", False, json.dumps({"result": None, "id": 1})),  # subscribe ack
+    ("bybit", False, json.dumps({"op": "pong", "data": []})),
+    ("gateio", False, json.dumps({"channel": "spot.usertrades", "result": {"status": "success"}})),
+    ("bitmart", True, b"not deflated"),
+    ("binance", False, "pong"),
+    ("binance", False, json.dumps({**FILL, "L": "0"})),
+])
+def test_frame_price_skips_frames_without_a_fill_price(exchange, is_binary, payload):
+    assert frame_price(exchange, is_binary, payload) is None
@@ -0,0 +1,125 @@
+import threading
+import time
+
+from websocket_manager.resync import GapRecovery
+
+KEY = ("binance", "BTC/USDT")
+
+
+class FakeExchange:
+    has = {"fetchClosedOrders": True}
+
+    def __init__(self, orders=(), trades=()):
+        self.orders = list(orders)
+        self.trades = list(trades)
+        self.since = []
+        self.gate = None  # set to hold the fetch until released
+
+    def fetch_closed_orders(self, symbol, since=None):
+        self.since.append(since)
+        if self.gate is not None:
+            self.gate.wait(5)
+        if isinstance(self.orders, Exception):
+            raise self.orders
+        return [o for o in self.orders if (o["lastTradeTimestamp"] or 0) >= since]
+
+    def fetch_my_trades(self, symbol, since=None):
+        self.since.append(since)
+        return [t for t in self.trades if t["timestamp"] >= since]
+
+
+def _order(order_id, ms, status="closed"):
+    return {"id": order_id, "status": status, "filled": 1.0, "price": 100.0, "lastTradeTimestamp": ms,
+            "timestamp": ms, "clientOrderId": None}
+
+
+def _recovery(**kwargs):
+    clock = [1000.0]
+    kwargs.setdefault("retries", 0)
+    return GapRecovery(overlap=5, clock=lambda: clock[0], **kwargs), clock
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def test_missed_fills_are_replayed_in_order_before_live_ones():
+    recovery, clock = _recovery()
+    applied = []
+    recovery.fill(KEY, "1", 990_000, lambda: applied.append("1"))
+    recovery.disconnected(KEY)
+
+    exchange = FakeExchange([_order("3", 1_001_000), _order("1", 990_000), _order("2", 1_000_500),
+                             _order("4", 1_000_700, status="canceled")])
+    exchange.gate = threading.Event()
+    thread = recovery.reconnected(KEY, exchange, "BTC/USDT", lambda order: applied.append(order["id"]))
+    recovery.fill(KEY, "5", 1_002_000, lambda: applied.append("5"))  # live, while the backfill runs
+    exchange.gate.set()
+    thread.join(5)
+
+    assert exchange.since == [995_000]  # the drop less the overlap, after the last fill
+    assert applied == ["1", "2", "3", "5"]
+    assert recovery.fill(KEY, "3", 1_001_000, lambda: applied.append("dup")) is False
+    assert recovery.reconnected(KEY, exchange, "BTC/USDT", applied.append) is None  # the gap is closed
+
+
+def test_failed_fetch_leaves_the_gap_for_the_next_reconnect():
+    recovery, clock = _recovery()
+    recovery.disconnected(KEY)
+    exchange = FakeExchange()
+    exchange.orders = ConnectionError("timed out")
+    recovery.reconnected(KEY, exchange, "BTC/USDT", lambda order: None).join(5)
+
+    exchange.orders = [_order("7", 999_000)]
+    applied = []
+    recovery.reconnected(KEY, exchange, "BTC/USDT", lambda order: applied.append(order["id"])).join(5)
+    assert applied == ["7"] and exchange.since == [995_000, 995_000]
+
+
+def test_failed_fetch_is_retried_on_a_socket_that_stays_up():
+    recovery, clock = _recovery(retries=3, retry_delay=0.01)
+    recovery.disconnected(KEY)
+    exchange = FakeExchange()
+    exchange.orders = ConnectionError("timed out")
+    applied = []
+    recovery.reconnected(KEY, exchange, "BTC/USDT", lambda order: applied.append(order["id"])).join(5)
+    exchange.orders = [_order("7", 999_000)]
+
+    _wait_for(lambda: applied == ["7"])
+    assert exchange.since == [995_000, 995_000]
+    assert recovery.reconnected(KEY, exchange, "BTC/USDT", applied.append) is None  # the gap is closed
+
+
+def test_retries_stop_after_the_bound_and_when_the_grid_is_stopped():
+    recovery, clock = _recovery(retries=2, retry_delay=0.01)
+    recovery.disconnected(KEY)
+    exchange = FakeExchange()
+    exchange.orders = ConnectionError("timed out")
+    recovery.reconnected(KEY, exchange, "BTC/USDT", lambda order: None).join(5)
+    _wait_for(lambda: len(exchange.since) == 3)
+    time.sleep(0.2)
+    assert len(exchange.since) == 3  # the first fetch and two retries
+
+    recovery, clock = _recovery(retries=2, retry_delay=0.1)
+    recovery.disconnected(KEY)
+    stopped = FakeExchange()
+    stopped.orders = ConnectionError("timed out")
+    recovery.reconnected(KEY, stopped, "BTC/USDT", lambda order: None).join(5)
+    recovery.forget(KEY)
+    time.sleep(0.3)
+    assert len(stopped.since) == 1
+
+
+def test_trades_stand_in_without_closed_orders():
+    recovery, clock = _recovery()
+    recovery.disconnected(KEY)
+    exchange = FakeExchange(trades=[{"order": "8", "price": 99.0, "timestamp": 996_000},
+                                    {"order": "8", "price": 98.5, "timestamp": 996_100}])
+    exchange.has = {"fetchClosedOrders": False}
+    applied = []
+    recovery.reconnected(KEY, exchange, "BTC/USDT", applied.append).join(5)
+    assert [(o["id"], o["price"]) for o in applied] == [("8", 98.5)]
@@ -0,0 +1,35 @@
+from grid_logic.sharding import ShardedGridBot, shard_index
+
+GRIDS = [("binance", f"S{i}/USDT") for i in range(12)]
+
+
+class FakeShard:
+    def __init__(self, slot, log):
+        self.slot, self.log = slot, log
+        self.grids = set()
+        self.alive = True
+
+    def request(self, method, *args, timeout=None):
+        self.log.append((self.slot, method) + args)
+        return True
+
+
+def test_rebalance_hands_grids_over_without_liquidating():
+    log = []
+    bot = ShardedGridBot(3)
+    bot._shards = [FakeShard(slot, log) for slot in range(3)]
+    for grid in GRIDS:
+        bot._route(*grid).grids.add(grid)
+
+    retired = bot._shards[2:]
+    bot._shards = bot._shards[:2]
+    bot._rebalance(retired)
+
+    moved = [grid for grid in GRIDS if shard_index(*grid, 3) != shard_index(*grid, 2)]
+    assert moved
+    assert {method for _, method, *_ in log} == {"detach_symbol", "run_symbol"}
+    for exchange, symbol in moved:
+        source, target = shard_index(exchange, symbol, 3), shard_index(exchange, symbol, 2)
+        detach = log.index((source, "detach_symbol", symbol, exchange))
+        assert log.index((target, "run_symbol", exchange, symbol)) > detach  # the orders are reconciled, not rebought
+    assert {grid for shard in bot._shards for grid in shard.grids} == set(GRIDS)
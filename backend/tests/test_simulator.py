@@ -0,0 +1,105 @@
+import json
+
+import pytest
+import requests
+import websocket
+from ccxt.base.errors import DuplicateOrderId, InsufficientFunds, InvalidOrder
+
+from simulator.server import SimulatorServer
+from simulator.venue import SimulatedExchange, SimulatedVenue
+
+
+def _venue(exchange_id="binance", fee_rate=0.001, quote_balance=1000.0):
+    venue = SimulatedVenue(exchange_id, fee_rate=fee_rate, quote_balance=quote_balance)
+    venue.add_market("BTC/USDT", 100.0, tick_size="0.01", step_size="0.001", min_notional=5.0)
+    venue.add_account("key", "secret")
+    return venue, SimulatedExchange(venue, "key", "secret")
+
+
+def test_set_price_fills_the_resting_orders_it_crosses_at_their_own_price():
+    venue, exchange = _venue()
+    buys = [exchange.create_limit_buy_order("BTC/USDT", 1, price) for price in (99.0, 95.0)]
+    events = []
+    venue.listeners.append(lambda v, key, event, order, trade: events.append((event, order["id"], trade and trade["price"])))
+
+    assert venue.set_price("BTC/USDT", 97.0) == 1
+    assert exchange.fetch_order(buys[0]["id"])["status"] == "closed"
+    assert exchange.fetch_order(buys[0]["id"])["average"] == 99.0  # its limit, not the new last price
+    assert [o["id"] for o in exchange.fetch_open_orders("BTC/USDT")] == [buys[1]["id"]]
+    assert events == [("fill", buys[0]["id"], 99.0)]
+    assert venue.nearest_levels("BTC/USDT") == (95.0, None)
+    assert venue.unanswered_fills() == 1
+
+    exchange.create_limit_sell_order("BTC/USDT", 1, 101.0)  # the grid's follow-up answers the fill
+    assert venue.unanswered_fills() == 0 and len(venue.replacement_latencies) == 1
+    assert venue.set_price("BTC/USDT", 97.5) == 0  # nothing crossed
+
+
+def test_marketable_limit_orders_fill_at_once():
+    venue, exchange = _venue()
+    order = exchange.create_limit_buy_order("BTC/USDT", 1, 110.0)
+    assert order["status"] == "closed" and order["average"] == 110.0
+    assert venue.unanswered_fills() == 0  # only resting fills wait for a follow-up
+
+
+def test_balances_lock_funds_and_charge_quote_fees():
+    venue, exchange = _venue(fee_rate=0.001, quote_balance=1000.0)
+    buy = exchange.create_limit_buy_order("BTC/USDT", 2, 99.0)
+    balance = exchange.fetch_balance()
+    assert (balance["USDT"]["free"], balance["USDT"]["used"]) == (802.0, 198.0)
+
+    venue.set_price("BTC/USDT", 98.0)
+    balance = exchange.fetch_balance()
+    assert balance["USDT"]["used"] == 0.0
+    assert balance["USDT"]["free"] == pytest.approx(1000.0 - 198.0 - 0.198)
+    assert balance["BTC"]["free"] == 2.0
+
+    sell = exchange.create_limit_sell_order("BTC/USDT", 2, 101.0)
+    assert exchange.fetch_balance()["BTC"] == {"free": 0.0, "used": 2.0, "total": 2.0}
+    exchange.cancel_order(sell["id"], "BTC/USDT")
+    assert exchange.fetch_balance()["BTC"]["free"] == 2.0
+
+    with pytest.raises(InsufficientFunds):
+        exchange.create_limit_buy_order("BTC/USDT", 100, 99.0)
+    with pytest.raises(InsufficientFunds):
+        exchange.create_market_sell_order("BTC/USDT", 3)
+    assert exchange.fetch_order(buy["id"])["fee"] == {"cost": pytest.approx(0.198), "currency": "USDT"}
+
+
+@pytest.mark.parametrize("exchange_id, error, message", [
+    ("binance", InvalidOrder, '"code":-2010'),
+    ("bybit", InvalidOrder, '"retCode":110072'),
+    ("gateio", DuplicateOrderId, "duplicate client order id"),
+])
+def test_a_reused_client_order_id_is_rejected_like_the_venue(exchange_id, error, message):
+    venue, exchange = _venue(exchange_id)
+    exchange.create_limit_buy_order("BTC/USDT", 1, 99.0, {"clientOrderId": "gb1l0g0"})
+    with pytest.raises(error) as caught:
+        exchange.create_limit_buy_order("BTC/USDT", 1, 98.0, {"clientOrderId": "gb1l0g0"})
+    assert message in str(caught.value)
+    assert len(exchange.fetch_open_orders("BTC/USDT")) == 1
+
+    venue.set_price("BTC/USDT", 98.5)  # once filled, the id may be used again
+    exchange.create_limit_buy_order("BTC/USDT", 1, 97.0, {"clientOrderId": "gb1l0g0"})
+
+
+def test_a_fill_reaches_the_binance_user_stream():
+    venue, exchange = _venue()
+    server = SimulatorServer({"binance": venue}).start()
+    try:
+        response = requests.post(f"{server.http_url}/api/v3/userDataStream", headers={"X-MBX-APIKEY": "key"}, timeout=5)
+        ws = websocket.create_connection(f"{server.binance_ws_url}/{response.json()['listenKey']}", timeout=5)
+        try:
+            order = exchange.create_limit_buy_order("BTC/USDT", 1, 99.0, {"newClientOrderId": "gb1l0g0"})
+            assert json.loads(ws.recv())["X"] == "NEW"
+
+            venue.set_price("BTC/USDT", 98.0)
+            report = json.loads(ws.recv())
+        finally:
+            ws.close()
+    finally:
+        server.stop()
+
+    assert report["e"] == "executionReport" and report["s"] == "BTCUSDT" and report["c"] == "gb1l0g0"
+    assert (report["x"], report["X"], report["i"]) == ("TRADE", "FILLED", int(order["id"]))
+    assert float(report["L"]) == 99.0 and float(report["l"]) == 1.0
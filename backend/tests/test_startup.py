@@ -0,0 +1,11 @@
+from benchmarks import startup
+
+
+def test_import_main_defers_heavy_dependencies():
+    result = startup.import_breakdown()
+    assert result["deferred_loaded"] == [], f"import main loaded {result['deferred_loaded']}"
+    assert result["import_seconds"] < startup.IMPORT_BUDGET, result["packages"]
+
+
+def test_first_request_within_budget():
+    assert startup.time_to_first_request() < startup.FIRST_REQUEST_BUDGET
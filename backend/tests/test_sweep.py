@@ -0,0 +1,45 @@
+import numpy as np
+
+from backtesting.sweep import param_grid, run_sweep, to_symbols_request
+
+
+def _wave(bars, base=100.0, swing=0.03):
+    """Bars oscillating around `base`, enough to fill SLs and rebound TPs."""
+    close = base * (1 + swing * np.sin(np.arange(bars) / 5))
+    return close, close * 1.002, close * 0.998, close
+
+
+def test_param_grid_is_the_product_or_a_seeded_sample():
+    combos = param_grid([1, 2], [0.5, 1], sl_levels=(3, 5))
+    assert len(combos) == 8 and {"tp_percent": 2, "sl_percent": 1, "sl_levels": 5, "amount": 10.0} in combos
+    assert param_grid([1, 2], [0.5, 1], samples=2, seed=7) == param_grid([1, 2], [0.5, 1], samples=2, seed=7)
+    assert len(param_grid([1, 2], [0.5, 1], samples=10)) == 4
+
+
+def test_sweep_ranks_best_first_and_skips_symbols_without_bars():
+    empty = np.array([], dtype=np.float64)
+    data = {"WAVE/USDT": _wave(400), "EMPTY/USDT": (empty, empty, empty, empty)}
+    combos = param_grid([0.5, 1, 2], [0.5, 1])
+
+    results = run_sweep(data, combos, max_workers=1, rank_by="pnl")
+
+    assert len(results) == len(combos) and {r["symbol"] for r in results} == {"WAVE/USDT"}
+    assert [r["pnl"] for r in results] == sorted((r["pnl"] for r in results), reverse=True)
+
+
+def test_symbols_request_keeps_stored_symbols_the_sweep_did_not_cover():
+    results = [
+        {"symbol": "btc/usdt", "tp_percent": 2.0, "sl_percent": 0.5, "sl_levels": 5, "amount": 20.0},
+        {"symbol": "btc/usdt", "tp_percent": 1.0, "sl_percent": 1.0, "sl_levels": 3, "amount": 10.0},
+    ]
+    stored = {"symbols": [
+        {"symbol": "BTC/USDT", "configs": [{"exchange": "binance", "tp_percent": 3.0, "sl_percent": 3.0}]},
+        {"symbol": "ETH/USDT", "configs": [{"exchange": "binance", "tp_percent": 1.5, "sl_percent": 0.8}]},
+    ]}
+
+    body = to_symbols_request(results, stored)
+
+    assert body == {"symbols": [
+        {"symbol": "BTC/USDT", "tp_percent": 2.0, "sl_percent": 0.5, "sl_levels": 5, "amount": 20.0},
+        {"symbol": "ETH/USDT", "tp_percent": 1.5, "sl_percent": 0.8},
+    ]}
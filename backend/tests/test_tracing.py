@@ -0,0 +1,84 @@
+from observability.tracing import NOOP_TRACE, FillTracer, otlp_spans
+
+MS = 1_000_000
+
+
+class RecordingExporter:
+    def __init__(self):
+        self.traces = []
+
+    def submit(self, trace):
+        self.traces.append(trace)
+
+
+def _fill(tracer, order_id, exchange="binance", symbol="BTC/USDT", ack=None):
+    trace = tracer.start(exchange, symbol, order_id=order_id, exchange_ts_ms=1_000, received_ns=1_002 * MS)
+    if ack is not None:
+        trace.add_ack("create_limit_buy_order", 1_003 * MS, {"id": ack})
+    trace.settle()
+    return trace
+
+
+def test_only_the_newest_traces_are_kept():
+    exporter = RecordingExporter()
+    tracer = FillTracer(capacity=3, exporter=exporter)
+    for order_id in "12345":
+        _fill(tracer, order_id)
+
+    assert [t["order_id"] for t in tracer.recent()] == ["5", "4", "3"]
+    assert len(exporter.traces) == 5  # the exporter sees every trace, the ring only the newest
+    assert FillTracer(capacity=0).start("binance", "BTC/USDT") is NOOP_TRACE
+
+
+def test_spans_are_ordered_from_the_exchange_event():
+    tracer = FillTracer(capacity=10)
+    trace = tracer.start("binance", "BTC/USDT", order_id=1, exchange_ts_ms="1000", received_ns=1_002 * MS)
+    trace.add_span("timer_wait", 1_010 * MS, 1_020 * MS)
+    trace.add_span("decode", 1_002 * MS, 1_003 * MS)
+    trace.expect_placement()
+    trace.settle()
+    assert tracer.recent() == []  # the scheduled placement has not reported back
+
+    trace.add_ack("create_limit_sell_order", 1_020 * MS, {"id": 77})
+    trace.placement_done()
+    [result] = tracer.recent()
+    assert result["finished"] and result["replacement_order_ids"] == ["77"]
+    assert [(s["name"], s["offset_ms"]) for s in result["spans"]] == [
+        ("receive", 0.0), ("decode", 2.0), ("timer_wait", 10.0), ("rest_submit", 20.0)]
+    assert result["spans"][0]["duration_ms"] == 2.0
+
+
+def test_recent_filters_by_exchange_symbol_and_order():
+    tracer = FillTracer(capacity=10)
+    first = _fill(tracer, "1", ack="10")
+    _fill(tracer, "2", exchange="bybit")
+    _fill(tracer, "3", symbol="ETH/USDT")
+    follow_up = _fill(tracer, "10")  # the fill of the order the first trace placed
+
+    assert follow_up.placed_by == first.trace_id
+    assert [t["order_id"] for t in tracer.recent(exchange="binance")] == ["10", "3", "1"]
+    assert [t["order_id"] for t in tracer.recent(symbol="BTC/USDT")] == ["10", "2", "1"]
+    assert [t["order_id"] for t in tracer.recent(order_id="10")] == ["10", "1"]
+    assert [t["order_id"] for t in tracer.recent(limit=2)] == ["10", "3"]
+
+
+def test_otlp_spans_hang_every_stage_off_a_fill_root():
+    tracer = FillTracer(capacity=10)
+    trace = tracer.start("binance", "BTC/USDT", order_id=5, exchange_ts_ms=1_000, received_ns=1_002 * MS)
+    trace.add_span("state_update", 1_003 * MS, 1_004 * MS, levels=2, ratio=0.5, dry=False)
+    trace.add_ack("create_limit_buy_order", 1_004 * MS, {"id": 9})
+    trace.settle(error=ValueError("no balance"))
+
+    root, *children = otlp_spans(trace)
+    assert root["name"] == "fill" and root["traceId"] == trace.trace_id and "parentSpanId" not in root
+    assert root["startTimeUnixNano"] == str(1_000 * MS) and root["endTimeUnixNano"] == str(trace.finished_ns)
+    assert root["status"] == {"code": 2, "message": "ValueError('no balance')"}
+    assert {"key": "replacement.order_ids", "value": {"stringValue": "9"}} in root["attributes"]
+    assert all(a["key"] != "placed_by_trace" for a in root["attributes"])  # None is left out
+
+    assert [c["name"] for c in children] == ["receive", "state_update", "rest_submit"]
+    assert {c["parentSpanId"] for c in children} == {root["spanId"]}
+    assert [c["kind"] for c in children] == [1, 1, 3]
+    assert children[1]["attributes"] == [{"key": "levels", "value": {"intValue": "2"}},
+                                         {"key": "ratio", "value": {"doubleValue": 0.5}},
+                                         {"key": "dry", "value": {"boolValue": False}}]
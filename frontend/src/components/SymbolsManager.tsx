@@ -114,15 +114,14 @@ export default function SymbolsManager() {
         return;
       }
   
-      await Promise.all(
-        storedExchanges.map(async (exchange: string) => {
-          return fetch(`${API_URL}/grid-bot/start-symbol`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ exchange, symbol }),
-          });
-        })
-      );
+      // ✅ One bulk request; the backend starts each exchange with its own concurrency limit
+      await fetch(`${API_URL}/grid-bot/bulk-start`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          pairs: storedExchanges.map((exchange: string) => ({ exchange, symbol })),
+        }),
+      });
   
       setSymbolRows((prev) =>
         prev.map((row) =>